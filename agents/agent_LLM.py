@@ -2,6 +2,13 @@
 # Licensed under the Apache License, Version 2.0, see LICENSE for details.
 # SPDX-License-Identifier: Apache-2.0
 
+import copy
+import threading
+import time
+import unittest
+from concurrent.futures import Future, ThreadPoolExecutor, wait
+from dataclasses import dataclass, field
+
 from agents.agent_base import *
 from loggers.logger_base import BaseLogger
 from loggers.logger_csv import CSVLogger
@@ -19,6 +26,40 @@ from stimuli_filter import *
 # PERIOD = 7
 
 
+# A response requested ahead of time, while the simulator runs the last stimuli
+# of the buffer
+@dataclass
+class Prefetch:
+    prompt: str
+    # the copy of the prompt generator that generated the prompt, taken over if
+    # the response is used
+    prompt_generator: BasePromptGenerator
+    # the LLM conversation before the prompt, restored if it is not
+    conversation: tuple
+    # number of bins hit when the prompt was generated
+    hit_cnt: int
+    future: Future
+
+
+# A response streaming in, whose stimuli are buffered as they are extracted
+@dataclass
+class StimulusStream:
+    prompt: str
+    # the response as kept among the best messages, its content is filled in
+    # once the response has ended
+    response: dict
+    future: Union[Future, None] = None
+    # notified on new stimuli and at the end of the response, on the buffer lock
+    # of the agent
+    cond: threading.Condition = field(default_factory=threading.Condition)
+    stimulus_cnt: int = 0
+    # characters since the last stimulus
+    stall_chars: int = 0
+    # asked to stop early
+    stopped: bool = False
+    done: bool = False
+
+
 class LLMAgent(BaseAgent):
     def __init__(
         self,
@@ -30,7 +71,13 @@ class LLMAgent(BaseAgent):
         dialog_bound: int = 650,
         rst_plan: Callable[..., bool] = None,
         token_budget: Union[Budget, None] = None,
-        bin_count = 0
+        bin_count = 0,
+        prefetch_threshold: int = 0,
+        prefetch_tolerance: int = 0,
+        streaming: bool = False,
+        stream_stimulus_bound: int = 0,
+        stream_stall_chars: int = 0,
+        buffer_policy: Callable[[List[int]], bool] = None,
     ):
         super().__init__()
         self.prompt_generator = prompt_generator
@@ -40,6 +87,11 @@ class LLMAgent(BaseAgent):
 
         self.state = "INIT"  # states: INIT, ITER, DONE
         self.stimuli_buffer = []
+        # (dialog, message, index in the response) of each buffered stimulus
+        self.stimuli_origins: List[Tuple[int, int, int]] = []
+        # held to change the buffer while a response streams into it on another
+        # thread, and by the condition of the stream
+        self.buffer_lock = threading.Lock()
         self.stimulus_cnt = 0
         self.dialog_bound = dialog_bound
         self.rst_plan: Callable[..., bool] = rst_plan
@@ -57,13 +109,62 @@ class LLMAgent(BaseAgent):
         self.token_budget: Union[Budget, None] = token_budget
         self.bin_count = bin_count
 
+        # Speculative prefetch: once no more than `prefetch_threshold` stimuli are
+        # left in the buffer, the next response is requested in the background
+        # from the coverage so far. It is used if no more than
+        # `prefetch_tolerance` bins were newly hit by the time the buffer is
+        # empty, and discarded otherwise. 0 disables prefetching.
+        self.prefetch_threshold = prefetch_threshold
+        self.prefetch_tolerance = prefetch_tolerance
+        self.prefetch: Union[Prefetch, None] = None
+        self.prefetch_executor: Union[ThreadPoolExecutor, None] = None
+        self.prefetch_used_cnt = 0
+        self.prefetch_discarded_cnt = 0
+
+        # Streaming: stimuli are sent to the simulator as soon as they are
+        # extracted from the response streaming in. The response is stopped
+        # once it has given `stream_stimulus_bound` stimuli, or when
+        # `stream_stall_chars` characters have followed the last stimulus
+        # without another one, i.e. the response has degenerated. 0 disables
+        # either limit.
+        self.streaming = streaming
+        self.stream_stimulus_bound = stream_stimulus_bound
+        self.stream_stall_chars = stream_stall_chars
+        self.stream: Union[StimulusStream, None] = None
+        self.stream_executor: Union[ThreadPoolExecutor, None] = None
+        self.stream_stopped_cnt = 0
+
+        # Coverage attribution: the origin (self, (dialog, message, index in the
+        # response), value) of the last value handed out, None if it came from no
+        # response, and of each value of the last batch. The bins newly hit by
+        # each stimulus are recorded by a CoverageAttributor into `attribution`:
+        # (dialog, message, index in the response) -> (value, newly hit bins),
+        # i.e. the stimuli of the run that were of any use.
+        self.last_origin: Union[tuple, None] = None
+        self.batch_origins: List[Union[tuple, None]] = []
+        self.attribution: Dict[Tuple[int, int, int], Tuple[Any, List[str]]] = {}
+
+        # Buffer policy: told the bins hit when each stimulus of the current
+        # response was handed out, and now, decides whether the rest of the
+        # response is dropped, so that the LLM is asked again sooner (see the
+        # buffer policies below). None keeps every response whole.
+        self.buffer_policy: Callable[[List[int]], bool] = buffer_policy
+        self.response_hit_hist: List[int] = []
+        self.hit_cnt = 0
+        self.buffer_cut_cnt = 0
+
     def reset(self):
+        # the conversation the prefetched response continues is restarted
+        self._discard_prefetch()
+        self._stop_stream()
         self.log_reset()
 
         self.dialog_index += 1
         self.msg_index = 0
         self.state = "INIT"
         self.stimuli_buffer.clear()
+        self.stimuli_origins.clear()
+        self.response_hit_hist.clear()
         self.stimulus_cnt = 0
         self.history_cov_rate.clear()
 
@@ -78,10 +179,9 @@ class LLMAgent(BaseAgent):
             return False
 
         coverage = coverage_database.get_coverage_plan()
-        missed_bins = list(
-            map(lambda p: p[0], filter(lambda p: p[1] == 0, coverage.items()))
-        )
+        missed_bins = coverage_database.get_missed_bins()
         if len(missed_bins) == 0:
+            self._stop_stream()
             self.state = "DONE"
             self.log_append({"role": "coverage", "content": coverage})
             self.log_append({"role": "stop", "content": "done"})
@@ -89,13 +189,18 @@ class LLMAgent(BaseAgent):
             return True
 
         if self._check_converge():
+            self._stop_stream()
             self.state = "DONE"
             self.log_append({"role": "coverage", "content": coverage})
             self.log_append({"role": "stop", "content": "model converged"})
             self.save_log()
             return True
 
-        if self.total_msg_cnt >= self.dialog_bound and len(self.stimuli_buffer) == 0:
+        if (
+            self.total_msg_cnt >= self.dialog_bound
+            and len(self.stimuli_buffer) == 0
+            and self.stream is None
+        ):
             self.state = "DONE"
             self.log_append({"role": "coverage", "content": coverage})
             self.log_append({"role": "stop", "content": "max dialog number"})
@@ -106,6 +211,7 @@ class LLMAgent(BaseAgent):
             self.token_budget is not None
             and self.token_budget.no_budget()
             and len(self.stimuli_buffer) == 0
+            and self.stream is None
         ):
             self.state = "DONE"
             self.log_append({"role": "coverage", "content": coverage})
@@ -124,24 +230,48 @@ class LLMAgent(BaseAgent):
         )
 
     def _get_next_value_from_buffer(self):
-        stimulus = self.stimuli_buffer[0]
-        self.stimuli_buffer.pop(0)
+        with self.buffer_lock:
+            stimulus = self.stimuli_buffer.pop(0)
+            self.last_origin = (self, self.stimuli_origins.pop(0), stimulus)
+        self.response_hit_hist.append(self.hit_cnt)
         self.stimulus_cnt += 1
         return stimulus
 
+    # (dialog, message, index in the response) of each of the next stimuli
+    # buffered, from the current message
+    def _buffer_origins(self, count: int, start: int = 0):
+        self.stimuli_origins.extend(
+            (self.dialog_index, self.msg_index, i) for i in range(start, start + count)
+        )
+
+    # Records the bins first hit by a stimulus handed out, see last_origin
+    def record_attribution(self, key: Tuple[int, int, int], value, new_bins: List[str]):
+        if key in self.attribution:
+            new_bins = self.attribution[key][1] + new_bins
+        self.attribution[key] = (value, new_bins)
+
     def generate_next_value(
         self,
         dut_state: GlobalDUTState,
         coverage_database: GlobalCoverageDatabase,
         is_ic=False,
     ) -> Union[int, List[Tuple[int, int]], None]:
+        self.last_origin = None
 
         if coverage_database.get() is None:
             return 0 if not is_ic else []
 
+        self.apply_buffer_policy(coverage_database)
+
+        # the rest of the response streaming in
+        if self.stream is not None and len(self.stimuli_buffer) == 0:
+            self._wait_stream()
+
         # When not first stimulus & need to generate new response
         # log coverage, update coverage of last msg, check need to reset
         if len(self.stimuli_buffer) == 0 and self.state != "INIT":
+            # the LLM is not to be touched while a prefetch request is in flight
+            self._wait_prefetch()
             coverage = coverage_database.get_coverage_plan()
             # Log coverage
             self.log_append({"role": "coverage", "content": coverage})
@@ -216,37 +346,41 @@ class LLMAgent(BaseAgent):
                     self.save_log()
                     print("log saved\n")
 
-            # Load prompt
-            prompt = ""
-            if self.state == "INIT":
-                prompt = self.prompt_generator.generate_initial_prompt(
-                    current_pc=dut_state.get_pc(),
-                    last_instr=dut_state.get_last_instr(),
-                )
-            elif self.state == "ITER":
-                prompt = self.prompt_generator.generate_iterative_prompt(
-                    coverage_database,
-                    # gibbering
-                    response_invalid=(f_ == 1),
-                    # asking for long response
-                    # warmed_up=(
-                    #     len(self.history_cov_rate) >= 4
-                    #     and self.history_cov_rate[-1] - self.history_cov_rate[-4] >= 50
-                    # ),
-                    # invalid update
-                    update_invalid=(f_ == 2),
-                    current_pc=dut_state.get_pc(),
-                    last_instr=dut_state.get_last_instr(),
-                )
-            elif self.state == "DONE":  # should never happen
-                prompt = "Thank you."
-
-            # Generate response
-            response, (
-                input_token_cnt,
-                output_token_cnt,
-                total_token_cnt,
-            ) = self.stimulus_generator(prompt)
+            prefetched = self._take_prefetch(coverage_database) if f_ == 0 else None
+            if prefetched is not None:
+                prompt, response, (
+                    input_token_cnt,
+                    output_token_cnt,
+                    total_token_cnt,
+                ) = prefetched
+            else:
+                # Load prompt
+                prompt = ""
+                if self.state == "INIT":
+                    prompt = self.prompt_generator.generate_initial_prompt(
+                        current_pc=dut_state.get_pc(),
+                        last_instr=dut_state.get_last_instr(),
+                    )
+                elif self.state == "ITER":
+                    prompt = self._iterative_prompt(
+                        self.prompt_generator, dut_state, coverage_database, f_
+                    )
+                elif self.state == "DONE":  # should never happen
+                    prompt = "Thank you."
+
+                # Generate response
+                if self.streaming:
+                    self._start_stream(prompt, coverage_database)
+                    if self._wait_stream():
+                        break
+                    # no stimuli in the whole response
+                    f_ = 1
+                    continue
+                response, (
+                    input_token_cnt,
+                    output_token_cnt,
+                    total_token_cnt,
+                ) = self.stimulus_generator(prompt)
 
             # update best_msgs
             if self.state == "ITER":
@@ -286,10 +420,273 @@ class LLMAgent(BaseAgent):
                 f_ = 2
                 continue
 
+            self._buffer_origins(len(stimuli))
             self.stimuli_buffer.extend(stimuli)
+            self.response_hit_hist.clear()
             # print(f"Response: {response}\nStimuli: {stimuli[0]}\n")
 
-        return self._get_next_value_from_buffer()
+        value = self._get_next_value_from_buffer()
+        self._start_prefetch(dut_state, coverage_database)
+        return value
+
+    # The first value may trigger a new response; the rest of the batch is
+    # drained from the same response's buffer, so no coverage feedback is skipped
+    def generate_next_batch(
+        self,
+        dut_state: GlobalDUTState,
+        coverage_database: GlobalCoverageDatabase,
+        batch_size: int,
+        is_ic=False,
+    ) -> list:
+        batch = [self.generate_next_value(dut_state, coverage_database, is_ic)]
+        self.batch_origins = [self.last_origin]
+        while len(batch) < batch_size and len(self.stimuli_buffer) > 0:
+            batch.append(self._get_next_value_from_buffer())
+            self.batch_origins.append(self.last_origin)
+        self._start_prefetch(dut_state, coverage_database)
+        return batch
+
+    # Only a new response is based on the coverage, buffered values are not
+    def needs_coverage_feedback(self) -> bool:
+        return len(self.stimuli_buffer) == 0
+
+    # The prompt following the last response, asking to mend it if it was
+    # gibberish (f_ == 1) or an invalid update (f_ == 2). Shared by the requests
+    # made now and the prefetched ones, which must not differ.
+    def _iterative_prompt(
+        self,
+        prompt_generator: BasePromptGenerator,
+        dut_state: GlobalDUTState,
+        coverage_database: GlobalCoverageDatabase,
+        f_: int = 0,
+    ) -> str:
+        return prompt_generator.generate_iterative_prompt(
+            coverage_database,
+            # gibbering
+            response_invalid=(f_ == 1),
+            # asking for long response
+            # warmed_up=(
+            #     len(self.history_cov_rate) >= 4
+            #     and self.history_cov_rate[-1] - self.history_cov_rate[-4] >= 50
+            # ),
+            # invalid update
+            update_invalid=(f_ == 2),
+            current_pc=dut_state.get_pc(),
+            last_instr=dut_state.get_last_instr(),
+            extraction_errors=self.extractor.errors,
+        )
+
+    # Requests the next response in the background if the buffer is about to run
+    # out. The prompt is generated from the coverage so far, on a copy of the
+    # prompt generator so that it can be dropped along with the response.
+    def _start_prefetch(
+        self, dut_state: GlobalDUTState, coverage_database: GlobalCoverageDatabase
+    ):
+        if (
+            self.prefetch_threshold <= 0
+            or self.prefetch is not None
+            or self.stream is not None
+            or self.state != "ITER"
+            or len(self.stimuli_buffer) > self.prefetch_threshold
+            or self.total_msg_cnt >= self.dialog_bound
+            or self._check_converge()
+            or self.token_budget is not None
+            and self.token_budget.no_budget()
+        ):
+            return
+
+        prompt_generator = copy.deepcopy(self.prompt_generator)
+        prompt = self._iterative_prompt(prompt_generator, dut_state, coverage_database)
+        if self.prefetch_executor is None:
+            self.prefetch_executor = ThreadPoolExecutor(max_workers=1)
+        self.prefetch = Prefetch(
+            prompt=prompt,
+            prompt_generator=prompt_generator,
+            conversation=self.stimulus_generator.save_conversation(),
+            hit_cnt=coverage_database.get_coverage_rate()[0],
+            future=self.prefetch_executor.submit(self.stimulus_generator, prompt),
+        )
+
+    def _wait_prefetch(self):
+        if self.prefetch is not None:
+            wait([self.prefetch.future])
+
+    # Returns the prefetched (prompt, response, token counts) if it can replace a
+    # request made now, None otherwise
+    def _take_prefetch(self, coverage_database: GlobalCoverageDatabase):
+        if self.prefetch is None:
+            return None
+        self._wait_prefetch()
+
+        new_hit_cnt = coverage_database.get_coverage_rate()[0] - self.prefetch.hit_cnt
+        if self.prefetch.future.exception() is not None:
+            self._discard_prefetch()
+            return None
+        if new_hit_cnt > self.prefetch_tolerance:
+            print(f"Prefetched response discarded, {new_hit_cnt} bins hit since its prompt\n")
+            self._discard_prefetch()
+            return None
+
+        prefetch = self.prefetch
+        self.prefetch = None
+        self.prefetch_used_cnt += 1
+        self.prompt_generator = prefetch.prompt_generator
+        response, token_cnts = prefetch.future.result()
+        return prefetch.prompt, response, token_cnts
+
+    # Drops the prefetched response and undoes its turn of the conversation. Its
+    # tokens were spent all the same.
+    def _discard_prefetch(self):
+        if self.prefetch is None:
+            return
+        self._wait_prefetch()
+
+        prefetch = self.prefetch
+        self.prefetch = None
+        self.prefetch_discarded_cnt += 1
+        self.stimulus_generator.restore_conversation(prefetch.conversation)
+        if prefetch.future.exception() is not None:
+            print(f"Prefetch failed: {prefetch.future.exception()}\n")
+        elif self.token_budget is not None:
+            self.token_budget.budget -= prefetch.future.result()[1][2]
+
+    # Requests a response streaming into the buffer. It counts as a message of
+    # the dialog from now on, and is logged once it has ended.
+    def _start_stream(self, prompt: str, coverage_database: GlobalCoverageDatabase):
+        response = {"role": "assistant", "content": ""}
+        # update best_msgs
+        if self.state == "ITER":
+            self.stimulus_generator.append_successful(
+                prompt={"role": "user", "content": prompt},
+                response=response,
+                cur_coverage=coverage_database,
+            )
+        if self.state == "INIT":
+            self.state = "ITER"
+        self.total_msg_cnt += 1
+        self.msg_index += 1
+        self.response_hit_hist.clear()
+
+        self.stream = StimulusStream(
+            prompt=prompt, response=response, cond=threading.Condition(self.buffer_lock)
+        )
+        if self.stream_executor is None:
+            self.stream_executor = ThreadPoolExecutor(max_workers=1)
+        self.stream.future = self.stream_executor.submit(self._run_stream, self.stream)
+
+    def _run_stream(self, stream: StimulusStream):
+        try:
+            result = self.stimulus_generator.stream(
+                stream.prompt, lambda text: self._on_streamed_text(stream, text)
+            )
+            # the text after the last complete stimulus of a stopped response is
+            # cut off, not a stimulus
+            stimuli = self.extractor.flush()
+            if not stream.stopped:
+                self._buffer_streamed(stream, self.stimulus_filter(stimuli))
+            return result
+        finally:
+            with stream.cond:
+                stream.done = True
+                stream.cond.notify_all()
+
+    # Buffers the stimuli completed by a new piece of the response, returns
+    # whether the response is to go on
+    def _on_streamed_text(self, stream: StimulusStream, text: str) -> bool:
+        stimuli = self.stimulus_filter(self.extractor.feed(text))
+        self._buffer_streamed(stream, stimuli)
+        with stream.cond:
+            stream.stall_chars = 0 if len(stimuli) > 0 else stream.stall_chars + len(text)
+            if (
+                self.stream_stimulus_bound > 0
+                and stream.stimulus_cnt >= self.stream_stimulus_bound
+                or self.stream_stall_chars > 0
+                and stream.stimulus_cnt > 0
+                and stream.stall_chars >= self.stream_stall_chars
+            ):
+                stream.stopped = True
+            return not stream.stopped
+
+    def _buffer_streamed(self, stream: StimulusStream, stimuli: list):
+        with stream.cond:
+            self._buffer_origins(len(stimuli), stream.stimulus_cnt)
+            self.stimuli_buffer.extend(stimuli)
+            stream.stimulus_cnt += len(stimuli)
+            stream.cond.notify_all()
+
+    # Waits for the next stimulus of the response streaming in, or for its end,
+    # and returns whether there is a stimulus in the buffer
+    def _wait_stream(self) -> bool:
+        stream = self.stream
+        with stream.cond:
+            stream.cond.wait_for(lambda: len(self.stimuli_buffer) > 0 or stream.done)
+        if stream.done:
+            self._finish_stream()
+        return len(self.stimuli_buffer) > 0
+
+    # Logs the streamed response once it has ended
+    def _finish_stream(self):
+        stream = self.stream
+        self.stream = None
+        response, (
+            input_token_cnt,
+            output_token_cnt,
+            total_token_cnt,
+        ) = stream.future.result()
+        stream.response["content"] = response
+        if stream.stopped:
+            self.stream_stopped_cnt += 1
+
+        self.log_append(
+            {"role": "user", "content": stream.prompt, "token cnt": input_token_cnt}
+        )
+        self.log_append(
+            {"role": "assistant", "content": response, "token cnt": output_token_cnt}
+        )
+        if self.token_budget is not None:
+            self.token_budget.budget -= total_token_cnt
+
+    # Stops the response streaming in, e.g. when the simulation ends. Its
+    # stimuli not sent yet are dropped.
+    def _stop_stream(self):
+        if self.stream is None:
+            return
+        with self.stream.cond:
+            self.stream.stopped = True
+        wait([self.stream.future])
+        self._finish_stream()
+        self.stimuli_buffer.clear()
+        self.stimuli_origins.clear()
+
+    # Drops the rest of the current response if the buffer policy says so, told
+    # the bins hit so far. Returns whether it did.
+    def apply_buffer_policy(self, coverage_database: GlobalCoverageDatabase) -> bool:
+        self.hit_cnt = coverage_database.get_coverage_rate()[0]
+        if (
+            self.buffer_policy is None
+            or len(self.stimuli_buffer) == 0
+            or not self.buffer_policy(self.response_hit_hist + [self.hit_cnt])
+        ):
+            return False
+        self._cut_buffer()
+        return True
+
+    # Drops the rest of the current response, as asked by the buffer policy. A
+    # response still streaming in is stopped.
+    def _cut_buffer(self):
+        dropped_cnt = len(self.stimuli_buffer)
+        if self.stream is not None:
+            self._stop_stream()
+        self.stimuli_buffer.clear()
+        self.stimuli_origins.clear()
+        self.buffer_cut_cnt += 1
+
+        cut = (
+            f"{dropped_cnt} stimuli dropped after {len(self.response_hit_hist)} "
+            f"with {self.hit_cnt - (self.response_hit_hist or [self.hit_cnt])[0]} bins newly hit"
+        )
+        self.log_append({"role": "cut", "content": cut})
+        print(f"Dialog #{self.dialog_index} Message #{self.msg_index} cut: {cut}\n")
 
     def _check_gibberish(self, response: str) -> bool:
         stimuli = self.stimulus_filter(self.extractor(response))
@@ -380,6 +777,7 @@ class LLMAgent(BaseAgent):
     # {role: ..., content: ..., token cnt: ...},
     # {role: coverage, content: [coverage_plan]}
     # {role: stop, content: done | max stimuli number}
+    # {role: cut, content: stimuli dropped from the buffer}
     # {role: reset}
     def log_append(self, entry: Dict[str, Union[str, dict]]):
         for logger in self.loggers:
@@ -411,6 +809,8 @@ class LLMAgent(BaseAgent):
                     logger.log[-1]["Coverage Plan"] = str(coverage_plan)
                 elif entry["role"] == "stop":
                     logger.log[-1]["Action"] = entry["content"]
+                elif entry["role"] == "cut":
+                    logger.log[-1]["Action"] = "cut: " + entry["content"]
                 elif entry["role"] == "reset":
                     logger.log[-1]["Action"] = "reset"
 
@@ -481,3 +881,245 @@ def rst_plan_IDAdaAvoidConverge(cov_hist: List[int], all_cov_hist: List[int], bi
     else:
         period = 7
     return len(cov_hist) >= period and cov_hist[-1] - cov_hist[-period] < epsilon
+
+
+"""Buffer policies"""
+
+
+# Drops the rest of a response once `patience` stimuli in a row have hit no new
+# bin, i.e. over a sliding window of the last `patience` stimuli. `patience`
+# depends on the DUT: how many stimuli a bin takes to hit, and how costly a
+# stimulus is to simulate.
+#
+# The policy is asked once per value or batch handed out, and the bins hit are
+# only known per batch: with batches, a response is cut once the last whole
+# batches, together `patience` stimuli or more, have hit no new bin. A batch
+# that hits one stays in the window with all its stimuli.
+class StagnationBufferPolicy:
+    def __init__(self, patience: int):
+        assert patience > 0, "The patience of a buffer policy must be positive."
+        self.patience = patience
+
+    def __call__(self, hit_hist: List[int]) -> bool:
+        return (
+            len(hit_hist) > self.patience
+            and hit_hist[-1] == hit_hist[-1 - self.patience]
+        )
+
+
+"""Tests"""
+
+
+# Numbered responses of `response_len` stimuli, the conversation being the list
+# of prompts and responses
+class _StubLLM(BaseLLM):
+    def __init__(self, response_len: int = 4):
+        super().__init__()
+        self.response_len = response_len
+        self.prompts = []
+        self.reset()
+
+    def __call__(self, prompt: str) -> Tuple[str, Tuple[int, int, int]]:
+        self.prompts.append(prompt)
+        self.total_msg_cnt += 1
+        response = "\n".join(
+            str(self.total_msg_cnt * 100 + i) for i in range(self.response_len)
+        )
+        self.messages += [
+            {"role": "user", "content": prompt},
+            {"role": "assistant", "content": response},
+        ]
+        return response, (1, 1, 2)
+
+    def reset(self):
+        self.messages = []
+        self.recent_msgs = []
+        self.total_msg_cnt = 0
+
+
+# _StubLLM streaming its responses a few characters at a time
+class _StreamingStubLLM(_StubLLM):
+    STREAMING = True
+
+    def __call__(self, prompt: str) -> Tuple[str, Tuple[int, int, int]]:
+        response, token_cnts = super().__call__(prompt)
+        if self._on_text is not None:
+            for i in range(0, len(response), 3):
+                # the main thread takes values in between
+                time.sleep(0.0001)
+                if self._on_text(response[i : i + 3]) is False:
+                    break
+        return response, token_cnts
+
+
+# Prompts telling the arguments they were generated from, but the coverage
+class _StubPromptGenerator:
+    def generate_initial_prompt(self, **kwargs) -> str:
+        return "initial"
+
+    def generate_iterative_prompt(self, coverage_database, **kwargs) -> str:
+        return f"iterative {sorted(kwargs.items())}"
+
+    def reset(self):
+        pass
+
+
+# Reports the number of stimuli of each response as an error
+class _StubExtractor(DumbExtractor):
+    def __call__(self, text: str):
+        stimuli = super().__call__(text)
+        self.errors = [f"{len(stimuli)} stimuli"]
+        return stimuli
+
+
+def _stub_agent(llm: BaseLLM = None, **kwargs) -> LLMAgent:
+    return LLMAgent(
+        _StubPromptGenerator(),
+        llm or _StubLLM(),
+        _StubExtractor(),
+        Filter(-(2**31), 2**31 - 1),
+        [],
+        rst_plan=lambda *args: False,
+        **kwargs,
+    )
+
+
+# Runs the agent on the stride detector's golden model, returns the values it
+# handed out
+def _drive(agent: LLMAgent, cnt: int) -> list:
+    import asyncio
+    from stride_detector.golden_model import GOLDEN_MODEL
+    from stride_detector.shared_types import Stimulus
+
+    model = GOLDEN_MODEL()
+    dut_state, coverage_database = GlobalDUTState(), GlobalCoverageDatabase()
+    values = []
+    value = 0
+    for _ in range(cnt):
+        (state, coverage), _ = asyncio.run(model.handle_stimulus(Stimulus(value, False)))
+        dut_state.set(state)
+        coverage_database.set(coverage)
+        value = agent.generate_next_value(dut_state, coverage_database)
+        values.append(value)
+    return values
+
+
+class TestPrefetch(unittest.TestCase):
+    # a prefetched response is asked for with the prompt a request made once the
+    # buffer is empty would have
+    def test_same_prompts(self) -> None:
+        agent = _stub_agent()
+        prefetching = _stub_agent(prefetch_threshold=2, prefetch_tolerance=10**6)
+        self.assertEqual(_drive(agent, 30), _drive(prefetching, 30))
+        self.assertEqual(agent.stimulus_generator.prompts, prefetching.stimulus_generator.prompts)
+        self.assertIn("4 stimuli", prefetching.stimulus_generator.prompts[-1])
+        self.assertGreater(prefetching.prefetch_used_cnt, 0)
+        self.assertEqual(0, prefetching.prefetch_discarded_cnt)
+
+    # a discarded prefetch leaves no trace in the conversation
+    def test_discarded(self) -> None:
+        agent = _stub_agent()
+        prefetching = _stub_agent(prefetch_threshold=2, prefetch_tolerance=-1)
+        values = _drive(prefetching, 30)
+        self.assertGreater(prefetching.prefetch_discarded_cnt, 0)
+        self.assertEqual(0, prefetching.prefetch_used_cnt)
+
+        # as if asked again; the responses are numbered by the conversation
+        self.assertEqual(_drive(agent, 30), values)
+        # the last one, still in flight
+        prefetching._discard_prefetch()
+        self.assertEqual(agent.stimulus_generator.messages, prefetching.stimulus_generator.messages)
+        self.assertEqual(agent.total_msg_cnt, prefetching.total_msg_cnt)
+
+    def test_reset(self) -> None:
+        prefetching = _stub_agent(prefetch_threshold=2, prefetch_tolerance=10**6)
+        _drive(prefetching, 7)
+        self.assertIsNotNone(prefetching.prefetch)
+        conversation = prefetching.prefetch.conversation
+        prefetching.reset()
+        self.assertIsNone(prefetching.prefetch)
+        self.assertEqual(1, prefetching.prefetch_discarded_cnt)
+        self.assertEqual([], prefetching.stimulus_generator.messages)
+        self.assertEqual(2, len(conversation[0]) // 2)
+
+
+# The stride detector's coverage, but for the number of bins hit, set by tests
+class _ScriptedHits(GlobalCoverageDatabase):
+    def __init__(self):
+        from stride_detector.golden_model import GOLDEN_MODEL
+
+        super().__init__(GOLDEN_MODEL().coverage_database)
+        self.hit_cnt = 0
+
+    def get_coverage_rate(self) -> Tuple[int, int]:
+        return self.hit_cnt, 100
+
+
+class TestBufferPolicy(unittest.TestCase):
+    def test_stagnation(self) -> None:
+        policy = StagnationBufferPolicy(2)
+        self.assertFalse(policy([3, 3]))
+        self.assertTrue(policy([3, 3, 3]))
+        self.assertTrue(policy([1, 3, 3, 3]))
+        self.assertFalse(policy([1, 3, 3]))
+        self.assertFalse(policy([3, 3, 4]))
+        with self.assertRaises(AssertionError):
+            StagnationBufferPolicy(0)
+
+    # Values handed out of the first response, with the bins hit before each
+    # value or batch handed out
+    def _first_response_len(self, hits: List[int], patience: int, batch_size: int = 1) -> int:
+        agent = _stub_agent(
+            _StubLLM(response_len=20), buffer_policy=StagnationBufferPolicy(patience)
+        )
+        dut_state, coverage_database = GlobalDUTState(), _ScriptedHits()
+        values = []
+        for hit_cnt in hits:
+            coverage_database.hit_cnt = hit_cnt
+            values += agent.generate_next_batch(dut_state, coverage_database, batch_size)
+        self.assertEqual(1, agent.buffer_cut_cnt)
+        return [value // 100 for value in values].index(2)
+
+    def test_cut(self) -> None:
+        # stimuli 2, 3 and 4 hit no new bin
+        self.assertEqual(5, self._first_response_len([0, 1, 2, 2, 2, 2], 3))
+        # stimulus 3 does, and 4, 5 and 6 do not
+        self.assertEqual(7, self._first_response_len([0, 1, 2, 2, 3, 3, 3, 3], 3))
+
+    # hits are known per batch, so the cut comes after whole batches
+    def test_cut_batches(self) -> None:
+        # the second batch hits no new bin
+        self.assertEqual(8, self._first_response_len([0, 1, 1], 3, batch_size=4))
+        # nor does the third, and both make the patience
+        self.assertEqual(12, self._first_response_len([0, 1, 1, 1], 6, batch_size=4))
+
+
+class TestStreaming(unittest.TestCase):
+    # values are taken from the buffer as the response streams into it, and are
+    # those of the whole responses
+    def test_same_values(self) -> None:
+        agent = _stub_agent(_StubLLM(response_len=30))
+        streaming = _stub_agent(_StreamingStubLLM(response_len=30), streaming=True)
+        self.assertEqual(_drive(agent, 200), _drive(streaming, 200))
+
+        streaming = _stub_agent(_StreamingStubLLM(response_len=30), streaming=True)
+        origins = []
+        for _ in range(60):
+            _drive(streaming, 1)
+            origins.append(streaming.last_origin[1])
+        self.assertEqual([(1, 1, i) for i in range(30)] + [(1, 2, i) for i in range(30)], origins)
+
+    def test_stimulus_bound(self) -> None:
+        streaming = _stub_agent(
+            _StreamingStubLLM(response_len=30), streaming=True, stream_stimulus_bound=5
+        )
+        values = _drive(streaming, 20)
+        self.assertEqual([100 * (i // 5 + 1) + i % 5 for i in range(20)], values)
+        # the last one may still be the current response
+        streaming._stop_stream()
+        self.assertEqual(4, streaming.stream_stopped_cnt)
+        self.assertEqual([], streaming.stimuli_buffer)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -23,3 +23,18 @@ class BaseAgent:
         self, dut_state: GlobalDUTState, coverage_database: GlobalCoverageDatabase
     ):
         raise NotImplementedError
+
+    # Stimuli that can be sent to the simulator in one round-trip, i.e. that
+    # do not depend on the coverage feedback of each other
+    def generate_next_batch(
+        self,
+        dut_state: GlobalDUTState,
+        coverage_database: GlobalCoverageDatabase,
+        batch_size: int,
+    ) -> list:
+        return [self.generate_next_value(dut_state, coverage_database)]
+
+    # Whether the next generated value depends on the coverage of every stimulus
+    # sent so far. If not, replies may still be in flight when it is generated.
+    def needs_coverage_feedback(self) -> bool:
+        return True
@@ -0,0 +1,288 @@
+# Copyright ***** contributors.
+# Licensed under the Apache License, Version 2.0, see LICENSE for details.
+# SPDX-License-Identifier: Apache-2.0
+
+import threading
+import unittest
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
+
+import numpy as np
+
+from agents.agent_base import *
+from agents.agent_LLM import LLMAgent
+from models.llm_base import BaseLLM
+
+
+# Keeps several LLM dialogs open at once, each an LLMAgent with its own prompt
+# generator, LLM and loggers. The missed bins are split between them, and while
+# the simulator runs the response of one dialog, the others wait for their LLMs
+# in the background. Responses are sent to the simulator whole, one after the
+# other, so that sequences within a response stay intact, unless a dialog's
+# buffer policy cuts one short. The coverage database is shared, so every dialog
+# sees the bins hit by any of them, as of when it asked for its response.
+class MultiDialogAgent(BaseAgent):
+    def __init__(self, dialogs: List[LLMAgent]):
+        super().__init__()
+        self.dialogs = dialogs
+        self.executor = ThreadPoolExecutor(max_workers=len(dialogs))
+
+        # dialog index -> first value of its next response
+        self.pending: Dict[int, Future] = {}
+        self.finished: Set[int] = set()
+        # the dialog whose response is being sent to the simulator
+        self.active: Union[int, None] = None
+        self.bins_assigned = False
+        # origins of the last value and batch handed out, see LLMAgent
+        self.last_origin: Union[tuple, None] = None
+        self.batch_origins: List[Union[tuple, None]] = []
+
+    @property
+    def total_msg_cnt(self) -> int:
+        return sum(dialog.total_msg_cnt for dialog in self.dialogs)
+
+    def reset(self):
+        wait(self.pending.values())
+        self.pending.clear()
+        self.finished.clear()
+        self.active = None
+        for dialog in self.dialogs:
+            dialog.reset()
+
+    def end_simulation(
+        self, dut_state: GlobalDUTState, coverage_database: GlobalCoverageDatabase
+    ):
+        if coverage_database.get() is None:
+            return False
+
+        if len(coverage_database.get_missed_bins()) == 0:
+            # let the dialogs still waiting for a response log the end too
+            wait(self.pending.values())
+            self.pending.clear()
+        for (i, dialog) in enumerate(self.dialogs):
+            if (
+                i not in self.finished
+                and i not in self.pending
+                and len(dialog.stimuli_buffer) == 0
+                and dialog.end_simulation(dut_state, coverage_database)
+            ):
+                self.finished.add(i)
+        return len(self.finished) == len(self.dialogs)
+
+    def generate_next_value(
+        self,
+        dut_state: GlobalDUTState,
+        coverage_database: GlobalCoverageDatabase,
+        is_ic=False,
+    ):
+        self.last_origin = None
+        if coverage_database.get() is None:
+            return 0 if not is_ic else []
+        if not self.bins_assigned:
+            self._assign_bins(coverage_database)
+
+        if self.active is not None:
+            active = self.dialogs[self.active]
+            # cut here rather than in the dialog, so that its next response is
+            # asked for in the background like the others
+            active.apply_buffer_policy(coverage_database)
+            if len(active.stimuli_buffer) > 0:
+                value = active.generate_next_value(dut_state, coverage_database, is_ic)
+                self.last_origin = active.last_origin
+                return value
+
+        # The active response is used up, every idle dialog asks for its next one.
+        # The state and coverage are set again while they wait, so each is given
+        # those of now.
+        self.active = None
+        for (i, dialog) in enumerate(self.dialogs):
+            if i not in self.pending and i not in self.finished:
+                self.pending[i] = self.executor.submit(
+                    dialog.generate_next_value,
+                    dut_state.snapshot(),
+                    coverage_database.snapshot(),
+                    is_ic,
+                )
+
+        # and the first response to arrive is sent next
+        while len(self.pending) > 0:
+            wait(self.pending.values(), return_when=FIRST_COMPLETED)
+            for i in sorted(self.pending):
+                if not self.pending[i].done():
+                    continue
+                value = self.pending.pop(i).result()
+                dialog = self.dialogs[i]
+                # the dialog stopped instead of asking its LLM
+                if len(dialog.stimuli_buffer) == 0 and dialog.end_simulation(
+                    dut_state, coverage_database
+                ):
+                    self.finished.add(i)
+                    continue
+                self.active = i
+                self.last_origin = dialog.last_origin
+                return value
+
+        # every dialog has stopped, so does end_simulation
+        return 0 if not is_ic else []
+
+    def generate_next_batch(
+        self,
+        dut_state: GlobalDUTState,
+        coverage_database: GlobalCoverageDatabase,
+        batch_size: int,
+        is_ic=False,
+    ) -> list:
+        batch = [self.generate_next_value(dut_state, coverage_database, is_ic)]
+        self.batch_origins = [self.last_origin]
+        if self.active is None:
+            return batch
+        dialog = self.dialogs[self.active]
+        while len(batch) < batch_size and len(dialog.stimuli_buffer) > 0:
+            batch.append(dialog.generate_next_value(dut_state, coverage_database, is_ic))
+            self.batch_origins.append(dialog.last_origin)
+        return batch
+
+    # Only a new response is based on the coverage, buffered values are not
+    def needs_coverage_feedback(self) -> bool:
+        return self.active is None or len(self.dialogs[self.active].stimuli_buffer) == 0
+
+    # Splits the bins missed at the start into one contiguous share per dialog,
+    # so that each dialog is asked for bins of similar kinds. A dialog whose
+    # share is all hit is asked for any missed bin.
+    def _assign_bins(self, coverage_database: GlobalCoverageDatabase):
+        missed_bins = coverage_database.get_missed_bins()
+        for (dialog, share) in zip(
+            self.dialogs, np.array_split(np.array(missed_bins, dtype=object), len(self.dialogs))
+        ):
+            dialog.prompt_generator.assigned_bins = set(share)
+        self.bins_assigned = True
+
+
+"""Tests"""
+
+
+# The stride detector's golden model, sent the values handed out by an agent
+class _GoldenRun:
+    def __init__(self):
+        from stride_detector.golden_model import GOLDEN_MODEL
+
+        self.model = GOLDEN_MODEL()
+        self.dut_state, self.coverage_database = GlobalDUTState(), GlobalCoverageDatabase()
+        self.send(0)
+
+    def send(self, value: int):
+        import asyncio
+        from stride_detector.shared_types import Stimulus
+
+        (state, coverage), _ = asyncio.run(self.model.handle_stimulus(Stimulus(value, False)))
+        self.dut_state.set(state)
+        self.coverage_database.set(coverage)
+
+    # (index of the dialog it came from, value) of the next value handed out
+    def next_value(self, agent: MultiDialogAgent) -> Tuple[Union[int, None], int]:
+        value = agent.generate_next_value(self.dut_state, self.coverage_database)
+        self.send(value)
+        if agent.last_origin is None:
+            return None, value
+        return agent.dialogs.index(agent.last_origin[0]), value
+
+
+def _stub_dialogs(cnt: int, llms: List[BaseLLM] = None, **kwargs) -> MultiDialogAgent:
+    from agents.agent_LLM import _stub_agent
+
+    return MultiDialogAgent([_stub_agent(llms and llms[i], **kwargs) for i in range(cnt)])
+
+
+def _stub_llm(**kwargs) -> BaseLLM:
+    from agents.agent_LLM import _StubLLM
+
+    # answers once `release` is set, telling whether it was on the main thread
+    class _WorkerLLM(_StubLLM):
+        def __init__(self, release: threading.Event = None):
+            super().__init__()
+            self.release = release
+            self.on_main_thread = []
+
+        def __call__(self, prompt: str):
+            if self.release is not None:
+                self.release.wait()
+            self.on_main_thread.append(threading.current_thread() is threading.main_thread())
+            return super().__call__(prompt)
+
+    return _WorkerLLM(**kwargs)
+
+
+class TestMultiDialogAgent(unittest.TestCase):
+    def test_assign_bins(self) -> None:
+        run = _GoldenRun()
+        agent = _stub_dialogs(3)
+        missed_bins = run.coverage_database.get_missed_bins()
+        run.next_value(agent)
+        shares = [dialog.prompt_generator.assigned_bins for dialog in agent.dialogs]
+        # contiguous shares of similar sizes, in plan order
+        self.assertGreater(len(missed_bins), 3)
+        contiguous = sum((sorted(share, key=missed_bins.index) for share in shares), [])
+        self.assertEqual(missed_bins, contiguous)
+        self.assertLessEqual(max(map(len, shares)) - min(map(len, shares)), 1)
+        self.assertEqual(len(missed_bins), sum(map(len, shares)))
+
+    # the first response to arrive is sent first, then whole, then the next
+    def test_first_completed(self) -> None:
+        release = threading.Event()
+        agent = _stub_dialogs(2, [_stub_llm(release=release), _stub_llm()])
+        run = _GoldenRun()
+        self.assertEqual([1] * 4, [run.next_value(agent)[0] for _ in range(4)])
+        release.set()
+        agent.pending[0].result()
+        self.assertEqual([0] * 4, [run.next_value(agent)[0] for _ in range(4)])
+
+    def test_end_simulation(self) -> None:
+        agent = _stub_dialogs(2, dialog_bound=1)
+        run = _GoldenRun()
+        sent = []
+        while not agent.end_simulation(run.dut_state, run.coverage_database):
+            sent.append(run.next_value(agent))
+        self.assertEqual([4, 4], [[i for (i, _) in sent].count(i) for i in range(2)])
+        self.assertEqual({0, 1}, agent.finished)
+        self.assertEqual(2, agent.total_msg_cnt)
+        self.assertEqual({}, agent.pending)
+
+    # a batch is the rest of one response, with the origins of its values
+    def test_batches(self) -> None:
+        agent = _stub_dialogs(2)
+        run = _GoldenRun()
+        for _ in range(6):
+            batch = agent.generate_next_batch(run.dut_state, run.coverage_database, 10)
+            for value in batch:
+                run.send(value)
+            self.assertEqual(4, len(batch))
+            self.assertEqual(batch, [value for (_, _, value) in agent.batch_origins])
+            self.assertEqual([0, 1, 2, 3], [key[2] for (_, key, _) in agent.batch_origins])
+            self.assertEqual(1, len({dialog for (dialog, _, _) in agent.batch_origins}))
+
+    # a cut response is followed by one asked for in the background
+    def test_buffer_cut(self) -> None:
+        llms = [_stub_llm(), _stub_llm()]
+        agent = _stub_dialogs(2, llms, buffer_policy=lambda hit_hist: len(hit_hist) > 1)
+        run = _GoldenRun()
+        for _ in range(8):
+            run.next_value(agent)
+            self.assertEqual(0, agent.last_origin[1][2])
+        self.assertGreater(sum(dialog.buffer_cut_cnt for dialog in agent.dialogs), 0)
+        on_main_thread = sum((llm.on_main_thread for llm in llms), [])
+        self.assertEqual([False] * agent.total_msg_cnt, on_main_thread)
+
+    # the dialogs waiting for a response read the state and coverage of when they
+    # asked for it
+    def test_snapshot(self) -> None:
+        run = _GoldenRun()
+        dut_state, coverage_database = run.dut_state.snapshot(), run.coverage_database.snapshot()
+        plan = dict(coverage_database.get_coverage_plan())
+        for value in range(0, 64, 4):
+            run.send(value)
+        self.assertNotEqual(plan, run.coverage_database.get_coverage_plan())
+        self.assertEqual(plan, coverage_database.get_coverage_plan())
+        self.assertIsNot(dut_state.get(), run.dut_state.get())
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -30,6 +30,21 @@ class RandomAgent(BaseAgent):
         self.current_cycle += 1
         return random.getrandbits(32)
 
+    def generate_next_batch(
+        self,
+        dut_state: GlobalDUTState,
+        coverage_database: GlobalCoverageDatabase,
+        batch_size: int,
+    ):
+        batch_size = min(batch_size, self.total_cycle - self.current_cycle)
+        return [
+            self.generate_next_value(dut_state, coverage_database)
+            for _ in range(max(batch_size, 1))
+        ]
+
+    def needs_coverage_feedback(self) -> bool:
+        return False
+
 
 class RandomAgent4IC(RandomAgent):
     def __init__(self, total_cycle=1000000, seed=0):
@@ -56,48 +56,50 @@ class SimulationController:
 
     # Handles driving a new_value when one is provided by `determine_next_value`
     async def controller_loop(self):
-        with self.zmq_context.socket(zmq.REP) as socket:
-            socket.bind(self.zmq_addr)
+        with open_server_socket(self.zmq_context, self.zmq_addr) as socket:
 
             await ClockCycles(self.dut.core_clk, 1)
             await ReadWrite()
 
-            while True:
-                stimulus_msg = socket.recv()
-                stimulus_obj = pickle.loads(stimulus_msg)
-                print(stimulus_obj)
-
-                dut_state = self.sample_dut_state()
-
-                stimulus = stimulus_obj.value
-                op = stimulus[0]
-                op = op.lower()
-                nodeslot = stimulus[1]
-                feature_count = stimulus[2]
-                neighbour_count = stimulus[3]
-
-                if(op == "deallocate"):
-                    await self.deallocate_tag()
-                elif(op == "allocate"):
-                    await self.allocate_tag(nodeslot=nodeslot,feature_count=feature_count)
-                elif(op == "adjacency_write"):
-                    await self.req_adj_write(neighbour_count=neighbour_count, nodeslot=nodeslot)
-                # elif(op == "adjacency_read"):
-                #     await self.req_adj_read()
-                elif(op == "message_write"):
-                    await self.req_message_write(nodeslot=nodeslot)
-                # elif(op == "message_read"):
-                #     await self.req_message_read(nodeslot=nodeslot)
-                elif(op == "scale_write"):
-                    await self.req_scale_write(neighbour_count=neighbour_count, nodeslot=nodeslot)
-                # elif(op == "scale_read"):
-                #     await self.req_scale_read()
-
-                socket.send_pyobj((dut_state, self.coverage_monitor.coverage_database))
-
-                if stimulus_obj.finish:
-                    self.end_simulation_event.set()
-                    break
+            await serve_stimuli(
+                socket,
+                self.handle_stimulus,
+                lambda: self.coverage_monitor.coverage_database,
+                WIRE_TYPES,
+            )
+            self.end_simulation_event.set()
+
+    # Drives a single stimulus, returns the reply to it and whether it ends the simulation
+    async def handle_stimulus(self, stimulus_obj):
+        print(stimulus_obj)
+
+        dut_state = self.sample_dut_state()
+
+        stimulus = stimulus_obj.value
+        op = stimulus[0]
+        op = op.lower()
+        nodeslot = stimulus[1]
+        feature_count = stimulus[2]
+        neighbour_count = stimulus[3]
+
+        if(op == "deallocate"):
+            await self.deallocate_tag()
+        elif(op == "allocate"):
+            await self.allocate_tag(nodeslot=nodeslot,feature_count=feature_count)
+        elif(op == "adjacency_write"):
+            await self.req_adj_write(neighbour_count=neighbour_count, nodeslot=nodeslot)
+        # elif(op == "adjacency_read"):
+        #     await self.req_adj_read()
+        elif(op == "message_write"):
+            await self.req_message_write(nodeslot=nodeslot)
+        # elif(op == "message_read"):
+        #     await self.req_message_read(nodeslot=nodeslot)
+        elif(op == "scale_write"):
+            await self.req_scale_write(neighbour_count=neighbour_count, nodeslot=nodeslot)
+        # elif(op == "scale_read"):
+        #     await self.req_scale_read()
+
+        return (dut_state, self.coverage_monitor.coverage_database), stimulus_obj.finish
 
     # allocate fetch tag
     async def allocate_tag(self, nodeslot, feature_count):
@@ -350,7 +352,7 @@ class SimulationController:
 async def basic_test(dut):
     from global_shared_types import GlobalCoverageDatabase
 
-    server_port = input("Please enter server's port (e.g. 5050, 5555): ")
+    server_port = ask_server_port("Please enter server's port (e.g. 5050, 5555) or shm://name: ")
     # server_port = "5050"
     trial_cnt = 0
 
@@ -383,7 +385,7 @@ async def basic_test(dut):
         await do_reset(dut.resetn, dut.core_clk, 3)
 
         with closing(
-            SimulationController(dut, coverage_monitor, f"tcp://*:{server_port}")
+            SimulationController(dut, coverage_monitor, server_address(server_port))
         ) as simulation_controller:
             simulation_controller.run_controller()
 
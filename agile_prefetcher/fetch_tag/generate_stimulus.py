@@ -17,6 +17,7 @@ sys.path.insert(0, os.path.dirname("/".join(directory.split("/")[:-1])))
 # print(sys.path)
 
 from agile_prefetcher.fetch_tag.shared_types import *
+from shared_helpers.stimulus_sender import BaseStimulusSender, sender_address, ask_server_ip_port
 from global_shared_types import *
 from agents.agent_random import *
 from agents.agent_LLM import *
@@ -25,18 +26,13 @@ from models.llm_gpt import ChatGPT
 from models.llm_openrouter import OpenRouter
 from loggers.logger_csv import CSVLogger
 from loggers.logger_txt import TXTLogger
+from loggers.logger_base import log_dir
 from pathlib import Path
 
-class StimulusSender:
-    def __init__(self, zmq_addr):
-        self.context = zmq.Context()
-        self.socket = self.context.socket(zmq.REQ)
-        self.socket.connect(zmq_addr)
-
-    def send_stimulus(self, stimulus_obj):
-        self.socket.send_pyobj(stimulus_obj)
-        state_coverage_obj = self.socket.recv_pyobj()
+class StimulusSender(BaseStimulusSender):
+    wire_types = WIRE_TYPES
 
+    def check_reply(self, state_coverage_obj):
         if not isinstance(state_coverage_obj, tuple):
             raise RuntimeError("Bad format of coverage response")
         if not isinstance(state_coverage_obj[0], DUTState):
@@ -44,17 +40,11 @@ class StimulusSender:
         if not isinstance(state_coverage_obj[1], CoverageDatabase):
             raise RuntimeError("Bad format of coverage response element 1")
 
-        return state_coverage_obj
-
-    def close(self):
-        if self.socket:
-            self.socket.close()
-
 def random_experiment():
     print("Running random experiment on AG_FT...\n")
 
-    # server_ip_port = input(
-    #     "Please enter server's IP and port (e.g. 127.0.0.1:5050, 128.232.65.218:5555): "
+    # server_ip_port = ask_server_ip_port(
+    #     "Please enter server's IP and port (e.g. 127.0.0.1:5050, 128.232.65.218:5555) or shm://name: "
     # )
     server_ip_port = "0.0.0.0:5050"
 
@@ -66,7 +56,7 @@ def random_experiment():
     g_dut_state = GlobalDUTState()
     g_coverage = GlobalCoverageDatabase()
 
-    with closing(StimulusSender(f"tcp://{server_ip_port}")) as stimulus_sender:
+    with closing(StimulusSender(sender_address(server_ip_port))) as stimulus_sender:
         while not agent.end_simulation(g_dut_state, g_coverage):
             stimulus.value = agent.generate_next_value(g_dut_state, g_coverage)
             if(isinstance(stimulus.value, int)):
@@ -100,8 +90,8 @@ def main(model_name="meta-llama/llama-2-70b-chat", missed_bin_sampling="RANDOM",
         dialogue_restarting = rst_plan_Coverage_RateBased_Tolerance
     print("Running main experiment on AG_FT...")
 
-    server_ip_port = input(
-        "Pleasenter server's IP and port (e.g. 127.0.0.1:5050, 128.232.65.218:5555): "
+    server_ip_port = ask_server_ip_port(
+        "Pleasenter server's IP and port (e.g. 127.0.0.1:5050, 128.232.65.218:5555) or shm://name: "
     )
     # server_ip_port = "0.0.0.0:5050"
 
@@ -127,7 +117,7 @@ def main(model_name="meta-llama/llama-2-70b-chat", missed_bin_sampling="RANDOM",
     stimulus_filter = UniversalFilter([None,[0,63],[1,1023],[1,1023]])
 
     # build loggers
-    prefix = "./logs/" + model_name + "_"
+    prefix = log_dir() + model_name + "_"
     # if(increment_address):
     #     prefix = prefix.replace(prefix.split("/")[-2], prefix.split("/")[-2] + "/incremental")
     # else:
@@ -209,7 +199,7 @@ def main(model_name="meta-llama/llama-2-70b-chat", missed_bin_sampling="RANDOM",
     g_coverage = GlobalCoverageDatabase()
     stimulus = Stimulus(value=0, finish=False)
 
-    with closing(StimulusSender(f"tcp://{server_ip_port}")) as stimulus_sender:
+    with closing(StimulusSender(sender_address(server_ip_port))) as stimulus_sender:
         while not agent.end_simulation(g_dut_state, g_coverage):
             stimulus.value = agent.generate_next_value(g_dut_state, g_coverage)
             if(isinstance(stimulus.value, int)):
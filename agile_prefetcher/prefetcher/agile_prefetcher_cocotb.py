@@ -56,61 +56,63 @@ class SimulationController:
 
     # Handles driving a new_value when one is provided by `determine_next_value`
     async def controller_loop(self):
-        with self.zmq_context.socket(zmq.REP) as socket:
-            socket.bind(self.zmq_addr)
+        with open_server_socket(self.zmq_context, self.zmq_addr) as socket:
 
             await ClockCycles(self.dut.core_clk, 1)
             await ReadWrite()
 
-            while True:
-                stimulus_msg = socket.recv()
-                stimulus_obj = pickle.loads(stimulus_msg)
-                print(stimulus_obj)
-
-                dut_state = self.sample_dut_state()
-
-                if(not self.dut.nsb_prefetcher_req_ready.value):
-                    await RisingEdge(self.dut.nsb_prefetcher_req_ready.value)
-
-                stimulus = stimulus_obj.value
-                req_opcode = stimulus[0]
-                start_address = stimulus[1]
-                in_features = stimulus[2]
-                out_features = stimulus[3]
-                nodeslot = stimulus[4]
-                nodeslot_precision = stimulus[5]
-                neighbour_count = stimulus[6]
-
-                payload_nsb_prefetcher_req = assemble_payload_from_struct([
-                    [neighbour_count, 10],
-                    [nodeslot_precision, 2],
-                    [nodeslot, 6],
-                    [out_features, 11],
-                    [in_features, 11],
-                    [start_address, 34],
-                    [req_opcode, 3]])
-                
-                self.dut.nsb_prefetcher_req.value = payload_nsb_prefetcher_req
-
-                timeout = False
-                cycle_count = 0
-
-                while(not self.dut.nsb_prefetcher_resp_valid.value):
-                    cycle_count += 1
-                    if cycle_count > 1000:
-                        timeout = True
-                        print("No valid response has been received")
-                        break
-                    await ClockCycles(self.dut.core_clk, 1)
-                
-                if(not timeout):
-                    self.check_hits(self.dut.nsb_prefetcher_resp.value)
-                
-                socket.send_pyobj((dut_state, self.coverage_monitor.coverage_database))
-
-                if stimulus_obj.finish:
-                    self.end_simulation_event.set()
-                    break
+            await serve_stimuli(
+                socket,
+                self.handle_stimulus,
+                lambda: self.coverage_monitor.coverage_database,
+                WIRE_TYPES,
+            )
+            self.end_simulation_event.set()
+
+    # Drives a single stimulus, returns the reply to it and whether it ends the simulation
+    async def handle_stimulus(self, stimulus_obj):
+        print(stimulus_obj)
+
+        dut_state = self.sample_dut_state()
+
+        if(not self.dut.nsb_prefetcher_req_ready.value):
+            await RisingEdge(self.dut.nsb_prefetcher_req_ready.value)
+
+        stimulus = stimulus_obj.value
+        req_opcode = stimulus[0]
+        start_address = stimulus[1]
+        in_features = stimulus[2]
+        out_features = stimulus[3]
+        nodeslot = stimulus[4]
+        nodeslot_precision = stimulus[5]
+        neighbour_count = stimulus[6]
+
+        payload_nsb_prefetcher_req = assemble_payload_from_struct([
+            [neighbour_count, 10],
+            [nodeslot_precision, 2],
+            [nodeslot, 6],
+            [out_features, 11],
+            [in_features, 11],
+            [start_address, 34],
+            [req_opcode, 3]])
+
+        self.dut.nsb_prefetcher_req.value = payload_nsb_prefetcher_req
+
+        timeout = False
+        cycle_count = 0
+
+        while(not self.dut.nsb_prefetcher_resp_valid.value):
+            cycle_count += 1
+            if cycle_count > 1000:
+                timeout = True
+                print("No valid response has been received")
+                break
+            await ClockCycles(self.dut.core_clk, 1)
+
+        if(not timeout):
+            self.check_hits(self.dut.nsb_prefetcher_resp.value)
+
+        return (dut_state, self.coverage_monitor.coverage_database), stimulus_obj.finish
     
     def check_hits(self, response):
         partial = self.dut.nsb_prefetcher_resp.value[0]
@@ -176,7 +178,7 @@ class SimulationController:
 async def basic_test(dut):
     from global_shared_types import GlobalCoverageDatabase
 
-    server_port = input("Please enter server's port (e.g. 5050, 5555): ")
+    server_port = ask_server_port("Please enter server's port (e.g. 5050, 5555) or shm://name: ")
 
     trial_cnt = 0
 
@@ -255,7 +257,7 @@ async def basic_test(dut):
         await do_reset(dut.resetn, dut.core_clk, 3)
 
         with closing(
-            SimulationController(dut, coverage_monitor, f"tcp://*:{server_port}")
+            SimulationController(dut, coverage_monitor, server_address(server_port))
         ) as simulation_controller:
             simulation_controller.run_controller()
 
@@ -14,6 +14,7 @@ sys.path.insert(0, os.path.dirname("/".join(directory.split("/")[:-1])))
 # print(sys.path)
 
 from agile_prefetcher.prefetcher.shared_types import *
+from shared_helpers.stimulus_sender import BaseStimulusSender, sender_address, ask_server_ip_port
 from global_shared_types import *
 from agents.agent_random import *
 from agents.agent_LLM import *
@@ -21,17 +22,12 @@ from prompt_generators.prompt_generator_template_AG_PR import *
 from models.llm_gpt import ChatGPT
 from loggers.logger_csv import CSVLogger
 from loggers.logger_txt import TXTLogger
+from loggers.logger_base import log_dir
 
-class StimulusSender:
-    def __init__(self, zmq_addr):
-        self.context = zmq.Context()
-        self.socket = self.context.socket(zmq.REQ)
-        self.socket.connect(zmq_addr)
-
-    def send_stimulus(self, stimulus_obj):
-        self.socket.send_pyobj(stimulus_obj)
-        state_coverage_obj = self.socket.recv_pyobj()
+class StimulusSender(BaseStimulusSender):
+    wire_types = WIRE_TYPES
 
+    def check_reply(self, state_coverage_obj):
         if not isinstance(state_coverage_obj, tuple):
             raise RuntimeError("Bad format of coverage response")
         if not isinstance(state_coverage_obj[0], DUTState):
@@ -39,17 +35,11 @@ class StimulusSender:
         if not isinstance(state_coverage_obj[1], CoverageDatabase):
             raise RuntimeError("Bad format of coverage response element 1")
 
-        return state_coverage_obj
-
-    def close(self):
-        if self.socket:
-            self.socket.close()
-
 # def random_experiment():
 #     print("Running random experiment on AG_PR...\n")
 
-#     server_ip_port = input(
-#         "Please enter server's IP and port (e.g. 127.0.0.1:5050, 128.232.65.218:5555): "
+#     server_ip_port = ask_server_ip_port(
+#         "Please enter server's IP and port (e.g. 127.0.0.1:5050, 128.232.65.218:5555) or shm://name: "
 #     )
 
 #     CYCLES = 16
@@ -60,7 +50,7 @@ class StimulusSender:
 #     g_dut_state = GlobalDUTState()
 #     g_coverage = GlobalCoverageDatabase()
 
-#     with closing(StimulusSender(f"tcp://{server_ip_port}")) as stimulus_sender:
+#     with closing(StimulusSender(sender_address(server_ip_port))) as stimulus_sender:
 #         while not agent.end_simulation(g_dut_state, g_coverage):
 #             stimulus.value = agent.generate_next_value(g_dut_state, g_coverage)
 #             print(stimulus.value)
@@ -84,8 +74,8 @@ class StimulusSender:
 def main():
     print("Running main experiment on AG_PR...")
 
-    server_ip_port = input(
-        "Please enter server's IP and port (e.g. 127.0.0.1:5050, 128.232.65.218:5555): "
+    server_ip_port = ask_server_ip_port(
+        "Please enter server's IP and port (e.g. 127.0.0.1:5050, 128.232.65.218:5555) or shm://name: "
     )
 
     # build components
@@ -109,7 +99,7 @@ def main():
     stimulus_filter = UniversalFilter([[0,4],[0,2**34-1],[1,1023],[1,1023],[1,63],[0,3],[1,1023]])
 
     # build loggers
-    prefix = "./logs/"
+    prefix = log_dir()
     t = datetime.now()
     t = t.strftime("%Y%m%d_%H%M%S")
     logger_txt = TXTLogger(f"{prefix}{t}.txt")
@@ -134,7 +124,7 @@ def main():
     g_coverage = GlobalCoverageDatabase()
     stimulus = Stimulus(value=0, finish=False)
 
-    with closing(StimulusSender(f"tcp://{server_ip_port}")) as stimulus_sender:
+    with closing(StimulusSender(sender_address(server_ip_port))) as stimulus_sender:
         while not agent.end_simulation(g_dut_state, g_coverage):
             stimulus.value = agent.generate_next_value(g_dut_state, g_coverage)
             if(isinstance(stimulus.value, int)):
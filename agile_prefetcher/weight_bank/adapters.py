@@ -0,0 +1,27 @@
+# Copyright ***** contributors.
+# Licensed under the Apache License, Version 2.0, see LICENSE for details.
+# SPDX-License-Identifier: Apache-2.0
+
+from shared_helpers.dut_registry import *
+from agile_prefetcher.weight_bank.shared_types import CoverageDatabase, DUTState
+
+# Registers the AGILE prefetcher weight bank's types with GlobalCoverageDatabase
+# and GlobalDUTState
+
+AG_WB_BOUND = 64
+
+
+def coverage_bins_AG_WB(coverage: CoverageDatabase) -> List[Bin]:
+    # TODO: Prioritise harder bins?
+    bins = []
+    for i in range(1, AG_WB_BOUND+1):
+        bins.append((("out_features", i), f"out_{i}", "out", 1))
+        for j in range(1, int(AG_WB_BOUND/16+1)):
+            bins.append((("combined_features", j, i), f"combined_features_{j}_{i}", "combined", 1))
+    for i in range(1, int(AG_WB_BOUND/16+1)):
+        bins.append((("in_features", i), f"in_{i}", "in", 1))
+    return bins
+
+
+register_coverage(CoverageDatabase, coverage_bins_AG_WB)
+register_dut_state(DUTState)
@@ -41,80 +41,82 @@ class SimulationController:
 
     # Handles driving a new_value when one is provided by `determine_next_value`
     async def controller_loop(self):
-        with self.zmq_context.socket(zmq.REP) as socket:
-            socket.bind(self.zmq_addr)
+        with open_server_socket(self.zmq_context, self.zmq_addr) as socket:
 
             await ClockCycles(self.dut.core_clk, 1)
             await ReadWrite()
 
-            while True:
-                stimulus_msg = socket.recv()
-                await do_reset(reset_sig=self.dut.resetn, clock_sig=self.dut.core_clk, reset_cycles=3) # needs reset for every new stimulus due to possible state machine issue
-                stimulus_obj = pickle.loads(stimulus_msg)
-                print(stimulus_obj)
-
-                if not isinstance(stimulus_obj, Stimulus):
-                    assert False, "Saw bad stimulus message"
-
-                dut_state = self.sample_dut_state()
-
-                # drive primary input
-                if(int(self.dut.nsb_prefetcher_weight_bank_req_ready.value) == 0):
-                    await RisingEdge(self.dut.nsb_prefetcher_weight_bank_req_ready) # wait until dut can receive request
-                if stimulus_obj.value is None:
-                    self.dut.nsb_prefetcher_weight_bank_req_valid.value = 0
-                    self.dut.nsb_prefetcher_weight_bank_req.value = 0
-                else:
-                    req_opcode = 0
-                    start_address = 0
-                    in_features = int(stimulus_obj.value[0])
-                    if(in_features < 1):
-                        in_features = 1
-                    out_features = int(stimulus_obj.value[1])
-                    if(out_features < 1):
-                        out_features = 1
-                    nodeslot = 0
-                    nodeslot_precision = 0
-                    neighbour_count = 0
-
-                    payload = assemble_payload_from_struct([
-                        [neighbour_count, 10],
-                        [nodeslot_precision, 2],
-                        [nodeslot, 6],
-                        [out_features, 11],
-                        [in_features, 11],
-                        [start_address, 34],
-                        [req_opcode, 3]])
-
-                    self.dut.nsb_prefetcher_weight_bank_req_valid.value = 1
-                    self.dut.nsb_prefetcher_weight_bank_req.value = payload
-
-                if(int(self.dut.weight_channel_resp_valid.value) == 0):
-                    await RisingEdge(self.dut.weight_channel_resp_valid)
-                cont = True
-                while(cont):
-                    valid_mask = str(self.dut.weight_channel_resp)[-1024:-1]
-                    number_of_ones = valid_mask.count('1')
-                    cont = number_of_ones == 0
-                    await ClockCycles(self.dut.core_clk, 1)
-                self.continue_sampling = True
-                while (self.continue_sampling):
-                    self.continue_sampling = determine_coverage(
-                        coverage_monitor=self.coverage_monitor, 
-                        sample_condition=self.dut.weight_channel_resp_ready.value and self.dut.weight_channel_resp_valid.value,
-                        signals=str(self.dut.weight_channel_resp)[-1024:-1],
-                        finish_condition=str(self.dut.weight_channel_resp)[-1] == '1',
-                        duration=[self.coverage_monitor.coverage_database.in_features, 16, -1],
-                        count_high=[1,self.coverage_monitor.coverage_database.out_features],
-                        combine=[0,self.coverage_monitor.coverage_database.combined_features]
-                        )
-                    await ClockCycles(self.dut.core_clk, 1)
-
-                socket.send_pyobj((dut_state, self.coverage_monitor.coverage_database))
-
-                if stimulus_obj.finish:
-                    self.end_simulation_event.set()
-                    break
+            await serve_stimuli(
+                socket,
+                self.handle_stimulus,
+                lambda: self.coverage_monitor.coverage_database,
+                WIRE_TYPES,
+            )
+            self.end_simulation_event.set()
+
+    # Drives a single stimulus, returns the reply to it and whether it ends the simulation
+    async def handle_stimulus(self, stimulus_obj):
+        await do_reset(reset_sig=self.dut.resetn, clock_sig=self.dut.core_clk, reset_cycles=3) # needs reset for every new stimulus due to possible state machine issue
+        print(stimulus_obj)
+
+        if not isinstance(stimulus_obj, Stimulus):
+            assert False, "Saw bad stimulus message"
+
+        dut_state = self.sample_dut_state()
+
+        # drive primary input
+        if(int(self.dut.nsb_prefetcher_weight_bank_req_ready.value) == 0):
+            await RisingEdge(self.dut.nsb_prefetcher_weight_bank_req_ready) # wait until dut can receive request
+        if stimulus_obj.value is None:
+            self.dut.nsb_prefetcher_weight_bank_req_valid.value = 0
+            self.dut.nsb_prefetcher_weight_bank_req.value = 0
+        else:
+            req_opcode = 0
+            start_address = 0
+            in_features = int(stimulus_obj.value[0])
+            if(in_features < 1):
+                in_features = 1
+            out_features = int(stimulus_obj.value[1])
+            if(out_features < 1):
+                out_features = 1
+            nodeslot = 0
+            nodeslot_precision = 0
+            neighbour_count = 0
+
+            payload = assemble_payload_from_struct([
+                [neighbour_count, 10],
+                [nodeslot_precision, 2],
+                [nodeslot, 6],
+                [out_features, 11],
+                [in_features, 11],
+                [start_address, 34],
+                [req_opcode, 3]])
+
+            self.dut.nsb_prefetcher_weight_bank_req_valid.value = 1
+            self.dut.nsb_prefetcher_weight_bank_req.value = payload
+
+        if(int(self.dut.weight_channel_resp_valid.value) == 0):
+            await RisingEdge(self.dut.weight_channel_resp_valid)
+        cont = True
+        while(cont):
+            valid_mask = str(self.dut.weight_channel_resp)[-1024:-1]
+            number_of_ones = valid_mask.count('1')
+            cont = number_of_ones == 0
+            await ClockCycles(self.dut.core_clk, 1)
+        self.continue_sampling = True
+        while (self.continue_sampling):
+            self.continue_sampling = determine_coverage(
+                coverage_monitor=self.coverage_monitor, 
+                sample_condition=self.dut.weight_channel_resp_ready.value and self.dut.weight_channel_resp_valid.value,
+                signals=str(self.dut.weight_channel_resp)[-1024:-1],
+                finish_condition=str(self.dut.weight_channel_resp)[-1] == '1',
+                duration=[self.coverage_monitor.coverage_database.in_features, 16, -1],
+                count_high=[1,self.coverage_monitor.coverage_database.out_features],
+                combine=[0,self.coverage_monitor.coverage_database.combined_features]
+                )
+            await ClockCycles(self.dut.core_clk, 1)
+
+        return (dut_state, self.coverage_monitor.coverage_database), stimulus_obj.finish
 
     def sample_dut_state(self):
         return DUTState(
@@ -131,7 +133,7 @@ class SimulationController:
 async def basic_test(dut):
     from global_shared_types import GlobalCoverageDatabase
 
-    server_port = input("Please enter server's port (e.g. 5050, 5555): ")
+    server_port = ask_server_port("Please enter server's port (e.g. 5050, 5555) or shm://name: ")
     # server_port = "5050"
 
     trial_cnt = 0
@@ -156,7 +158,7 @@ async def basic_test(dut):
         await do_reset(reset_sig=dut.resetn, clock_sig=dut.core_clk, reset_cycles=3)
 
         with closing(
-            SimulationController(dut, coverage_monitor, f"tcp://*:{server_port}")
+            SimulationController(dut, coverage_monitor, server_address(server_port))
         ) as simulation_controller:
             simulation_controller.run_controller()
 
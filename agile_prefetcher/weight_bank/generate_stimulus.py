@@ -17,6 +17,7 @@ directory = os.path.dirname(os.path.abspath("__file__"))
 sys.path.insert(0, os.path.dirname("/".join(directory.split("/")[:-1])))
 
 from agile_prefetcher.weight_bank.shared_types import *
+from shared_helpers.stimulus_sender import BaseStimulusSender, sender_address, ask_server_ip_port
 from global_shared_types import *
 from agents.agent_random import *
 from agents.agent_LLM import *
@@ -27,17 +28,12 @@ from stimuli_extractor import UniversalExtractor
 from stimuli_filter import UniversalFilter
 from loggers.logger_csv import CSVLogger
 from loggers.logger_txt import TXTLogger
+from loggers.logger_base import log_dir
 
-class StimulusSender:
-    def __init__(self, zmq_addr):
-        self.context = zmq.Context()
-        self.socket = self.context.socket(zmq.REQ)
-        self.socket.connect(zmq_addr)
-
-    def send_stimulus(self, stimulus_obj):
-        self.socket.send_pyobj(stimulus_obj)
-        state_coverage_obj = self.socket.recv_pyobj()
+class StimulusSender(BaseStimulusSender):
+    wire_types = WIRE_TYPES
 
+    def check_reply(self, state_coverage_obj):
         if not isinstance(state_coverage_obj, tuple):
             raise RuntimeError("Bad format of coverage response")
         if not isinstance(state_coverage_obj[0], DUTState):
@@ -45,17 +41,11 @@ class StimulusSender:
         if not isinstance(state_coverage_obj[1], CoverageDatabase):
             raise RuntimeError("Bad format of coverage response element 1")
 
-        return state_coverage_obj
-
-    def close(self):
-        if self.socket:
-            self.socket.close()
-
 def random_experiment():
     print("Running random experiment on AG_WB...\n")
 
-    server_ip_port = input(
-        "Please enter server's IP and port (e.g. 127.0.0.1:5050, 128.232.65.218:5555): "
+    server_ip_port = ask_server_ip_port(
+        "Please enter server's IP and port (e.g. 127.0.0.1:5050, 128.232.65.218:5555) or shm://name: "
     )
     # server_ip_port = "0.0.0.0:5050"
 
@@ -67,7 +57,7 @@ def random_experiment():
     g_dut_state = GlobalDUTState()
     g_coverage = GlobalCoverageDatabase()
 
-    with closing(StimulusSender(f"tcp://{server_ip_port}")) as stimulus_sender:
+    with closing(StimulusSender(sender_address(server_ip_port))) as stimulus_sender:
         while not agent.end_simulation(g_dut_state, g_coverage):
             stimulus.value = agent.generate_next_value(g_dut_state, g_coverage)
             print(stimulus.value)
@@ -103,8 +93,8 @@ def main(model_name="meta-llama/llama-2-70b-chat", missed_bin_sampling="RANDOM",
     print("Running main experiment on AG_WB...")
 
     # server_ip_port = "0.0.0.0:5050"
-    server_ip_port = input(
-        "Please enter server's IP and port (e.g. 127.0.0.1:5050, 128.232.65.218:5555): "
+    server_ip_port = ask_server_ip_port(
+        "Please enter server's IP and port (e.g. 127.0.0.1:5050, 128.232.65.218:5555) or shm://name: "
     )
 
     # build components
@@ -130,7 +120,7 @@ def main(model_name="meta-llama/llama-2-70b-chat", missed_bin_sampling="RANDOM",
     stimulus_filter = UniversalFilter([[1,64],[1,64]])
 
 # build loggers
-    prefix = "./logs/" + model_name + "_"
+    prefix = log_dir() + model_name + "_"
     if("gpt-3" in model_name):
         prefix = prefix.replace("openai", "openai_gpt-3")
     elif("gpt-4" in model_name):
@@ -208,7 +198,7 @@ def main(model_name="meta-llama/llama-2-70b-chat", missed_bin_sampling="RANDOM",
     g_coverage = GlobalCoverageDatabase()
     stimulus = Stimulus(value=0, finish=False)
 
-    with closing(StimulusSender(f"tcp://{server_ip_port}")) as stimulus_sender:
+    with closing(StimulusSender(sender_address(server_ip_port))) as stimulus_sender:
         while not agent.end_simulation(g_dut_state, g_coverage):
             stimulus.value = agent.generate_next_value(g_dut_state, g_coverage)
             if(isinstance(stimulus.value, int)):
@@ -34,4 +34,8 @@ class CoverageDatabase:
         
     # Flatten all coverage bins into a single vector (python list of integers)
     def get_coverage_vector(self):
-        return (self.in_features + self.out_features)
\ No newline at end of file
+        return (self.in_features + self.out_features)
+
+# Types sent over the binary wire format (shared_helpers/wire_format.py), the
+# coverage database first. The position of a type is its id on the wire.
+WIRE_TYPES = [CoverageDatabase, Stimulus, DUTState]
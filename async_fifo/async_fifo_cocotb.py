@@ -19,6 +19,7 @@ directory = os.path.dirname(os.path.abspath("__file__"))
 sys.path.insert(0, os.path.dirname(directory))
 
 from async_fifo.shared_types import *
+from shared_helpers.cocotb_helpers import serve_stimuli, open_server_socket, server_address, ask_server_port
 
 wclk_period = 10
 rclk_period = 13
@@ -68,41 +69,43 @@ class SimulationController:
     async def controller_loop(self):
         await cocotb.start(read_monitor(self))
         await cocotb.start(write_monitor(self))
-        with self.zmq_context.socket(zmq.REP) as socket:
-            socket.bind(self.zmq_addr)
+        with open_server_socket(self.zmq_context, self.zmq_addr) as socket:
 
-            while True:
-                stimulus_msg = socket.recv()
-                stimulus_obj = pickle.loads(stimulus_msg)
-                print(stimulus_obj)
+            await serve_stimuli(
+                socket,
+                self.handle_stimulus,
+                lambda: self.coverage_monitor.coverage_database,
+                WIRE_TYPES,
+            )
+            self.end_simulation_event.set()
 
-                dut_state = self.sample_dut_state()
-                wait_time = stimulus_obj.value[0]
-                read = stimulus_obj.value[1]
-                write = stimulus_obj.value[2]
+    # Drives a single stimulus, returns the reply to it and whether it ends the simulation
+    async def handle_stimulus(self, stimulus_obj):
+        print(stimulus_obj)
 
-                winc = 0
-                rinc = 0
-                wdata = 0
+        dut_state = self.sample_dut_state()
+        wait_time = stimulus_obj.value[0]
+        read = stimulus_obj.value[1]
+        write = stimulus_obj.value[2]
 
-                if read:
-                    rinc = 1
-                if write:
-                    winc = 1
+        winc = 0
+        rinc = 0
+        wdata = 0
 
-                self.dut.winc.value = winc
-                self.dut.rinc.value = rinc
-                self.dut.wdata.value = wdata
+        if read:
+            rinc = 1
+        if write:
+            winc = 1
 
-                await Timer(wait_time, units="ns")
+        self.dut.winc.value = winc
+        self.dut.rinc.value = rinc
+        self.dut.wdata.value = wdata
 
-                self.sample_signals()
+        await Timer(wait_time, units="ns")
 
-                socket.send_pyobj((dut_state, self.coverage_monitor.coverage_database))
+        self.sample_signals()
 
-                if stimulus_obj.finish:
-                    self.end_simulation_event.set()
-                    break
+        return (dut_state, self.coverage_monitor.coverage_database), stimulus_obj.finish
     
     def check_hits(self):
         if(self.dut.rempty.value and not (self.rempty_prev == 1 or self.rempty_prev == None)):
@@ -190,7 +193,7 @@ async def do_reset(dut):
 async def basic_test(dut):
     from global_shared_types import GlobalCoverageDatabase
 
-    server_port = input("Please enter server's port (e.g. 5050, 5555): ")
+    server_port = ask_server_port("Please enter server's port (e.g. 5050, 5555) or shm://name: ")
     # server_port = "5050"
 
     trial_cnt = 0
@@ -205,7 +208,7 @@ async def basic_test(dut):
         await do_reset(dut)
 
         with closing(
-            SimulationController(dut, coverage_monitor, f"tcp://*:{server_port}")
+            SimulationController(dut, coverage_monitor, server_address(server_port))
         ) as simulation_controller:
             simulation_controller.run_controller()
 
@@ -0,0 +1,176 @@
+# Copyright ***** contributors.
+# Licensed under the Apache License, Version 2.0, see LICENSE for details.
+# SPDX-License-Identifier: Apache-2.0
+
+import random
+
+from async_fifo.shared_types import *
+
+# Pure Python golden model of src/async_fifo.sv (ASIZE = 4) and its testbench,
+# served in-process for golden:// addresses (see shared_helpers/local_transport.py).
+#
+# The write and read clocks run with the periods of async_fifo_cocotb.py from the
+# time its reset sequence ends, each stimulus holds its inputs for its wait
+# time, and at every rising edge the registers are updated and then sampled by
+# the same checks as read_monitor / write_monitor. An edge falling exactly at the
+# end of a wait time still sees that stimulus' inputs, where the event ordering
+# of the simulator may differ. How closely it follows the RTL is unknown until
+# an RTL trace is recorded and checked with shared_helpers/golden_conformance.py.
+
+ASIZE = 4
+PTR_MASK = (1 << (ASIZE + 1)) - 1
+PTR_MSB = 1 << ASIZE
+# the two MSBs of a gray pointer differ between the full and empty conditions
+FULL_GRAY_FLIP = 0b11 << (ASIZE - 1)
+
+# in ps, see async_fifo_cocotb.py
+WCLK_PERIOD = 10000
+RCLK_PERIOD = 13000
+# do_reset waits 3 write then 3 read clock cycles, twice, from time 0
+RESET_END = 117000
+
+
+def gray(binary):
+    return (binary >> 1) ^ binary
+
+
+class AsyncFifoModel:
+    def __init__(self):
+        self.coverage_database = CoverageDatabase()
+        self.coverage_database.misc_bins = {
+            "full_read_wrap": 0,
+            "gray_read_wrap": 0,
+            "full_write_wrap": 0,
+            "gray_write_wrap": 0,
+            "underflow": 0,
+            "overflow": 0,
+            "full": 0,
+            "empty": 0,
+            "read_while_write": 0,
+            "write_while_read": 0,
+        }
+
+        self.time = RESET_END
+        self.winc = 0
+        self.rinc = 0
+
+        # registers after reset
+        self.wbin = 0
+        self.wptr = 0
+        self.wfull = 0
+        self.awfull = 0
+        self.wq1_rptr = 0
+        self.wq2_rptr = 0
+        self.rbin = 0
+        self.rptr = 0
+        self.rempty = 1
+        self.arempty = 0
+        self.rq1_wptr = 0
+        self.rq2_wptr = 0
+
+        # what the monitors remember from the previous edge of their clock
+        self.monitor_rptr = None
+        self.monitor_rempty = None
+        self.monitor_wptr = None
+        self.monitor_wfull = None
+
+    # Drives a single stimulus, returns the reply to it and whether it ends the simulation
+    async def handle_stimulus(self, stimulus_obj):
+        dut_state = DUTState()
+        wait_time = stimulus_obj.value[0]
+        read = stimulus_obj.value[1]
+        write = stimulus_obj.value[2]
+
+        self.rinc = 1 if read else 0
+        self.winc = 1 if write else 0
+
+        self.run_until(self.time + round(wait_time * 1000))
+
+        return (dut_state, self.coverage_database), stimulus_obj.finish
+
+    # Runs the clock edges in (self.time, end]
+    def run_until(self, end):
+        while True:
+            next_wclk = (self.time // WCLK_PERIOD + 1) * WCLK_PERIOD
+            next_rclk = (self.time // RCLK_PERIOD + 1) * RCLK_PERIOD
+            edge = min(next_wclk, next_rclk)
+            if edge > end:
+                break
+            self.clock(edge == next_wclk, edge == next_rclk)
+            self.time = edge
+        self.time = end
+
+    # Rising edges of the write and/or read clock at the same time
+    def clock(self, wclk, rclk):
+        # both domains sample the other's pointer from before the edge
+        wptr, rptr = self.wptr, self.rptr
+
+        if wclk:
+            wbinnext = (self.wbin + (self.winc & ~self.wfull & 1)) & PTR_MASK
+            full_rptr = self.wq2_rptr ^ FULL_GRAY_FLIP
+            self.wfull = int(gray(wbinnext) == full_rptr)
+            self.awfull = int(gray((wbinnext + 1) & PTR_MASK) == full_rptr)
+            self.wbin, self.wptr = wbinnext, gray(wbinnext)
+            self.wq2_rptr, self.wq1_rptr = self.wq1_rptr, rptr
+
+        if rclk:
+            rbinnext = (self.rbin + (self.rinc & ~self.rempty & 1)) & PTR_MASK
+            self.rempty = int(gray(rbinnext) == self.rq2_wptr)
+            self.arempty = int(gray((rbinnext + 1) & PTR_MASK) == self.rq2_wptr)
+            self.rbin, self.rptr = rbinnext, gray(rbinnext)
+            self.rq2_wptr, self.rq1_wptr = self.rq1_wptr, wptr
+
+        # the monitors run once all registers of the time step are updated
+        if rclk:
+            self.read_monitor()
+        if wclk:
+            self.write_monitor()
+
+    def read_monitor(self):
+        bins = self.coverage_database.misc_bins
+        rptr_prev = self.monitor_rptr
+        self.monitor_rptr = self.rptr
+
+        if self.rempty and not (self.monitor_rempty == 1 or self.monitor_rempty is None):
+            bins["empty"] += 1
+        if self.rptr == 0 and not (rptr_prev == 0 or rptr_prev == 1 or rptr_prev is None):
+            bins["full_read_wrap"] += 1
+        if rptr_prev is not None and (self.rptr ^ rptr_prev) & PTR_MSB:
+            bins["gray_read_wrap"] += 1
+        if self.rinc and self.monitor_rempty:
+            bins["underflow"] += 1
+        if self.rinc and self.winc:
+            bins["read_while_write"] += 1
+        self.monitor_rempty = self.rempty
+
+    def write_monitor(self):
+        bins = self.coverage_database.misc_bins
+        wptr_prev = self.monitor_wptr
+        self.monitor_wptr = self.wptr
+
+        if self.wfull and not (self.monitor_wfull == 1 or self.monitor_wfull is None):
+            bins["full"] += 1
+        if self.wptr == 0 and not (wptr_prev == 0 or wptr_prev == 1 or wptr_prev is None):
+            bins["full_write_wrap"] += 1
+        if wptr_prev is not None and (self.wptr ^ wptr_prev) & PTR_MSB:
+            bins["gray_write_wrap"] += 1
+        if self.winc and self.monitor_wfull:
+            bins["overflow"] += 1
+        if self.rinc and self.winc:
+            bins["write_while_read"] += 1
+        self.monitor_wfull = self.wfull
+
+
+GOLDEN_MODEL = AsyncFifoModel
+
+
+# Stimulus for recording conformance traces, as RandomAgent4AF generates it but
+# with bursts of reads or writes so that the FIFO fills and empties
+def random_stimulus(rng: random.Random, length: int):
+    stimuli = []
+    while len(stimuli) < length:
+        read, write = rng.choice([(0, 1), (1, 0), (1, 1), (0, 0)])
+        for _ in range(rng.randint(1, 12)):
+            wait_time = rng.choice([rng.randint(1, 30), rng.getrandbits(10)])
+            stimuli.append(Stimulus(value=[wait_time, read, write], finish=False))
+    return stimuli[:length]
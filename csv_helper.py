@@ -5,7 +5,7 @@
 import csv
 import os.path
 
-from models.llm_gpt import num_tokens_from_messages
+from models.token_counter import num_tokens_from_conversations
 
 
 def add_token_cnt(filename: str):
@@ -25,17 +25,18 @@ def print_old_token_cnt_avg(filename: str):
         "Coverage Rate",
         "Coverage Plan",
     ]
-    input_token = []
-    output_token = []
+    inputs = []
+    outputs = []
     with open(filename, "r", newline="") as f:
         reader = csv.DictReader(f, fieldnames=header)
         for i, row in enumerate(reader):
             if i <= 1:
                 continue
-            input_token.append(num_tokens_from_messages([{"user": row["USER"]}]))
-            output_token.append(
-                num_tokens_from_messages([{"assistant": row["ASSISTANT"]}])
-            )
+            inputs.append([{"user": row["USER"]}])
+            outputs.append([{"assistant": row["ASSISTANT"]}])
+        # all rows are encoded in one batch
+        input_token = num_tokens_from_conversations(inputs)
+        output_token = num_tokens_from_conversations(outputs)
         print(sum(input_token) / len(input_token))
         print(sum(output_token) / len(output_token))
 
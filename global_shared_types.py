@@ -2,42 +2,88 @@
 # Licensed under the Apache License, Version 2.0, see LICENSE for details.
 # SPDX-License-Identifier: Apache-2.0
 
-import re
+import copy
+import random
+import threading
+import unittest
+from dataclasses import dataclass
 from typing import *
 
-from stride_detector.shared_types import CoverageDatabase as SDCD
-from ibex_decoder.shared_types import CoverageDatabase as IDCD
-from stride_detector.shared_types import DUTState as SDDS
-from ibex_cpu.shared_types import IbexStateInfo as ICDS
-from ibex_cpu.shared_types import CoverageDatabase as ICCD
-
-#AGILE
-from agile_prefetcher.weight_bank.shared_types import CoverageDatabase as AG_WBCD
-from agile_prefetcher.weight_bank.shared_types import DUTState as AG_WBDS
-
-from agile_prefetcher.fetch_tag.shared_types import CoverageDatabase as AG_FTCD
-from agile_prefetcher.fetch_tag.shared_types import DUTState as AG_FTDS
-
-from agile_prefetcher.prefetcher.shared_types import CoverageDatabase as AG_PRCD
-from agile_prefetcher.prefetcher.shared_types import DUTState as AG_PRDS
-
-#ASYNC FIFO
-from async_fifo.shared_types import CoverageDatabase as AFCD
-from async_fifo.shared_types import DUTState as AFDS
-
-#SDRAM controller
-from sdram_controller.shared_types import CoverageDatabase as SDRAMCD
-from sdram_controller.shared_types import DUTState as SDRAMDS
-
-#MIPS CPU
-from mips_cpu.shared_types import CoverageDatabase as MCCD
-from mips_cpu.shared_types import MipsStateInfo as MCDS
-
-AG_WB_BOUND = 64
-
+import numpy as np
+
+from shared_helpers.dut_registry import *
+from shared_helpers.sim_protocol import CoverageUpdate, apply_coverage_delta, coverage_counters
+
+
+# Flat view of the coverage plan of one DUT: its bins in a fixed order, with the
+# counter, name, group and weight of each. A CoverageDatabase then reads as a
+# vector of counters in that order, on which rates, scores, missed bins, deltas
+# and unions are single NumPy operations. Built once per DUT and counter shape
+# from the DUT's bin registry (see shared_helpers/dut_registry.py), and shared.
+class CoverageLayout:
+    def __init__(self, bins: List[Bin], counter_paths: Set[tuple]):
+        # a name given to several counters shows the last of them, as in a dict
+        entries = {}
+        for (path, name, group, weight) in bins:
+            entries[name] = (path, group, weight)
+
+        self.names = list(entries)
+        self.names_array = np.array(self.names, dtype=object)
+        self.index = {k: i for (i, k) in enumerate(self.names)}
+        # counter path of each bin
+        self.paths = [path for (path, _, _) in entries.values()]
+        self.path_index = {path: i for (i, path) in enumerate(self.paths)}
+        # e.g. single/double, op/reg/cross, seen/raw_hazard
+        self.groups = np.array([group for (_, group, _) in entries.values()], dtype=object)
+        # weight of each bin in the score when prioritising harder bins
+        self.weights = np.array([weight for (_, _, weight) in entries.values()], dtype=float)
+        # all counters of the database, including those shown in no bin
+        self.counter_paths = counter_paths
+
+    def __len__(self):
+        return len(self.names)
+
+    def vector(self, counters: Dict[tuple, int]) -> np.ndarray:
+        return np.fromiter(
+            (counters[path] for path in self.paths), dtype=np.int64, count=len(self.paths)
+        )
+
+    # A vector back as `coverage_counters`, e.g. to apply_coverage_delta a sum of
+    # vectors to a database
+    def counters(self, vector: np.ndarray) -> Dict[tuple, int]:
+        return dict(zip(self.paths, vector.tolist()))
+
+
+_LAYOUTS: Dict[tuple, CoverageLayout] = {}
+
+
+# The coverage plan and the views derived from it (rate, score, missed bins) are
+# built once per change of the database and cached, as a vector of counters. The
+# bin of each counter is known from the layout, so later changes only update
+# the bins whose counters moved, without formatting the bin names again.
+#
+# The missed bins are kept as an ordered set that shrinks as bins are hit, so a
+# change costs O(missed bins) rather than O(all bins). The progress of the run
+# (LLM messages and stimuli so far, see set_progress) at the change that first
+# hit each bin is recorded too, e.g. to tell how efficiently bins were closed.
+# Changes are seen when the database is next queried, so a bin hit by several
+# changes between two queries is stamped with the last of them.
 class GlobalCoverageDatabase:
     def __init__(self, coverage=None):
         self._coverage_database = None
+        self._lock = threading.Lock()
+        self._layout: Union[CoverageLayout, None] = None
+        self._counts: Union[np.ndarray, None] = None
+        self._plan: Union[Dict[str, int], None] = None
+        # layout indices of the missed bins, ascending, and their names
+        self._missed: Union[np.ndarray, None] = None
+        self._missed_bins: Union[List[str], None] = None
+        # (message count, stimulus count) of the run, and at the last change
+        self._progress = (-1, -1)
+        self._changed_at = (-1, -1)
+        # progress at which each bin was first hit, -1 if not yet
+        self._first_msg: Union[np.ndarray, None] = None
+        self._first_stimulus: Union[np.ndarray, None] = None
         self.set(coverage)
 
     def get(self):
@@ -49,250 +95,225 @@ class GlobalCoverageDatabase:
                 coverage, type(self._coverage_database)
             ), "New coverage is of different type of self._coverage_database."
 
-        if isinstance(coverage, SDCD):
-            self._coverage_database: SDCD
-        elif isinstance(coverage, IDCD):
-            self._coverage_database: IDCD
-        elif (isinstance(coverage, MCCD) or isinstance(coverage, ICCD)):
-            self._coverage_database: ICCD
-        elif isinstance(coverage, AG_PRCD):
-            self._coverage_database: AG_PRCD
-        elif isinstance(coverage, AG_FTCD):
-            self._coverage_database: AG_FTCD
-        elif isinstance(coverage, AG_WBCD):
-            self._coverage_database: AG_WBCD
-        elif isinstance(coverage, AFCD):
-            self._coverage_database: AFCD
-        elif isinstance(coverage, SDRAMCD):
-            self._coverage_database: SDRAMCD
-        elif coverage is None:
-            pass
-        else:
+        if coverage is not None and coverage_bins(type(coverage)) is None:
             raise TypeError(f"Coverage of type {type(coverage)} is not supported.")
 
-        self._coverage_database = coverage
-
+        # not while a worker thread refreshes the views of the last change
+        with self._lock:
+            if self._layout is not None and type(coverage) is not type(self._coverage_database):
+                self._layout = None
+            self._coverage_database = coverage
+            # any counter may have changed
+            self._dirty = True
+            self._changed_paths: Union[Set[tuple], None] = None
+            self._changed_at = self._progress
+
+    # Progress of the run the coverage of the next set or apply_update is at:
+    # LLM messages and stimuli sent so far
+    def set_progress(self, message_cnt: int, stimulus_cnt: int):
+        self._progress = (message_cnt, stimulus_cnt)
+
+    # Keeps a replica of the simulator's coverage in sync from CoverageUpdates
+    def apply_update(self, update: CoverageUpdate):
+        if update.snapshot is not None:
+            self.set(update.snapshot)
+            return
+        with self._lock:
+            apply_coverage_delta(self._coverage_database, update.changes)
+            if not self._dirty:
+                self._dirty = True
+                self._changed_paths = set(update.changes)
+            elif self._changed_paths is not None:
+                self._changed_paths.update(update.changes)
+            self._changed_at = self._progress
+
+    # The returned dict is not updated later on, and must not be modified
     def get_coverage_plan(self) -> Dict[str, int]:
-        if isinstance(self._coverage_database, SDCD):
-            return self._get_coverage_plan_SD()
-        elif isinstance(self._coverage_database, IDCD):
-            return self._get_coverage_plan_ID()
-        elif isinstance(self._coverage_database, ICCD):
-            return self._get_coverage_plan_IC()
-        elif isinstance(self._coverage_database, AG_WBCD):
-            return self._get_coverage_plan_AG_WBCD()
-        elif isinstance(self._coverage_database, AG_FTCD):
-            return self._get_coverage_plan_AG_FTCD()
-        elif isinstance(self._coverage_database, AG_PRCD):
-            return self._get_coverage_plan_AG_PRCD()
-        elif isinstance(self._coverage_database, AFCD):
-            return self._get_coverage_plan_AFCD()
-        elif isinstance(self._coverage_database, SDRAMCD):
-            return self._get_coverage_plan_SDRAMCD()
+        self._refresh()
+        if self._plan is None:
+            self._plan = dict(zip(self._layout.names, self._counts.tolist()))
+        return self._plan
+
+    # In plan order. The returned list is not updated later on, and must not be
+    # modified
+    def get_missed_bins(self) -> List[str]:
+        self._refresh()
+        if self._missed_bins is None:
+            self._missed_bins = self._layout.names_array[self._missed].tolist()
+        return self._missed_bins
+
+    # (message count, stimulus count) at which a bin was first hit, None if it
+    # has not been
+    def get_first_hit(self, bin_name: str) -> Union[Tuple[int, int], None]:
+        self._refresh()
+        i = self._layout.index[bin_name]
+        if self._counts[i] <= 0:
+            return None
+        return int(self._first_msg[i]), int(self._first_stimulus[i])
+
+    # bin name -> (message count, stimulus count) of its first hit, for the bins
+    # hit so far
+    def get_first_hits(self) -> Dict[str, Tuple[int, int]]:
+        self._refresh()
+        hit = np.flatnonzero(self._counts > 0)
+        return dict(
+            zip(
+                self._layout.names_array[hit].tolist(),
+                zip(self._first_msg[hit].tolist(), self._first_stimulus[hit].tolist()),
+            )
+        )
+
+    # A copy of the database and its views as of now, e.g. for a worker thread
+    # to read while this one is set again
+    def snapshot(self) -> "GlobalCoverageDatabase":
+        self._refresh()
+        with self._lock:
+            snapshot = copy.copy(self)
+            snapshot._lock = threading.Lock()
+            snapshot._coverage_database = copy.deepcopy(self._coverage_database)
+            # updated in place
+            if self._first_msg is not None:
+                snapshot._first_msg = self._first_msg.copy()
+                snapshot._first_stimulus = self._first_stimulus.copy()
+            if self._changed_paths is not None:
+                snapshot._changed_paths = set(self._changed_paths)
+        return snapshot
+
+    def get_layout(self) -> CoverageLayout:
+        self._refresh()
+        return self._layout
+
+    # Counters of the bins in layout order, a copy
+    def get_coverage_vector(self) -> np.ndarray:
+        self._refresh()
+        return self._counts.copy()
+
+    def get_missed_mask(self) -> np.ndarray:
+        self._refresh()
+        return self._counts <= 0
+
+    def _refresh(self):
+        with self._lock:
+            if not self._dirty:
+                return
+            if self._layout is None:
+                self._rebuild()
+            else:
+                self._update()
+            self._update_missed()
+            self._plan = None
+            self._dirty = False
+            self._changed_paths = None
+
+    def _rebuild(self):
+        counters = coverage_counters(self._coverage_database)
+        key = (type(self._coverage_database), tuple(counters))
+        if key not in _LAYOUTS:
+            _LAYOUTS[key] = CoverageLayout(self._bins(), set(counters))
+        old_layout, old_counts = self._layout, self._counts
+        old_first_msg, old_first_stimulus = self._first_msg, self._first_stimulus
+        self._layout = _LAYOUTS[key]
+        self._counts = self._layout.vector(counters)
+        # every bin is taken as missed, those already hit are stamped next
+        self._missed = np.arange(len(self._layout))
+        self._missed_bins = None
+        self._first_msg = np.full(len(self._layout), -1, dtype=np.int64)
+        self._first_stimulus = np.full(len(self._layout), -1, dtype=np.int64)
+        self._dropped = False
+
+        # bins hit in the previous layout and still hit, e.g. after new cross
+        # bins were created, keep their first hits
+        if old_layout is not None and old_layout is not self._layout:
+            kept = [
+                (i, old_layout.index[k])
+                for (i, k) in enumerate(self._layout.names)
+                if k in old_layout.index
+                and self._counts[i] > 0
+                and old_counts[old_layout.index[k]] > 0
+            ]
+            if kept:
+                new, old = (np.array(ids) for ids in zip(*kept))
+                self._first_msg[new] = old_first_msg[old]
+                self._first_stimulus[new] = old_first_stimulus[old]
+                self._missed = np.setdiff1d(self._missed, new)
+
+    # Drops the bins hit by the last change from the missed set, stamping them
+    # with the progress of the change
+    def _update_missed(self):
+        if self._dropped:
+            # counters went down, e.g. a new trial in the same database: the
+            # bins missed again lose their first hit
+            missed = np.flatnonzero(self._counts <= 0)
+            self._first_msg[missed] = -1
+            self._first_stimulus[missed] = -1
+            first_hits = np.setdiff1d(self._missed, missed)
         else:
+            hit = self._counts[self._missed] > 0
+            if not hit.any():
+                return
+            missed = self._missed[~hit]
+            first_hits = self._missed[hit]
+
+        self._first_msg[first_hits], self._first_stimulus[first_hits] = self._changed_at
+        self._missed = missed
+        self._missed_bins = None
+
+    # Updates the bins of the counters that moved, in a new vector as earlier
+    # plans may still be referenced (e.g. by loggers)
+    def _update(self):
+        layout = self._layout
+        if self._changed_paths is None:
+            counters = coverage_counters(self._coverage_database)
+            if counters.keys() != layout.counter_paths:
+                self._rebuild()
+            else:
+                counts = layout.vector(counters)
+                self._dropped = bool((counts < self._counts).any())
+                self._counts = counts
+            return
+
+        if not self._changed_paths <= layout.counter_paths:
+            self._rebuild()
+            return
+        counts = self._counts.copy()
+        self._dropped = False
+        for path in self._changed_paths:
+            i = layout.path_index.get(path)
+            if i is not None:
+                counts[i] = self._read_counter(path)
+                self._dropped |= bool(counts[i] < self._counts[i])
+        self._counts = counts
+
+    def _read_counter(self, path: tuple) -> int:
+        container = getattr(self._coverage_database, path[0])
+        for key in path[1:]:
+            container = container[key]
+        return container
+
+    # The bins of the DUT's coverage plan, from its registry in <dut>/adapters.py
+    def _bins(self) -> List[Bin]:
+        bins = coverage_bins(type(self._coverage_database))
+        if bins is None:
             raise TypeError(
                 f"coverage_database of type {type(self._coverage_database)} not supported."
             )
-        
-    def _get_coverage_plan_SDRAMCD(self) -> Dict[str, int]:
-        coverage_plan = self._coverage_database.misc_bins
-        return coverage_plan
-
-    def _get_coverage_plan_AFCD(self) -> Dict[str, int]:
-        coverage_plan = self._coverage_database.misc_bins
-        return coverage_plan
-
-    def _get_coverage_plan_AG_PRCD(self) -> Dict[str, int]:
-        coverage_plan = self._coverage_database.misc_bins
-        return coverage_plan
-    
-    def _get_coverage_plan_AG_FTCD(self) -> Dict[str, int]:
-        coverage_plan = self._coverage_database.misc_bins
-        return coverage_plan
-
-    def _get_coverage_plan_AG_WBCD(self) -> Dict[str, int]:
-        coverage_plan = {}
-        for i in range(1, AG_WB_BOUND+1):
-            coverage_plan[f"out_{i}"] = self._coverage_database.out_features[i]
-            for j in range(1, int(AG_WB_BOUND/16+1)):
-                coverage_plan[f"combined_features_{j}_{i}"] = self._coverage_database.combined_features[j][i]
-        for i in range(1, int(AG_WB_BOUND/16+1)):
-            coverage_plan[f"in_{i}"] = self._coverage_database.in_features[i]
-        return coverage_plan
-
-    def _get_coverage_plan_SD(self) -> Dict[str, int]:
-        coverage_plan = {}
-        for i, bin_val in enumerate(self._coverage_database.stride_1_seen):
-            if i >= 16:
-                i -= 32
-            coverage_plan[f"single_{i}"] = bin_val
-        for i, bins in enumerate(self._coverage_database.stride_2_seen):
-            for j, bin_val in enumerate(bins):
-                if i >= 16:
-                    i -= 32
-                if j >= 16:
-                    j -= 32
-                if i == j:
-                    continue
-                coverage_plan[f"double_{i}_{j}"] = bin_val
-        coverage_plan = {**coverage_plan, **self._coverage_database.misc_bins}
-        return coverage_plan
-
-    def _get_coverage_plan_ID(self) -> Dict[str, int]:
-        coverage_plan = {}
-        op_bins = ["alu_ops", "alu_imm_ops", "misc", "load_ops", "store_ops"]
-        reg_bins = ["read_reg_a", "read_reg_b", "write_reg"]
-        cross_bins = [
-            "alu_ops_x_read_reg_a",
-            "alu_ops_x_read_reg_b",
-            "alu_ops_x_write_reg",
-            "alu_imm_ops_x_read_reg_a",
-            "alu_imm_ops_x_write_reg",
-            "load_ops_x_read_reg_a",
-            "load_ops_x_write_reg",
-            "store_ops_x_read_reg_a",
-            "store_ops_x_read_reg_b",
-        ]
-
-        for bins_type in op_bins:
-            bins: Dict[str, int] = getattr(self._coverage_database, bins_type)
-            for op, v in bins.items():
-                op = op.upper()
-                k = f"{bins_type}_{op}"
-                if bins_type == "alu_ops":
-                    k = op
-                elif bins_type == "alu_imm_ops":
-                    k = f"{op}I"
-                elif bins_type == "misc":
-                    k = "illegal_instruction"
-                elif bins_type == "load_ops":
-                    k = f"L{op[0]}"
-                elif bins_type == "store_ops":
-                    k = f"S{op[0]}"
-                coverage_plan[k] = v
-
-        for bins_type in reg_bins:
-            bins: List[int] = getattr(self._coverage_database, bins_type)
-            for i, v in enumerate(bins):
-                k = f"{bins_type}_{i}"
-                if bins_type == "read_reg_a":
-                    k = f"read_A_reg_{i}"
-                elif bins_type == "read_reg_b":
-                    k = f"read_B_reg_{i}"
-                elif bins_type == "write_reg":
-                    k = f"write_reg_{i}"
-                coverage_plan[k] = v
-
-        for bins_type in cross_bins:
-            bins: Dict[str, List[int]] = getattr(self._coverage_database, bins_type)
-            for op, regs in bins.items():
-                op = op.upper()
-                for i, v in enumerate(regs):
-                    k = f"{bins_type}__{op}_{i}"
-                    if bins_type == "alu_ops_x_read_reg_a":
-                        k = f"{op}_x_read_A_reg_{i}"
-                    elif bins_type == "alu_ops_x_read_reg_b":
-                        k = f"{op}_x_read_B_reg_{i}"
-                    elif bins_type == "alu_ops_x_write_reg":
-                        k = f"{op}_x_write_reg_{i}"
-                    elif bins_type == "alu_imm_ops_x_read_reg_a":
-                        k = f"{op}I_x_read_A_reg_{i}"
-                    elif bins_type == "alu_imm_ops_x_write_reg":
-                        k = f"{op}I_x_write_reg_{i}"
-                    elif bins_type == "load_ops_x_read_reg_a":
-                        k = f"L{op[0]}_x_read_A_reg_{i}"
-                    elif bins_type == "load_ops_x_write_reg":
-                        k = f"L{op[0]}_x_write_reg_{i}"
-                    elif bins_type == "store_ops_x_read_reg_a":
-                        k = f"S{op[0]}_x_read_A_reg_{i}"
-                    elif bins_type == "store_ops_x_read_reg_b":
-                        k = f"S{op[0]}_x_read_B_reg_{i}"
-                    coverage_plan[k] = v
-
-        return coverage_plan
-
-    def _get_coverage_plan_IC(self) -> Dict[str, int]:
-        self._coverage_database: ICCD
-        return self._coverage_database.get_coverage_dict()
+        return bins(self._coverage_database)
 
     def get_coverage_rate(self) -> Tuple[int, int]:
-        coverage = self.get_coverage_plan()
-        coverage_hit = {k: v for (k, v) in coverage.items() if v > 0}
-        return len(coverage_hit), len(coverage)
+        self._refresh()
+        return len(self._counts) - len(self._missed), len(self._counts)
 
     def get_coverage_score(self, prioritise_harder_bins=True) -> float:
-        if isinstance(self._coverage_database, SDCD):
-            coverage_plan = self._get_coverage_plan_SD()
-            coverage = [k for (k, v) in coverage_plan.items() if v > 0]
-            if not prioritise_harder_bins:  # without prioritising harder bins
-                return len(coverage)
-            # Prioritise harder bins
-            return sum(
-                map(
-                    lambda k: 2.5
-                    if re.fullmatch(r"double_-?\d+_-?\d+", k) is not None
-                    else 1,
-                    coverage,
-                )
-            )
-        elif isinstance(self._coverage_database, IDCD):
-            coverage_plan = self._get_coverage_plan_ID()
-            coverage = [k for (k, v) in coverage_plan.items() if v > 0]
-            if not prioritise_harder_bins:  # without prioritising harder bins
-                return len(coverage)
-            # Prioritise harder bins
-            return sum(map(lambda k: 2.5 if "_x_" in k else 1, coverage))
-        elif isinstance(self._coverage_database, ICCD):
-            coverage_plan = self._get_coverage_plan_IC()
-            coverage = [k for (k, v) in coverage_plan.items() if v > 0]
-            if not prioritise_harder_bins:  # without prioritising harder bins
-                return len(coverage)
-            # TODO: Prioritise harder bins? not effective since delayed feedback
-            return sum(map(lambda k: 2.5 if "raw_hazard" in k else 1, coverage))
-        elif isinstance(self._coverage_database, AG_WBCD):
-            coverage_plan = self._get_coverage_plan_AG_WBCD()
-            coverage = [k for (k, v) in coverage_plan.items() if v > 0]
-            if not prioritise_harder_bins:  # without prioritising harder bins
-                return len(coverage)
-            # TODO: Prioritise harder bins?
-            return len(coverage)
-        elif isinstance(self._coverage_database, AG_FTCD):
-            coverage_plan = self._get_coverage_plan_AG_FTCD()
-            coverage = [k for (k, v) in coverage_plan.items() if v > 0]
-            if not prioritise_harder_bins:  # without prioritising harder bins
-                return len(coverage)
-            # TODO: Prioritise harder bins?
-            return len(coverage)
-        elif isinstance(self._coverage_database, AG_PRCD):
-            coverage_plan = self._get_coverage_plan_AG_PRCD()
-            coverage = [k for (k, v) in coverage_plan.items() if v > 0]
-            if not prioritise_harder_bins:  # without prioritising harder bins
-                return len(coverage)
-            # TODO: Prioritise harder bins?
-            return len(coverage)
-        elif isinstance(self._coverage_database, AFCD):
-            coverage_plan = self._get_coverage_plan_AFCD()
-            coverage = [k for (k, v) in coverage_plan.items() if v > 0]
-            if not prioritise_harder_bins:  # without prioritising harder bins
-                return len(coverage)
-            # TODO: Prioritise harder bins?
-            return len(coverage)
-        elif isinstance(self._coverage_database, SDRAMCD):
-            coverage_plan = self._get_coverage_plan_SDRAMCD()
-            coverage = [k for (k, v) in coverage_plan.items() if v > 0]
-            if not prioritise_harder_bins:  # without prioritising harder bins
-                return len(coverage)
-            # TODO: Prioritise harder bins?
-            return len(coverage)
-        else:
-            raise TypeError(
-                f"coverage_database of type {type(self._coverage_database)} not supported."
-            )
+        self._refresh()
+        if not prioritise_harder_bins:  # without prioritising harder bins
+            return len(self._counts) - len(self._missed)
+        return float(self._layout.weights[self._counts > 0].sum())
 
 
 class GlobalDUTState:
     def __init__(self):
         self._dut_state = None
+        self._is_cpu = False
         self.prev_valid_pc = None
         self.prev_valid_instr = None
 
@@ -305,29 +326,20 @@ class GlobalDUTState:
                 dut_state, type(self._dut_state)
             ), "New dut_state is of different type of self._dut_state."
 
-        if isinstance(dut_state, SDDS):
-            self._dut_state: SDDS
-        elif isinstance(dut_state, ICDS) or isinstance(dut_state, MCDS):
-            self._dut_state: ICDS
-        elif isinstance(dut_state, AG_WBDS):
-            self._dut_state: AG_WBDS
-        elif isinstance(dut_state, AG_FTDS):
-            self._dut_state: AG_FTDS
-        elif isinstance(dut_state, AG_PRDS):
-            self._dut_state: AG_PRDS
-        elif isinstance(dut_state, AFDS):
-            self._dut_state: AFDS
-        elif isinstance(dut_state, SDRAMDS):
-            self._dut_state: SDRAMDS
-        elif dut_state is None:
-            pass
-        else:
+        is_cpu = dut_state_is_cpu(type(dut_state)) if dut_state is not None else False
+        if is_cpu is None:
             raise TypeError(f"DUT state of type {type(dut_state)} is not supported.")
+        self._is_cpu = is_cpu
 
         self._dut_state = dut_state
 
+    # A copy of the state as of now, e.g. for a worker thread to read while this
+    # one is set again
+    def snapshot(self) -> "GlobalDUTState":
+        return copy.deepcopy(self)
+
     def get_pc(self):
-        if isinstance(self._dut_state, ICDS):
+        if self._is_cpu:
             if self._dut_state.last_pc is None:
                 # return "\"invalid\" since the CPU has tried to execute invalid instruction(s)."
                 if self.prev_valid_pc is None:
@@ -340,7 +352,7 @@ class GlobalDUTState:
             return hex(0x00100080)
 
     def get_last_instr(self):
-        if isinstance(self._dut_state, ICDS):
+        if self._is_cpu:
             if self._dut_state.last_insn is None:
                 return None if self.prev_valid_instr is None else hex(self.prev_valid_instr)
             self.prev_valid_instr = self._dut_state.last_insn
@@ -360,3 +372,170 @@ class Budget:
 
     def no_budget(self):
         return self.budget <= 0
+
+
+# Everything above is what `from global_shared_types import *` gives, as before
+# the tests below were added
+__all__ = [k for k in dir() if not k.startswith("_")]
+
+
+"""Tests"""
+
+
+@dataclass
+class _Coverage:
+    misc_bins: Dict[str, int]
+    cross: Dict[str, List[int]]
+    # shown in no bin
+    hidden: int = 0
+
+
+def _coverage_bins(coverage: _Coverage) -> List[Bin]:
+    bins = misc_bins(coverage)
+    for (k, counts) in coverage.cross.items():
+        bins += [(("cross", k, i), f"{k}_x_{i}", "cross", 2.5) for i in range(len(counts))]
+    return bins
+
+
+# Increments of a few counters, which with `drops` may also be reset
+def _random_delta(rng: random.Random, coverage: _Coverage, drops: bool) -> Dict[tuple, int]:
+    counters = coverage_counters(coverage)
+    delta = {}
+    for path in rng.sample(sorted(counters, key=str), min(3, len(counters))):
+        if drops and rng.random() < 0.3:
+            delta[path] = -counters[path]
+        else:
+            delta[path] = rng.randint(0, 2)
+    return delta
+
+
+# A copy of the coverage with bins added or removed
+def _random_layout(rng: random.Random, coverage: _Coverage) -> _Coverage:
+    coverage = copy.deepcopy(coverage)
+    table = rng.choice([coverage.misc_bins, coverage.cross])
+    if len(table) > 1 and rng.random() < 0.4:
+        del table[rng.choice(list(table))]
+    elif table is coverage.misc_bins:
+        table[f"m{rng.randrange(20)}"] = rng.randint(0, 1)
+    else:
+        table[f"c{rng.randrange(20)}"] = [rng.randint(0, 1) for _ in range(rng.randint(1, 3))]
+    return coverage
+
+
+class TestGlobalCoverageDatabase(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls) -> None:
+        register_coverage(_Coverage, _coverage_bins)
+
+    def _coverage(self) -> _Coverage:
+        return _Coverage({f"m{i}": 0 for i in range(6)}, {f"c{i}": [0] * 3 for i in range(3)})
+
+    # Every view of the database against one built from scratch. `first_hits`
+    # follows the first hits seen so far, stamped with the progress of the last
+    # change before the query that saw them.
+    def _check(
+        self,
+        db: GlobalCoverageDatabase,
+        coverage: _Coverage,
+        first_hits: Dict[str, Tuple[int, int]],
+        changed_at: Tuple[int, int],
+    ):
+        counters = coverage_counters(coverage)
+        bins = _coverage_bins(coverage)
+        plan = {name: counters[path] for (path, name, _, _) in bins}
+        weights = {name: weight for (_, name, _, weight) in bins}
+        for k in list(first_hits):
+            if plan.get(k, 0) <= 0:
+                del first_hits[k]
+        for (k, v) in plan.items():
+            if v > 0 and k not in first_hits:
+                first_hits[k] = changed_at
+
+        missed = [k for (k, v) in plan.items() if v <= 0]
+        self.assertEqual(list(plan), db.get_layout().names)
+        self.assertEqual(plan, db.get_coverage_plan())
+        self.assertEqual(missed, db.get_missed_bins())
+        self.assertEqual((len(plan) - len(missed), len(plan)), db.get_coverage_rate())
+        self.assertEqual(len(plan) - len(missed), db.get_coverage_score(False))
+        self.assertAlmostEqual(
+            sum(weights[k] for (k, v) in plan.items() if v > 0), db.get_coverage_score()
+        )
+        self.assertEqual(list(plan.values()), db.get_coverage_vector().tolist())
+        self.assertEqual([v <= 0 for v in plan.values()], db.get_missed_mask().tolist())
+        self.assertEqual(first_hits, db.get_first_hits())
+        for k in plan:
+            self.assertEqual(first_hits.get(k), db.get_first_hit(k))
+
+    # Changes the coverage at random, as replaced whole, as a snapshot or as the
+    # increments of a CoverageUpdate, checking the database now and then
+    def _walk(self, seed: int, drops: bool = False, layouts: bool = False, steps: int = 300):
+        rng = random.Random(seed)
+        coverage = self._coverage()
+        db = GlobalCoverageDatabase(copy.deepcopy(coverage))
+        first_hits = {}
+        progress = (0, 0)
+        old_plans = []
+        for _ in range(steps):
+            progress = (progress[0] + rng.randint(0, 1), progress[1] + rng.randint(1, 4))
+            db.set_progress(*progress)
+            op = rng.random()
+            if layouts and op < 0.1:
+                coverage = _random_layout(rng, coverage)
+                db.set(copy.deepcopy(coverage))
+            elif op < 0.5:
+                delta = _random_delta(rng, coverage, drops)
+                apply_coverage_delta(coverage, delta)
+                db.apply_update(CoverageUpdate(changes=delta))
+            else:
+                apply_coverage_delta(coverage, _random_delta(rng, coverage, drops))
+                if op < 0.75:
+                    db.set(copy.deepcopy(coverage))
+                else:
+                    db.apply_update(CoverageUpdate(changes={}, snapshot=copy.deepcopy(coverage)))
+
+            if rng.random() < 0.4:
+                self._check(db, coverage, first_hits, progress)
+                # earlier plans are not updated
+                plan = db.get_coverage_plan()
+                old_plans.append((plan, dict(plan)))
+        for (plan, copied) in old_plans:
+            self.assertEqual(copied, plan)
+
+    def test_updates(self) -> None:
+        for seed in range(5):
+            with self.subTest(seed=seed):
+                self._walk(seed)
+
+    # counters going down, e.g. a new trial, take back the bins' first hits
+    def test_dropped_counters(self) -> None:
+        for seed in range(5):
+            with self.subTest(seed=seed):
+                self._walk(seed, drops=True)
+
+    def test_layout_changes(self) -> None:
+        for seed in range(5):
+            with self.subTest(seed=seed):
+                self._walk(seed, drops=True, layouts=True)
+
+    # bins hit before new bins were created keep their first hits
+    def test_first_hits_across_layout_change(self) -> None:
+        coverage = self._coverage()
+        db = GlobalCoverageDatabase(copy.deepcopy(coverage))
+        db.set_progress(1, 10)
+        db.apply_update(CoverageUpdate(changes={("misc_bins", "m0"): 1, ("cross", "c0", 1): 2}))
+        self.assertEqual({"m0": (1, 10), "c0_x_1": (1, 10)}, db.get_first_hits())
+
+        coverage.misc_bins["m0"] = 1
+        coverage.cross["c0"][1] = 2
+        coverage.cross["c9"] = [0, 3]
+        db.set_progress(2, 20)
+        db.set(copy.deepcopy(coverage))
+        self.assertEqual(
+            {"m0": (1, 10), "c0_x_1": (1, 10), "c9_x_1": (2, 20)}, db.get_first_hits()
+        )
+        self.assertIn("c9_x_0", db.get_missed_bins())
+        self.assertEqual((3, len(db.get_layout())), db.get_coverage_rate())
+
+
+if __name__ == "__main__":
+    unittest.main()
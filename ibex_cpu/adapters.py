@@ -0,0 +1,32 @@
+# Copyright ***** contributors.
+# Licensed under the Apache License, Version 2.0, see LICENSE for details.
+# SPDX-License-Identifier: Apache-2.0
+
+from shared_helpers.dut_registry import *
+from ibex_cpu.shared_types import CoverageDatabase, IbexStateInfo
+
+# Registers the ibex CPU's types with GlobalCoverageDatabase and GlobalDUTState
+
+
+# As CoverageDatabase.get_coverage_dict, also used for the MIPS CPU
+def coverage_bins_CPU(coverage) -> List[Bin]:
+    bins = []
+    for (instr, covs) in coverage.instructions.items():
+        for cov in covs:
+            bins.append((("instructions", instr, cov), f"{instr.value}_{cov.value}", cov.value, 1))
+    for (instr, x_covs) in coverage.cross_coverage.items():
+        for (prev_instr, cov) in x_covs:
+            bins.append(
+                (
+                    ("cross_coverage", instr, (prev_instr, cov)),
+                    f"{prev_instr.value}->{instr.value}_{cov.value}",
+                    cov.value,
+                    # TODO: Prioritise harder bins? not effective since delayed feedback
+                    2.5 if cov.value == "raw_hazard" else 1,
+                )
+            )
+    return bins
+
+
+register_coverage(CoverageDatabase, coverage_bins_CPU)
+register_dut_state(IbexStateInfo, cpu=True)
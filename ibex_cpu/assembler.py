@@ -0,0 +1,254 @@
+# Copyright ***** contributors.
+# Licensed under the Apache License, Version 2.0, see LICENSE for details.
+# SPDX-License-Identifier: Apache-2.0
+
+import re
+import unittest
+
+from ibex_cpu.instructions import Encoding, JInstruction, RInstruction, SInstruction
+
+
+# Assembler of single RV32I instructions, for the LLM to write instructions as
+# mnemonics instead of 32-bit hex words. It covers the instructions modelled in
+# instructions.py (R-type ALU operations, SB/SH/SW and JAL) and those of the
+# decoder's bins (immediate ALU operations and loads):
+#   add x5, x6, x7         R-type
+#   addi a0, a1, -12       I-type, also slli/srli/srai with a shift amount
+#   lw t0, 8(sp)           loads, offset(base)
+#   sw t0, -4(sp)          stores, offset(base)
+#   jal ra, -16            jumps, offset in bytes from the instruction
+# Registers are x0-x31 or their ABI names.
+
+
+class AssemblyError(ValueError):
+    pass
+
+
+REGISTERS = {f"x{i}": i for i in range(32)}
+REGISTERS.update(
+    {
+        name: i
+        for (i, name) in enumerate(
+            ["zero", "ra", "sp", "gp", "tp", "t0", "t1", "t2", "s0", "s1"]
+            + [f"a{i}" for i in range(8)]
+            + [f"s{i}" for i in range(2, 12)]
+            + [f"t{i}" for i in range(3, 7)]
+        )
+    }
+)
+REGISTERS["fp"] = 8
+
+# mnemonic -> (funct7, funct3)
+R_TYPE = {
+    "add": (0x00, 0b000),
+    "sub": (0x20, 0b000),
+    "sll": (0x00, 0b001),
+    "slt": (0x00, 0b010),
+    "sltu": (0x00, 0b011),
+    "xor": (0x00, 0b100),
+    "srl": (0x00, 0b101),
+    "sra": (0x20, 0b101),
+    "or": (0x00, 0b110),
+    "and": (0x00, 0b111),
+}
+# mnemonic -> funct3; "sltui" as the decoder's bins call sltiu
+I_TYPE = {
+    "addi": 0b000,
+    "slti": 0b010,
+    "sltiu": 0b011,
+    "sltui": 0b011,
+    "xori": 0b100,
+    "ori": 0b110,
+    "andi": 0b111,
+}
+# mnemonic -> (funct7, funct3)
+SHIFT_TYPE = {
+    "slli": (0x00, 0b001),
+    "srli": (0x00, 0b101),
+    "srai": (0x20, 0b101),
+}
+LOAD_TYPE = {"lb": 0b000, "lh": 0b001, "lw": 0b010, "lbu": 0b100, "lhu": 0b101}
+STORE_TYPE = {"sb": 0b000, "sh": 0b001, "sw": 0b010}
+
+MNEMONICS = {*R_TYPE, *I_TYPE, *SHIFT_TYPE, *LOAD_TYPE, *STORE_TYPE, "jal"}
+
+OP_REG = 0b0110011
+OP_IMM = 0b0010011
+OP_LOAD = 0b0000011
+OP_STORE = 0b0100011
+OP_JAL = 0b1101111
+
+
+# Encodes one instruction, e.g. "add x5, x6, x7"
+def assemble(line: str) -> int:
+    parts = line.strip().split(None, 1)
+    if len(parts) == 0:
+        raise AssemblyError("empty instruction")
+    mnemonic = parts[0].lower()
+    operands = [op.strip() for op in parts[1].split(",")] if len(parts) > 1 else []
+
+    if mnemonic in R_TYPE:
+        rd, rs1, rs2 = _operands(mnemonic, operands, 3)
+        funct7, funct3 = R_TYPE[mnemonic]
+        return (
+            funct7 << 25
+            | _register(rs2) << 20
+            | _register(rs1) << 15
+            | funct3 << 12
+            | _register(rd) << 7
+            | OP_REG
+        )
+    if mnemonic in I_TYPE:
+        rd, rs1, imm = _operands(mnemonic, operands, 3)
+        return _i_type(OP_IMM, I_TYPE[mnemonic], _register(rd), _register(rs1), _immediate(imm, 12))
+    if mnemonic in SHIFT_TYPE:
+        rd, rs1, shamt_text = _operands(mnemonic, operands, 3)
+        funct7, funct3 = SHIFT_TYPE[mnemonic]
+        shamt = _integer(shamt_text)
+        if not 0 <= shamt < 32:
+            raise AssemblyError(f"shift amount {shamt} out of range 0 to 31")
+        return funct7 << 25 | _i_type(OP_IMM, funct3, _register(rd), _register(rs1), shamt)
+    if mnemonic in LOAD_TYPE:
+        rd, address = _operands(mnemonic, operands, 2)
+        offset, rs1 = _address(address)
+        return _i_type(OP_LOAD, LOAD_TYPE[mnemonic], _register(rd), rs1, offset)
+    if mnemonic in STORE_TYPE:
+        rs2, address = _operands(mnemonic, operands, 2)
+        offset, rs1 = _address(address)
+        return (
+            (offset >> 5 & 0x7F) << 25
+            | _register(rs2) << 20
+            | rs1 << 15
+            | STORE_TYPE[mnemonic] << 12
+            | (offset & 0x1F) << 7
+            | OP_STORE
+        )
+    if mnemonic == "jal":
+        # "jal offset" links to ra
+        if len(operands) == 1:
+            operands = ["ra"] + operands
+        rd, offset_text = _operands(mnemonic, operands, 2)
+        offset = _immediate(offset_text, 21)
+        if offset % 2 != 0:
+            raise AssemblyError(f"jump offset {offset} is not a multiple of 2")
+        return (
+            (offset >> 20 & 0x1) << 31
+            | (offset >> 1 & 0x3FF) << 21
+            | (offset >> 11 & 0x1) << 20
+            | (offset >> 12 & 0xFF) << 12
+            | _register(rd) << 7
+            | OP_JAL
+        )
+    raise AssemblyError(f"unknown instruction '{mnemonic}'")
+
+
+def _operands(mnemonic: str, operands: list[str], count: int) -> list[str]:
+    if len(operands) != count:
+        raise AssemblyError(f"{mnemonic} takes {count} operands, got {len(operands)}")
+    return operands
+
+
+def _i_type(opcode: int, funct3: int, rd: int, rs1: int, imm: int) -> int:
+    return (imm & 0xFFF) << 20 | rs1 << 15 | funct3 << 12 | rd << 7 | opcode
+
+
+def _register(name: str) -> int:
+    if name.lower() not in REGISTERS:
+        raise AssemblyError(f"unknown register '{name}'")
+    return REGISTERS[name.lower()]
+
+
+def _integer(text: str) -> int:
+    try:
+        return int(text, 0)
+    except ValueError:
+        raise AssemblyError(f"invalid immediate '{text}'") from None
+
+
+# Signed immediate of `bits` bits
+def _immediate(text: str, bits: int) -> int:
+    imm = _integer(text)
+    if not -(1 << (bits - 1)) <= imm < 1 << (bits - 1):
+        raise AssemblyError(
+            f"immediate {imm} out of range {-(1 << (bits - 1))} to {(1 << (bits - 1)) - 1}"
+        )
+    return imm
+
+
+# (offset, base register) of "offset(base)"
+def _address(text: str) -> tuple[int, int]:
+    match = re.fullmatch(r"(.*?)\s*\(\s*(\w+)\s*\)", text)
+    if match is None:
+        raise AssemblyError(f"invalid address '{text}', expected offset(register)")
+    offset = _immediate(match.group(1) or "0", 12)
+    return offset, _register(match.group(2))
+
+
+class TestAssembler(unittest.TestCase):
+    def test_r_type(self) -> None:
+        instr = [
+            ("add x0, x0, x0", 0x00000033),
+            ("sll x5, x28, x30", 0x01EE12B3),
+            ("sub a2, a5, t1", 0x40678633),
+        ]
+        for (line, enc) in instr:
+            self.assertEqual(enc, assemble(line))
+
+    def test_j_type(self) -> None:
+        instr = [
+            ("jal t0, -23524", 0xC1CFA2EF),
+            ("jal ra, 4562", 0x1D2010EF),
+            ("jal x0, -4", 0xFFDFF06F),
+        ]
+        for (line, enc) in instr:
+            self.assertEqual(enc, assemble(line))
+        self.assertEqual(assemble("jal ra, 4562"), assemble("jal 4562"))
+
+    def test_s_type(self) -> None:
+        instr = [
+            ("sw x5, -34(x6)", 0xFC532F23),
+            ("sh x10, 932(x28)", 0x3AAE1223),
+            ("sb x3, -932(x17)", 0xC4388E23),
+        ]
+        for (line, enc) in instr:
+            self.assertEqual(enc, assemble(line))
+
+    def test_i_type(self) -> None:
+        instr = [
+            ("xori x9, x4, 1049", 0x41924493),
+            ("addi a7, sp, 21", 0x01510893),
+            ("lb t0, 1(ra)", 0x00108283),
+            ("sltiu gp, gp, 11", 0x00B1B193),
+            ("srai x1, x2, 3", 0x40315093),
+        ]
+        for (line, enc) in instr:
+            self.assertEqual(enc, assemble(line))
+
+    # decoded back by the model of instructions.py
+    def test_round_trip(self) -> None:
+        i = Encoding(assemble("sltu x3, x1, x2")).typed()
+        assert isinstance(i, RInstruction)
+        self.assertEqual(("sltu", 3, 1, 2), (i.instruction().value, i.rd(), i.rs1(), i.rs2()))
+        i = Encoding(assemble("sh x1, -2048(x0)")).typed()
+        assert isinstance(i, SInstruction)
+        self.assertEqual(("sh", 0, 1, -2048), (i.instruction().value, i.rs1(), i.rs2(), i.offset()))
+        i = Encoding(assemble("jal x0, -1048576")).typed()
+        assert isinstance(i, JInstruction)
+        self.assertEqual(-1048576, i.offset())
+
+    def test_errors(self) -> None:
+        for line in [
+            "subi x1, x2, 3",
+            "add x1, x2",
+            "add x1, x2, x32",
+            "addi x1, x2, 2048",
+            "slli x1, x2, 32",
+            "lw x1, x2",
+            "jal ra, 3",
+        ]:
+            with self.assertRaises(AssemblyError):
+                assemble(line)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -15,7 +15,8 @@ import cocotb
 from cocotb.clock import Clock
 from cocotb.triggers import Timer, ClockCycles, ReadWrite, Event
 from ibex_cpu.instruction_monitor import InstructionMonitor
-from ibex_cpu.shared_types import Stimulus, IbexStateInfo
+from ibex_cpu.shared_types import Stimulus, IbexStateInfo, WIRE_TYPES
+from shared_helpers.cocotb_helpers import serve_stimuli, open_server_socket, server_address, ask_server_port
 
 from contextlib import closing
 
@@ -135,77 +136,78 @@ class SimulationController:
 
 
     async def controller_loop(self):
-        global instr_buffer
-        with self.zmq_context.socket(zmq.REP) as socket:
-            socket.bind(self.zmq_addr)
+        with open_server_socket(self.zmq_context, self.zmq_addr) as socket:
 
             await ClockCycles(self.dut.clk_i, 1)
             await ReadWrite()
 
-            while True:
-                stimulus_obj = socket.recv_pyobj()
-
-                if not isinstance(stimulus_obj, Stimulus):
-                    assert False, "Saw bad stimulus message"
-                
-                if(increment_address):
-                    self.incremental_address = self.dut.u_top.rvfi_pc_rdata.value + 0x8
-                    for data in stimulus_obj.insn_mem_updates:
-                        if(not isinstance(data,int)):
-                            instr = data[1]
-                        else:
-                            instr = data
-                        self.prevous_pc=self.dut.u_top.rvfi_pc_rdata.value
-                        self.imem_agent.write_mem(self.incremental_address, instr)
-                        instr_buffer.append(instr)
-
-                        while (len(instr_buffer) > 5):
-                            self.prevous_pc=self.dut.u_top.rvfi_pc_rdata.value
-                            buffer_first = instr_buffer[0]
-                            i = 0
-                            while(buffer_first != self.instruction_monitor.insn.value or not self.instruction_monitor.insn_valid.value):
-                                await ClockCycles(self.dut.clk_i, 1)
-                                await ReadWrite()
-                                i+=1
-                                if(i > 10):
-                                    print("STUCK AT BUFFER")
-                                    instr_buffer = instr_buffer[1:]
-                                    await do_reset(self.dut)
-                                    break
-                            self.instruction_monitor.sample_insn_coverage()
-                            if(self.prevous_pc != self.dut.u_top.rvfi_pc_rdata.value):
-                                if len(instr_buffer) > 2:
-                                    instr_buffer = instr_buffer[1:]
-                                else:
-                                    instr_buffer = []
-                            else:
-                                self.pc_unchanged += 1
-                                if(self.pc_unchanged > 10):
-                                    print("STUCK AT PC")
-                                    await do_reset(self.dut)
-                                    instr_buffer = instr_buffer[1:]
-                                    self.pc_unchanged = 0
-                                    self.prevous_pc = -1
-                        # print(instr_buffer)
+            await serve_stimuli(
+                socket,
+                self.handle_stimulus,
+                lambda: self.instruction_monitor.coverage_db,
+                WIRE_TYPES,
+            )
+            self.end_simulation_event.set()
+
+    # Drives a single stimulus, returns the reply to it and whether it ends the simulation
+    async def handle_stimulus(self, stimulus_obj):
+        global instr_buffer
+
+        if not isinstance(stimulus_obj, Stimulus):
+            assert False, "Saw bad stimulus message"
+
+        if(increment_address):
+            self.incremental_address = self.dut.u_top.rvfi_pc_rdata.value + 0x8
+            for data in stimulus_obj.insn_mem_updates:
+                if(not isinstance(data,int)):
+                    instr = data[1]
                 else:
-                    for addr, data in stimulus_obj.insn_mem_updates:
-                        self.imem_agent.write_mem(addr, data)
-                    await ClockCycles(self.dut.clk_i, 1)
-                    await ReadWrite()
+                    instr = data
+                self.prevous_pc=self.dut.u_top.rvfi_pc_rdata.value
+                self.imem_agent.write_mem(self.incremental_address, instr)
+                instr_buffer.append(instr)
+
+                while (len(instr_buffer) > 5):
+                    self.prevous_pc=self.dut.u_top.rvfi_pc_rdata.value
+                    buffer_first = instr_buffer[0]
+                    i = 0
+                    while(buffer_first != self.instruction_monitor.insn.value or not self.instruction_monitor.insn_valid.value):
+                        await ClockCycles(self.dut.clk_i, 1)
+                        await ReadWrite()
+                        i+=1
+                        if(i > 10):
+                            print("STUCK AT BUFFER")
+                            instr_buffer = instr_buffer[1:]
+                            await do_reset(self.dut)
+                            break
                     self.instruction_monitor.sample_insn_coverage()
+                    if(self.prevous_pc != self.dut.u_top.rvfi_pc_rdata.value):
+                        if len(instr_buffer) > 2:
+                            instr_buffer = instr_buffer[1:]
+                        else:
+                            instr_buffer = []
+                    else:
+                        self.pc_unchanged += 1
+                        if(self.pc_unchanged > 10):
+                            print("STUCK AT PC")
+                            await do_reset(self.dut)
+                            instr_buffer = instr_buffer[1:]
+                            self.pc_unchanged = 0
+                            self.prevous_pc = -1
+                # print(instr_buffer)
+        else:
+            for addr, data in stimulus_obj.insn_mem_updates:
+                self.imem_agent.write_mem(addr, data)
+            await ClockCycles(self.dut.clk_i, 1)
+            await ReadWrite()
+            self.instruction_monitor.sample_insn_coverage()
 
-                ibex_state_info = IbexStateInfo(
-                    last_pc=self.instruction_monitor.last_pc,
-                    last_insn=self.instruction_monitor.last_insn,
-                )
-
-                socket.send_pyobj(
-                    (ibex_state_info, self.instruction_monitor.coverage_db)
-                )
+        ibex_state_info = IbexStateInfo(
+            last_pc=self.instruction_monitor.last_pc,
+            last_insn=self.instruction_monitor.last_insn,
+        )
 
-                if stimulus_obj.finish:
-                    self.end_simulation_event.set()
-                    break
+        return (ibex_state_info, self.instruction_monitor.coverage_db), stimulus_obj.finish
 
     def close(self):
         self.zmq_context.term()
@@ -217,7 +219,7 @@ async def basic_test(dut):
     from global_shared_types import GlobalCoverageDatabase
 
     # server_port = "5555"
-    server_port = input("Please enter server's port (e.g. 5050, 5555): ")
+    server_port = ask_server_port("Please enter server's port (e.g. 5050, 5555) or shm://name: ")
 
     while True:
         dut.data_gnt_i.value = 0
@@ -237,7 +239,7 @@ async def basic_test(dut):
         await ClockCycles(dut.clk_i, 1)
 
         sim_ctrl = SimulationController(
-            dut, ins_mon, imem_agent, f"tcp://*:{server_port}"
+            dut, ins_mon, imem_agent, server_address(server_port)
         )
         with closing(sim_ctrl) as simulation_controller:
             cocotb.start_soon(simulation_controller.controller_loop())
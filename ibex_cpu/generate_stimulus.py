@@ -25,9 +25,11 @@ from agents.agent_IC_dumb import *
 from agents.agent_random import *
 from loggers.logger_csv import CSVLogger
 from loggers.logger_txt import TXTLogger
+from loggers.logger_base import log_dir
 from models.llm_gpt import ChatGPT
 from models.llm_openrouter import OpenRouter
 from ibex_cpu.shared_types import *
+from shared_helpers.stimulus_sender import BaseStimulusSender, sender_address, ask_server_ip_port
 from stimuli_extractor import *
 from stimuli_filter import *
 from prompt_generators.prompt_generator_template_IC import *
@@ -35,16 +37,10 @@ from prompt_generators.prompt_generator_template_IC import *
 increment_address = True
 
 
-class StimulusSender:
-    def __init__(self, zmq_addr):
-        self.context = zmq.Context()
-        self.socket = self.context.socket(zmq.REQ)
-        self.socket.connect(zmq_addr)
-
-    def send_stimulus(self, stimulus_obj):
-        self.socket.send_pyobj(stimulus_obj)
-        state_coverage_obj = self.socket.recv_pyobj()
+class StimulusSender(BaseStimulusSender):
+    wire_types = WIRE_TYPES
 
+    def check_reply(self, state_coverage_obj):
         if not isinstance(state_coverage_obj, tuple):
             raise RuntimeError("Bad format of coverage response")
         if not isinstance(state_coverage_obj[0], IbexStateInfo):
@@ -52,18 +48,12 @@ class StimulusSender:
         if not isinstance(state_coverage_obj[1], CoverageDatabase):
             raise RuntimeError("Bad format of coverage response element 1")
 
-        return state_coverage_obj
-
-    def close(self):
-        if self.socket:
-            self.socket.close()
-
 
 def random_experiment():
     print("Running random experiment on IC...")
 
-    server_ip_port = input(
-        "Please enter server's IP and port (e.g. 127.0.0.1:5050, 128.232.65.218:5555): "
+    server_ip_port = ask_server_ip_port(
+        "Please enter server's IP and port (e.g. 127.0.0.1:5050, 128.232.65.218:5555) or shm://name: "
     )
 
     # server_ip_port = "0.0.0.0:5050"
@@ -76,7 +66,7 @@ def random_experiment():
     g_dut_state = GlobalDUTState()
     g_coverage = GlobalCoverageDatabase()
 
-    with closing(StimulusSender(f"tcp://{server_ip_port}")) as stimulus_sender:
+    with closing(StimulusSender(sender_address(server_ip_port))) as stimulus_sender:
         while not agent.end_simulation(g_dut_state, g_coverage):
             stimulus.insn_mem_updates = agent.generate_next_value(
                 g_dut_state, g_coverage
@@ -102,7 +92,7 @@ def random_experiment():
         print(f"Final coverage rate: {g_coverage.get_coverage_rate()}")
 
 
-def main(model_name="meta-llama/llama-2-70b-chat", missed_bin_sampling="RANDOM", best_iter_message_sampling="Recent Responses", dialogue_restarting="rst_plan_Low_Tolerance", buffer_resetting="STABLE", code_summary_type=0, few_shot=0):
+def main(model_name="meta-llama/llama-2-70b-chat", missed_bin_sampling="RANDOM", best_iter_message_sampling="Recent Responses", dialogue_restarting="rst_plan_Low_Tolerance", buffer_resetting="STABLE", code_summary_type=0, few_shot=0, assembly=0, buffer_patience=0):
     if(dialogue_restarting == "rst_plan_Normal_Tolerance"):
         dialogue_restarting = rst_plan_Normal_Tolerance
     elif (dialogue_restarting == "rst_plan_Low_Tolerance"):
@@ -114,16 +104,18 @@ def main(model_name="meta-llama/llama-2-70b-chat", missed_bin_sampling="RANDOM",
     print("Running main experiment on IC...\n")
 
     # server_ip_port = "0.0.0.0:5555"
-    server_ip_port = input(
-        "Please enter server's IP and port (e.g. 127.0.0.1:5050, 128.232.65.218:5555): "
+    server_ip_port = ask_server_ip_port(
+        "Please enter server's IP and port (e.g. 127.0.0.1:5050, 128.232.65.218:5555) or shm://name: "
     )
 
-    prefix = f"./logs/"
+    prefix = log_dir()
     t = datetime.now()
     t = t.strftime("%Y%m%d_%H%M%S")
 
     # build components
-    prompt_generator = TemplatePromptGenerator4IC2(
+    # instructions written in assembly, or as hex words
+    prompt_generator_type = TemplatePromptGenerator4IC3 if assembly else TemplatePromptGenerator4IC2
+    prompt_generator = prompt_generator_type(
         bin_descr_path="../examples_IC/bins_description.txt",
         sampling_missed_bins_method=missed_bin_sampling,
         code_summary_type=int(code_summary_type),
@@ -139,14 +131,14 @@ def main(model_name="meta-llama/llama-2-70b-chat", missed_bin_sampling="RANDOM",
         model_name=model_name
     )
     if(increment_address):
-        extractor = UniversalExtractor(1)
+        extractor = AsmExtractor() if assembly else UniversalExtractor(1)
         stimulus_filter = UniversalFilter([[0x0, 0xFFFFFFFF]], True)
     else:
         extractor = ICExtractor()
         stimulus_filter = ICFilter(0x0, 0xFFFFFFFF)
 
     # build loggers
-    prefix = "./logs/" + model_name + "_"
+    prefix = log_dir() + model_name + "_"
     if(increment_address):
         prefix = prefix.replace(prefix.split("/")[-2], prefix.split("/")[-2] + "/incremental")
     else:
@@ -221,7 +213,8 @@ def main(model_name="meta-llama/llama-2-70b-chat", missed_bin_sampling="RANDOM",
         [logger_txt, logger_csv],
         dialog_bound=700,
         rst_plan=dialogue_restarting,
-        bin_count=196
+        bin_count=196,
+        buffer_policy=StagnationBufferPolicy(buffer_patience) if buffer_patience else None,
     )
     print("Agent successfully built\n")
 
@@ -231,7 +224,7 @@ def main(model_name="meta-llama/llama-2-70b-chat", missed_bin_sampling="RANDOM",
     g_dut_state = GlobalDUTState()
     g_coverage = GlobalCoverageDatabase()
 
-    with closing(StimulusSender(f"tcp://{server_ip_port}")) as stimulus_sender:
+    with closing(StimulusSender(sender_address(server_ip_port))) as stimulus_sender:
         while not agent.end_simulation(g_dut_state, g_coverage):
             stimulus.insn_mem_updates = agent.generate_next_value(
                 g_dut_state, g_coverage, is_ic=True
@@ -265,13 +258,13 @@ def budget_experiment():
 
     BUDGET = Budget(budget_per_trial=INIT_BUDGET, total_budget=INIT_BUDGET)
 
-    server_ip_port = input(
-        "Please enter server's IP and port (e.g. 127.0.0.1:5050, 128.232.65.218:5555): "
+    server_ip_port = ask_server_ip_port(
+        "Please enter server's IP and port (e.g. 127.0.0.1:5050, 128.232.65.218:5555) or shm://name: "
     )
 
     t = datetime.now()
     t = t.strftime("%Y%m%d_%H%M%S")
-    prefix = f"./logs/{t}_budget/"
+    prefix = f"{log_dir()}{t}_budget/"
     if not os.path.exists(prefix):
         os.makedirs(prefix)
 
@@ -325,7 +318,7 @@ def budget_experiment():
         g_dut_state = GlobalDUTState()
         g_coverage = GlobalCoverageDatabase()
 
-        with closing(StimulusSender(f"tcp://{server_ip_port}")) as stimulus_sender:
+        with closing(StimulusSender(sender_address(server_ip_port))) as stimulus_sender:
             while not agent.end_simulation(g_dut_state, g_coverage):
                 stimulus.insn_mem_updates = agent.generate_next_value(
                     g_dut_state, g_coverage, is_ic=True
@@ -404,8 +397,10 @@ if __name__ == "__main__":
     parser.add_argument("--buffer_resetting", type=str, default="STABLE")
     parser.add_argument("--code_summary_type", type=int, default=0)
     parser.add_argument("--few_shot", type=int, default=0)
+    parser.add_argument("--assembly", type=int, default=0, help="let the LLM write instructions in assembly instead of hex words")
+    parser.add_argument("--buffer_patience", type=int, default=0, help="stimuli in a row without a newly hit bin after which the rest of a response is dropped, 0 to disable")
     args = parser.parse_args()
-    main(args.model_name, args.missed_bin_sampling, args.best_iter_message_sampling, args.dialogue_restarting, args.buffer_resetting, args.code_summary_type, args.few_shot)
+    main(args.model_name, args.missed_bin_sampling, args.best_iter_message_sampling, args.dialogue_restarting, args.buffer_resetting, args.code_summary_type, args.few_shot, args.assembly, args.buffer_patience)
     # Example: python generate_stimulus.py --model_name meta-llama/llama-2-70b-chat --missed_bin_sampling MIXED --best_iter_message_sampling Successful_Responses --dialogue_restarting rst_plan_Low_Tolerance --buffer_resetting KEEP --code_summary_type 0 --few_shot 0
 
 
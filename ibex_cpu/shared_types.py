@@ -76,3 +76,8 @@ class Stimulus:
 class IbexStateInfo:
     last_pc: Optional[int]
     last_insn: Optional[int]
+
+
+# Types sent over the binary wire format (shared_helpers/wire_format.py), the
+# coverage database first. The position of a type is its id on the wire.
+WIRE_TYPES = [CoverageDatabase, Stimulus, IbexStateInfo, Instr, Cov]
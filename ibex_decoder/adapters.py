@@ -0,0 +1,51 @@
+# Copyright ***** contributors.
+# Licensed under the Apache License, Version 2.0, see LICENSE for details.
+# SPDX-License-Identifier: Apache-2.0
+
+from shared_helpers.dut_registry import *
+from ibex_decoder.shared_types import CoverageDatabase
+
+# Registers the ibex decoder's coverage with GlobalCoverageDatabase
+
+# name of an op given its bins type
+OP_BINS = {
+    "alu_ops": lambda op: op,
+    "alu_imm_ops": lambda op: f"{op}I",
+    "misc": lambda op: "illegal_instruction",
+    "load_ops": lambda op: f"L{op[0]}",
+    "store_ops": lambda op: f"S{op[0]}",
+}
+REG_BINS = {
+    "read_reg_a": "read_A_reg",
+    "read_reg_b": "read_B_reg",
+    "write_reg": "write_reg",
+}
+CROSS_BINS = {
+    "alu_ops_x_read_reg_a": lambda op: f"{op}_x_read_A_reg",
+    "alu_ops_x_read_reg_b": lambda op: f"{op}_x_read_B_reg",
+    "alu_ops_x_write_reg": lambda op: f"{op}_x_write_reg",
+    "alu_imm_ops_x_read_reg_a": lambda op: f"{op}I_x_read_A_reg",
+    "alu_imm_ops_x_write_reg": lambda op: f"{op}I_x_write_reg",
+    "load_ops_x_read_reg_a": lambda op: f"L{op[0]}_x_read_A_reg",
+    "load_ops_x_write_reg": lambda op: f"L{op[0]}_x_write_reg",
+    "store_ops_x_read_reg_a": lambda op: f"S{op[0]}_x_read_A_reg",
+    "store_ops_x_read_reg_b": lambda op: f"S{op[0]}_x_read_B_reg",
+}
+
+
+def coverage_bins_ID(coverage: CoverageDatabase) -> List[Bin]:
+    bins = []
+    for (bins_type, name) in OP_BINS.items():
+        for op in getattr(coverage, bins_type):
+            bins.append(((bins_type, op), name(op.upper()), "op", 1))
+    for (bins_type, name) in REG_BINS.items():
+        for i in range(len(getattr(coverage, bins_type))):
+            bins.append(((bins_type, i), f"{name}_{i}", "reg", 1))
+    for (bins_type, name) in CROSS_BINS.items():
+        for (op, regs) in getattr(coverage, bins_type).items():
+            for i in range(len(regs)):
+                bins.append(((bins_type, op, i), f"{name(op.upper())}_{i}", "cross", 2.5))
+    return bins
+
+
+register_coverage(CoverageDatabase, coverage_bins_ID)
@@ -21,6 +21,7 @@ sys.path.insert(0, os.path.dirname(directory))
 # print(sys.path)
 
 from ibex_decoder.shared_types import *
+from shared_helpers.stimulus_sender import BaseStimulusSender, sender_address, ask_server_ip_port
 from global_shared_types import *
 from agents.agent_random import RandomAgent
 from agents.agents_CLI import *
@@ -30,40 +31,29 @@ from prompt_generators.prompt_generator_template_ID import *
 from models.llm_gpt import ChatGPT
 from models.llm_openrouter import OpenRouter
 from models.llm_openrouter import OpenRouter
-from stimuli_extractor import DumbExtractor
+from stimuli_extractor import AsmExtractor, DumbExtractor
 from stimuli_filter import Filter
 from loggers.logger_csv import CSVLogger
 from loggers.logger_txt import TXTLogger
+from loggers.logger_base import log_dir
 from agents.agent_ID_dumb import DumbAgent4ID
 
 
-class StimulusSender:
-    def __init__(self, zmq_addr):
-        self.context = zmq.Context()
-        self.socket = self.context.socket(zmq.REQ)
-        self.socket.connect(zmq_addr)
-
-    def send_stimulus(self, stimulus_obj):
-        self.socket.send_pyobj(stimulus_obj)
-        coverage_obj = self.socket.recv_pyobj()
+class StimulusSender(BaseStimulusSender):
+    wire_types = WIRE_TYPES
 
+    def check_reply(self, coverage_obj):
         if not isinstance(coverage_obj, CoverageDatabase):
             raise RuntimeError("Bad format of coverage response")
 
-        return coverage_obj
-
-    def close(self):
-        if self.socket:
-            self.socket.close()
-
 
 def random_experiment():
     print("Running random experiment on ID...")
 
     # server_ip_port = "0.0.0.0:5050"
 
-    server_ip_port = input(
-        "Please enter server's IP and port (e.g. 127.0.0.1:5050, 128.232.65.218:5555): "
+    server_ip_port = ask_server_ip_port(
+        "Please enter server's IP and port (e.g. 127.0.0.1:5050, 128.232.65.218:5555) or shm://name: "
     )
 
     CYCLES = 1000000
@@ -73,7 +63,7 @@ def random_experiment():
     g_dut_state = GlobalDUTState()
     g_coverage = GlobalCoverageDatabase()
 
-    with closing(StimulusSender(f"tcp://{server_ip_port}")) as stimulus_sender:
+    with closing(StimulusSender(sender_address(server_ip_port))) as stimulus_sender:
         while not agent.end_simulation(g_dut_state, g_coverage):
             stimulus = agent.generate_next_value(g_dut_state, g_coverage)
             coverage = stimulus_sender.send_stimulus(stimulus)
@@ -97,8 +87,8 @@ def main_llama2():
 
     from models.llm_llama2 import Llama2
 
-    server_ip_port = input(
-        "Please enter server's IP and port (e.g. 127.0.0.1:5050, 128.232.65.218:5555): "
+    server_ip_port = ask_server_ip_port(
+        "Please enter server's IP and port (e.g. 127.0.0.1:5050, 128.232.65.218:5555) or shm://name: "
     )
 
     # build components
@@ -119,7 +109,7 @@ def main_llama2():
     stimulus_filter = Filter(0x0, 0xFFFFFFFF)
 
     # build loggers
-    prefix = "./logs/"
+    prefix = log_dir()
     t = datetime.now()
     t = t.strftime("%Y%m%d_%H%M%S")
     logger_txt = TXTLogger(f"{prefix}{t}.txt")
@@ -141,7 +131,7 @@ def main_llama2():
     g_dut_state = GlobalDUTState()
     g_coverage = GlobalCoverageDatabase()
 
-    with closing(StimulusSender(f"tcp://{server_ip_port}")) as stimulus_sender:
+    with closing(StimulusSender(sender_address(server_ip_port))) as stimulus_sender:
         while not agent.end_simulation(g_dut_state, g_coverage):
             stimulus = agent.generate_next_value(g_dut_state, g_coverage)
             coverage = stimulus_sender.send_stimulus(stimulus)
@@ -159,7 +149,7 @@ def main_llama2():
         )
 
 
-def main(model_name="meta-llama/llama-2-70b-chat", missed_bin_sampling="RANDOM", best_iter_message_sampling="Recent Responses", dialogue_restarting="rst_plan_Low_Tolerance", buffer_resetting="STABLE", code_summary_type = 0, few_shot=0):
+def main(model_name="meta-llama/llama-2-70b-chat", missed_bin_sampling="RANDOM", best_iter_message_sampling="Recent Responses", dialogue_restarting="rst_plan_Low_Tolerance", buffer_resetting="STABLE", code_summary_type = 0, few_shot=0, assembly=0, buffer_patience=0):
     if(dialogue_restarting == "rst_plan_Normal_Tolerance"):
         dialogue_restarting = rst_plan_Normal_Tolerance
     elif (dialogue_restarting == "rst_plan_Low_Tolerance"):
@@ -170,13 +160,15 @@ def main(model_name="meta-llama/llama-2-70b-chat", missed_bin_sampling="RANDOM",
         dialogue_restarting = rst_plan_Coverage_RateBased_Tolerance
     print("Running main experiment on ID...")
 
-    server_ip_port = input(
-        "Please enter server's IP and port (e.g. 127.0.0.1:5050, 128.232.65.218:5555): "
+    server_ip_port = ask_server_ip_port(
+        "Please enter server's IP and port (e.g. 127.0.0.1:5050, 128.232.65.218:5555) or shm://name: "
     )
     # server_ip_port = "0.0.0.0:5555"
 
     # build components
-    prompt_generator = TemplatePromptGenerator4ID1(
+    # instructions written in assembly, or as hex words
+    prompt_generator_type = TemplatePromptGenerator4ID4 if assembly else TemplatePromptGenerator4ID1
+    prompt_generator = prompt_generator_type(
         bin_descr_path="../examples_ID/bins_description.txt",
         sampling_missed_bins_method=missed_bin_sampling,
         code_summary_type=0,
@@ -193,11 +185,11 @@ def main(model_name="meta-llama/llama-2-70b-chat", missed_bin_sampling="RANDOM",
         prioritise_harder_bins=False,
         model_name=model_name
     )
-    extractor = UniversalExtractor(1)
+    extractor = AsmExtractor() if assembly else UniversalExtractor(1)
     stimulus_filter = UniversalFilter([[0x0, 0xFFFFFFFF]], True)
 
     # build loggers
-    prefix = "./logs/" + model_name + "_"
+    prefix = log_dir() + model_name + "_"
     # if(increment_address):
     #     prefix = prefix.replace(prefix.split("/")[-2], prefix.split("/")[-2] + "/incremental")
     # else:
@@ -271,7 +263,8 @@ def main(model_name="meta-llama/llama-2-70b-chat", missed_bin_sampling="RANDOM",
         [logger_txt, logger_csv],
         dialog_bound=700,
         rst_plan=dialogue_restarting,
-        bin_count=2107
+        bin_count=2107,
+        buffer_policy=StagnationBufferPolicy(buffer_patience) if buffer_patience else None,
     )
     print("Agent successfully built\n")
 
@@ -281,7 +274,7 @@ def main(model_name="meta-llama/llama-2-70b-chat", missed_bin_sampling="RANDOM",
     g_dut_state = GlobalDUTState()
     g_coverage = GlobalCoverageDatabase()
 
-    with closing(StimulusSender(f"tcp://{server_ip_port}")) as stimulus_sender:
+    with closing(StimulusSender(sender_address(server_ip_port))) as stimulus_sender:
         while not agent.end_simulation(g_dut_state, g_coverage):
             stimulus = agent.generate_next_value(g_dut_state, g_coverage)
             coverage = stimulus_sender.send_stimulus(stimulus)
@@ -314,13 +307,13 @@ def budget_experiment():
 
     BUDGET = Budget(budget_per_trial=INIT_BUDGET, total_budget=INIT_BUDGET)
 
-    server_ip_port = input(
-        "Please enter server's IP and port (e.g. 127.0.0.1:5050, 128.232.65.218:5555): "
+    server_ip_port = ask_server_ip_port(
+        "Please enter server's IP and port (e.g. 127.0.0.1:5050, 128.232.65.218:5555) or shm://name: "
     )
 
     t = datetime.now()
     t = t.strftime("%Y%m%d_%H%M%S")
-    prefix = f"./logs/{t}_budget/"
+    prefix = f"{log_dir()}{t}_budget/"
     if not os.path.exists(prefix):
         os.makedirs(prefix)
 
@@ -375,7 +368,7 @@ def budget_experiment():
         g_dut_state = GlobalDUTState()
         g_coverage = GlobalCoverageDatabase()
 
-        with closing(StimulusSender(f"tcp://{server_ip_port}")) as stimulus_sender:
+        with closing(StimulusSender(sender_address(server_ip_port))) as stimulus_sender:
             while not agent.end_simulation(g_dut_state, g_coverage):
                 stimulus = agent.generate_next_value(g_dut_state, g_coverage)
                 coverage = stimulus_sender.send_stimulus(stimulus)
@@ -433,8 +426,10 @@ if __name__ == "__main__":
     parser.add_argument("--buffer_resetting", type=str, default="STABLE")
     parser.add_argument("--code_summary_type", type=int, default=0)
     parser.add_argument("--few_shot", type=int, default=0)
+    parser.add_argument("--assembly", type=int, default=0, help="let the LLM write instructions in assembly instead of hex words")
+    parser.add_argument("--buffer_patience", type=int, default=0, help="stimuli in a row without a newly hit bin after which the rest of a response is dropped, 0 to disable")
     args = parser.parse_args()
-    main(args.model_name, args.missed_bin_sampling, args.best_iter_message_sampling, args.dialogue_restarting, args.buffer_resetting, args.code_summary_type, args.few_shot)
+    main(args.model_name, args.missed_bin_sampling, args.best_iter_message_sampling, args.dialogue_restarting, args.buffer_resetting, args.code_summary_type, args.few_shot, args.assembly, args.buffer_patience)
     # Example: python generate_stimulus.py --model_name meta-llama/llama-2-70b-chat --missed_bin_sampling MIXED --best_iter_message_sampling Successful_Responses --dialogue_restarting rst_plan_Low_Tolerance --buffer_resetting KEEP --code_summary_type 0 --few_shot 0
 
 
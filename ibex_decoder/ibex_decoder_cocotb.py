@@ -16,6 +16,7 @@ import zmq
 import pickle
 from contextlib import closing
 from ibex_decoder.shared_types import *
+from shared_helpers.cocotb_helpers import serve_stimuli, open_server_socket, server_address, ask_server_port
 
 import cocotb
 from cocotb.clock import Clock
@@ -189,38 +190,42 @@ class SimulationController:
 
     # Handles driving a new_value when one is provided by `determine_next_value`
     async def controller_loop(self):
-        with self.zmq_context.socket(zmq.REP) as socket:
-            socket.bind(self.zmq_addr)
+        with open_server_socket(self.zmq_context, self.zmq_addr) as socket:
 
             await Timer(5, units="ns")
             await ReadWrite()
 
-            while True:
-                stimulus_msg = socket.recv()
-                stimulus_obj = pickle.loads(stimulus_msg)
-                print(stimulus_obj)
+            await serve_stimuli(
+                socket,
+                self.handle_stimulus,
+                lambda: self.coverage_monitor.coverage_database,
+                WIRE_TYPES,
+            )
+            self.end_simulation_event.set()
+
+    # Drives a single stimulus, returns the reply to it and whether it ends the simulation
+    async def handle_stimulus(self, stimulus_obj):
+        print(stimulus_obj)
 
-                if stimulus_obj is None:
-                    socket.send_pyobj(self.coverage_monitor.coverage_database)
-                    self.end_simulation_event.set()
-                    break
+        if stimulus_obj is None:
+            return self.coverage_monitor.coverage_database, True
 
-                if not isinstance(stimulus_obj, int):
-                    try:
-                        stimulus_obj = int(stimulus_obj[0])
-                    except:
-                        assert False, "Saw bad stimulus message"
+        if not isinstance(stimulus_obj, int):
+            try:
+                stimulus_obj = int(stimulus_obj[0])
+            except:
+                assert False, "Saw bad stimulus message"
 
-                if stimulus_obj > 2**32 or stimulus_obj < 0:
-                    assert False, "Saw out of range stimulus message"
+        if stimulus_obj > 2**32 or stimulus_obj < 0:
+            assert False, "Saw out of range stimulus message"
 
-                self.dut.insn_i.value = stimulus_obj
+        self.dut.insn_i.value = stimulus_obj
 
-                await Timer(5, units="ns")
-                await ReadWrite()
+        await Timer(5, units="ns")
+        await ReadWrite()
 
-                self.coverage_monitor.sample_coverage()
-                socket.send_pyobj(self.coverage_monitor.coverage_database)
+        self.coverage_monitor.sample_coverage()
+        return self.coverage_monitor.coverage_database, False
 
     def close(self):
         self.zmq_context.term()
@@ -233,7 +238,7 @@ class SimulationController:
 async def basic_test(dut):
     from global_shared_types import GlobalCoverageDatabase
 
-    server_port = input("Please enter server's port (e.g. 5050, 5555): ")
+    server_port = ask_server_port("Please enter server's port (e.g. 5050, 5555) or shm://name: ")
     # server_port = "5555"
 
     trial_cnt = 0
@@ -245,7 +250,7 @@ async def basic_test(dut):
         dut.insn_i.value = 0
 
         with closing(
-            SimulationController(dut, coverage_monitor, f"tcp://*:{server_port}")
+            SimulationController(dut, coverage_monitor, server_address(server_port))
         ) as simulation_controller:
             simulation_controller.run_controller()
 
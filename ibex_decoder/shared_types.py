@@ -189,3 +189,8 @@ class CoverageDatabase:
         self.output_cross_coverage(self.store_ops_x_read_reg_a)
         print("\nStore Ops x Read Port B:")
         self.output_cross_coverage(self.store_ops_x_read_reg_b)
+
+
+# Types sent over the binary wire format (shared_helpers/wire_format.py), the
+# coverage database first. The position of a type is its id on the wire.
+WIRE_TYPES = [CoverageDatabase]
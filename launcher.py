@@ -0,0 +1,228 @@
+#!/bin/env python3
+# Copyright ***** contributors.
+# Licensed under the Apache License, Version 2.0, see LICENSE for details.
+# SPDX-License-Identifier: Apache-2.0
+
+# Headless experiment launcher. Each run starts the DUT's cocotb simulation
+# (`make` in the DUT directory) and its generate_stimulus.py as subprocesses,
+# wired together through a free port (or a shm:// link) passed in the
+# LLM4DV_SERVER_PORT / LLM4DV_SERVER environment variables instead of the
+# interactive prompts. Runs are executed concurrently, each in its own log
+# directory, which the generator also writes its logs to (LLM4DV_LOG_DIR), and a
+# summary of their exit statuses is written at the end.
+#
+# Example:
+#   python launcher.py stride_detector --runs 4 --jobs 4 -- --model_name gpt-4
+#   python launcher.py ibex_decoder --entry random_experiment --transport shm
+#   python launcher.py stride_detector --runs 16 --transport golden
+# With --transport golden the DUT's Python golden model is used in-process by
+# the generator (see shared_helpers/local_transport.py) and no simulator runs.
+# This is experimental, the golden models are not checked against the RTL yet.
+
+import argparse
+import csv
+import os
+import socket
+import subprocess
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, asdict
+from datetime import datetime
+from pathlib import Path
+from typing import List, Optional
+
+from shared_helpers.stimulus_sender import SERVER_ENV
+from shared_helpers.stimulus_server import SERVER_PORT_ENV
+from shared_helpers.local_transport import GOLDEN_SCHEME
+from loggers.logger_base import LOG_DIR_ENV
+
+ROOT = Path(__file__).resolve().parent
+
+
+@dataclass
+class RunResult:
+    run_id: int
+    dut: str
+    server: str
+    log_dir: str
+    generator_status: Optional[int]
+    simulator_status: Optional[int]
+    duration: float
+    timed_out: bool
+
+    def succeeded(self) -> bool:
+        return (
+            not self.timed_out
+            and self.generator_status == 0
+            and self.simulator_status == 0
+        )
+
+
+# A port nothing listens on right now. Another process may still take it
+# before the simulator binds it, in which case that run fails and is reported.
+def free_port() -> int:
+    with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def check_dut(dut: str) -> Path:
+    dut_dir = ROOT / dut
+    for required in ["Makefile", "generate_stimulus.py"]:
+        if not (dut_dir / required).is_file():
+            raise SystemExit(f"{dut_dir} has no {required}, not a DUT directory")
+    return dut_dir
+
+
+def generator_command(entry: str, generator_args: List[str]) -> List[str]:
+    if entry == "main":
+        return [sys.executable, "generate_stimulus.py"] + generator_args
+    return [
+        sys.executable,
+        "-c",
+        f"import generate_stimulus; generate_stimulus.{entry}()",
+    ]
+
+
+def stop(process: subprocess.Popen, grace: float = 10):
+    if process.poll() is not None:
+        return
+    process.terminate()
+    try:
+        process.wait(grace)
+    except subprocess.TimeoutExpired:
+        process.kill()
+        process.wait()
+
+
+def run_one(run_id: int, args, log_root: Path) -> RunResult:
+    dut_dir = check_dut(args.dut)
+    log_dir = log_root / f"run_{run_id}"
+    log_dir.mkdir(parents=True, exist_ok=True)
+
+    if args.transport == "golden":
+        server_port = None
+        server = GOLDEN_SCHEME
+    elif args.transport == "shm":
+        server_port = f"shm://{args.dut.replace('/', '_')}_{os.getpid()}_{run_id}"
+        server = server_port
+    else:
+        server_port = str(free_port())
+        server = f"127.0.0.1:{server_port}"
+
+    env = dict(os.environ)
+    if server_port is not None:
+        env[SERVER_PORT_ENV] = server_port
+    env[SERVER_ENV] = server
+    # instead of the DUT's shared ./logs directory
+    env[LOG_DIR_ENV] = str(log_dir / "logs")
+    # the generators import the shared modules from the repository root
+    env["PYTHONPATH"] = os.pathsep.join(filter(None, [str(ROOT), env.get("PYTHONPATH")]))
+
+    start = time.time()
+    timed_out = False
+    with open(log_dir / "simulator.log", "w") as sim_log, open(
+        log_dir / "generator.log", "w"
+    ) as gen_log:
+        # separate build directory and results file so that runs of the same DUT
+        # do not overwrite each other
+        simulator = None if server_port is None else subprocess.Popen(
+            [
+                "make",
+                f"SIM_BUILD={log_dir / 'sim_build'}",
+                f"COCOTB_RESULTS_FILE={log_dir / 'results.xml'}",
+            ]
+            + args.make_args,
+            cwd=dut_dir,
+            env=env,
+            stdin=subprocess.DEVNULL,
+            stdout=sim_log,
+            stderr=subprocess.STDOUT,
+        )
+        generator = subprocess.Popen(
+            generator_command(args.entry, args.generator_args),
+            cwd=dut_dir,
+            env=env,
+            stdin=subprocess.DEVNULL,
+            stdout=gen_log,
+            stderr=subprocess.STDOUT,
+        )
+
+        try:
+            generator.wait(args.timeout)
+            # the generator has sent the finishing stimulus, or died; in the
+            # latter case the simulator would wait for stimuli forever
+            if generator.returncode == 0 and simulator is not None:
+                simulator.wait(args.timeout)
+        except subprocess.TimeoutExpired:
+            timed_out = True
+        finally:
+            stop(generator)
+            if simulator is not None:
+                stop(simulator)
+
+    result = RunResult(
+        run_id=run_id,
+        dut=args.dut,
+        server=server,
+        log_dir=str(log_dir),
+        generator_status=generator.returncode,
+        simulator_status=simulator.returncode if simulator is not None else 0,
+        duration=time.time() - start,
+        timed_out=timed_out,
+    )
+    print(
+        f"Run #{run_id} {'succeeded' if result.succeeded() else 'FAILED'} "
+        f"after {result.duration:.0f}s, logs in {log_dir}"
+    )
+    return result
+
+
+def main(args):
+    check_dut(args.dut)
+    t = datetime.now().strftime("%Y%m%d_%H%M%S")
+    log_root = Path(args.log_dir).resolve() / f"{t}_{args.dut.replace('/', '_')}"
+    log_root.mkdir(parents=True, exist_ok=True)
+
+    print(f"Launching {args.runs} run(s) of {args.dut}, {args.jobs} at a time\n")
+    with ThreadPoolExecutor(max_workers=args.jobs) as executor:
+        results = list(
+            executor.map(lambda i: run_one(i, args, log_root), range(args.runs))
+        )
+
+    with open(log_root / "summary.csv", "w", newline="") as f:
+        writer = csv.DictWriter(f, fieldnames=list(asdict(results[0]).keys()))
+        writer.writeheader()
+        for result in results:
+            writer.writerow(asdict(result))
+
+    failed = [r.run_id for r in results if not r.succeeded()]
+    print(
+        f"\n{len(results) - len(failed)}/{len(results)} run(s) succeeded, "
+        f"summary in {log_root / 'summary.csv'}"
+    )
+    if failed:
+        print(f"Failed runs: {failed}")
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        formatter_class=argparse.ArgumentDefaultsHelpFormatter,
+        description="Arguments after -- are passed to generate_stimulus.py",
+    )
+    parser.add_argument("dut", type=str, help="DUT directory, e.g. stride_detector or agile_prefetcher/fetch_tag")
+    parser.add_argument("--runs", type=int, default=1)
+    parser.add_argument("--jobs", type=int, default=os.cpu_count())
+    parser.add_argument("--transport", type=str, default="tcp", choices=["tcp", "shm", "golden"])
+    parser.add_argument("--entry", type=str, default="main", help="function of generate_stimulus.py to run, e.g. random_experiment")
+    parser.add_argument("--timeout", type=float, default=None, help="seconds before a run is stopped")
+    parser.add_argument("--log_dir", type=str, default="./launcher_logs")
+    parser.add_argument("--make_args", type=str, nargs="*", default=[])
+
+    argv = sys.argv[1:]
+    generator_args = argv[argv.index("--") + 1 :] if "--" in argv else []
+    args = parser.parse_args(argv[: argv.index("--")] if "--" in argv else argv)
+    args.generator_args = generator_args
+    sys.exit(main(args))
@@ -7,6 +7,14 @@ from datetime import datetime
 import os
 from typing import *
 
+# environment variable set by launcher.py to the log directory of a run
+LOG_DIR_ENV = "LLM4DV_LOG_DIR"
+
+
+# directory the logs are written to, ./logs/ unless run by launcher.py
+def log_dir() -> str:
+    return os.path.join(os.environ.get(LOG_DIR_ENV, "./logs"), "")
+
 
 class BaseLogger:
     # Loggers' fields are updated by agent directly. Agent calls save_log when writing to the log files
@@ -13,12 +13,11 @@ class CSVLogger(BaseLogger):
         if log_path == "":
             t = datetime.now()
             t = t.strftime("%Y%m%d_%H%M%S")
-            self.log_path = f"./logs/{t}.csv"
+            self.log_path = f"{log_dir()}{t}.csv"
         else:
             self.log_path = log_path
 
-        t = self.log_path.split("/")
-        self.log_prefix = t[0] + "/" + t[1]
+        self.log_prefix = os.path.dirname(self.log_path)
         if not os.path.exists(self.log_prefix):
             os.makedirs(self.log_prefix)
 
@@ -11,12 +11,11 @@ class TXTLogger(BaseLogger):
         if log_path == "":
             t = datetime.now()
             t = t.strftime("%Y%m%d_%H%M%S")
-            self.log_path = f"./logs/{t}.txt"
+            self.log_path = f"{log_dir()}{t}.txt"
         else:
             self.log_path = log_path
 
-        t = self.log_path.split("/")
-        self.log_prefix = t[0] + "/" + t[1]
+        self.log_prefix = os.path.dirname(self.log_path)
         if not os.path.exists(self.log_prefix):
             os.makedirs(self.log_prefix)
 
@@ -25,6 +24,7 @@ class TXTLogger(BaseLogger):
         # {role: ..., content: ...},
         # {role: coverage, content: [coverage_plan]}
         # {role: stop, content: done | max stimuli number}
+        # {role: cut, content: stimuli dropped from the buffer}
         # {role: reset}
         self.log: List[List[Dict[str, Union[str, dict]]]] = [[]]
         self.logged_index = 0  # log index for logging
@@ -53,6 +53,9 @@ class TXTLogger(BaseLogger):
                 elif rec["role"] == "stop":
                     f.write(f'Stop: {rec["content"]}\n\n')
 
+                elif rec["role"] == "cut":
+                    f.write(f'Cut: {rec["content"]}\n\n')
+
                 elif rec["role"] == "reset":
                     f.write("\n<<<<< RESET >>>>>\n\n\n")
 
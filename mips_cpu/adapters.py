@@ -0,0 +1,12 @@
+# Copyright ***** contributors.
+# Licensed under the Apache License, Version 2.0, see LICENSE for details.
+# SPDX-License-Identifier: Apache-2.0
+
+from shared_helpers.dut_registry import *
+from ibex_cpu.adapters import coverage_bins_CPU
+from mips_cpu.shared_types import CoverageDatabase, MipsStateInfo
+
+# Registers the MIPS CPU's types with GlobalCoverageDatabase and GlobalDUTState
+
+register_coverage(CoverageDatabase, coverage_bins_CPU)
+register_dut_state(MipsStateInfo)
@@ -69,3 +69,8 @@ class Stimulus:
 class MipsStateInfo:
     last_pc: Optional[int]
     last_insn: Optional[int]
+
+
+# Types sent over the binary wire format (shared_helpers/wire_format.py), the
+# coverage database first. The position of a type is its id on the wire.
+WIRE_TYPES = [CoverageDatabase, Stimulus, MipsStateInfo, Instr, Cov]
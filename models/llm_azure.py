@@ -2,18 +2,17 @@
 # Licensed under the Apache License, Version 2.0, see LICENSE for details.
 # SPDX-License-Identifier: Apache-2.0
 
-import random
-import time
-
 from models.llm_base import *
 import os
 
-import openai
-from openai import AzureOpenAI
-import tiktoken
+from models.token_counter import num_tokens_from_messages
 
 
 class AzureOpenai(BaseLLM):
+    STREAMING = True
+    # not taken by older API versions
+    STREAM_USAGE = False
+
     def __init__(
         self,
         system_prompt: str = "",
@@ -34,9 +33,13 @@ class AzureOpenai(BaseLLM):
         )
         azure_openai_api_key = os.getenv("AZURE_OPENAI_API_KEY")
         assert azure_openai_api_key is not None, "OpenAI API key not found."
-        self.client = AzureOpenAI(
-            api_key=azure_openai_api_key,
-        )
+        self.api_key = azure_openai_api_key
+        # as read by the openai package
+        self.endpoint = os.getenv("AZURE_OPENAI_ENDPOINT")
+        assert self.endpoint is not None, "Azure OpenAI endpoint not found."
+        self.endpoint = self.endpoint.rstrip("/")
+        self.api_version = os.getenv("OPENAI_API_VERSION")
+        assert self.api_version is not None, "Azure OpenAI API version not found."
 
         self.model_name = model_name
         self.model_max_context = (
@@ -99,45 +102,60 @@ class AzureOpenai(BaseLLM):
 
         model = self.model_name
 
-        for delay in [2**x for x in range(0, 6)]:
-            try:
-                result = self.client.chat.completions.create(
-                    model=model,
-                    messages=self.messages,
-                    temperature=self.temperature,
-                    top_p=self.top_p,
-                    max_tokens=self.max_gen_tokens,
-                    n=1,
-                    timeout=30,
-                )
-            except Exception as e:
-                randomness_collision_avoidance = random.randint(0, 1000) / 300.0
-                sleep_dur = delay + randomness_collision_avoidance
-                print(f"Error: {e}. Retrying in {round(sleep_dur, 2)} seconds.")
-                time.sleep(sleep_dur)
-                continue
-            else:
-                response_choices: List[Dict[str, str]] = [
-                    choice["message"] for choice in result["choices"]
-                ]
-                self.messages.append(response_choices[0])
-                self.recent_msgs.append(response_choices[0])
-                self.total_msg_cnt += 1
-                input_token = result["usage"]["prompt_tokens"]
-                output_token = result["usage"]["completion_tokens"]
-                total_token = result["usage"]["total_tokens"]
-                if total_token != input_token + output_token:
-                    print(
-                        f"Correcting fault of token cnts: input {input_token}, output {output_token}, "
-                        f"total {total_token}"
-                    )
-                    total_token = input_token + output_token
-                print("Returned")
-                return response_choices[0]["content"], (
-                    input_token,
-                    output_token,
-                    total_token,
-                )
+        cached = self._cached_response(model, self.messages, self.max_gen_tokens)
+        if cached is not None:
+            response, tokens = cached
+            self.messages.append({"role": "assistant", "content": response})
+            self.recent_msgs.append({"role": "assistant", "content": response})
+            self.total_msg_cnt += 1
+            return response, tokens
+
+        estimated_tokens = self._admit(self.messages, self.max_gen_tokens)
+        result = self._complete(
+            f"{self.endpoint}/openai/deployments/{model}/chat/completions?api-version={self.api_version}",
+            {
+                "model": model,
+                "messages": self.messages,
+                "temperature": self.temperature,
+                "top_p": self.top_p,
+                "max_tokens": self.max_gen_tokens,
+                "n": 1,
+            },
+            {"api-key": self.api_key},
+            read_timeout=30,
+        )
+        response_choices: List[Dict[str, str]] = [
+            {"role": choice["message"]["role"], "content": choice["message"]["content"]}
+            for choice in result["choices"]
+        ]
+        self.messages.append(response_choices[0])
+        self.recent_msgs.append(response_choices[0])
+        self.total_msg_cnt += 1
+        input_token = result["usage"]["prompt_tokens"]
+        output_token = result["usage"]["completion_tokens"]
+        self._settle(estimated_tokens, input_token + output_token)
+        total_token = result["usage"]["total_tokens"]
+        if total_token != input_token + output_token:
+            print(
+                f"Correcting fault of token cnts: input {input_token}, output {output_token}, "
+                f"total {total_token}"
+            )
+            total_token = input_token + output_token
+        print("Returned")
+        # a response stopped early is not the whole response to the request
+        if not result.get("stopped", False):
+            self._cache_response(
+                model,
+                self.messages[:-1],
+                self.max_gen_tokens,
+                response_choices[0]["content"],
+                (input_token, output_token, total_token),
+            )
+        return response_choices[0]["content"], (
+            input_token,
+            output_token,
+            total_token,
+        )
 
     def _compress_conversation(self):
         # STABLE RST & CLEAR RST
@@ -178,49 +196,3 @@ class AzureOpenai(BaseLLM):
         if self.best_iter_buffer_resetting == "CLEAR":
             self.best_messages.clear()
 
-
-def num_tokens_from_messages(
-    messages: List[Dict[str, str]], model="gpt-3.5-turbo-0613"
-) -> int:
-    """Return the number of tokens used by a list of messages."""
-    try:
-        encoding = tiktoken.encoding_for_model(model)
-    except KeyError:
-        print("Warning: model not found. Using cl100k_base encoding.")
-        encoding = tiktoken.get_encoding("cl100k_base")
-    if model in {
-        "gpt-3.5-turbo-0613",
-        "gpt-3.5-turbo-16k-0613",
-        "gpt-4-0314",
-        "gpt-4-32k-0314",
-        "gpt-4-0613",
-        "gpt-4-32k-0613",
-    }:
-        tokens_per_message = 3
-        tokens_per_name = 1
-    elif model == "gpt-3.5-turbo-0301":
-        tokens_per_message = (
-            4  # every message follows <|start|>{role/name}\n{content}<|end|>\n
-        )
-        tokens_per_name = -1  # if there's a name, the role is omitted
-    elif "gpt-3.5-turbo" in model:
-        # print("Warning: gpt-3.5-turbo may update over time. Returning num tokens assuming gpt-3.5-turbo-0613.")
-        return num_tokens_from_messages(messages, model="gpt-3.5-turbo-0613")
-    elif "gpt-4" in model:
-        # print("Warning: gpt-4 may update over time. Returning num tokens assuming gpt-4-0613.")
-        return num_tokens_from_messages(messages, model="gpt-4-0613")
-    else:
-        raise NotImplementedError(
-            f"""num_tokens_from_messages() is not implemented for model {model}. 
-            See https://github.com/openai/openai-python/blob/main/chatml.md for information on 
-            how messages are converted to tokens."""
-        )
-    num_tokens = 0
-    for message in messages:
-        num_tokens += tokens_per_message
-        for key, value in message.items():
-            num_tokens += len(encoding.encode(value))
-            if key == "name":
-                num_tokens += tokens_per_name
-    num_tokens += 3  # every reply is primed with <|start|>assistant<|message|>
-    return num_tokens
@@ -2,16 +2,25 @@
 # Licensed under the Apache License, Version 2.0, see LICENSE for details.
 # SPDX-License-Identifier: Apache-2.0
 
+import copy
 from abc import abstractmethod
 from typing import *
 
 import numpy as np
 
 from global_shared_types import GlobalCoverageDatabase
+from models.llm_scheduler import TokenBucketScheduler
+from models.llm_transport import HTTPTransport, shared_transport
+from models.response_cache import ResponseCache
+from models.token_counter import num_tokens_from_messages, num_tokens_from_text
 
 
 class BaseLLM:
     REMAIN_ITER_NUM = 3
+    # whether __call__ streams its responses to stream()'s on_text, and asks the
+    # backend to report the usage of streamed responses
+    STREAMING = False
+    STREAM_USAGE = True
 
     def __init__(
         self,
@@ -22,6 +31,9 @@ class BaseLLM:
         self.system_prompt = system_prompt
         self.temperature = 1
         self.top_p = 1
+        # sampling seed of the OpenAI-compatible backends, None for none. With a
+        # seed, the response cache reuses responses at any temperature.
+        self.seed: Union[int, None] = None
 
         # 'msg': messages, 'hits': hit #, 'id': msg id
         self.best_messages: List[Dict[str, Union[Tuple[dict, dict], int, float]]] = []
@@ -34,15 +46,151 @@ class BaseLLM:
         ], f'Invalid best-iter-message buffer resetting method. Should be one of {["STABLE", "KEEP", "CLEAR"]}.'
         self.best_iter_buffer_resetting = best_iter_buffer_resetting.upper()
         self.prioritise_harder_bins = prioritise_harder_bins
+        # optional, see models/response_cache.py
+        self.response_cache: Union[ResponseCache, None] = None
+        # pooled HTTP client of the remote backends
+        self.transport: HTTPTransport = shared_transport()
+        # optional, shared by the LLMs using the same quota
+        self.scheduler: Union[TokenBucketScheduler, None] = None
+        # receiver of the response being streamed, see stream()
+        self._on_text: Union[Callable[[str], bool], None] = None
 
     @abstractmethod
     def __call__(self, prompt: str) -> Tuple[str, Tuple[int, int, int]]:
         raise NotImplementedError
 
+    # __call__ receiving the response as it is generated: `on_text` is called
+    # with each new piece of text, and may return False to stop the response
+    # there, e.g. once it has given enough stimuli. Returns what __call__ does,
+    # for the response up to where it stopped. Backends that do not stream give
+    # their whole response at once.
+    def stream(
+        self, prompt: str, on_text: Callable[[str], bool]
+    ) -> Tuple[str, Tuple[int, int, int]]:
+        if not self.STREAMING:
+            response, token_cnts = self(prompt)
+            on_text(response)
+            return response, token_cnts
+
+        self._on_text = on_text
+        try:
+            return self(prompt)
+        finally:
+            self._on_text = None
+
     @abstractmethod
     def reset(self):
         raise NotImplementedError
 
+    # The conversation state a call extends, saved before a speculative call so
+    # that it can be undone if its response is not used. Copied deep, as some
+    # backends (e.g. Llama2) extend nested message lists in place.
+    def save_conversation(self):
+        return copy.deepcopy(self.messages), copy.deepcopy(self.recent_msgs), self.total_msg_cnt
+
+    def restore_conversation(self, conversation):
+        messages, recent_msgs, self.total_msg_cnt = conversation
+        self.messages = list(messages)
+        self.recent_msgs = list(recent_msgs)
+
+    # The cached (response, token counts) of the conversation `messages`, if the
+    # response cache has one and may reuse it. A cached response is given whole
+    # to stream()'s on_text, as the backend is not asked for it.
+    def _cached_response(
+        self, model: str, messages: List[Dict[str, str]], max_tokens: int
+    ) -> Union[Tuple[str, Tuple[int, int, int]], None]:
+        if self.response_cache is None or not self.response_cache.reusable(
+            self.temperature, self.seed
+        ):
+            return None
+        cached = self.response_cache.get(
+            ResponseCache.key(model, messages, self.temperature, self.top_p, max_tokens, self.seed)
+        )
+        if cached is not None and self._on_text is not None:
+            self._on_text(cached[0])
+        return cached
+
+    def _cache_response(
+        self,
+        model: str,
+        messages: List[Dict[str, str]],
+        max_tokens: int,
+        response: str,
+        tokens: Tuple[int, int, int],
+    ):
+        if self.response_cache is None:
+            return
+        self.response_cache.put(
+            ResponseCache.key(model, messages, self.temperature, self.top_p, max_tokens, self.seed),
+            model,
+            response,
+            tokens,
+        )
+
+    # Requests a chat completion from an OpenAI-compatible endpoint, streaming
+    # it if stream() was called. A streamed response comes back in the form of
+    # a whole one, with its usage counted here if the backend did not report it
+    # (e.g. when it was stopped early). "stopped" tells whether it was cut off
+    # by on_text, in which case it is not to be cached as the response to the
+    # request.
+    def _complete(
+        self,
+        url: str,
+        payload: dict,
+        headers: Dict[str, str],
+        read_timeout: Union[float, None] = None,
+    ) -> dict:
+        if self.seed is not None:
+            payload = {**payload, "seed": self.seed}
+        if self._on_text is None:
+            return self.transport.post_json(url, payload, headers, read_timeout)
+
+        if self.STREAM_USAGE:
+            payload = {**payload, "stream_options": {"include_usage": True}}
+        events = self.transport.stream_json(url, payload, headers, read_timeout)
+        content = []
+        usage = None
+        stopped = False
+        try:
+            for event in events:
+                usage = event.get("usage") or usage
+                for choice in event.get("choices", []):
+                    text = (choice.get("delta") or {}).get("content")
+                    if text:
+                        content.append(text)
+                        stopped = stopped or self._on_text(text) is False
+                if stopped:
+                    break
+        finally:
+            events.close()
+
+        content = "".join(content)
+        if usage is None or stopped:
+            usage = {
+                "prompt_tokens": num_tokens_from_messages(payload["messages"]),
+                "completion_tokens": num_tokens_from_text(content),
+            }
+            usage["total_tokens"] = usage["prompt_tokens"] + usage["completion_tokens"]
+        return {
+            "choices": [{"message": {"role": "assistant", "content": content}}],
+            "usage": usage,
+            "stopped": stopped,
+        }
+
+    # Waits for the scheduler to admit a request for `messages`, returns its
+    # estimated tokens. The estimate counts tokens as OpenAI models do, which
+    # is close enough for other models too.
+    def _admit(self, messages: List[Dict[str, str]], max_tokens: int) -> int:
+        if self.scheduler is None:
+            return 0
+        estimated_tokens = num_tokens_from_messages(messages) + max_tokens
+        self.scheduler.acquire(estimated_tokens)
+        return estimated_tokens
+
+    def _settle(self, estimated_tokens: int, actual_tokens: int):
+        if self.scheduler is not None:
+            self.scheduler.settle(estimated_tokens, actual_tokens)
+
     # Called by agent when LLM had generated response
     def append_successful(
         self,
@@ -5,7 +5,7 @@
 from llama import Llama
 
 from models.llm_base import *
-from models.llm_gpt import num_tokens_from_messages
+from models.token_counter import num_tokens_from_messages
 
 
 class Llama2(BaseLLM):
@@ -85,6 +85,14 @@ class Llama2(BaseLLM):
         self.messages[-1].append({"role": "user", "content": prompt})
         self.recent_msgs.append({"role": "user", "content": prompt})
 
+        cached = self._cached_response(self.model_name, self.messages[-1], self.max_gen_len)
+        if cached is not None:
+            response, tokens = cached
+            self.messages[-1].append({"role": "assistant", "content": response})
+            self.recent_msgs.append({"role": "assistant", "content": response})
+            self.total_msg_cnt += 1
+            return response, tokens
+
         results = self.generator.chat_completion(
             self.messages,  # type: ignore
             max_gen_len=self.max_gen_len,
@@ -99,6 +107,13 @@ class Llama2(BaseLLM):
         input_token = num_tokens_from_messages(self.messages[-1][:-1])
         output_token = num_tokens_from_messages(self.messages[-1][-1:])
         total_token = input_token + output_token
+        self._cache_response(
+            self.model_name,
+            self.messages[-1][:-1],
+            self.max_gen_len,
+            response,
+            (input_token, output_token, total_token),
+        )
 
         return response, (
             input_token,
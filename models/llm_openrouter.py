@@ -1,15 +1,11 @@
-import random
-import time
-
 from models.llm_base import *
 import os
-import json
-import requests
 
-import tiktoken
-from models.llm_gpt import num_tokens_from_messages
+from models.token_counter import num_tokens_from_messages
 
 class OpenRouter(BaseLLM):
+    STREAMING = True
+
     def __init__(
         self,
         system_prompt: str = "",
@@ -31,6 +27,7 @@ class OpenRouter(BaseLLM):
         openrouter_api_key = os.getenv("OPENROUTER_API_KEY")
         assert openrouter_api_key is not None, "OpenRouter API key not found."
         self.api_key = openrouter_api_key
+        self.base_url = os.getenv("OPENROUTER_BASE_URL", "https://openrouter.ai/api/v1")
 
         self.model_max_context = 4096
         self.temperature = temperature
@@ -94,45 +91,54 @@ class OpenRouter(BaseLLM):
         else:
             model = self.model_name
 
-        for delay in [2**x for x in range(0, 6)]:
-            try:
-                response = requests.post(
-                timeout=30,
-                url="https://openrouter.ai/api/v1/chat/completions",
-                headers={
-                    "Authorization": f"Bearer {self.api_key}"
-                },
-                data=json.dumps({
-                    "model": model, # Optional
-                    "messages": self.messages,
-                    "temperature": self.temperature,
-                    "top_p": self.top_p,
-                    "max_tokens": self.max_gen_tokens,
-                })
-                )
-                result = response.json()
-            except Exception as e:
-                randomness_collision_avoidance = random.randint(0, 1000) / 300.0
-                sleep_dur = delay + randomness_collision_avoidance
-                print(f"Error: {e}. Retrying in {round(sleep_dur, 2)} seconds.")
-                time.sleep(sleep_dur)
-                continue
-            else:
-                response_choices: List[Dict[str, str]] = [
-                    choice["message"] for choice in result["choices"]
-                ]
-                self.messages.append(response_choices[0])
-                self.recent_msgs.append(response_choices[0])
-                self.total_msg_cnt += 1
-                input_token = result["usage"]["prompt_tokens"]
-                output_token = result["usage"]["completion_tokens"]
-                total_token = input_token + output_token
-                print("Returned")
-                return response_choices[0]["content"], (
-                    input_token,
-                    output_token,
-                    total_token,
-                )
+        cached = self._cached_response(model, self.messages, self.max_gen_tokens)
+        if cached is not None:
+            response, tokens = cached
+            self.messages.append({"role": "assistant", "content": response})
+            self.recent_msgs.append({"role": "assistant", "content": response})
+            self.total_msg_cnt += 1
+            return response, tokens
+
+        estimated_tokens = self._admit(self.messages, self.max_gen_tokens)
+        result = self._complete(
+            f"{self.base_url}/chat/completions",
+            {
+                "model": model,
+                "messages": self.messages,
+                "temperature": self.temperature,
+                "top_p": self.top_p,
+                "max_tokens": self.max_gen_tokens,
+                "n": 1,
+            },
+            {"Authorization": f"Bearer {self.api_key}"},
+            read_timeout=30,
+        )
+        response_choices: List[Dict[str, str]] = [
+            {"role": choice["message"]["role"], "content": choice["message"]["content"]}
+            for choice in result["choices"]
+        ]
+        self.messages.append(response_choices[0])
+        self.recent_msgs.append(response_choices[0])
+        self.total_msg_cnt += 1
+        input_token = result["usage"]["prompt_tokens"]
+        output_token = result["usage"]["completion_tokens"]
+        self._settle(estimated_tokens, input_token + output_token)
+        total_token = input_token + output_token
+        print("Returned")
+        # a response stopped early is not the whole response to the request
+        if not result.get("stopped", False):
+            self._cache_response(
+                model,
+                self.messages[:-1],
+                self.max_gen_tokens,
+                response_choices[0]["content"],
+                (input_token, output_token, total_token),
+            )
+        return response_choices[0]["content"], (
+            input_token,
+            output_token,
+            total_token,
+        )
 
     def _compress_conversation(self):
         # STABLE RST & CLEAR RST
@@ -0,0 +1,193 @@
+# Copyright ***** contributors.
+# Licensed under the Apache License, Version 2.0, see LICENSE for details.
+# SPDX-License-Identifier: Apache-2.0
+
+import threading
+import time
+import unittest
+from collections import deque
+from typing import *
+
+# Admission of LLM requests within the quota of a provider, shared by all the
+# LLMs (agents, dialogs, trials) of a process. Two token buckets, of requests
+# and of tokens, refill continuously at the per-minute limits, and a request is
+# sent only once both hold enough for it. Requests are admitted first come,
+# first served, so that large ones are not starved by small ones.
+#
+# The tokens of a request are estimated before it is sent (its prompt plus the
+# most it may generate), and settled against the usage reported once it is
+# answered. Requests wait on the threads they are made on, e.g. those of the
+# dialogs of a MultiDialogAgent or of prefetches.
+
+
+class TokenBucketScheduler:
+    def __init__(
+        self,
+        requests_per_minute: int = 0,
+        tokens_per_minute: int = 0,
+        clock: Callable[[], float] = time.monotonic,
+    ):
+        # 0 for no limit
+        self.requests_per_minute = requests_per_minute
+        self.tokens_per_minute = tokens_per_minute
+        # seconds, e.g. a fake clock in tests
+        self.clock = clock
+
+        self._cond = threading.Condition()
+        self._requests = float(requests_per_minute)
+        self._tokens = float(tokens_per_minute)
+        self._refilled = clock()
+        # tickets of the waiting requests, in arrival order
+        self._queue: Deque[object] = deque()
+
+        self.admitted_cnt = 0
+        self.wait_time = 0.0
+
+    # Blocks until a request of `tokens` estimated tokens may be sent
+    def acquire(self, tokens: int):
+        # a request larger than the whole budget is admitted once it is full
+        tokens = min(tokens, self.tokens_per_minute) if self.tokens_per_minute else 0
+        ticket = object()
+        start = self.clock()
+        with self._cond:
+            self._queue.append(ticket)
+            while True:
+                self._refill()
+                wait = self._wait_for(tokens) if self._queue[0] is ticket else None
+                if wait == 0:
+                    break
+                self._cond.wait(wait)
+            self._queue.popleft()
+            if self.requests_per_minute:
+                self._requests -= 1
+            self._tokens -= tokens
+            self.admitted_cnt += 1
+            self.wait_time += self.clock() - start
+            # the next request may fit too
+            self._cond.notify_all()
+
+    # Corrects the token bucket by the actual tokens of an admitted request
+    def settle(self, estimated_tokens: int, actual_tokens: int):
+        if not self.tokens_per_minute:
+            return
+        with self._cond:
+            self._tokens += min(estimated_tokens, self.tokens_per_minute) - actual_tokens
+            self._cond.notify_all()
+
+    def _refill(self):
+        now = self.clock()
+        elapsed, self._refilled = now - self._refilled, now
+        if self.requests_per_minute:
+            self._requests = min(
+                self.requests_per_minute, self._requests + elapsed * self.requests_per_minute / 60
+            )
+        if self.tokens_per_minute:
+            self._tokens = min(
+                self.tokens_per_minute, self._tokens + elapsed * self.tokens_per_minute / 60
+            )
+
+    # Seconds until both buckets hold enough for a request, 0 if they do now
+    def _wait_for(self, tokens: int) -> float:
+        wait = 0.0
+        if self.requests_per_minute and self._requests < 1:
+            wait = max(wait, (1 - self._requests) * 60 / self.requests_per_minute)
+        if self.tokens_per_minute and self._tokens < tokens:
+            wait = max(wait, (tokens - self._tokens) * 60 / self.tokens_per_minute)
+        return wait
+
+    def __str__(self):
+        return (
+            f"Scheduler ({self.requests_per_minute} requests/min, {self.tokens_per_minute} tokens/min): "
+            f"{self.admitted_cnt} requests admitted after {self.wait_time:.2f}s of waiting in total"
+        )
+
+
+"""Tests"""
+
+
+class TestTokenBucketScheduler(unittest.TestCase):
+    def setUp(self) -> None:
+        self.now = 0.0
+        # a request or 10 tokens per second
+        self.scheduler = TokenBucketScheduler(60, 600, clock=lambda: self.now)
+        self.admitted = []
+
+    def _advance(self, seconds: float):
+        self.now += seconds
+        with self.scheduler._cond:
+            self.scheduler._cond.notify_all()
+
+    # Requests `tokens` on a thread once the requests before it are queued
+    def _request(self, name: str, tokens: int) -> threading.Thread:
+        queued = len(self.scheduler._queue)
+        thread = threading.Thread(
+            target=lambda: (self.scheduler.acquire(tokens), self.admitted.append(name)),
+            daemon=True,
+        )
+        thread.start()
+        while len(self.scheduler._queue) == queued and thread.is_alive():
+            time.sleep(0.001)
+        return thread
+
+    def _wait_admitted(self, names: List[str]):
+        deadline = time.monotonic() + 10
+        while len(self.admitted) < len(names) and time.monotonic() < deadline:
+            time.sleep(0.001)
+        # and no more
+        time.sleep(0.05)
+        self.assertEqual(names, self.admitted)
+
+    def test_refill(self) -> None:
+        for _ in range(6):
+            self.scheduler.acquire(100)
+        self.assertEqual(0, self.scheduler.wait_time)
+        self._request("a", 100)
+        self._advance(5)
+        self._wait_admitted([])
+        self._advance(5)
+        self._wait_admitted(["a"])
+        self.assertEqual(10, self.scheduler.wait_time)
+
+        # not beyond the per-minute limits
+        self._advance(600)
+        for _ in range(6):
+            self.scheduler.acquire(100)
+        self._request("b", 1)
+        self._wait_admitted(["a"])
+
+    # first come, first served: a small request does not overtake a large one
+    def test_queueing(self) -> None:
+        self.scheduler.acquire(600)
+        self._request("large", 300)
+        self._request("small", 10)
+        self._advance(10)
+        self._wait_admitted([])
+        self._advance(20)
+        self._wait_admitted(["large"])
+        self._advance(1)
+        self._wait_admitted(["large", "small"])
+
+    def test_requests_per_minute(self) -> None:
+        scheduler = self.scheduler = TokenBucketScheduler(2, clock=lambda: self.now)
+        scheduler.acquire(10**6)
+        scheduler.acquire(10**6)
+        self._request("a", 0)
+        self._advance(29)
+        self._wait_admitted([])
+        self._advance(1)
+        self._wait_admitted(["a"])
+
+    def test_settle(self) -> None:
+        self.scheduler.acquire(500)
+        self.scheduler.settle(500, 200)
+        self.assertEqual(0, self.scheduler._wait_for(400))
+        # a request larger than the whole budget, once it is full
+        self._request("large", 10**6)
+        self._advance(19)
+        self._wait_admitted([])
+        self._advance(1)
+        self._wait_admitted(["large"])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,379 @@
+# Copyright ***** contributors.
+# Licensed under the Apache License, Version 2.0, see LICENSE for details.
+# SPDX-License-Identifier: Apache-2.0
+
+import email.utils
+import http.client
+import http.server
+import json
+import random
+import threading
+import time
+import unittest
+from collections import deque
+from typing import *
+from unittest import mock
+from urllib.parse import urlsplit
+
+# HTTP client shared by the remote LLM backends (ChatGPT, AzureOpenai and
+# OpenRouter). Connections are kept alive and pooled per host, so that a
+# message does not open a new TCP/TLS connection. Failed requests are retried
+# with exponential backoff and jitter, or after the delay asked by the server in
+# Retry-After if it gives one, at most `max_backoff` either way. Latency, waiting
+# for a pooled connection and retries are recorded, as totals and the latencies
+# of the latest requests. Responses may also be streamed, as
+# server-sent events, and cancelled part way.
+#
+# Any OpenAI-compatible server can stand in for a backend through its base URL
+# (see e.g. OPENAI_BASE_URL), e.g. a local stub when testing.
+
+# server errors and rate limits, worth another try
+RETRY_STATUSES = {408, 409, 429, 500, 502, 503, 504}
+# latest requests the latency percentiles are of
+LATENCY_WINDOW = 1000
+
+
+class TransportError(Exception):
+    def __init__(self, status: int, body: str):
+        super().__init__(f"HTTP {status}: {body[:500]}")
+        self.status = status
+        self.body = body
+
+
+class HTTPTransport:
+    def __init__(
+        self,
+        pool_size: int = 8,
+        connect_timeout: float = 10,
+        read_timeout: float = 60,
+        max_retries: int = 5,
+        backoff_base: float = 1,
+        max_backoff: float = 60,
+    ):
+        self.pool_size = pool_size
+        self.connect_timeout = connect_timeout
+        self.read_timeout = read_timeout
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.max_backoff = max_backoff
+
+        self._lock = threading.Lock()
+        # (scheme, host, port) -> idle connections, and the slots of connections
+        # in use, at most pool_size per host
+        self._idle: Dict[tuple, List[http.client.HTTPConnection]] = {}
+        self._slots: Dict[tuple, threading.BoundedSemaphore] = {}
+
+        self.request_cnt = 0
+        self.retry_cnt = 0
+        self.failure_cnt = 0
+        # seconds from sending a request to the last byte of its response, and
+        # waiting for a pooled connection before that, over all requests
+        self.latency_sum = 0.0
+        self.queue_time_sum = 0.0
+        # latencies of the latest requests
+        self.latencies: Deque[float] = deque(maxlen=LATENCY_WINDOW)
+
+    # POSTs `payload` as JSON, returns the decoded JSON response
+    def post_json(
+        self,
+        url: str,
+        payload: dict,
+        headers: Union[Dict[str, str], None] = None,
+        read_timeout: Union[float, None] = None,
+    ) -> dict:
+        body = json.dumps(payload).encode()
+        headers = {"Content-Type": "application/json", **(headers or {})}
+        data = self._retrying(
+            lambda: self._request(url, body, headers, read_timeout or self.read_timeout)
+        )
+        return json.loads(data)
+
+    # POSTs `payload` with streaming on, yields the JSON events of the response
+    # (server-sent events) as they arrive. Closing the generator early cancels
+    # the response, closing its connection.
+    def stream_json(
+        self,
+        url: str,
+        payload: dict,
+        headers: Union[Dict[str, str], None] = None,
+        read_timeout: Union[float, None] = None,
+    ) -> Iterator[dict]:
+        body = json.dumps({**payload, "stream": True}).encode()
+        headers = {"Content-Type": "application/json", **(headers or {})}
+        origin, conn, response, slots, start, sent = self._retrying(
+            lambda: self._request(url, body, headers, read_timeout or self.read_timeout, stream=True)
+        )
+
+        complete = False
+        try:
+            for line in response:
+                line = line.strip()
+                if not line.startswith(b"data:"):
+                    continue
+                data = line[len(b"data:") :].strip()
+                if data == b"[DONE]":
+                    break
+                yield json.loads(data)
+            response.read()
+            complete = True
+        finally:
+            if complete and not response.will_close:
+                with self._lock:
+                    self._idle[origin].append(conn)
+            else:
+                conn.close()
+            slots.release()
+            self._record(start, sent)
+
+    # Runs `request` until it succeeds or runs out of retries, returns its data
+    def _retrying(self, request: Callable[[], tuple]):
+        for attempt in range(self.max_retries + 1):
+            retry_after = None
+            try:
+                status, response_headers, data = request()
+            except (OSError, http.client.HTTPException) as e:
+                error = e
+            else:
+                if status < 300:
+                    return data
+                error = TransportError(status, data.decode(errors="replace"))
+                if status not in RETRY_STATUSES:
+                    break
+                retry_after = _retry_after(response_headers.get("Retry-After"))
+
+            if attempt == self.max_retries:
+                break
+            if retry_after is not None:
+                sleep_dur = min(retry_after, self.max_backoff)
+            else:
+                delay = min(self.max_backoff, self.backoff_base * 2**attempt)
+                # jitter, so that dialogs failing together do not retry together
+                sleep_dur = delay + random.uniform(0, delay)
+            with self._lock:
+                self.retry_cnt += 1
+            print(f"Error: {error}. Retrying in {round(sleep_dur, 2)} seconds.")
+            time.sleep(sleep_dur)
+
+        with self._lock:
+            self.failure_cnt += 1
+        raise error
+
+    # One attempt at a request, returns (status, headers, body). With `stream`,
+    # a successful response is left unread, and handed over with its connection
+    # and slot in place of the body.
+    def _request(
+        self, url: str, body: bytes, headers: Dict[str, str], read_timeout: float, stream: bool = False
+    ):
+        parts = urlsplit(url)
+        origin = (parts.scheme, parts.hostname, parts.port)
+        path = parts.path + ("?" + parts.query if parts.query else "")
+
+        start = time.perf_counter()
+        slots = self._slot(origin)
+        slots.acquire()
+        sent = time.perf_counter()
+        handed_over = False
+        try:
+            conn, reused = self._connection(origin)
+            try:
+                try:
+                    response = self._send(conn, path, body, headers, read_timeout)
+                except (http.client.RemoteDisconnected, ConnectionResetError, BrokenPipeError):
+                    if not reused:
+                        raise
+                    # the server closed the idle connection, try a new one
+                    conn.close()
+                    conn = self._connect(origin)
+                    response = self._send(conn, path, body, headers, read_timeout)
+                if stream and response.status < 300:
+                    handed_over = True
+                    return response.status, response.headers, (
+                        origin, conn, response, slots, start, sent
+                    )
+                data = response.read()
+            except BaseException:
+                conn.close()
+                raise
+            if response.will_close:
+                conn.close()
+            else:
+                with self._lock:
+                    self._idle[origin].append(conn)
+        finally:
+            if not handed_over:
+                slots.release()
+
+        self._record(start, sent)
+        return response.status, response.headers, data
+
+    def _record(self, start: float, sent: float):
+        latency = time.perf_counter() - sent
+        with self._lock:
+            self.request_cnt += 1
+            self.latency_sum += latency
+            self.queue_time_sum += sent - start
+            self.latencies.append(latency)
+
+    def _send(self, conn, path: str, body: bytes, headers: Dict[str, str], read_timeout: float):
+        conn.request("POST", path, body=body, headers=headers)
+        conn.sock.settimeout(read_timeout)
+        return conn.getresponse()
+
+    def _slot(self, origin: tuple) -> threading.BoundedSemaphore:
+        with self._lock:
+            if origin not in self._slots:
+                self._slots[origin] = threading.BoundedSemaphore(self.pool_size)
+                self._idle[origin] = []
+            return self._slots[origin]
+
+    # An idle connection to `origin` if there is one, else a new one
+    def _connection(self, origin: tuple) -> Tuple[http.client.HTTPConnection, bool]:
+        with self._lock:
+            if self._idle[origin]:
+                return self._idle[origin].pop(), True
+        return self._connect(origin), False
+
+    def _connect(self, origin: tuple) -> http.client.HTTPConnection:
+        scheme, host, port = origin
+        connection_type = (
+            http.client.HTTPSConnection if scheme == "https" else http.client.HTTPConnection
+        )
+        conn = connection_type(host, port, timeout=self.connect_timeout)
+        conn.connect()
+        return conn
+
+    def __str__(self):
+        with self._lock:
+            latencies = sorted(self.latencies)
+            request_cnt, latency_sum = self.request_cnt, self.latency_sum
+            queue_time = self.queue_time_sum
+        if not latencies:
+            return "LLM requests: none"
+        return (
+            f"LLM requests: {request_cnt}, retries: {self.retry_cnt}, failed: {self.failure_cnt}, "
+            f"latency mean {latency_sum / request_cnt:.2f}s, "
+            f"p90 of the last {len(latencies)} {latencies[int(0.9 * (len(latencies) - 1))]:.2f}s, "
+            f"waiting for a connection {queue_time:.2f}s in total"
+        )
+
+    def close(self):
+        with self._lock:
+            for conns in self._idle.values():
+                for conn in conns:
+                    conn.close()
+                conns.clear()
+
+
+# Seconds asked by a Retry-After header, given either in seconds or as a date
+def _retry_after(value: Union[str, None]) -> Union[float, None]:
+    if value is None:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        return max(0.0, email.utils.parsedate_to_datetime(value).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return None
+
+
+_shared_transport: Union[HTTPTransport, None] = None
+_shared_lock = threading.Lock()
+
+
+# The transport shared by all LLMs of the process
+def shared_transport() -> HTTPTransport:
+    global _shared_transport
+    with _shared_lock:
+        if _shared_transport is None:
+            _shared_transport = HTTPTransport()
+        return _shared_transport
+
+
+"""Tests"""
+
+
+# A local OpenAI-compatible stub keeping connections alive. It answers the
+# scripted (status, headers) in turn, then 200, with a JSON body telling the
+# request's number and the client port, i.e. its connection.
+class _StubServer(http.server.ThreadingHTTPServer):
+    def __init__(self, script: List[Tuple[int, Dict[str, str]]] = ()):
+        super().__init__(("127.0.0.1", 0), _StubHandler)
+        self.script = list(script)
+        self.request_cnt = 0
+        threading.Thread(target=self.serve_forever, daemon=True).start()
+
+    @property
+    def url(self) -> str:
+        return f"http://127.0.0.1:{self.server_address[1]}/v1/chat/completions"
+
+    def close(self):
+        self.shutdown()
+        self.server_close()
+
+
+class _StubHandler(http.server.BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def do_POST(self):
+        self.rfile.read(int(self.headers["Content-Length"]))
+        self.server.request_cnt += 1
+        status, headers = self.server.script.pop(0) if self.server.script else (200, {})
+        body = json.dumps({"request": self.server.request_cnt, "port": self.client_address[1]})
+        self.send_response(status)
+        for (k, v) in {**headers, "Content-Type": "application/json"}.items():
+            self.send_header(k, v)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body.encode())
+
+    def log_message(self, format, *args):
+        pass
+
+
+class TestHTTPTransport(unittest.TestCase):
+    def _transport(self, script: List[Tuple[int, Dict[str, str]]] = (), **kwargs):
+        server = _StubServer(script)
+        self.addCleanup(server.close)
+        transport = HTTPTransport(backoff_base=0.01, **kwargs)
+        self.addCleanup(transport.close)
+        return server, transport
+
+    def test_connection_reuse(self) -> None:
+        server, transport = self._transport()
+        replies = [transport.post_json(server.url, {"n": i}) for i in range(3)]
+        self.assertEqual([1, 2, 3], [reply["request"] for reply in replies])
+        self.assertEqual(1, len({reply["port"] for reply in replies}))
+        self.assertEqual(3, transport.request_cnt)
+        self.assertIn("LLM requests: 3, retries: 0", str(transport))
+
+    # the delay asked by the server, at most max_backoff
+    def test_retry_after(self) -> None:
+        server, transport = self._transport(
+            [(429, {"Retry-After": "0.5"}), (503, {"Retry-After": "3600"})], max_backoff=2
+        )
+        with mock.patch.object(time, "sleep") as sleep:
+            self.assertEqual(3, transport.post_json(server.url, {})["request"])
+        self.assertEqual([mock.call(0.5), mock.call(2)], sleep.call_args_list)
+        self.assertEqual((2, 0), (transport.retry_cnt, transport.failure_cnt))
+
+    def test_not_retried(self) -> None:
+        server, transport = self._transport([(400, {}), (400, {})])
+        with self.assertRaises(TransportError) as e:
+            transport.post_json(server.url, {})
+        self.assertEqual(400, e.exception.status)
+        self.assertEqual(1, server.request_cnt)
+        self.assertEqual((0, 1), (transport.retry_cnt, transport.failure_cnt))
+
+    def test_bounded_stats(self) -> None:
+        transport = HTTPTransport()
+        for _ in range(LATENCY_WINDOW + 10):
+            transport._record(0, 0)
+        self.assertEqual(LATENCY_WINDOW, len(transport.latencies))
+        self.assertEqual(LATENCY_WINDOW + 10, transport.request_cnt)
+        self.assertIn(f"p90 of the last {LATENCY_WINDOW}", str(transport))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,189 @@
+# Copyright ***** contributors.
+# Licensed under the Apache License, Version 2.0, see LICENSE for details.
+# SPDX-License-Identifier: Apache-2.0
+
+import hashlib
+import json
+import sqlite3
+import threading
+import time
+import unittest
+from typing import *
+
+# Responses of LLM backends kept in a local SQLite database, so that replaying
+# a conversation (e.g. the initial prompt of every dialog and trial, or a whole
+# repeated experiment) does not call the backend again. Entries are addressed
+# by a hash of everything that decides the response: model, messages and
+# sampling parameters.
+#
+# Modes:
+#   DETERMINISTIC  reuse responses only when the backend would give the same
+#                  response anyway: when sampling at temperature 0, or with a
+#                  fixed seed (see BaseLLM.seed). At the temperature the LLMs
+#                  default to and without a seed, nothing is reused, so this
+#                  mode is opt-in by setting either.
+#   ALWAYS         reuse responses at any temperature, e.g. to replay an
+#                  experiment offline
+# New responses are stored in both modes. A hit returns the token counts of the
+# original call, so that replays follow the same token budget.
+#
+# The least recently used entries are evicted beyond `max_entries`.
+
+CACHE_MODES = ["DETERMINISTIC", "ALWAYS"]
+
+
+class ResponseCache:
+    def __init__(self, path: str, mode: str = "DETERMINISTIC", max_entries: int = 100000):
+        assert mode.upper() in CACHE_MODES, f"Invalid response cache mode. Should be one of {CACHE_MODES}."
+        self.path = path
+        self.mode = mode.upper()
+        self.max_entries = max_entries
+
+        # shared by the LLMs of all dialogs, on their threads
+        self._lock = threading.Lock()
+        self.db = sqlite3.connect(path, timeout=60, check_same_thread=False)
+        self.db.execute(
+            "CREATE TABLE IF NOT EXISTS responses ("
+            "key TEXT PRIMARY KEY, model TEXT, response TEXT, "
+            "input_tokens INTEGER, output_tokens INTEGER, "
+            "last_used REAL, hit_cnt INTEGER)"
+        )
+        self.db.execute("CREATE INDEX IF NOT EXISTS lru ON responses (last_used)")
+        self.db.commit()
+
+        self.hit_cnt = 0
+        self.miss_cnt = 0
+        self.evicted_cnt = 0
+        self.last_used = 0.0
+
+    @staticmethod
+    def key(
+        model: str,
+        messages: List[Dict[str, str]],
+        temperature: float,
+        top_p: float,
+        max_tokens: int,
+        seed: Union[int, None] = None,
+    ) -> str:
+        request = {
+            "model": model,
+            "messages": [
+                {"role": message["role"], "content": message["content"]}
+                for message in messages
+            ],
+            "temperature": temperature,
+            "top_p": top_p,
+            "max_tokens": max_tokens,
+            "seed": seed,
+        }
+        return hashlib.sha256(json.dumps(request, sort_keys=True).encode()).hexdigest()
+
+    def reusable(self, temperature: float, seed: Union[int, None] = None) -> bool:
+        return self.mode == "ALWAYS" or temperature == 0 or seed is not None
+
+    # Time of a use of an entry, later than any before it, as entries used at the
+    # same time would be evicted in no particular order
+    def _use_time(self) -> float:
+        self.last_used = max(time.time(), self.last_used + 1e-6)
+        return self.last_used
+
+    # (response, (input, output, total tokens)) stored under `key`, or None
+    def get(self, key: str) -> Union[Tuple[str, Tuple[int, int, int]], None]:
+        with self._lock:
+            row = self.db.execute(
+                "SELECT response, input_tokens, output_tokens FROM responses WHERE key = ?",
+                (key,),
+            ).fetchone()
+            if row is None:
+                self.miss_cnt += 1
+                return None
+            self.db.execute(
+                "UPDATE responses SET last_used = ?, hit_cnt = hit_cnt + 1 WHERE key = ?",
+                (self._use_time(), key),
+            )
+            self.db.commit()
+            self.hit_cnt += 1
+        response, input_token, output_token = row
+        return response, (input_token, output_token, input_token + output_token)
+
+    def put(self, key: str, model: str, response: str, tokens: Tuple[int, int, int]):
+        with self._lock:
+            self.db.execute(
+                "INSERT OR REPLACE INTO responses VALUES (?, ?, ?, ?, ?, ?, 0)",
+                (key, model, response, tokens[0], tokens[1], self._use_time()),
+            )
+            excess = self.db.execute("SELECT COUNT(*) FROM responses").fetchone()[0] - self.max_entries
+            if excess > 0:
+                self.db.execute(
+                    "DELETE FROM responses WHERE key IN "
+                    "(SELECT key FROM responses ORDER BY last_used LIMIT ?)",
+                    (excess,),
+                )
+                self.evicted_cnt += excess
+            self.db.commit()
+
+    def __len__(self):
+        with self._lock:
+            return self.db.execute("SELECT COUNT(*) FROM responses").fetchone()[0]
+
+    def __str__(self):
+        lookup_cnt = self.hit_cnt + self.miss_cnt
+        hit_rate = self.hit_cnt / lookup_cnt if lookup_cnt > 0 else 0
+        return (
+            f"Response cache {self.path} ({self.mode}): {self.hit_cnt} hits, "
+            f"{self.miss_cnt} misses ({hit_rate:.1%}), {self.evicted_cnt} evicted, "
+            f"{len(self)} entries"
+        )
+
+    def close(self):
+        with self._lock:
+            self.db.close()
+
+
+"""Tests"""
+
+
+class TestResponseCache(unittest.TestCase):
+    def setUp(self) -> None:
+        self.cache = ResponseCache(":memory:", max_entries=3)
+        self.addCleanup(self.cache.close)
+
+    def _key(self, content: str, temperature: float = 0, seed: Union[int, None] = None) -> str:
+        messages = [{"role": "user", "content": content}]
+        return ResponseCache.key("model", messages, temperature, 1, 100, seed)
+
+    def test_get_put(self) -> None:
+        self.assertIsNone(self.cache.get(self._key("a")))
+        self.cache.put(self._key("a"), "model", "A", (3, 4, 7))
+        self.assertEqual(("A", (3, 4, 7)), self.cache.get(self._key("a")))
+        self.assertEqual((1, 1), (self.cache.hit_cnt, self.cache.miss_cnt))
+        # everything deciding the response is in the key
+        keys = {self._key("a"), self._key("b"), self._key("a", 0.4), self._key("a", 0, 1)}
+        self.assertEqual(4, len(keys))
+
+    # the least recently used entries go first, a hit counting as a use
+    def test_lru_eviction(self) -> None:
+        for k in "abc":
+            self.cache.put(self._key(k), "model", k.upper(), (1, 1, 2))
+        self.cache.get(self._key("a"))
+        self.cache.put(self._key("d"), "model", "D", (1, 1, 2))
+        self.cache.put(self._key("e"), "model", "E", (1, 1, 2))
+        self.assertEqual(3, len(self.cache))
+        self.assertEqual(2, self.cache.evicted_cnt)
+        self.assertIsNone(self.cache.get(self._key("b")))
+        self.assertIsNone(self.cache.get(self._key("c")))
+        for k in "ade":
+            self.assertEqual(k.upper(), self.cache.get(self._key(k))[0])
+
+    def test_modes(self) -> None:
+        self.assertTrue(self.cache.reusable(0))
+        self.assertFalse(self.cache.reusable(0.4))
+        self.assertTrue(self.cache.reusable(0.4, seed=0))
+        cache = ResponseCache(":memory:", "always")
+        self.addCleanup(cache.close)
+        self.assertTrue(cache.reusable(0.4))
+        self.assertTrue(cache.reusable(0))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,193 @@
+# Copyright ***** contributors.
+# Licensed under the Apache License, Version 2.0, see LICENSE for details.
+# SPDX-License-Identifier: Apache-2.0
+
+import random
+import threading
+import unittest
+from collections import OrderedDict
+from functools import lru_cache
+from typing import *
+from unittest import mock
+
+import tiktoken
+
+# Token counting of conversations, as billed by OpenAI chat models. Encoders are
+# resolved once per process, and the token count of each message content is
+# memoized, so that a conversation is only encoded as far as it is new: the
+# system prompt and the initial prompt are encoded once, not at every call.
+
+# (encoding name, content) -> number of tokens, in order of use, the least
+# recently used dropped beyond the bound. Shared by the LLMs of all dialogs, on
+# their threads. An OrderedDict rather than an lru_cache, so that contents
+# encoded in a batch can be added.
+_CONTENT_TOKENS: "OrderedDict[Tuple[str, str], int]" = OrderedDict()
+_CONTENT_TOKENS_BOUND = 100000
+_CONTENT_TOKENS_LOCK = threading.Lock()
+
+
+@lru_cache(maxsize=None)
+def get_encoding(model: str) -> tiktoken.Encoding:
+    try:
+        return tiktoken.encoding_for_model(model)
+    except KeyError:
+        print("Warning: model not found. Using cl100k_base encoding.")
+        return tiktoken.get_encoding("cl100k_base")
+
+
+# (tokens per message, tokens per name, model the count is based on)
+@lru_cache(maxsize=None)
+def _message_format(model: str) -> Tuple[int, int, str]:
+    if model in {
+        "gpt-3.5-turbo-0613",
+        "gpt-3.5-turbo-16k-0613",
+        "gpt-4-0314",
+        "gpt-4-32k-0314",
+        "gpt-4-0613",
+        "gpt-4-32k-0613",
+    }:
+        return 3, 1, model
+    elif model == "gpt-3.5-turbo-0301":
+        # every message follows <|start|>{role/name}\n{content}<|end|>\n, and
+        # if there's a name, the role is omitted
+        return 4, -1, model
+    elif "gpt-3.5-turbo" in model:
+        # print("Warning: gpt-3.5-turbo may update over time. Returning num tokens assuming gpt-3.5-turbo-0613.")
+        return _message_format("gpt-3.5-turbo-0613")
+    elif "gpt-4" in model:
+        # print("Warning: gpt-4 may update over time. Returning num tokens assuming gpt-4-0613.")
+        return _message_format("gpt-4-0613")
+    else:
+        raise NotImplementedError(
+            f"""num_tokens_from_messages() is not implemented for model {model}.
+            See https://github.com/openai/openai-python/blob/main/chatml.md for information on
+            how messages are converted to tokens."""
+        )
+
+
+def _memoized_tokens(key: Tuple[str, str]) -> Union[int, None]:
+    with _CONTENT_TOKENS_LOCK:
+        tokens = _CONTENT_TOKENS.get(key)
+        if tokens is not None:
+            _CONTENT_TOKENS.move_to_end(key)
+        return tokens
+
+
+def _memoize_tokens(key: Tuple[str, str], tokens: int):
+    with _CONTENT_TOKENS_LOCK:
+        _CONTENT_TOKENS[key] = tokens
+        _CONTENT_TOKENS.move_to_end(key)
+        while len(_CONTENT_TOKENS) > _CONTENT_TOKENS_BOUND:
+            _CONTENT_TOKENS.popitem(last=False)
+
+
+def _content_tokens(encoding: tiktoken.Encoding, content: str) -> int:
+    key = (encoding.name, content)
+    tokens = _memoized_tokens(key)
+    if tokens is None:
+        tokens = len(encoding.encode(content))
+        _memoize_tokens(key, tokens)
+    return tokens
+
+
+def num_tokens_from_messages(
+    messages: List[Dict[str, str]], model="gpt-3.5-turbo-0613"
+) -> int:
+    """Return the number of tokens used by a list of messages."""
+    tokens_per_message, tokens_per_name, model = _message_format(model)
+    encoding = get_encoding(model)
+    num_tokens = 0
+    for message in messages:
+        num_tokens += tokens_per_message
+        for key, value in message.items():
+            num_tokens += _content_tokens(encoding, value)
+            if key == "name":
+                num_tokens += tokens_per_name
+    num_tokens += 3  # every reply is primed with <|start|>assistant<|message|>
+    return num_tokens
+
+
+# Tokens of a piece of text, e.g. of a response received in parts
+def num_tokens_from_text(text: str, model="gpt-3.5-turbo-0613") -> int:
+    return _content_tokens(get_encoding(_message_format(model)[2]), text)
+
+
+# num_tokens_from_messages of many conversations, e.g. when recounting logs. The
+# contents not counted yet are encoded in one parallel batch.
+def num_tokens_from_conversations(
+    conversations: List[List[Dict[str, str]]],
+    model="gpt-3.5-turbo-0613",
+    num_threads: int = 8,
+) -> List[int]:
+    encoding = get_encoding(_message_format(model)[2])
+    new_contents = list(
+        {
+            value
+            for messages in conversations
+            for message in messages
+            for value in message.values()
+            if _memoized_tokens((encoding.name, value)) is None
+        }
+    )
+    for (content, tokens) in zip(
+        new_contents, encoding.encode_batch(new_contents, num_threads=num_threads)
+    ):
+        _memoize_tokens((encoding.name, content), len(tokens))
+    return [num_tokens_from_messages(messages, model) for messages in conversations]
+
+
+"""Tests"""
+
+
+# Conversations of random messages drawn from a few contents, so that many repeat
+def _random_conversations(rng: random.Random, cnt: int) -> List[List[Dict[str, str]]]:
+    words = ["stride", "0x1f", "-4", "\n", "bins", "hit", "of", "the", "detector"]
+    contents = [" ".join(rng.choices(words, k=rng.randint(0, 30))) for _ in range(40)]
+    return [
+        [
+            {"role": rng.choice(["system", "user", "assistant"]), "content": rng.choice(contents)}
+            for _ in range(rng.randint(1, 8))
+        ]
+        for _ in range(cnt)
+    ]
+
+
+def _uncached_tokens(messages: List[Dict[str, str]], model="gpt-3.5-turbo-0613") -> int:
+    tokens_per_message, tokens_per_name, model = _message_format(model)
+    encoding = get_encoding(model)
+    return 3 + sum(
+        tokens_per_message
+        + sum(len(encoding.encode(value)) for value in message.values())
+        + (tokens_per_name if "name" in message else 0)
+        for message in messages
+    )
+
+
+class TestTokenCounter(unittest.TestCase):
+    def setUp(self) -> None:
+        _CONTENT_TOKENS.clear()
+        self.addCleanup(_CONTENT_TOKENS.clear)
+
+    # counts of memoized contents are those of contents encoded anew, also once
+    # some were dropped
+    def test_memoized(self) -> None:
+        conversations = _random_conversations(random.Random(0), 50)
+        expected = [_uncached_tokens(messages) for messages in conversations]
+        for bound in [100000, 10]:
+            _CONTENT_TOKENS.clear()
+            with self.subTest(bound=bound), mock.patch(f"{__name__}._CONTENT_TOKENS_BOUND", bound):
+                self.assertEqual(expected, [num_tokens_from_messages(m) for m in conversations])
+                self.assertEqual(expected, [num_tokens_from_messages(m) for m in conversations])
+                self.assertLessEqual(len(_CONTENT_TOKENS), bound)
+                self.assertEqual(expected, num_tokens_from_conversations(conversations))
+
+    def test_least_recently_used(self) -> None:
+        with mock.patch(f"{__name__}._CONTENT_TOKENS_BOUND", 2):
+            for text in ["a", "b b", "a", "c c c"]:
+                num_tokens_from_text(text)
+        name = get_encoding("gpt-3.5-turbo-0613").name
+        self.assertEqual([(name, "a"), (name, "c c c")], list(_CONTENT_TOKENS))
+
+
+if __name__ == "__main__":
+    unittest.main()
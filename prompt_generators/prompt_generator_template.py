@@ -8,6 +8,17 @@ from abc import ABC
 
 BOUND = 523
 
+# Instructions written in assembly, assembled by AsmExtractor (see
+# ibex_cpu/assembler.py) instead of being encoded by the LLM
+ASM_FORMAT = (
+    "Output format: one RISC-V instruction in assembly per line, registers x0 to x31, e.g.\n"
+    "add x5, x6, x7\n"
+    "addi x5, x6, -12\n"
+    "lw x5, 8(x6)\n"
+    "sw x7, -4(x6)\n"
+    "jal x1, 16"
+)
+
 
 class TemplatePromptGenerator(BasePromptGenerator, ABC):
     def __init__(
@@ -43,6 +54,10 @@ class TemplatePromptGenerator(BasePromptGenerator, ABC):
         self.easy_cutoff = easy_cutoff
         self.few_shot = few_shot
 
+        # bins this generator asks for, when several dialogs split the missed
+        # bins between them (see agents/agent_multi_dialog.py); None for all
+        self.assigned_bins: Union[Set[str], None] = None
+
     def _resolve_sampling_method(self, sampling_missed_bins_method: Union[str, None]):
         methods = [
             "ORIGINAL",
@@ -151,12 +166,10 @@ class TemplatePromptGenerator(BasePromptGenerator, ABC):
 
         # calculate difference
         coverage_difference = ""
-        coverage_plan = coverage_database.get_coverage_plan()
-        missed_bins = list(
-            map(lambda p: p[0], filter(lambda p: p[1] == 0, coverage_plan.items()))
-        )
+        missed_bins = coverage_database.get_missed_bins()
         if len(missed_bins) == 0:
             pass
+        missed_bins = self._assigned_missed_bins(missed_bins)
         # Sampling missed bins
         if self.sampling_missed_bins:
             missed_bins = self.sampling_missed_bins_method(
@@ -166,7 +179,7 @@ class TemplatePromptGenerator(BasePromptGenerator, ABC):
         for bin_name in missed_bins:
             coverage_difference += self.coverage_difference_prompts_dict[bin_name]
 
-        iterative_prompt = self._load_result_summary(
+        iterative_prompt = self._load_extraction_errors(**kwargs) + self._load_result_summary(
             **kwargs
         ) + "------\n" "UNREACHED BINS\n" + coverage_difference + "------\n" + self._load_iter_question(
             **kwargs
@@ -175,6 +188,24 @@ class TemplatePromptGenerator(BasePromptGenerator, ABC):
         self.prev_coverage = cur_coverage
         return iterative_prompt
 
+    # Lines of the last response the extractor could not make stimuli of, e.g.
+    # instructions that failed to assemble
+    def _load_extraction_errors(self, **kwargs) -> str:
+        errors = kwargs.get("extraction_errors", [])
+        if len(errors) == 0:
+            return ""
+        return (
+            "These lines of your response could not be used:\n"
+            + "".join(f"- {error}\n" for error in errors)
+        )
+
+    # Missed bins among the assigned ones, or all of them once those are all hit
+    def _assigned_missed_bins(self, missed_bins: List[str]) -> List[str]:
+        if self.assigned_bins is None:
+            return missed_bins
+        assigned = [bin_name for bin_name in missed_bins if bin_name in self.assigned_bins]
+        return assigned if len(assigned) > 0 else missed_bins
+
     """Missed-bin sampling methods"""
 
     @staticmethod
@@ -394,3 +394,94 @@ class TemplatePromptGenerator4IC2(TemplatePromptGenerator4IC1):
                 f"and update addresses into diverse variety of operations. \n"
             )
         return prompt
+
+
+# Instructions in assembly instead of hexadecimal words, as many responses are
+# otherwise lost to invalid encodings
+class TemplatePromptGenerator4IC3(TemplatePromptGenerator4IC2):
+    def __init__(
+        self,
+        dut_code_path: str = "../examples_IC/dut_code.txt",
+        tb_code_path: str = "../examples_IC/tb_code.txt",
+        bin_descr_path: str = "../examples_IC/bins_description.txt",
+        code_summary_type: int = 0,  # 0: no code, 1: code, 2: summary
+        sampling_missed_bins_method: Union[str, None] = None,
+        easy_cutoff: int = 100,
+        few_shot: int = 0
+    ):
+        # instructions are loaded at incrementing addresses only
+        assert increment_address, "Assembly output needs increment_address"
+        super().__init__(
+            dut_code_path,
+            tb_code_path,
+            bin_descr_path,
+            code_summary_type,
+            sampling_missed_bins_method,
+            easy_cutoff,
+            few_shot
+        )
+
+    def generate_system_prompt(self) -> str:
+        return (
+            f"Please output a list of RISC-V instructions in assembly only. \n"
+            f"Do not give any explanations. \n"
+            f"{ASM_FORMAT}"
+        )
+
+    def generate_initial_prompt(self, **kwargs) -> str:
+        with open(self.bin_descr_path, "r") as f:
+            bins_description = f.read()
+        prompt = (
+            f"We are working with a CPU capable of executing RISC-V instructions. "
+            f"Our objective is to load a sequence of instructions into the CPU's instruction "
+            f"memory. The goal is to ensure that, when the CPU resumes executing instructions "
+            f"from the current PC, it covers the bins (i.e. test cases) that are of interest to us. \n"
+            f"Here's the description of the bins that are of interest to us:\n"
+            "------\n"
+            "BINS DESCRIPTION\n"
+            f"{bins_description}"
+            "------\n"
+        )
+        prompt += self._load_examples()
+        prompt += (
+            f"Following the bins description, generate a list, which can be empty if "
+            f"necessary, of instructions in RISC-V assembly "
+            f"to update the CPU's memory, ensuring it covers the specified bins upon resuming "
+            f"execution from the current PC. Only use R-type operations, SB, SH, SW and JAL. "
+            f"We encourage you to use a diverse variety of operations. \n"
+        )
+        return prompt
+
+    def _load_examples(self) -> str:
+        if(self.few_shot == 1):
+            examples = (
+                f"Here are a few examples:\n"
+                f"- add x20, x3, x7 => add_seen covered\n"
+                f"- jal x0, -4 => jal_seen, jal_br_backwards, jal_zero_dst covered\n"
+                f"- sll x5, x5, x0 => sll_seen, sll_zero_src covered\n"
+                f"- sw x15, 5(x15) => sw_seen, sw_same_src covered\n"
+                f"- sh x1, 0(x0) => sh_seen, sh_zero_src covered\n"
+                f"- sltu x3, x1, x2 followed by xor x4, x3, x5 => sltu_seen, xor_seen, sltu->xor_raw_hazard covered\n"
+                f"- jal x1, 8 followed by sw x1, 0(x2) => jal_seen, jal_br_forwards, sw_seen, jal->sw_raw_hazard covered\n"
+                f"------\n"
+            )
+        else:
+            examples = ""
+        return examples
+
+    def _load_result_summary(self, **kwargs) -> str:
+        if not kwargs["response_invalid"]:
+            return super()._load_result_summary(**kwargs)
+        return (
+            "Your response doesn't answer my query. \n"
+            "Please generate a list of RISC-V instructions in assembly. \n"
+            f"{ASM_FORMAT}\n"
+            f"Here are {'some of ' if self.sampling_missed_bins else ''}the unreached bins:\n"
+        )
+
+    def _load_iter_question(self, **kwargs) -> str:
+        return (
+            f"Please generate a list, which can be empty if necessary, of "
+            f"instructions in RISC-V assembly, one per line. Only use R-type "
+            f"operations, SB, SH, SW and JAL.\n"
+        )
@@ -283,3 +283,88 @@ class TemplatePromptGenerator4ID3(TemplatePromptGenerator4ID2):
                 "according to the BINS DESCRIPTION."
             )
         return iter_question
+
+
+# Instructions in assembly instead of hexadecimal words, as many responses are
+# otherwise lost to invalid encodings
+class TemplatePromptGenerator4ID4(TemplatePromptGenerator4ID1):
+    def __init__(
+        self,
+        dut_code_path: str = "../examples_ID/dut_code.txt",
+        tb_code_path: str = "../examples_ID/tb_code.txt",
+        bin_descr_path: str = "../examples_ID/bins_description.txt",
+        code_summary_type: int = 0,  # 0: no code, 1: code, 2: summary
+        sampling_missed_bins_method: Union[str, None] = None,
+        easy_cutoff: int = 100,
+        few_shot: int = 0
+    ):
+        super().__init__(
+            dut_code_path,
+            tb_code_path,
+            bin_descr_path,
+            code_summary_type,
+            sampling_missed_bins_method,
+            easy_cutoff,
+            few_shot
+        )
+
+    def generate_system_prompt(self) -> str:
+        return (
+            "Please output a list of RISC-V instructions in assembly only. \n"
+            f"Do not give any explanations, or any other text, like apologise.\n"
+            f"{ASM_FORMAT}"
+        )
+
+    def _load_introduction(self) -> str:
+        if self.code_summary_type == 0:
+            return (
+                "You will receive a description of bins (i.e. test cases) of a testbench for "
+                "a hardware device under test (DUT), which is a RISC-V instruction decoder. "
+                "Then, you are going to generate a list of RISC-V instructions in assembly "
+                "to cover these test cases.\n"
+            )
+        return super()._load_introduction()
+
+    def _load_examples(self) -> str:
+        if(self.few_shot == 1):
+            examples = (
+                f"Here are a few examples:\n"
+                f"- xori x9, x4, 1049 => read_A_reg_4, write_reg_9, XORI, XORI_x_read_A_reg_4, XORI_x_write_reg_9 covered\n"
+                f"- addi x17, x2, 21 => read_A_reg_2, write_reg_17, ADDI, ADDI_x_read_A_reg_2, ADDI_x_write_reg_17 covered\n"
+                f"- sub x16, x15, x11 => read_A_reg_15, read_B_reg_11, write_reg_16, SUB, SUB_x_read_A_reg_15, SUB_x_read_B_reg_11, SUB_x_write_reg_16 covered\n"
+                f"- and x23, x2, x4 => read_A_reg_2, read_B_reg_4, write_reg_23, AND, AND_x_read_A_reg_2, AND_x_read_B_reg_4, AND_x_write_reg_23 covered\n"
+                f"- lb x5, 1(x1) => read_A_reg_1, write_reg_5, LB, LB_x_read_A_reg_1, LB_x_write_reg_5 covered\n"
+                f"- sltiu x3, x3, 11 => read_A_reg_3, write_reg_3, SLTUI, SLTUI_x_read_A_reg_3, SLTUI_x_write_reg_3 covered\n"
+                f"- sra x21, x18, x10 => read_A_reg_18, read_B_reg_10, write_reg_21, SRA, SRA_x_read_A_reg_18, SRA_x_read_B_reg_10, SRA_x_write_reg_21 covered\n"
+                f"------\n"
+            )
+        else:
+            examples = ""
+        return examples
+
+    def _load_init_question(self) -> str:
+        init_question = (
+            "Following the bins description"
+            + (", and refer to the programs" if self.code_summary_type != 0 else "")
+            + ", generate a list of RISC-V instructions in assembly, one per line, "
+            "which covers the described bins as much as you can.\n"
+        )
+        return init_question
+
+    def _load_result_summary(self, **kwargs) -> str:
+        if not kwargs["response_invalid"]:
+            return super()._load_result_summary(**kwargs)
+        return (
+            "Your response doesn't answer my query. \n"
+            "Please generate a list of RISC-V instructions in assembly. \n"
+            f"{ASM_FORMAT}\n"
+            f"Here are {'some of ' if self.sampling_missed_bins else ''}the unreached bins:\n"
+        )
+
+    def _load_iter_question(self, **kwargs) -> str:
+        if kwargs["response_invalid"]:
+            return "Please generate a list of RISC-V instructions in assembly, one per line."
+        return (
+            "Please regenerate an instruction in assembly for each of these unreached bins "
+            "according to the BINS DESCRIPTION."
+        )
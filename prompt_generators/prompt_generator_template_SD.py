@@ -6,6 +6,23 @@ from prompt_generators.prompt_generator_template import *
 
 BOUND = 523
 
+# Constructs of StrideDSLExtractor (see stimuli_extractor.py), which spare the
+# LLM from spelling out each integer of a stride pattern
+DSL_FORMAT = (
+    "Instead of spelling out the integers, you may write them with these constructs, "
+    "which are expanded for you:\n"
+    "- range(start, stride, count): count integers from start, stride apart, "
+    "e.g. range(-15, 1, 18) is [-15, -14, -13, ..., 2]\n"
+    "- alt(start, s1, s2, count): count integers from start, with strides s1 and s2 in turn, "
+    "e.g. alt(-15, -1, 2, 18) is [-15, -16, -14, -15, -13, ..., -8]\n"
+    "- repeat(seq, n): seq n times, seq being a construct or a list, "
+    "e.g. repeat([1, 5, 4], 2) is [1, 5, 4, 1, 5, 4]\n"
+    "Output format: one construct or list per line, e.g.\n"
+    "range(-15, 1, 18)\n"
+    "[1, 5, 4, -11, -12, 5]\n"
+    "alt(0, 3, -5, 18)"
+)
+
 
 class TemplatePromptGenerator4SD1(TemplatePromptGenerator):
     def __init__(
@@ -16,8 +33,10 @@ class TemplatePromptGenerator4SD1(TemplatePromptGenerator):
         code_summary_type: int = 0,  # 0: no code, 1: code, 2: summary
         sampling_missed_bins_method: Union[str, None] = None,
         easy_cutoff: int = 100,
-        few_shot: int = 0
+        few_shot: int = 0,
+        stimulus_dsl: bool = False,  # teach the constructs of DSL_FORMAT
     ):
+        self.stimulus_dsl = stimulus_dsl
         super().__init__(
             dut_code_path,
             tb_code_path,
@@ -32,9 +51,15 @@ class TemplatePromptGenerator4SD1(TemplatePromptGenerator):
         return (
             "Please output a list of (positive or negative) integers only, "
             f"each integer between -{BOUND} and {BOUND}. \n"
-            f"Output format: [a, b, c, ...]."
+            + (DSL_FORMAT if self.stimulus_dsl else "Output format: [a, b, c, ...].")
         )
 
+    # the end of "Please generate a list of integers between ..."
+    def _output_format(self) -> str:
+        if self.stimulus_dsl:
+            return ".\n" + DSL_FORMAT
+        return ", with output format: [a, b, c, ...]."
+
     def _load_introduction(self) -> str:
         if self.code_summary_type == 1:
             return (
@@ -93,7 +118,16 @@ class TemplatePromptGenerator4SD1(TemplatePromptGenerator):
         return tb_summary
     
     def _load_examples(self) -> str:
-        if(self.few_shot == 1):
+        if self.few_shot == 1 and self.stimulus_dsl:
+            examples = (
+                f"Here are a few examples:\n"
+                f"- range(-15, 1, 18) => single_2 covered\n"
+                f"- alt(-15, -1, 2, 18) => double_-1_2 covered\n"
+                f"- [1, 5, 4, -11, -12, 5, 11, 0, -1, -2, -1, -1, -9, -13, -8, -9, -7, -8] range(0, 3, 18) => no_stride_to_single covered\n"
+                f"- range(0, 20, 18) => single_stride_p_overflow covered\n"
+                f"------\n"
+            )
+        elif(self.few_shot == 1):
             examples = (
                 f"Here are a few examples:\n"
                 f"- [-15, -14, -13, -12, -11, -10, -9, -8, -7, -6, -5, -4, -3, -2, -1, 0, 1, 2] => single_2 covered\n"
@@ -119,8 +153,8 @@ class TemplatePromptGenerator4SD1(TemplatePromptGenerator):
         if kwargs["response_invalid"]:
             result_summary = (
                 "Your response doesn't answer my query. \n"
-                f"Please generate a list of integers between -{BOUND} and {BOUND}, "
-                "with output format: [a, b, c, ...].\n"
+                f"Please generate a list of integers between -{BOUND} and {BOUND}"
+                + self._output_format() + "\n"
                 f"Here are {'some of ' if self.sampling_missed_bins else ''}the unreached bins:\n"
             )
 
@@ -180,8 +214,8 @@ class TemplatePromptGenerator4SD1(TemplatePromptGenerator):
     def _load_iter_question(self, **kwargs) -> str:
         if kwargs["response_invalid"]:
             iter_question = (
-                f"Please generate a list of integers between -{BOUND} and {BOUND}, "
-                "with output format: [a, b, c, ...]."
+                f"Please generate a list of integers between -{BOUND} and {BOUND}"
+                + self._output_format()
             )
         else:
             iter_question = (
@@ -434,12 +468,10 @@ class TemplatePromptGenerator4SDAnalog(TemplatePromptGenerator):
 
         # calculate difference
         coverage_difference = ""
-        coverage_plan = coverage_database.get_coverage_plan()
-        missed_bins = list(
-            map(lambda p: p[0], filter(lambda p: p[1] == 0, coverage_plan.items()))
-        )
+        missed_bins = coverage_database.get_missed_bins()
         if len(missed_bins) == 0:
             pass
+        missed_bins = self._assigned_missed_bins(missed_bins)
         # Sampling missed bins
         if self.sampling_missed_bins:
             missed_bins = self.sampling_missed_bins_method(
@@ -0,0 +1,12 @@
+# Copyright ***** contributors.
+# Licensed under the Apache License, Version 2.0, see LICENSE for details.
+# SPDX-License-Identifier: Apache-2.0
+
+from shared_helpers.dut_registry import *
+from sdram_controller.shared_types import CoverageDatabase, DUTState
+
+# Registers the SDRAM controller's types with GlobalCoverageDatabase and GlobalDUTState
+
+# TODO: Prioritise harder bins?
+register_coverage(CoverageDatabase, misc_bins)
+register_dut_state(DUTState)
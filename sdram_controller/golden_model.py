@@ -0,0 +1,204 @@
+# Copyright ***** contributors.
+# Licensed under the Apache License, Version 2.0, see LICENSE for details.
+# SPDX-License-Identifier: Apache-2.0
+
+import random
+
+from sdram_controller.shared_types import *
+
+# Pure Python golden model of the state machine of src/sdram_controller.sv and
+# its testbench, served in-process for golden:// addresses (see
+# shared_helpers/local_transport.py). It is meant to be cycle accurate: stimuli
+# are driven over the same clock cycles as in sdram_controller_cocotb.py, and
+# every rising edge the issued command is sampled like check_hits does. The
+# address and data paths are not modelled as no bin depends on them. It has not
+# been checked against an RTL trace yet; record one with
+# shared_helpers/golden_conformance.py.
+
+IDLE = 0b00000
+
+INIT_NOP1 = 0b01000
+INIT_PRE1 = 0b01001
+INIT_NOP1_1 = 0b00101
+INIT_REF1 = 0b01010
+INIT_NOP2 = 0b01011
+INIT_REF2 = 0b01100
+INIT_NOP3 = 0b01101
+INIT_LOAD = 0b01110
+INIT_NOP4 = 0b01111
+
+REF_PRE = 0b00001
+REF_NOP1 = 0b00010
+REF_REF = 0b00011
+REF_NOP2 = 0b00100
+
+READ_ACT = 0b10000
+READ_NOP1 = 0b10001
+READ_CAS = 0b10010
+READ_NOP2 = 0b10011
+READ_READ = 0b10100
+
+WRIT_ACT = 0b11000
+WRIT_NOP1 = 0b11001
+WRIT_CAS = 0b11010
+WRIT_NOP2 = 0b11011
+
+# {clock_enable, cs_n, ras_n, cas_n, we_n, bank/A10 bits}, x bits as 0
+CMD_PALL = 0b10010001
+CMD_REF = 0b10001000
+CMD_NOP = 0b10111000
+CMD_MRS = 0b10000000
+CMD_BACT = 0b10011000
+CMD_READ = 0b10101001
+CMD_WRIT = 0b10100001
+
+CLK_FREQUENCY = 133
+REFRESH_TIME = 32
+REFRESH_COUNT = 8192
+CYCLES_BETWEEN_REFRESH = (CLK_FREQUENCY * 1_000 * REFRESH_TIME) // REFRESH_COUNT
+
+# state -> (next state, command, state_cnt_nxt) once state_cnt has run out,
+# states not listed go back to IDLE
+TRANSITIONS = {
+    INIT_NOP1: (INIT_PRE1, CMD_PALL, 0),
+    INIT_PRE1: (INIT_NOP1_1, CMD_NOP, 0),
+    INIT_NOP1_1: (INIT_REF1, CMD_REF, 0),
+    INIT_REF1: (INIT_NOP2, CMD_NOP, 7),
+    INIT_NOP2: (INIT_REF2, CMD_REF, 0),
+    INIT_REF2: (INIT_NOP3, CMD_NOP, 7),
+    INIT_NOP3: (INIT_LOAD, CMD_MRS, 0),
+    INIT_LOAD: (INIT_NOP4, CMD_NOP, 1),
+    REF_PRE: (REF_NOP1, CMD_NOP, 0),
+    REF_NOP1: (REF_REF, CMD_REF, 0),
+    REF_REF: (REF_NOP2, CMD_NOP, 7),
+    WRIT_ACT: (WRIT_NOP1, CMD_NOP, 1),
+    WRIT_NOP1: (WRIT_CAS, CMD_WRIT, 0),
+    WRIT_CAS: (WRIT_NOP2, CMD_NOP, 1),
+    READ_ACT: (READ_NOP1, CMD_NOP, 1),
+    READ_NOP1: (READ_CAS, CMD_READ, 0),
+    READ_CAS: (READ_NOP2, CMD_NOP, 1),
+    READ_NOP2: (READ_READ, CMD_NOP, 0),
+}
+
+
+class SdramControllerModel:
+    def __init__(self):
+        self.coverage_database = CoverageDatabase()
+        self.coverage_database.misc_bins = {
+            "precharge": 0,
+            "auto_refresh": 0,
+            "command_inhibit": 0,
+            "load_mode_register": 0,
+            "activate": 0,
+            "read": 0,
+            "write": 0,
+        }
+
+        self.rst_n = 1
+        self.wr_enable = 0
+        self.rd_enable = 0
+
+        # registers after the testbench's reset
+        self.state = INIT_NOP1
+        self.command = CMD_NOP
+        self.state_cnt = 0xF
+        self.refresh_cnt = 0
+        self.busy = 0
+
+    # Drives a single stimulus, returns the reply to it and whether it ends the simulation
+    async def handle_stimulus(self, stimulus_obj):
+        dut_state = DUTState()
+        wr_enable = stimulus_obj.value[0]
+        rd_enable = stimulus_obj.value[1]
+        reset = stimulus_obj.value[2]
+
+        while self.state_cnt != 0:
+            self.clock()
+
+        if reset:
+            reset_cycles = 3
+            self.rst_n = 0
+        else:
+            reset_cycles = -1
+            self.rst_n = 1
+
+        self.wr_enable = int(wr_enable) & 1
+        self.rd_enable = int(rd_enable) & 1
+
+        self.clock()
+        while self.busy or reset_cycles > 0:
+            self.clock()
+            reset_cycles -= 1
+        self.rst_n = 1
+
+        return (dut_state, self.coverage_database), stimulus_obj.finish
+
+    # One rising clock edge, followed by the testbench's check of the command
+    def clock(self):
+        if not self.rst_n:
+            self.state = INIT_NOP1
+            self.command = CMD_NOP
+            self.state_cnt = 0xF
+            self.busy = 0
+            self.refresh_cnt = 0
+        else:
+            next_state, command_nxt, state_cnt_nxt = self.next_state()
+
+            self.refresh_cnt = 0 if self.state == REF_NOP2 else (self.refresh_cnt + 1) & 0x3FF
+            self.state_cnt = state_cnt_nxt if self.state_cnt == 0 else self.state_cnt - 1
+            self.busy = self.state >> 4
+            self.state = next_state
+            self.command = command_nxt
+
+        self.check_hits()
+
+    def next_state(self):
+        if self.state == IDLE:
+            if self.refresh_cnt >= CYCLES_BETWEEN_REFRESH:
+                return REF_PRE, CMD_PALL, 0
+            if self.rd_enable:
+                return READ_ACT, CMD_BACT, 0
+            if self.wr_enable:
+                return WRIT_ACT, CMD_BACT, 0
+            return IDLE, CMD_NOP, 0
+
+        if self.state_cnt == 0:
+            return TRANSITIONS.get(self.state, (IDLE, CMD_NOP, 0))
+        return self.state, self.command, 0
+
+    def check_hits(self):
+        cs = (self.command >> 6) & 1
+        ras = (self.command >> 5) & 1
+        cas = (self.command >> 4) & 1
+        we = (self.command >> 3) & 1
+        bins = self.coverage_database.misc_bins
+
+        if not cs and not ras and cas and not we:
+            bins["precharge"] += 1
+        if not cs and not ras and not cas and we:
+            bins["auto_refresh"] += 1
+        if not cs and ras and cas and we:
+            bins["command_inhibit"] += 1
+        if not cs and not ras and not cas and not we:
+            bins["load_mode_register"] += 1
+        if not cs and not ras and cas and we:
+            bins["activate"] += 1
+        if not cs and ras and not cas and we:
+            bins["read"] += 1
+        if not cs and ras and not cas and not we:
+            bins["write"] += 1
+
+
+GOLDEN_MODEL = SdramControllerModel
+
+
+# Stimulus for recording conformance traces, as RandomAgent4SDRAM generates it
+# but with resets kept rare enough for refreshes to happen
+def random_stimulus(rng: random.Random, length: int):
+    return [
+        Stimulus(
+            value=[rng.getrandbits(1), rng.getrandbits(1), int(rng.random() < 0.02)],
+            finish=False,
+        )
+        for _ in range(length)
+    ]
@@ -49,45 +49,47 @@ class SimulationController:
     # Handles driving a new_value when one is provided by `determine_next_value`
     async def controller_loop(self):
         await cocotb.start(async_check_hits(self))
-        with self.zmq_context.socket(zmq.REP) as socket:
-            socket.bind(self.zmq_addr)
-
-            while True:
-                stimulus_msg = socket.recv()
-                stimulus_obj = pickle.loads(stimulus_msg)
-                print(stimulus_obj)
-
-                dut_state = self.sample_dut_state()
-                wr_enable = stimulus_obj.value[0]
-                rd_enable = stimulus_obj.value[1]
-                reset = stimulus_obj.value[2]
-
-                while (self.dut.state_cnt.value != 0):
-                    await ClockCycles(self.dut.clk, 1)
-
-                if(reset):
-                    reset_cycles = 3
-                    self.dut.rst_n.value = 0
-                    print("RESET")
-                else:
-                    reset_cycles = -1
-                    self.dut.rst_n.value = 1
-
-                self.dut.wr_enable.value = wr_enable
-                self.dut.rd_enable.value = rd_enable
-
-                print(self.dut.state.value)
-                await ClockCycles(self.dut.clk, 1)
-                while(self.dut.busy.value or reset_cycles > 0):
-                    await ClockCycles(self.dut.clk, 1)
-                    reset_cycles -= 1
-                self.dut.rst_n.value = 1
-
-                socket.send_pyobj((dut_state, self.coverage_monitor.coverage_database))
-
-                if stimulus_obj.finish:
-                    self.end_simulation_event.set()
-                    break
+        with open_server_socket(self.zmq_context, self.zmq_addr) as socket:
+
+            await serve_stimuli(
+                socket,
+                self.handle_stimulus,
+                lambda: self.coverage_monitor.coverage_database,
+                WIRE_TYPES,
+            )
+            self.end_simulation_event.set()
+
+    # Drives a single stimulus, returns the reply to it and whether it ends the simulation
+    async def handle_stimulus(self, stimulus_obj):
+        print(stimulus_obj)
+
+        dut_state = self.sample_dut_state()
+        wr_enable = stimulus_obj.value[0]
+        rd_enable = stimulus_obj.value[1]
+        reset = stimulus_obj.value[2]
+
+        while (self.dut.state_cnt.value != 0):
+            await ClockCycles(self.dut.clk, 1)
+
+        if(reset):
+            reset_cycles = 3
+            self.dut.rst_n.value = 0
+            print("RESET")
+        else:
+            reset_cycles = -1
+            self.dut.rst_n.value = 1
+
+        self.dut.wr_enable.value = wr_enable
+        self.dut.rd_enable.value = rd_enable
+
+        print(self.dut.state.value)
+        await ClockCycles(self.dut.clk, 1)
+        while(self.dut.busy.value or reset_cycles > 0):
+            await ClockCycles(self.dut.clk, 1)
+            reset_cycles -= 1
+        self.dut.rst_n.value = 1
+
+        return (dut_state, self.coverage_monitor.coverage_database), stimulus_obj.finish
     
     def check_hits(self):
         cs = self.dut.cs_n.value
@@ -131,7 +133,7 @@ async def basic_test(dut):
     from global_shared_types import GlobalCoverageDatabase
 
     # server_port = "5555"
-    server_port = input("Please enter server's port (e.g. 5050, 5555): ")
+    server_port = ask_server_port("Please enter server's port (e.g. 5050, 5555) or shm://name: ")
 
     trial_cnt = 0
 
@@ -144,7 +146,7 @@ async def basic_test(dut):
         await do_reset(dut.rst_n, dut.clk, 3)
 
         with closing(
-            SimulationController(dut, coverage_monitor, f"tcp://*:{server_port}")
+            SimulationController(dut, coverage_monitor, server_address(server_port))
         ) as simulation_controller:
             simulation_controller.run_controller()
 
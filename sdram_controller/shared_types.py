@@ -15,6 +15,10 @@ class DUTState:
 class CoverageDatabase:
     misc_bins: dict[str, int]
 
+# Types sent over the binary wire format (shared_helpers/wire_format.py), the
+# coverage database first. The position of a type is its id on the wire.
+WIRE_TYPES = [CoverageDatabase, Stimulus, DUTState]
+
 
 """
 BIN LIST:
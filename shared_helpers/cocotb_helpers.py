@@ -1,6 +1,7 @@
 import math
 from cocotb.triggers import ClockCycles
 import time
+from shared_helpers.stimulus_server import *
 #================================================================
 # drive an input that is a SV struct
 def assemble_payload_from_struct(variables):
@@ -0,0 +1,107 @@
+# Copyright ***** contributors.
+# Licensed under the Apache License, Version 2.0, see LICENSE for details.
+# SPDX-License-Identifier: Apache-2.0
+
+import unittest
+from typing import *
+
+from global_shared_types import GlobalCoverageDatabase
+
+# Attribution of the bins hit during a run to the stimuli that first hit them,
+# from the per-stimulus coverage deltas of stimulus batches (see BatchReply in
+# sim_protocol.py). Each stimulus an agent hands out may come with its origin,
+# (agent, key, value), key being e.g. (dialog, message, index in the response)
+# for an LLMAgent; the bins a stimulus newly hits are recorded into the table of
+# the agent it came from, see LLMAgent.record_attribution.
+#
+# Every batch sent since the simulators started must be attributed, in the
+# order their replies are received, including the stimuli without an origin:
+# their bins are not credited to anyone, but they are not new to later
+# stimuli either. With several simulators, batches running at the same time on
+# different simulators are credited in the order they complete.
+
+
+class CoverageAttributor:
+    def __init__(self):
+        # counter paths hit so far
+        self.hit_paths: Set[tuple] = set()
+        self.attributed_cnt = 0
+
+    # `origins` are those of the stimuli of a batch, in order, None for a stimulus
+    # no agent answers for
+    def attribute(
+        self,
+        origins: List[Union[tuple, None]],
+        coverage_deltas: List[Dict[tuple, int]],
+        coverage_database: GlobalCoverageDatabase,
+    ):
+        for (origin, delta) in zip(origins, coverage_deltas):
+            new_paths = [
+                path for (path, cnt) in delta.items() if cnt > 0 and path not in self.hit_paths
+            ]
+            if len(new_paths) == 0:
+                continue
+            self.hit_paths.update(new_paths)
+            if origin is None:
+                continue
+
+            # counters shown in no bin are not credited
+            layout = coverage_database.get_layout()
+            new_bins = [
+                layout.names[layout.path_index[path]]
+                for path in new_paths
+                if path in layout.path_index
+            ]
+            if len(new_bins) > 0:
+                agent, key, value = origin
+                agent.record_attribution(key, value, new_bins)
+                self.attributed_cnt += len(new_bins)
+
+
+"""Tests"""
+
+
+# Records what it is credited with, as LLMAgent.record_attribution
+class _Agent:
+    def __init__(self):
+        self.attribution = []
+
+    def record_attribution(self, key, value, new_bins: List[str]):
+        self.attribution.append((key, value, new_bins))
+
+
+class TestCoverageAttributor(unittest.TestCase):
+    def test_attribute(self) -> None:
+        from global_shared_types import _Coverage, _coverage_bins
+        from shared_helpers.dut_registry import register_coverage
+
+        register_coverage(_Coverage, _coverage_bins)
+        db = GlobalCoverageDatabase(
+            _Coverage({"m0": 0, "m1": 0, "m2": 0}, {"c0": [0, 0]}, hidden=0)
+        )
+        (a, b) = (_Agent(), _Agent())
+        attributor = CoverageAttributor()
+
+        m0, m1, m2, c0_1 = (
+            ("misc_bins", "m0"), ("misc_bins", "m1"), ("misc_bins", "m2"), ("cross", "c0", 1)
+        )
+        attributor.attribute(
+            [(a, (1, 1, 0), 5), None, (b, (1, 2, 0), 6)],
+            [{m0: 1, ("hidden",): 1}, {m1: 1}, {m0: 2, m1: 1, c0_1: 1, m2: 0}],
+            db,
+        )
+        # a bin is credited to the first stimulus hitting it, if it has an origin,
+        # and counters shown in no bin are not credited
+        self.assertEqual([((1, 1, 0), 5, ["m0"])], a.attribution)
+        self.assertEqual([((1, 2, 0), 6, ["c0_x_1"])], b.attribution)
+
+        # batches are attributed in turn
+        attributor.attribute([(a, (1, 3, 1), 7), (b, (1, 3, 2), 8)], [{m1: 3}, {m2: 1}], db)
+        self.assertEqual(1, len(a.attribution))
+        self.assertEqual(((1, 3, 2), 8, ["m2"]), b.attribution[-1])
+        self.assertEqual(3, attributor.attributed_cnt)
+        self.assertEqual({m0, m1, m2, c0_1, ("hidden",)}, attributor.hit_paths)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,331 @@
+# Copyright ***** contributors.
+# Licensed under the Apache License, Version 2.0, see LICENSE for details.
+# SPDX-License-Identifier: Apache-2.0
+
+# On-disk coverage of a whole campaign of one DUT, summed over every trial, run,
+# seed and configuration recorded into it. Runs, also in parallel processes,
+# merge their coverage deltas into the store, which then tells which bins no run
+# has hit yet, and which run and message hit a bin first.
+#
+# A store is a directory of:
+#   bins.txt       the bin names, in the order of the CoverageLayout the store
+#                  was created with, followed by those of any later layouts,
+#                  e.g. cross bins created as new ops are seen
+#   counts.npy     hits of each bin, summed over all runs
+#   first_run.npy  id of the run that hit each bin first, -1 if none has
+#   first_msg.npy  LLM message count of that run when it did
+#   runs.txt       id and label of each run, one per line
+#   lock           taken by every merge, and by snapshots
+# The arrays are memory mapped, so merges and queries do not read whole files.
+# New bins are added by writing the store again, under the lock; the other
+# processes open it again at their next merge or query.
+#
+# Report the closure of a store from the repository root:
+#   python -m shared_helpers.coverage_store coverage_store/stride_detector [--first BIN]
+
+import argparse
+import fcntl
+import os
+import shutil
+import tempfile
+import unittest
+from contextlib import contextmanager
+from typing import *
+
+import numpy as np
+
+from global_shared_types import CoverageLayout, GlobalCoverageDatabase
+
+ARRAYS = ["counts", "first_run", "first_msg"]
+
+
+class CoverageStore:
+    # `names` are needed to create the store, and added to an existing one
+    def __init__(self, directory: str, names: Union[List[str], None] = None):
+        self.directory = directory
+        os.makedirs(directory, exist_ok=True)
+        self.lock_file = open(self._path("lock"), "a")
+        self.names: List[str] = []
+        self.bins_size = -1
+
+        with self._locked(fcntl.LOCK_EX):
+            if not os.path.exists(self._path("bins.txt")):
+                if names is None:
+                    raise FileNotFoundError(f"No coverage store in {directory}")
+                self._write([], names)
+            self._load()
+            if names is not None:
+                self._add_bins(names)
+
+    def _path(self, name: str) -> str:
+        return os.path.join(self.directory, name)
+
+    # Writes the store with the bins `names` added after the `names` it holds,
+    # which are first opened again if another process added bins
+    def _write(self, old_names: List[str], names: List[str]):
+        new_names = [k for k in dict.fromkeys(names) if k not in set(old_names)]
+        for name in ARRAYS:
+            fill = 0 if name == "counts" else -1
+            new = np.full(len(new_names), fill, dtype=np.int64)
+            if len(old_names) > 0:
+                new = np.concatenate([getattr(self, name), new])
+            np.save(self._path(f"{name}.tmp.npy"), new)
+            os.replace(self._path(f"{name}.tmp.npy"), self._path(f"{name}.npy"))
+        open(self._path("runs.txt"), "a").close()
+        # written last, as it marks the store as created, or its bins as added
+        with open(self._path("bins.txt.tmp"), "w") as f:
+            f.write("".join(f"{k}\n" for k in old_names + new_names))
+        os.replace(self._path("bins.txt.tmp"), self._path("bins.txt"))
+
+    # Opens the store again if bins were added since it was last opened, under
+    # the lock
+    def _load(self):
+        if os.path.getsize(self._path("bins.txt")) == self.bins_size:
+            return
+        with open(self._path("bins.txt")) as f:
+            self.names = f.read().splitlines()
+        self.bins_size = os.path.getsize(self._path("bins.txt"))
+        self.index = {k: i for (i, k) in enumerate(self.names)}
+
+        self.counts = np.load(self._path("counts.npy"), mmap_mode="r+")
+        self.first_run = np.load(self._path("first_run.npy"), mmap_mode="r+")
+        self.first_msg = np.load(self._path("first_msg.npy"), mmap_mode="r+")
+
+    def _add_bins(self, names: List[str]):
+        if all(k in self.index for k in names):
+            return
+        self._write(self.names, names)
+        self._load()
+
+    # Adds the bins of `names` the store does not hold yet, after the others
+    def add_bins(self, names: List[str]):
+        with self._locked(fcntl.LOCK_EX):
+            self._load()
+            self._add_bins(names)
+
+    @contextmanager
+    def _locked(self, operation):
+        fcntl.flock(self.lock_file, operation)
+        try:
+            yield
+        finally:
+            fcntl.flock(self.lock_file, fcntl.LOCK_UN)
+
+    # Registers a run, returns its id
+    def start_run(self, label: str) -> int:
+        with self._locked(fcntl.LOCK_EX):
+            run = len(self.runs())
+            with open(self._path("runs.txt"), "a") as f:
+                f.write(f"{run}\t{label}\n")
+        return run
+
+    def runs(self) -> List[str]:
+        with open(self._path("runs.txt")) as f:
+            return [line.split("\t", 1)[1] for line in f.read().splitlines()]
+
+    # Adds the hits of `delta`, as made by run `run` at its LLM message
+    # `message`. `delta` is a vector in bin order, or of the bins at the indices
+    # `bins`.
+    def merge(
+        self,
+        delta: np.ndarray,
+        run: int,
+        message: int = -1,
+        bins: Union[np.ndarray, None] = None,
+    ):
+        with self._locked(fcntl.LOCK_EX):
+            self._load()
+            if bins is None:
+                self.counts += delta
+            else:
+                self.counts[bins] += delta
+            first_hits = (self.first_run < 0) & (self.counts > 0)
+            self.first_run[first_hits] = run
+            self.first_msg[first_hits] = message
+            self.counts.flush()
+            self.first_run.flush()
+            self.first_msg.flush()
+
+    def get_coverage_vector(self) -> np.ndarray:
+        with self._locked(fcntl.LOCK_SH):
+            self._load()
+            return np.array(self.counts)
+
+    def get_coverage_rate(self) -> Tuple[int, int]:
+        counts = self.get_coverage_vector()
+        return int(np.count_nonzero(counts > 0)), len(counts)
+
+    # Bins not hit by any run
+    def never_hit(self) -> List[str]:
+        counts = self.get_coverage_vector()
+        return [self.names[i] for i in np.flatnonzero(counts <= 0)]
+
+    # (label of the run, its message count) that first hit a bin, None if no run has
+    def first_hit(self, bin_name: str) -> Union[Tuple[str, int], None]:
+        with self._locked(fcntl.LOCK_SH):
+            self._load()
+        i = self.index[bin_name]
+        run = int(self.first_run[i])
+        if run < 0:
+            return None
+        return self.runs()[run], int(self.first_msg[i])
+
+    # Consistent copy of the store, e.g. to compare the closure later on
+    def snapshot(self, directory: str):
+        os.makedirs(directory, exist_ok=True)
+        with self._locked(fcntl.LOCK_SH):
+            for name in ["bins.txt", "runs.txt"] + [f"{a}.npy" for a in ARRAYS]:
+                shutil.copyfile(self._path(name), os.path.join(directory, name))
+
+    def close(self):
+        del self.counts, self.first_run, self.first_msg
+        self.lock_file.close()
+
+
+# Merges the coverage of one run into a store as it goes. The store is opened at
+# the first coverage seen, when the DUT's bins are known, and bins created later
+# on are added to it. A drop in the counters is taken as the start of a new
+# trial, whose coverage starts from zero.
+class CoverageRecorder:
+    def __init__(self, directory: str, label: str):
+        self.directory = directory
+        self.label = label
+        self.store: Union[CoverageStore, None] = None
+        self.run = None
+        self.layout: Union[CoverageLayout, None] = None
+        # index in the store of each bin of the layout
+        self.store_bins: Union[np.ndarray, None] = None
+        self.last_vector: Union[np.ndarray, None] = None
+
+    def record(self, coverage_database: GlobalCoverageDatabase, message: int = -1):
+        if coverage_database.get() is None:
+            return
+        vector = coverage_database.get_coverage_vector()
+        layout = coverage_database.get_layout()
+        if self.store is None:
+            self.store = CoverageStore(self.directory, layout.names)
+            self.run = self.store.start_run(self.label)
+        if layout is not self.layout:
+            # the counts recorded so far carry over to the bins of the new layout
+            last = {} if self.layout is None else dict(zip(self.layout.names, self.last_vector))
+            self.last_vector = np.array([last.get(k, 0) for k in layout.names], dtype=np.int64)
+            self.store.add_bins(layout.names)
+            self.store_bins = np.array([self.store.index[k] for k in layout.names], dtype=np.int64)
+            self.layout = layout
+        if (vector < self.last_vector).any():
+            self.last_vector = np.zeros_like(vector)
+
+        delta = vector - self.last_vector
+        if delta.any():
+            self.store.merge(delta, self.run, message, self.store_bins)
+            self.last_vector = vector
+
+    def close(self):
+        if self.store is not None:
+            self.store.close()
+
+
+
+"""Tests"""
+
+
+# A GlobalCoverageDatabase of the test coverage of global_shared_types, whose
+# bins are those of its misc_bins and cross counters
+def _coverage_database(misc: Dict[str, int], cross: Dict[str, List[int]] = None):
+    from global_shared_types import _Coverage, _coverage_bins
+    from shared_helpers.dut_registry import register_coverage
+
+    register_coverage(_Coverage, _coverage_bins)
+    return GlobalCoverageDatabase(_Coverage(dict(misc), dict(cross or {})))
+
+
+class TestCoverageStore(unittest.TestCase):
+    def setUp(self) -> None:
+        self.directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.directory)
+
+    def test_merge(self) -> None:
+        store = CoverageStore(self.directory, ["a", "b", "c"])
+        runs = [store.start_run("x"), store.start_run("y")]
+        store.merge(np.array([1, 0, 0]), runs[0], 3)
+        store.merge(np.array([2, 1, 0]), runs[1], 5)
+        self.assertEqual([3, 1, 0], store.get_coverage_vector().tolist())
+        self.assertEqual((2, 3), store.get_coverage_rate())
+        self.assertEqual(["c"], store.never_hit())
+        self.assertEqual(("x", 3), store.first_hit("a"))
+        self.assertEqual(("y", 5), store.first_hit("b"))
+        self.assertIsNone(store.first_hit("c"))
+        store.close()
+
+        with self.assertRaises(FileNotFoundError):
+            CoverageStore(os.path.join(self.directory, "none"))
+
+    # bins added by one process are seen by the others
+    def test_add_bins(self) -> None:
+        store = CoverageStore(self.directory, ["a", "b"])
+        other = CoverageStore(self.directory)
+        run = store.start_run("x")
+        store.merge(np.array([1, 0]), run)
+        other.add_bins(["b", "c", "a", "d"])
+        store.merge(np.array([1, 1]), run, 2, np.array([1, 3]))
+        self.assertEqual(["a", "b", "c", "d"], other.names)
+        self.assertEqual([1, 1, 0, 1], other.get_coverage_vector().tolist())
+        self.assertEqual(["c"], store.never_hit())
+        self.assertEqual(("x", 2), other.first_hit("d"))
+        store.close()
+        other.close()
+
+    def test_recorder(self) -> None:
+        db = _coverage_database({"m0": 1, "m1": 0}, {"c0": [0, 0]})
+        recorder = CoverageRecorder(self.directory, "x")
+        recorder.record(db, 1)
+        # a new trial
+        db.set(type(db.get())({"m0": 0, "m1": 1}, {"c0": [0, 0]}))
+        recorder.record(db, 2)
+        store = CoverageStore(self.directory)
+        self.assertEqual([1, 1, 0, 0], store.get_coverage_vector().tolist())
+        self.assertEqual(("x", 2), store.first_hit("m1"))
+        recorder.close()
+        store.close()
+
+    # bins created during a run are added to the store, and the counts recorded
+    # so far carry over
+    def test_layout_change(self) -> None:
+        db = _coverage_database({"m0": 1, "m1": 0}, {"c0": [0, 2]})
+        recorder = CoverageRecorder(self.directory, "x")
+        recorder.record(db, 1)
+        db.set(type(db.get())({"m0": 1, "m1": 0, "m2": 3}, {"c0": [0, 2], "c1": [1]}))
+        recorder.record(db, 2)
+        db.set(type(db.get())({"m0": 2, "m1": 0, "m2": 3}, {"c1": [1]}))
+        recorder.record(db, 3)
+        recorder.close()
+
+        # another run, from the layout it starts with
+        other = CoverageRecorder(self.directory, "y")
+        other.record(_coverage_database({"m0": 1, "m1": 1}, {"c0": [1, 0]}), 4)
+        other.close()
+
+        store = CoverageStore(self.directory)
+        self.assertEqual(
+            {"m0": 3, "m1": 1, "c0_x_0": 1, "c0_x_1": 2, "m2": 3, "c1_x_0": 1},
+            dict(zip(store.names, store.get_coverage_vector().tolist())),
+        )
+        self.assertEqual(("x", 2), store.first_hit("m2"))
+        self.assertEqual(("y", 4), store.first_hit("c0_x_0"))
+        store.close()
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(formatter_class=argparse.ArgumentDefaultsHelpFormatter)
+    parser.add_argument("store", type=str, help="directory of the coverage store")
+    parser.add_argument("--first", type=str, default=None, help="bin to tell the first hit of")
+    args = parser.parse_args()
+
+    store = CoverageStore(args.store)
+    hit_cnt, bin_cnt = store.get_coverage_rate()
+    print(f"{len(store.runs())} runs, {hit_cnt}/{bin_cnt} bins hit")
+    if args.first is not None:
+        first = store.first_hit(args.first)
+        print(f"{args.first}: " + ("never hit" if first is None else f"first hit by {first[0]} at message {first[1]}"))
+    else:
+        print("Never hit: " + ", ".join(store.never_hit()))
+    store.close()
@@ -0,0 +1,63 @@
+# Copyright ***** contributors.
+# Licensed under the Apache License, Version 2.0, see LICENSE for details.
+# SPDX-License-Identifier: Apache-2.0
+
+import importlib
+from typing import *
+
+# Per-DUT adapters of GlobalCoverageDatabase and GlobalDUTState, looked up by the
+# type of the coverage database or DUT state. Each DUT package registers its own
+# in <dut>/adapters.py, which is imported the first time one of the DUT's types
+# is looked up, so only the DUTs in use are ever imported.
+
+# A bin of a coverage plan: (counter path, name, group, weight). The counter
+# path is as in sim_protocol.coverage_counters, the weight is the difficulty of
+# the bin, counted in the score when prioritising harder bins.
+Bin = Tuple[tuple, str, str, float]
+
+# coverage database type -> its bin registry, listing the bins in plan order
+_COVERAGE_BINS: Dict[type, Callable[[Any], List[Bin]]] = {}
+# DUT state type -> whether it is the state of a CPU, with last_pc and last_insn
+_DUT_STATES: Dict[type, bool] = {}
+
+
+def register_coverage(coverage_type: type, bins: Callable[[Any], List[Bin]]):
+    _COVERAGE_BINS[coverage_type] = bins
+
+
+def register_dut_state(state_type: type, cpu: bool = False):
+    _DUT_STATES[state_type] = cpu
+
+
+def coverage_bins(coverage_type: type) -> Union[Callable[[Any], List[Bin]], None]:
+    return _lookup(_COVERAGE_BINS, coverage_type)
+
+
+def dut_state_is_cpu(state_type: type) -> Union[bool, None]:
+    return _lookup(_DUT_STATES, state_type)
+
+
+def _lookup(registry: dict, obj_type: type):
+    if obj_type not in registry:
+        _import_adapters(obj_type)
+    for base in obj_type.__mro__:
+        if base in registry:
+            return registry[base]
+    return None
+
+
+# e.g. stride_detector.adapters for stride_detector.shared_types.CoverageDatabase
+def _import_adapters(obj_type: type):
+    package = obj_type.__module__.rpartition(".")[0]
+    if not package:
+        return
+    try:
+        importlib.import_module(f"{package}.adapters")
+    except ModuleNotFoundError as e:
+        if e.name != f"{package}.adapters":
+            raise
+
+
+# The bins of a `misc_bins` dict of counters, as most DUTs have
+def misc_bins(coverage) -> List[Bin]:
+    return [(("misc_bins", k), k, "misc", 1) for k in coverage.misc_bins]
@@ -0,0 +1,165 @@
+# Copyright ***** contributors.
+# Licensed under the Apache License, Version 2.0, see LICENSE for details.
+# SPDX-License-Identifier: Apache-2.0
+
+# Conformance check of the golden models (<dut>/golden_model.py) against the RTL.
+# A trace is recorded once from a simulator: a stream of stimuli along with the
+# DUT state and coverage counters replied to each of them. It is then replayed
+# through the golden model, which has to give the same replies step by step.
+#
+# Run from the repository root:
+#   python -m shared_helpers.golden_conformance record stride_detector --server 127.0.0.1:5050
+#   python -m shared_helpers.golden_conformance check stride_detector
+# where the simulator is started beforehand with `make` in the DUT's directory.
+# Traces go to <dut>/golden_trace.pkl unless --trace is given; a trace committed
+# there is checked by the tests below.
+#
+# No trace has been recorded yet for any of the models, so until then golden://
+# is experimental: a model may differ from the RTL, and its coverage results are
+# no substitute for the simulator's.
+
+import argparse
+import importlib
+import os
+import pickle
+import random
+import sys
+import tempfile
+import time
+import unittest
+from contextlib import closing
+from dataclasses import dataclass
+from typing import Any, Dict, List
+
+from shared_helpers.sim_protocol import coverage_counters
+from shared_helpers.stimulus_sender import BaseStimulusSender, sender_address
+from shared_helpers.local_transport import GOLDEN_SCHEME
+
+GOLDEN_DUTS = ["stride_detector", "async_fifo", "sdram_controller"]
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+# where the RTL trace of a DUT is kept
+def trace_path(dut: str) -> str:
+    return os.path.join(ROOT, dut, "golden_trace.pkl")
+
+
+@dataclass
+class TraceStep:
+    stimulus: Any
+    dut_state: Any
+    counters: Dict[tuple, int]
+
+
+# StimulusSender of a DUT with a golden model, without the LLM dependencies of
+# its generate_stimulus.py
+def conformance_sender(dut: str):
+    shared_types = importlib.import_module(f"{dut}.shared_types")
+    golden_model = importlib.import_module(f"{dut}.golden_model")
+
+    class ConformanceSender(BaseStimulusSender):
+        wire_types = shared_types.WIRE_TYPES
+
+        def check_reply(self, reply):
+            if not isinstance(reply, tuple) or len(reply) != 2:
+                print(reply)
+                raise RuntimeError("Bad format of coverage response")
+
+    ConformanceSender.golden_model = golden_model.GOLDEN_MODEL
+    return ConformanceSender
+
+
+# Sends the stimuli one by one, the last one finishing the simulation
+def run_trace(sender: BaseStimulusSender, stimuli: List[Any]) -> List[TraceStep]:
+    steps = []
+    for (i, stimulus) in enumerate(stimuli):
+        stimulus.finish = i == len(stimuli) - 1
+        dut_state, coverage = sender.send_stimulus(stimulus)
+        steps.append(TraceStep(stimulus, dut_state, coverage_counters(coverage)))
+    return steps
+
+
+def record(dut: str, server: str, trace_path: str, length: int, seed: int):
+    golden_model = importlib.import_module(f"{dut}.golden_model")
+    stimuli = golden_model.random_stimulus(random.Random(seed), length)
+
+    with closing(conformance_sender(dut)(sender_address(server))) as sender:
+        steps = run_trace(sender, stimuli)
+
+    with open(trace_path, "wb") as f:
+        pickle.dump({"dut": dut, "steps": steps}, f)
+    print(f"Recorded {len(steps)} steps of {dut} to {trace_path}")
+
+
+# Replays a recorded trace through the golden model, returns the number of steps
+# where its replies differ from the RTL's
+def check(dut: str, trace_path: str, max_reports: int = 10) -> int:
+    with open(trace_path, "rb") as f:
+        trace = pickle.load(f)
+    if trace["dut"] != dut:
+        raise ValueError(f"{trace_path} is a trace of {trace['dut']}, not {dut}")
+    expected: List[TraceStep] = trace["steps"]
+
+    start = time.time()
+    with closing(conformance_sender(dut)(GOLDEN_SCHEME)) as sender:
+        actual = run_trace(sender, [step.stimulus for step in expected])
+    duration = time.time() - start
+
+    mismatches = 0
+    for (i, (rtl, model)) in enumerate(zip(expected, actual)):
+        if rtl.dut_state == model.dut_state and rtl.counters == model.counters:
+            continue
+        mismatches += 1
+        if mismatches <= max_reports:
+            print(f"Step {i}, stimulus {rtl.stimulus}:")
+            if rtl.dut_state != model.dut_state:
+                print(f"  DUT state  RTL: {rtl.dut_state}\n             model: {model.dut_state}")
+            for path in sorted(set(rtl.counters) | set(model.counters), key=str):
+                if rtl.counters.get(path) != model.counters.get(path):
+                    print(
+                        f"  {path}  RTL: {rtl.counters.get(path)}, "
+                        f"model: {model.counters.get(path)}"
+                    )
+
+    print(
+        f"{len(expected) - mismatches}/{len(expected)} steps of {dut} conform "
+        f"({len(expected) / duration:.0f} stimuli/s on the golden model)"
+    )
+    return mismatches
+
+
+class TestGoldenConformance(unittest.TestCase):
+    # the golden models against their recorded RTL traces
+    def test_rtl_traces(self) -> None:
+        for dut in GOLDEN_DUTS:
+            with self.subTest(dut=dut):
+                if not os.path.exists(trace_path(dut)):
+                    self.skipTest(f"no RTL trace of {dut} recorded, golden:// is experimental")
+                self.assertEqual(0, check(dut, trace_path(dut)))
+
+    # recording from a golden model and checking it against itself, as a check of
+    # the recording and replay
+    def test_self_conformance(self) -> None:
+        for dut in GOLDEN_DUTS:
+            with self.subTest(dut=dut), tempfile.TemporaryDirectory() as directory:
+                path = os.path.join(directory, "trace.pkl")
+                record(dut, GOLDEN_SCHEME, path, length=200, seed=1)
+                self.assertEqual(0, check(dut, path))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(formatter_class=argparse.ArgumentDefaultsHelpFormatter)
+    parser.add_argument("command", type=str, choices=["record", "check"])
+    parser.add_argument("dut", type=str, choices=GOLDEN_DUTS)
+    parser.add_argument("--trace", type=str, default=None, help="default <dut>/golden_trace.pkl")
+    parser.add_argument("--server", type=str, default="127.0.0.1:5050", help="simulator to record from")
+    parser.add_argument("--length", type=int, default=2000)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+    args.trace = args.trace or trace_path(args.dut)
+
+    if args.command == "record":
+        record(args.dut, args.server, args.trace, args.length, args.seed)
+    else:
+        sys.exit(1 if check(args.dut, args.trace) else 0)
@@ -0,0 +1,165 @@
+# Copyright ***** contributors.
+# Licensed under the Apache License, Version 2.0, see LICENSE for details.
+# SPDX-License-Identifier: Apache-2.0
+
+import asyncio
+import pickle
+import queue
+import threading
+import unittest
+
+import zmq
+
+from shared_helpers.stimulus_server import serve_stimuli
+
+# Experimental in-process alternative to the simulator link, selected with
+# golden:// addresses. The golden models are not checked against RTL traces yet
+# (see golden_conformance.py), so results on them must be confirmed on the RTL.
+# Instead of a cocotb simulation, a Python golden model of the DUT (see e.g.
+# stride_detector/golden_model.py) is served by the unchanged serve_stimuli loop
+# on a background thread. Messages still go through the wire format, so the
+# stimulus sender sees exactly what a simulator would send, including batches,
+# coverage updates and pipelined windows.
+#
+# A golden model offers the part of a SimulationController serve_stimuli uses:
+#   async handle_stimulus(stimulus_obj) -> (reply, finish)
+#   coverage_database
+
+GOLDEN_SCHEME = "golden://"
+
+# routing id of the single client, as a ROUTER socket would prefix its requests
+_PEER = b"golden"
+
+
+class _Frame:
+    # stands in for zmq.Frame
+    __slots__ = ("bytes", "buffer")
+
+    def __init__(self, data: bytes):
+        self.bytes = data
+        self.buffer = data
+
+
+# The server's end of the link, looks like a ROUTER socket to serve_stimuli
+class _ServerEnd:
+    socket_type = zmq.ROUTER
+
+    def __init__(self, requests: queue.SimpleQueue, replies: queue.SimpleQueue):
+        self.requests = requests
+        self.replies = replies
+
+    def recv_multipart(self, copy: bool = True):
+        return [_Frame(frame) for frame in self.requests.get()]
+
+    def send_multipart(self, frames):
+        # strip the routing id, like a ROUTER socket does
+        self.replies.put([bytes(frame) for frame in frames[1:]])
+
+
+# The client's end of the link. Offers the part of the zmq socket API used by
+# BaseStimulusSender: send(_multipart), recv(_multipart), poll and close.
+class LocalChannel:
+    def __init__(self, model, wire_types):
+        self.requests = queue.SimpleQueue()
+        self.replies = queue.SimpleQueue()
+        server_end = _ServerEnd(self.requests, self.replies)
+
+        def serve():
+            try:
+                asyncio.run(
+                    serve_stimuli(
+                        server_end,
+                        model.handle_stimulus,
+                        lambda: model.coverage_database,
+                        wire_types,
+                    )
+                )
+            except BaseException as e:
+                # hand the model's failure to the client instead of leaving it
+                # waiting for a reply forever
+                self.replies.put(e)
+
+        self.thread = threading.Thread(target=serve, daemon=True)
+        self.thread.start()
+
+    def send(self, payload):
+        self.send_multipart([b"", payload])
+
+    def send_multipart(self, frames):
+        self.requests.put([_PEER] + [bytes(frame) for frame in frames])
+
+    def recv(self, copy: bool = True):
+        return self.recv_multipart(copy)[-1]
+
+    def recv_multipart(self, copy: bool = True):
+        frames = self.replies.get()
+        if isinstance(frames, BaseException):
+            raise RuntimeError("Golden model failed") from frames
+        return [_Frame(frame) if not copy else frame for frame in frames]
+
+    def poll(self, timeout=0, flags=zmq.POLLIN) -> int:
+        return zmq.POLLIN if not self.replies.empty() else 0
+
+    def close(self):
+        # the server thread ends with the finishing stimulus; if none was sent
+        # it is left waiting, as a daemon thread
+        self.thread.join(0)
+
+
+# Tests: a model replying with the stimulus it was sent, in the pickle format
+class _EchoModel:
+    coverage_database = None
+
+    async def handle_stimulus(self, stimulus_obj):
+        if stimulus_obj == "fail":
+            raise ValueError(stimulus_obj)
+        return stimulus_obj, stimulus_obj == "finish"
+
+
+class TestLocalChannel(unittest.TestCase):
+    def setUp(self) -> None:
+        self.dumps, self.loads = pickle.dumps, pickle.loads
+        self.channel = LocalChannel(_EchoModel(), None)
+
+    def tearDown(self) -> None:
+        self.channel.close()
+
+    def test_copy(self) -> None:
+        self.channel.send(self.dumps("a"))
+        reply = self.channel.recv(copy=True)
+        self.assertIsInstance(reply, bytes)
+        self.assertEqual("a", self.loads(reply))
+
+        self.channel.send_multipart([b"", b"seq", self.dumps("b")])
+        frames = self.channel.recv_multipart(copy=True)
+        self.assertEqual([b"", b"seq"], frames[:-1])
+        self.assertEqual("b", self.loads(frames[-1]))
+
+    def test_no_copy(self) -> None:
+        self.channel.send(self.dumps("a"))
+        reply = self.channel.recv(copy=False)
+        self.assertEqual("a", self.loads(reply.buffer))
+        self.assertEqual(reply.bytes, reply.buffer)
+
+        self.channel.send_multipart([b"", b"seq", self.dumps("b")])
+        frames = self.channel.recv_multipart(copy=False)
+        self.assertEqual(b"seq", frames[1].bytes)
+        self.assertEqual("b", self.loads(frames[-1].buffer))
+
+    def test_finish(self) -> None:
+        self.assertEqual(0, self.channel.poll())
+        self.channel.send(self.dumps("finish"))
+        self.assertEqual("finish", self.loads(self.channel.recv()))
+        self.assertEqual(0, self.channel.poll())
+        self.channel.thread.join(5)
+        self.assertFalse(self.channel.thread.is_alive())
+
+    def test_model_failure(self) -> None:
+        self.channel.send(self.dumps("fail"))
+        with self.assertRaises(RuntimeError) as e:
+            self.channel.recv()
+        self.assertIsInstance(e.exception.__cause__, ValueError)
+
+
+if __name__ == "__main__":
+    unittest.main()
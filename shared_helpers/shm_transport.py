@@ -0,0 +1,303 @@
+# Copyright ***** contributors.
+# Licensed under the Apache License, Version 2.0, see LICENSE for details.
+# SPDX-License-Identifier: Apache-2.0
+
+import mmap
+import os
+import struct
+import tempfile
+import threading
+import time
+import unittest
+
+import zmq
+
+# Same-host alternative to the zmq link, selected with shm://name addresses.
+# The server (SimulationController) creates a memory-mapped file in /dev/shm
+# holding two single-producer single-consumer ring buffers, one for requests
+# and one for replies, and an array of coverage counters. The server writes
+# the flat coverage counters there (see WireCodec.shared_counters) and the
+# client reads them in place, so replies only carry the coverage layout hash.
+#
+# Segment layout:
+#   0   magic b"LVSM", version (u32)
+#   8   request ring head, tail (u64 each, bytes written / read so far)
+#   24  reply ring head, tail
+#   40  ring size, counter capacity (u32 each)
+#   48  server pid, client pid (u32 each, 0 until attached)
+#   56  server closed, client closed (u8 each)
+#   64  request ring data, reply ring data, counters (u32 each)
+# Each ring message is its length (u32) followed by the payload.
+# An end waiting on the other one gives up with a RuntimeError once its peer
+# has closed the link or its process is gone.
+
+SHM_SCHEME = "shm://"
+SHM_DIR = "/dev/shm" if os.path.isdir("/dev/shm") else tempfile.gettempdir()
+
+MAGIC = b"LVSM"
+VERSION = 2
+SEGMENT_HEADER = struct.Struct("<4sI")
+RING_INDICES = struct.Struct("<QQ")
+SIZES = struct.Struct("<II")
+PIDS = struct.Struct("<II")
+CLOSED = struct.Struct("<BB")
+MESSAGE_LENGTH = struct.Struct("<I")
+
+REQUEST_RING_OFFSET = 8
+REPLY_RING_OFFSET = 24
+SIZES_OFFSET = 40
+PIDS_OFFSET = 48
+CLOSED_OFFSET = 56
+DATA_OFFSET = 64
+
+
+def shm_path(name: str) -> str:
+    return os.path.join(SHM_DIR, f"llm4dv_{name}")
+
+
+class _Frame:
+    # stands in for zmq.Frame, recv(copy=False) callers only use .buffer
+    __slots__ = ("buffer",)
+
+    def __init__(self, buffer):
+        self.buffer = buffer
+
+
+class _Ring:
+    def __init__(
+        self, buf: mmap.mmap, index_offset: int, data_offset: int, size: int, peer_alive
+    ):
+        self.buf = buf
+        self.index_offset = index_offset
+        self.data_offset = data_offset
+        self.size = size
+        # checked while waiting on the other end
+        self.peer_alive = peer_alive
+
+    def put(self, payload: bytes):
+        length = MESSAGE_LENGTH.size + len(payload)
+        if length > self.size:
+            raise ValueError(
+                f"Message of {len(payload)} bytes does not fit the {self.size} byte ring"
+            )
+
+        head, tail = self._indices()
+        spins = 0
+        while self.size - (head - tail) < length:
+            spins = self._wait(spins)
+            head, tail = self._indices()
+
+        self._write(head, MESSAGE_LENGTH.pack(len(payload)))
+        self._write(head + MESSAGE_LENGTH.size, payload)
+        # publish the message only once it is complete
+        struct.pack_into("<Q", self.buf, self.index_offset, head + length)
+
+    def get(self) -> bytes:
+        head, tail = self._indices()
+        spins = 0
+        while head == tail:
+            spins = self._wait(spins)
+            head, tail = self._indices()
+
+        (length,) = MESSAGE_LENGTH.unpack(self._read(tail, MESSAGE_LENGTH.size))
+        payload = self._read(tail + MESSAGE_LENGTH.size, length)
+        struct.pack_into(
+            "<Q", self.buf, self.index_offset + 8, tail + MESSAGE_LENGTH.size + length
+        )
+        return payload
+
+    def poll(self) -> bool:
+        head, tail = self._indices()
+        return head != tail
+
+    # Backs off, checking now and then that the other end can still make progress.
+    # Its last messages are read before it is found gone, as they are published
+    # before it closes.
+    def _wait(self, spins: int) -> int:
+        if spins % 1000 == 999 and not self.peer_alive():
+            raise RuntimeError("The other end closed the shared memory link")
+        return _backoff(spins)
+
+    def _indices(self):
+        return RING_INDICES.unpack_from(self.buf, self.index_offset)
+
+    def _write(self, index: int, data: bytes):
+        pos = index % self.size
+        first = min(len(data), self.size - pos)
+        start = self.data_offset + pos
+        self.buf[start : start + first] = data[:first]
+        if first < len(data):
+            rest = len(data) - first
+            self.buf[self.data_offset : self.data_offset + rest] = data[first:]
+
+    def _read(self, index: int, length: int) -> bytes:
+        pos = index % self.size
+        first = min(length, self.size - pos)
+        start = self.data_offset + pos
+        data = self.buf[start : start + first]
+        if first < length:
+            data += self.buf[self.data_offset : self.data_offset + length - first]
+        return data
+
+
+# Spin briefly, then sleep while waiting on the other process
+def _backoff(spins: int) -> int:
+    time.sleep(0 if spins < 1000 else 0.0005)
+    return spins + 1
+
+
+# One end of a shm:// link. Offers the part of the zmq socket API used by
+# BaseStimulusSender and serve_stimuli: send, recv(copy=False), poll and close.
+class ShmChannel:
+    # a one to one link, like a zmq PAIR socket
+    socket_type = zmq.PAIR
+
+    def __init__(self, path: str, fd: int, is_server: bool):
+        self.path = path
+        self.is_server = is_server
+        self.buf = mmap.mmap(fd, 0)
+        os.close(fd)
+
+        magic, version = SEGMENT_HEADER.unpack_from(self.buf, 0)
+        if magic != MAGIC or version != VERSION:
+            raise RuntimeError(f"{path} is not a shared memory stimulus link")
+        ring_size, counter_capacity = SIZES.unpack_from(self.buf, SIZES_OFFSET)
+
+        requests = _Ring(self.buf, REQUEST_RING_OFFSET, DATA_OFFSET, ring_size, self._peer_alive)
+        replies = _Ring(
+            self.buf, REPLY_RING_OFFSET, DATA_OFFSET + ring_size, ring_size, self._peer_alive
+        )
+        (self.inbox, self.outbox) = (requests, replies) if is_server else (replies, requests)
+        # this end's slot in the pids and closed flags, the peer's is the other
+        self.end = 0 if is_server else 1
+        struct.pack_into("<I", self.buf, PIDS_OFFSET + 4 * self.end, os.getpid())
+
+        counters_offset = DATA_OFFSET + 2 * ring_size
+        self.counters = memoryview(self.buf)[
+            counters_offset : counters_offset + 4 * counter_capacity
+        ]
+
+    # Called by the server. A segment left behind by an earlier run is replaced.
+    @classmethod
+    def create(cls, name: str, ring_size: int = 1 << 23, counter_capacity: int = 1 << 20):
+        path = shm_path(name)
+        if os.path.exists(path):
+            os.unlink(path)
+
+        size = DATA_OFFSET + 2 * ring_size + 4 * counter_capacity
+        fd = os.open(path + ".tmp", os.O_CREAT | os.O_TRUNC | os.O_RDWR, 0o600)
+        os.ftruncate(fd, size)
+        header = bytearray(DATA_OFFSET)
+        SEGMENT_HEADER.pack_into(header, 0, MAGIC, VERSION)
+        SIZES.pack_into(header, SIZES_OFFSET, ring_size, counter_capacity)
+        os.pwrite(fd, header, 0)
+        # clients only see the segment once it is initialised
+        os.rename(path + ".tmp", path)
+        return cls(path, fd, is_server=True)
+
+    # Called by the client, waits for the server to create the segment
+    @classmethod
+    def attach(cls, name: str):
+        path = shm_path(name)
+        while not os.path.exists(path):
+            time.sleep(0.1)
+        return cls(path, os.open(path, os.O_RDWR), is_server=False)
+
+    def send(self, payload):
+        self.outbox.put(bytes(payload))
+
+    def recv(self, copy: bool = True):
+        payload = self.inbox.get()
+        return payload if copy else _Frame(payload)
+
+    def poll(self, timeout=0, flags=zmq.POLLIN) -> int:
+        return zmq.POLLIN if self.inbox.poll() else 0
+
+    def _peer_alive(self) -> bool:
+        peer = 1 - self.end
+        if CLOSED.unpack_from(self.buf, CLOSED_OFFSET)[peer]:
+            return False
+        pid = PIDS.unpack_from(self.buf, PIDS_OFFSET)[peer]
+        if pid == 0:
+            # the client has not attached yet
+            return True
+        try:
+            os.kill(pid, 0)
+        except ProcessLookupError:
+            return False
+        except PermissionError:
+            pass
+        return True
+
+    def close(self):
+        if self.buf is None:
+            return
+        struct.pack_into("<B", self.buf, CLOSED_OFFSET + self.end, 1)
+        self.counters.release()
+        self.buf.close()
+        self.buf = None
+        if self.is_server and os.path.exists(self.path):
+            os.unlink(self.path)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+class TestShmChannel(unittest.TestCase):
+    def setUp(self) -> None:
+        name = f"test_{os.getpid()}_{self._testMethodName}"
+        # rings of 64 bytes: a message of 28 bytes takes a third of one
+        self.server = ShmChannel.create(name, ring_size=64, counter_capacity=16)
+        self.client = ShmChannel.attach(name)
+
+    def tearDown(self) -> None:
+        self.client.close()
+        self.server.close()
+
+    def test_wraparound(self) -> None:
+        for i in range(100):
+            payload = bytes([i]) * (i % 50 + 1)
+            self.client.send(payload)
+            self.assertTrue(self.server.poll())
+            self.assertEqual(payload, self.server.recv())
+            self.server.send(payload[::-1])
+            self.assertEqual(payload[::-1], self.client.recv(copy=False).buffer)
+        self.assertFalse(self.server.poll())
+
+    def test_too_large(self) -> None:
+        self.assertRaises(ValueError, self.client.send, bytes(61))
+        self.client.send(bytes(60))
+        self.assertEqual(bytes(60), self.server.recv())
+
+    # a message larger than the free space waits for the reader
+    def test_full(self) -> None:
+        self.client.send(b"a" * 24)
+        self.client.send(b"b" * 24)
+        sender = threading.Thread(target=self.client.send, args=(b"c" * 24,))
+        sender.start()
+        sender.join(0.1)
+        self.assertTrue(sender.is_alive())
+        self.assertEqual(b"a" * 24, self.server.recv())
+        sender.join(5)
+        self.assertFalse(sender.is_alive())
+        self.assertEqual(b"b" * 24, self.server.recv())
+        self.assertEqual(b"c" * 24, self.server.recv())
+
+    def test_peer_closed(self) -> None:
+        self.server.send(b"last")
+        self.server.close()
+        self.assertEqual(b"last", self.client.recv())
+        self.assertRaises(RuntimeError, self.client.recv)
+        self.client.send(b"a" * 60)
+        self.assertRaises(RuntimeError, self.client.send, b"b")
+
+    def test_counters(self) -> None:
+        self.server.counters.cast("I")[3] = 7
+        self.assertEqual(7, self.client.counters.cast("I")[3])
+
+
+if __name__ == "__main__":
+    unittest.main()
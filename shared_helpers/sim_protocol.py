@@ -0,0 +1,182 @@
+# Copyright ***** contributors.
+# Licensed under the Apache License, Version 2.0, see LICENSE for details.
+# SPDX-License-Identifier: Apache-2.0
+
+import copy
+import unittest
+from dataclasses import dataclass
+from typing import Any, Dict, List
+
+# Messages shared by the stimulus senders (client) and the cocotb
+# SimulationControllers (server) on top of the original protocol, where a
+# single DUT specific Stimulus object is answered by a single reply.
+
+__all__ = [
+    "StimulusBatch",
+    "BatchReply",
+    "ReplyModeRequest",
+    "CoverageUpdate",
+    "coverage_counters",
+    "coverage_delta",
+    "apply_coverage_delta",
+    "merge_coverage",
+    "replace_coverage",
+    "CoverageUpdateEncoder",
+]
+
+
+@dataclass
+class StimulusBatch:
+    # DUT specific stimulus objects, driven back to back by the server
+    stimuli: List[Any]
+
+
+@dataclass
+class BatchReply:
+    # The reply the server would have sent for the last driven stimulus
+    reply: Any
+    # One entry per driven stimulus, mapping counter paths to increments
+    coverage_deltas: List[Dict[tuple, int]]
+
+
+@dataclass
+class ReplyModeRequest:
+    # Replace the coverage database in replies with CoverageUpdates
+    coverage_updates: bool
+    # Every `snapshot_period` replies carry the full database to resynchronise
+    snapshot_period: int = 100
+
+
+@dataclass
+class CoverageUpdate:
+    # Counter increments since the previous reply
+    changes: Dict[tuple, int]
+    # Full coverage database, sent instead of the changes on resynchronisation
+    snapshot: Any = None
+
+
+# Flatten a CoverageDatabase into {counter path: count}. A path is the
+# attribute name followed by the list indices / dict keys leading to the
+# counter, e.g. ("stride_2_seen", 3, 30) or ("misc_bins", "no_stride_to_single").
+def coverage_counters(coverage) -> Dict[tuple, int]:
+    counters = {}
+    for name, value in vars(coverage).items():
+        _collect_counters(value, (name,), counters)
+    return counters
+
+
+def _collect_counters(value, path: tuple, counters: Dict[tuple, int]):
+    if isinstance(value, int):
+        counters[path] = value
+    elif isinstance(value, list):
+        for i, v in enumerate(value):
+            _collect_counters(v, path + (i,), counters)
+    elif isinstance(value, dict):
+        for k, v in value.items():
+            _collect_counters(v, path + (k,), counters)
+
+
+# Counters that moved between two `coverage_counters` snapshots
+def coverage_delta(before: Dict[tuple, int], after: Dict[tuple, int]) -> Dict[tuple, int]:
+    return {
+        path: count - before.get(path, 0)
+        for (path, count) in after.items()
+        if count != before.get(path, 0)
+    }
+
+
+# Add the increments of a `coverage_delta` to a CoverageDatabase in place
+def apply_coverage_delta(coverage, delta: Dict[tuple, int]):
+    for path, increment in delta.items():
+        container = getattr(coverage, path[0])
+        for key in path[1:-1]:
+            container = container[key]
+        if len(path) == 1:
+            setattr(coverage, path[0], container + increment)
+        else:
+            container[path[-1]] += increment
+
+
+# Sum of the counters of several CoverageDatabases of the same DUT, as a new
+# database
+def merge_coverage(coverages: list):
+    merged = copy.deepcopy(coverages[0])
+    for coverage in coverages[1:]:
+        apply_coverage_delta(merged, coverage_counters(coverage))
+    return merged
+
+
+# Replace the coverage database inside a reply, which is either the database
+# itself or a tuple containing it
+def replace_coverage(reply, coverage, replacement):
+    if reply is coverage:
+        return replacement
+    if isinstance(reply, tuple):
+        return tuple(replacement if r is coverage else r for r in reply)
+    return reply
+
+
+# Server side of the coverage update mode: turns the live coverage database into
+# the CoverageUpdate the client needs to keep its replica in sync
+class CoverageUpdateEncoder:
+    def __init__(self, snapshot_period: int):
+        self.snapshot_period = snapshot_period
+        self.counters = None
+        self.reply_cnt = 0
+
+    def encode(self, coverage) -> CoverageUpdate:
+        counters = coverage_counters(coverage)
+        if self.counters is None or self.reply_cnt % self.snapshot_period == 0:
+            update = CoverageUpdate(changes={}, snapshot=coverage)
+        else:
+            update = CoverageUpdate(changes=coverage_delta(self.counters, counters))
+        self.counters = counters
+        self.reply_cnt += 1
+        return update
+
+
+class _Coverage:
+    def __init__(self):
+        self.seen = [0, 0, 0]
+        self.misc_bins = {"a": 0, "b": 0}
+
+
+class TestCoverageUpdates(unittest.TestCase):
+    def test_snapshot_cadence(self) -> None:
+        coverage = _Coverage()
+        encoder = CoverageUpdateEncoder(snapshot_period=3)
+        snapshots = []
+        for i in range(8):
+            coverage.seen[i % 3] += 1
+            update = encoder.encode(coverage)
+            snapshots.append(update.snapshot is not None)
+            if update.snapshot is None:
+                self.assertEqual({("seen", i % 3): 1}, update.changes)
+        self.assertEqual([True, False, False, True, False, False, True, False], snapshots)
+
+    # a replica following the updates stays equal to the database
+    def test_replica(self) -> None:
+        coverage = _Coverage()
+        encoder = CoverageUpdateEncoder(snapshot_period=4)
+        replica = None
+        for i in range(10):
+            coverage.seen[i % 3] += i
+            coverage.misc_bins["b"] += i % 2
+            update = encoder.encode(coverage)
+            if update.snapshot is not None:
+                replica = copy.deepcopy(update.snapshot)
+            else:
+                apply_coverage_delta(replica, update.changes)
+            self.assertEqual(coverage_counters(coverage), coverage_counters(replica))
+
+    def test_merge(self) -> None:
+        a, b = _Coverage(), _Coverage()
+        a.seen[0], b.seen[0], b.misc_bins["a"] = 1, 2, 5
+        merged = merge_coverage([a, b])
+        self.assertEqual([3, 0, 0], merged.seen)
+        self.assertEqual({"a": 5, "b": 0}, merged.misc_bins)
+        self.assertEqual([1, 0, 0], a.seen)
+
+
+if __name__ == "__main__":
+    unittest.main()
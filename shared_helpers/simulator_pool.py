@@ -0,0 +1,231 @@
+# Copyright ***** contributors.
+# Licensed under the Apache License, Version 2.0, see LICENSE for details.
+# SPDX-License-Identifier: Apache-2.0
+
+import asyncio
+import random
+import unittest
+from collections import deque
+from typing import Any, Deque, Dict, List, Tuple
+
+from shared_helpers.sim_protocol import *
+from shared_helpers.stimulus_sender import BaseStimulusSender
+
+
+# Drives several simulators of the same DUT, one StimulusSender each, behind the
+# StimulusSender API. Every reply has its coverage database replaced by the sum
+# of the latest coverage of all simulators, so the agent sees one campaign.
+#
+# submit_stimuli hands whole batches to the simulators in turn, so a batch runs
+# on one simulator while the others run the previous ones. send_stimuli shards
+# one batch over all of them. Simulators keep their own DUT state; the state in
+# a reply is that of the simulator which sent it.
+#
+# A batch may be submitted with a tag, e.g. the origins of its stimuli. Batches
+# may complete out of order across simulators, so the coverage deltas of tagged
+# batches are also kept along with their tags, to be taken with take_tagged.
+#
+# Any DUT whose StimulusSender has wire_types can be pooled; of the clients,
+# only stride_detector/generate_stimulus.py takes several simulator addresses.
+# A simulator that fails makes the pool raise, as a single sender would.
+class SimulatorPool:
+    def __init__(self, sender_cls, zmq_addrs: List[str], window: int = 1):
+        assert len(zmq_addrs) > 0, "A simulator pool needs at least one simulator."
+        self.senders: List[BaseStimulusSender] = [
+            sender_cls(zmq_addr, window=window) for zmq_addr in zmq_addrs
+        ]
+        self.coverage_type = sender_cls.wire_types[0]
+        # latest coverage database received from each simulator
+        self.coverages = [None] * len(self.senders)
+        self.next_sender = 0
+        # tags of the batches in flight on each simulator, oldest first
+        self.batch_tags: List[Deque[Any]] = [deque() for _ in self.senders]
+        # (tag, coverage deltas) of the tagged batches completed
+        self.tagged: List[Tuple[Any, List[Dict[tuple, int]]]] = []
+
+    def request_coverage_updates(self, snapshot_period: int = 100):
+        for sender in self.senders:
+            sender.request_coverage_updates(snapshot_period)
+
+    # Sends a batch to the next simulator without waiting for it. Returns the
+    # (reply, coverage deltas) of the batches that completed meanwhile.
+    def submit_stimuli(self, stimulus_objs: List[Any], tag: Any = None) -> list:
+        sender_id = self.next_sender
+        self.next_sender = (sender_id + 1) % len(self.senders)
+
+        replies = self._merge(sender_id, self.senders[sender_id].wait_for_room())
+        self._post_batch(sender_id, stimulus_objs, tag)
+        for (i, sender) in enumerate(self.senders):
+            replies += self._merge(i, sender.completed())
+        return replies
+
+    # Shards a batch over all simulators and waits for them. Returns the reply
+    # of the last shard and the coverage deltas of all stimuli, in order.
+    def send_stimuli(self, stimulus_objs: List[Any]) -> Tuple[Any, List[Dict[tuple, int]]]:
+        stimulus_objs = list(stimulus_objs)
+        shard_size = -(-len(stimulus_objs) // len(self.senders))
+        shards = [
+            (i, stimulus_objs[start : start + shard_size])
+            for (i, start) in enumerate(range(0, len(stimulus_objs), shard_size))
+        ]
+
+        self.drain()
+        for (i, shard) in shards:
+            self._post_batch(i, shard)
+
+        reply = None
+        coverage_deltas = []
+        for (i, _) in shards:
+            for (reply, deltas) in self._merge(i, self.senders[i].drain()):
+                coverage_deltas += deltas
+        return reply, coverage_deltas
+
+    # Sends a stimulus to every simulator, e.g. the one finishing the simulation
+    def send_stimulus(self, stimulus_obj):
+        self.drain()
+        for sender in self.senders:
+            sender.post(stimulus_obj)
+
+        reply = None
+        for (i, sender) in enumerate(self.senders):
+            (reply,) = self._merge(i, sender.drain())
+        return reply
+
+    def drain(self) -> list:
+        replies = []
+        for (i, sender) in enumerate(self.senders):
+            replies += self._merge(i, sender.drain())
+        return replies
+
+    # The (tag, coverage deltas) of the tagged batches completed since the last
+    # call, in the order they completed
+    def take_tagged(self) -> List[Tuple[Any, List[Dict[tuple, int]]]]:
+        tagged, self.tagged = self.tagged, []
+        return tagged
+
+    def _post_batch(self, sender_id: int, stimulus_objs: List[Any], tag: Any = None):
+        self.senders[sender_id].post(StimulusBatch(stimuli=list(stimulus_objs)))
+        self.batch_tags[sender_id].append(tag)
+
+    def _merge(self, sender_id: int, replies: list) -> list:
+        return [self._merge_reply(sender_id, reply) for reply in replies]
+
+    def _merge_reply(self, sender_id: int, reply):
+        if isinstance(reply, tuple) and len(reply) == 2 and isinstance(reply[1], list):
+            # a batch, delivered as (reply, coverage deltas)
+            tag = self.batch_tags[sender_id].popleft()
+            if tag is not None:
+                self.tagged.append((tag, reply[1]))
+            return self._merge_reply(sender_id, reply[0]), reply[1]
+
+        elements = reply if isinstance(reply, tuple) else (reply,)
+        coverage = next(e for e in elements if isinstance(e, self.coverage_type))
+        self.coverages[sender_id] = coverage
+        if len(self.senders) == 1:
+            return reply
+
+        merged = merge_coverage([c for c in self.coverages if c is not None])
+        return replace_coverage(reply, coverage, merged)
+
+    def close(self):
+        for sender in self.senders:
+            sender.close()
+
+
+# Tests with stride detector models over golden:// links
+def _stride_detector_sender(golden_model=None):
+    from shared_helpers.golden_conformance import conformance_sender
+    from shared_helpers.local_transport import GOLDEN_SCHEME
+
+    sender_cls = conformance_sender("stride_detector")
+    if golden_model is not None:
+        sender_cls = type("FailingSender", (sender_cls,), {"golden_model": golden_model})
+    return sender_cls, GOLDEN_SCHEME
+
+
+def _batches(cnt: int, size: int) -> list:
+    from stride_detector.golden_model import random_stimulus
+
+    stimuli = random_stimulus(random.Random(0), cnt * size)
+    return [stimuli[i : i + size] for i in range(0, len(stimuli), size)]
+
+
+# coverage counters of a model driven with the batches directly
+def _reference(batches: list) -> Dict[tuple, int]:
+    from stride_detector.golden_model import GOLDEN_MODEL
+
+    model = GOLDEN_MODEL()
+    for stimulus in [s for batch in batches for s in batch]:
+        asyncio.run(model.handle_stimulus(stimulus))
+    return coverage_counters(model.coverage_database)
+
+
+class TestSimulatorPool(unittest.TestCase):
+    def test_submit(self) -> None:
+        sender_cls, addr = _stride_detector_sender()
+        pool = SimulatorPool(sender_cls, [addr] * 3, window=2)
+        batches = _batches(12, 10)
+        replies = []
+        for (i, batch) in enumerate(batches):
+            replies += pool.submit_stimuli(batch, tag=i)
+            self.assertEqual(i % 3, (pool.next_sender - 1) % 3)
+        replies += pool.drain()
+        self.assertEqual(len(batches), len(replies))
+
+        # simulator i ran batches i, i + 3, ...
+        counters = [_reference(batches[i::3]) for i in range(3)]
+        expected = {path: sum(c[path] for c in counters) for path in counters[0]}
+        self.assertEqual(expected, coverage_counters(replies[-1][0][1]))
+
+        tagged = pool.take_tagged()
+        self.assertEqual(list(range(len(batches))), sorted(tag for (tag, _) in tagged))
+        for (tag, deltas) in tagged:
+            self.assertEqual(len(batches[tag]), len(deltas))
+        self.assertEqual([], pool.take_tagged())
+        pool.close()
+
+    def test_shards(self) -> None:
+        sender_cls, addr = _stride_detector_sender()
+        pool = SimulatorPool(sender_cls, [addr] * 2)
+        (batch,) = _batches(1, 25)
+        (_, coverage), deltas = pool.send_stimuli(batch)
+        self.assertEqual(25, len(deltas))
+        # 13 stimuli on the first simulator, 12 on the second
+        expected = _reference([batch[:13]])
+        for (path, cnt) in _reference([batch[13:]]).items():
+            expected[path] += cnt
+        self.assertEqual(expected, coverage_counters(coverage))
+        self.assertEqual(
+            sum(expected.values()), sum(cnt for delta in deltas for cnt in delta.values())
+        )
+        pool.close()
+
+    def test_single(self) -> None:
+        sender_cls, addr = _stride_detector_sender()
+        pool = SimulatorPool(sender_cls, [addr])
+        batches = _batches(3, 5)
+        for batch in batches:
+            (_, coverage), _ = pool.send_stimuli(batch)
+        self.assertEqual(_reference(batches), coverage_counters(coverage))
+        pool.close()
+
+    def test_failure(self) -> None:
+        from stride_detector.golden_model import GOLDEN_MODEL
+
+        class FailingModel(GOLDEN_MODEL):
+            async def handle_stimulus(self, stimulus_obj):
+                if stimulus_obj.value == 0:
+                    raise ValueError("simulator failed")
+                return await super().handle_stimulus(stimulus_obj)
+
+        sender_cls, addr = _stride_detector_sender(FailingModel)
+        pool = SimulatorPool(sender_cls, [addr] * 2)
+        stimulus_type = sender_cls.wire_types[1]
+        pool.submit_stimuli([stimulus_type(value=1, finish=False)])
+        pool.submit_stimuli([stimulus_type(value=0, finish=False)])
+        self.assertRaises(RuntimeError, pool.drain)
+        pool.close()
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,327 @@
+# Copyright ***** contributors.
+# Licensed under the Apache License, Version 2.0, see LICENSE for details.
+# SPDX-License-Identifier: Apache-2.0
+
+import asyncio
+import os
+import pickle
+import random
+import struct
+import unittest
+from abc import abstractmethod
+from typing import Any, Dict, List, Tuple
+
+import zmq
+
+from global_shared_types import GlobalCoverageDatabase
+from shared_helpers.sim_protocol import *
+from shared_helpers.wire_format import WireCodec
+from shared_helpers.shm_transport import SHM_SCHEME, ShmChannel
+from shared_helpers.local_transport import GOLDEN_SCHEME, LocalChannel
+
+
+# environment variable set by launcher.py to the simulator address(es)
+SERVER_ENV = "LLM4DV_SERVER"
+
+
+# IP and port (or shm://name, golden://) of the simulator, from the environment when run
+# headless, asked for otherwise
+def ask_server_ip_port(prompt: str) -> str:
+    return os.environ.get(SERVER_ENV) or input(prompt)
+
+
+# address a StimulusSender connects to, given the IP and port or the full address
+# (e.g. shm://name) entered by the user
+def sender_address(server_ip_port: str) -> str:
+    return server_ip_port if "://" in server_ip_port else f"tcp://{server_ip_port}"
+
+
+# Client side of the simulator link. Each DUT's generate_stimulus.py subclasses
+# this and only provides the check of its reply format.
+#
+# With window == 1 a REQ socket is used and every request waits for its reply.
+# With window > 1 a DEALER socket keeps up to `window` requests in flight; each
+# request carries a sequence number which the server echoes back, and replies
+# are delivered (and coverage updates applied) strictly in sequence order.
+#
+# shm://name addresses select the shared memory link of shm_transport.py, for a
+# simulator on the same host. It carries one request at a time (window == 1).
+#
+# golden:// addresses run the subclass's golden_model in-process instead of a
+# simulator (see local_transport.py), for the DUTs which have one.
+#
+# Subclasses set wire_types to their DUT's WIRE_TYPES to talk the binary wire
+# format of wire_format.py; otherwise messages are pickled.
+class BaseStimulusSender:
+    wire_types = None
+    golden_model = None
+
+    def __init__(self, zmq_addr, window: int = 1):
+        assert window >= 1, "The in-flight window must be at least 1."
+        self.window = window
+        self.context = zmq.Context()
+        if zmq_addr.startswith(SHM_SCHEME):
+            assert window == 1, "The shared memory link does not pipeline requests."
+            self.socket = ShmChannel.attach(zmq_addr[len(SHM_SCHEME):])
+        elif zmq_addr.startswith(GOLDEN_SCHEME):
+            if self.golden_model is None:
+                raise RuntimeError(f"{type(self).__name__} has no golden model")
+            self.socket = LocalChannel(self.golden_model(), self.wire_types)
+        else:
+            self.socket = self.context.socket(zmq.REQ if window == 1 else zmq.DEALER)
+            self.socket.connect(zmq_addr)
+        # local copy of the server's coverage when it only sends updates
+        self.coverage_replica: GlobalCoverageDatabase = None
+        self.codec = WireCodec(self.wire_types) if self.wire_types is not None else None
+        if self.codec is not None:
+            self.codec.shared_counters = getattr(self.socket, "counters", None)
+
+        self.sent_seq = 0
+        self.delivered_seq = 0
+        self.early_replies: Dict[int, Any] = {}
+
+    @abstractmethod
+    def check_reply(self, reply):
+        raise NotImplementedError
+
+    # Sends one stimulus and waits for its reply. Replies to requests still in
+    # flight are received first (their coverage updates are applied) and dropped.
+    def send_stimulus(self, stimulus_obj):
+        self.drain()
+        self._send(stimulus_obj)
+        return self._deliver(self._recv())
+
+    # Sends several stimuli in one round-trip. Returns the reply to the last
+    # stimulus along with the per-stimulus coverage deltas.
+    def send_stimuli(self, stimulus_objs: List[Any]) -> Tuple[Any, List[Dict[tuple, int]]]:
+        self.drain()
+        self._send(StimulusBatch(stimuli=list(stimulus_objs)))
+        return self._deliver(self._recv())
+
+    # Pipelined counterpart of send_stimulus/send_stimuli: sends without waiting
+    # and returns the replies that completed meanwhile, oldest first. Blocks only
+    # while the in-flight window is full. In the coverage update mode all the
+    # replies share the replica, which is up to date with the newest of them.
+    def submit(self, stimulus_obj) -> list:
+        self.post(stimulus_obj)
+        return self.wait_for_room()
+
+    def submit_stimuli(self, stimulus_objs: List[Any]) -> list:
+        return self.submit(StimulusBatch(stimuli=list(stimulus_objs)))
+
+    # Waits for every request in flight, returns their replies oldest first
+    def drain(self) -> list:
+        return self._collect(block_while_in_flight=0)
+
+    # Sends without waiting or receiving anything, the window must not be full
+    def post(self, stimulus_obj):
+        assert self.in_flight() < self.window, "The in-flight window is full."
+        self._send(stimulus_obj)
+
+    # Waits until another request can be posted, returns the replies received
+    def wait_for_room(self) -> list:
+        return self._collect(block_while_in_flight=self.window - 1)
+
+    # Returns the replies that already arrived, without waiting
+    def completed(self) -> list:
+        return self._collect(block_while_in_flight=self.window)
+
+    def in_flight(self) -> int:
+        return self.sent_seq - self.delivered_seq
+
+    # Opt in to replies carrying only the coverage counters that changed. The
+    # server sends a full snapshot every `snapshot_period` replies.
+    def request_coverage_updates(self, snapshot_period: int = 100):
+        self.drain()
+        self._send(ReplyModeRequest(coverage_updates=True, snapshot_period=snapshot_period))
+        self._recv()
+        self.coverage_replica = GlobalCoverageDatabase()
+
+    def _send(self, obj):
+        payload = self.codec.encode(obj) if self.codec else pickle.dumps(obj)
+        if self.window == 1:
+            self.socket.send(payload)
+        else:
+            self.socket.send_multipart([b"", struct.pack("<Q", self.sent_seq), payload])
+        self.sent_seq += 1
+
+    def _loads(self, frame):
+        return self.codec.decode(frame.buffer) if self.codec else pickle.loads(frame.buffer)
+
+    # Receives the reply to the oldest request in flight
+    def _recv(self):
+        if self.window == 1:
+            self.delivered_seq += 1
+            return self._loads(self.socket.recv(copy=False))
+
+        # replies are decoded in sequence order, the order the server encoded
+        # them in, as the codec keeps track of the coverage layouts sent so far
+        while self.delivered_seq not in self.early_replies:
+            frames = self.socket.recv_multipart(copy=False)
+            (seq,) = struct.unpack("<Q", frames[-2].bytes)
+            self.early_replies[seq] = frames[-1]
+        frame = self.early_replies.pop(self.delivered_seq)
+        self.delivered_seq += 1
+        return self._loads(frame)
+
+    def _collect(self, block_while_in_flight: int) -> list:
+        replies = []
+        while self.in_flight() > block_while_in_flight or (
+            self.in_flight() > 0 and self.socket.poll(0, zmq.POLLIN)
+        ):
+            replies.append(self._deliver(self._recv()))
+        return replies
+
+    def _deliver(self, reply):
+        if isinstance(reply, BatchReply):
+            resolved = self._resolve_coverage(reply.reply)
+            self.check_reply(resolved)
+            return resolved, reply.coverage_deltas
+        if isinstance(reply, StimulusBatch):
+            raise RuntimeError("Bad format of batch response")
+
+        reply = self._resolve_coverage(reply)
+        self.check_reply(reply)
+        return reply
+
+    # Applies the CoverageUpdate of a reply to the replica and puts the
+    # replica's database in its place
+    def _resolve_coverage(self, reply):
+        if self.coverage_replica is None:
+            return reply
+
+        elements = reply if isinstance(reply, tuple) else (reply,)
+        update = next((e for e in elements if isinstance(e, CoverageUpdate)), None)
+        if update is None:
+            raise RuntimeError("Bad format of coverage update response")
+
+        self.coverage_replica.apply_update(update)
+        return replace_coverage(reply, update, self.coverage_replica.get())
+
+    def close(self):
+        if self.socket:
+            self.socket.close()
+
+
+# Tests of the protocol over golden:// links, with the stride detector's model
+def _golden_sender(window: int = 1) -> BaseStimulusSender:
+    from shared_helpers.golden_conformance import conformance_sender
+
+    return conformance_sender("stride_detector")(GOLDEN_SCHEME, window)
+
+
+def _golden_stimuli(length: int) -> list:
+    from stride_detector.golden_model import random_stimulus
+
+    stimuli = random_stimulus(random.Random(0), length)
+    stimuli[-1].finish = True
+    return stimuli
+
+
+# replies of the model driven directly, without a link
+def _reference_replies(stimuli: list) -> list:
+    from stride_detector.golden_model import GOLDEN_MODEL
+
+    model = GOLDEN_MODEL()
+    replies = []
+    for stimulus in stimuli:
+        (dut_state, coverage), _ = asyncio.run(model.handle_stimulus(stimulus))
+        replies.append((dut_state, coverage_counters(coverage)))
+    return replies
+
+
+class TestCoverageUpdateMode(unittest.TestCase):
+    def test_replica(self) -> None:
+        stimuli = _golden_stimuli(50)
+        expected = _reference_replies(stimuli)
+        sender = _golden_sender()
+        sender.request_coverage_updates(snapshot_period=7)
+        for (stimulus, (dut_state, counters)) in zip(stimuli, expected):
+            reply_state, coverage = sender.send_stimulus(stimulus)
+            self.assertEqual(dut_state, reply_state)
+            self.assertEqual(counters, coverage_counters(coverage))
+        sender.close()
+
+    def test_batches(self) -> None:
+        stimuli = _golden_stimuli(40)
+        expected = _reference_replies(stimuli)
+        sender = _golden_sender()
+        sender.request_coverage_updates(snapshot_period=2)
+        before = {}
+        for i in range(0, len(stimuli), 8):
+            (dut_state, coverage), deltas = sender.send_stimuli(stimuli[i : i + 8])
+            self.assertEqual(expected[i + 7], (dut_state, coverage_counters(coverage)))
+            for (j, delta) in enumerate(deltas):
+                after = expected[i + j][1]
+                self.assertEqual(coverage_delta(before, after), delta)
+                before = after
+        sender.close()
+
+
+# Delivers the replies to the requests in flight in reverse order, as a server
+# answering them concurrently might
+class _ReorderingChannel:
+    def __init__(self, channel: LocalChannel):
+        self.channel = channel
+        self.in_flight = 0
+        self.received = []
+
+    def send_multipart(self, frames):
+        self.in_flight += 1
+        self.channel.send_multipart(frames)
+
+    def recv_multipart(self, copy: bool = True):
+        if not self.received:
+            self.received = [self.channel.recv_multipart(copy) for _ in range(self.in_flight)]
+            self.in_flight = 0
+        return self.received.pop()
+
+    def poll(self, timeout=0, flags=zmq.POLLIN) -> int:
+        return zmq.POLLIN if self.received or self.channel.poll() else 0
+
+    def close(self):
+        self.channel.close()
+
+
+class TestWindow(unittest.TestCase):
+    def check_window(self, sender: BaseStimulusSender, stimuli: list):
+        expected = _reference_replies(stimuli)
+        sender.request_coverage_updates(snapshot_period=5)
+        replies = []
+        for stimulus in stimuli:
+            replies += sender.submit(stimulus)
+            self.assertLessEqual(sender.in_flight(), sender.window)
+            if replies:
+                # the replica is that of the newest reply
+                self.assertEqual(expected[len(replies) - 1][1], coverage_counters(replies[-1][1]))
+        replies += sender.drain()
+        self.assertEqual(0, sender.in_flight())
+        self.assertEqual([dut_state for (dut_state, _) in expected], [r[0] for r in replies])
+        self.assertEqual(expected[-1][1], coverage_counters(replies[-1][1]))
+        sender.close()
+
+    def test_in_order(self) -> None:
+        self.check_window(_golden_sender(window=4), _golden_stimuli(60))
+
+    def test_out_of_order(self) -> None:
+        sender = _golden_sender(window=4)
+        sender.socket = _ReorderingChannel(sender.socket)
+        self.check_window(sender, _golden_stimuli(60))
+        self.assertEqual({}, sender.early_replies)
+
+    # a blocking send waits for the replies in flight first
+    def test_mixed(self) -> None:
+        stimuli = _golden_stimuli(10)
+        expected = _reference_replies(stimuli)
+        sender = _golden_sender(window=3)
+        sender.socket = _ReorderingChannel(sender.socket)
+        self.assertEqual([], sender.submit(stimuli[0]))
+        self.assertEqual([], sender.submit(stimuli[1]))
+        reply_state, coverage = sender.send_stimulus(stimuli[2])
+        self.assertEqual(expected[2], (reply_state, coverage_counters(coverage)))
+        self.assertEqual(3, sender.delivered_seq)
+        sender.close()
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,129 @@
+# Copyright ***** contributors.
+# Licensed under the Apache License, Version 2.0, see LICENSE for details.
+# SPDX-License-Identifier: Apache-2.0
+
+import os
+import pickle
+
+import zmq
+
+from shared_helpers.sim_protocol import *
+from shared_helpers.wire_format import CounterReader, WireCodec, is_wire_message
+from shared_helpers.shm_transport import SHM_SCHEME, ShmChannel
+
+# Server side of the simulator link, shared by the cocotb SimulationControllers
+# (through cocotb_helpers.py) and the in-process golden models. Does not depend
+# on cocotb: handle_stimulus only has to be a coroutine.
+
+# environment variable set by launcher.py to the port (or shm://name) to serve on
+SERVER_PORT_ENV = "LLM4DV_SERVER_PORT"
+
+# port to serve on, from the environment when run headless, asked for otherwise
+def ask_server_port(prompt):
+    return os.environ.get(SERVER_PORT_ENV) or input(prompt)
+
+# address a SimulationController serves on, given the port or the full address
+# (e.g. shm://name) entered by the user
+def server_address(server_port):
+    return server_port if "://" in server_port else f"tcp://*:{server_port}"
+
+# the socket a SimulationController serves on: a zmq ROUTER socket bound to the
+# address, or a shared memory link for shm://name addresses
+def open_server_socket(zmq_context, addr):
+    if addr.startswith(SHM_SCHEME):
+        return ShmChannel.create(addr[len(SHM_SCHEME):])
+    socket = zmq_context.socket(zmq.ROUTER)
+    socket.bind(addr)
+    return socket
+
+# serve stimuli received on a zmq ROUTER (or REP) socket until a finishing
+# stimulus is seen. With a ROUTER socket each request's envelope (routing id,
+# and for pipelined clients the sequence number) is echoed with the reply, so
+# REQ and windowed DEALER clients are served alike, in arrival order.
+# handle_stimulus: coroutine driving one stimulus object, returns (reply, finish)
+#   where reply is what the server sends back for that stimulus
+# get_coverage: returns the coverage database the replies refer to
+# wire_types: the DUT's WIRE_TYPES. If given, requests must use the binary wire
+#   format (see wire_format.py) and pickled requests are refused
+async def serve_stimuli(socket, handle_stimulus, get_coverage, wire_types=None):
+    update_encoder = None
+    # one codec per client, as each tracks the coverage layouts its peer knows
+    codecs = {}
+
+    while True:
+        envelope, stimulus_obj = recv_request(socket, wire_types, codecs)
+
+        if isinstance(stimulus_obj, ReplyModeRequest):
+            update_encoder = (
+                CoverageUpdateEncoder(stimulus_obj.snapshot_period)
+                if stimulus_obj.coverage_updates
+                else None
+            )
+            send_reply(socket, envelope, stimulus_obj, codecs)
+            continue
+
+        if isinstance(stimulus_obj, StimulusBatch):
+            reply, finish = await drive_batch(stimulus_obj, handle_stimulus, get_coverage)
+        else:
+            reply, finish = await handle_stimulus(stimulus_obj)
+
+        if update_encoder is not None:
+            coverage = get_coverage()
+            update = update_encoder.encode(coverage)
+            if isinstance(reply, BatchReply):
+                reply.reply = replace_coverage(reply.reply, coverage, update)
+            else:
+                reply = replace_coverage(reply, coverage, update)
+
+        send_reply(socket, envelope, reply, codecs)
+
+        if finish:
+            return
+
+def recv_request(socket, wire_types, codecs):
+    if socket.socket_type == zmq.ROUTER:
+        frames = socket.recv_multipart(copy=False)
+        envelope = [frame.bytes for frame in frames[:-1]]
+        peer = envelope[0]
+    else:
+        frames = [socket.recv(copy=False)]
+        envelope = None
+        peer = None
+    payload = frames[-1].buffer
+
+    if wire_types is None:
+        return envelope, pickle.loads(payload)
+    if not is_wire_message(payload):
+        raise RuntimeError("Request is not in the binary wire format")
+    if peer not in codecs:
+        codecs[peer] = WireCodec(wire_types)
+        codecs[peer].shared_counters = getattr(socket, "counters", None)
+    return envelope, codecs[peer].decode(payload)
+
+def send_reply(socket, envelope, reply, codecs):
+    peer = envelope[0] if envelope is not None else None
+    payload = codecs[peer].encode(reply) if peer in codecs else pickle.dumps(reply)
+    if envelope is None:
+        socket.send(payload)
+    else:
+        socket.send_multipart(envelope + [payload])
+
+# drive the stimuli of a batch back to back, recording the coverage delta of each.
+# The counters are read as flat arrays after each stimulus, and only those that
+# moved are turned into the delta.
+async def drive_batch(batch, handle_stimulus, get_coverage):
+    reply = None
+    finish = False
+    coverage_deltas = []
+    reader = CounterReader()
+    before = reader.read(get_coverage())
+
+    for stimulus_obj in batch.stimuli:
+        reply, finish = await handle_stimulus(stimulus_obj)
+        after = reader.read(get_coverage())
+        coverage_deltas.append(reader.delta(before, after))
+        before = after
+        if finish:
+            break
+
+    return BatchReply(reply=reply, coverage_deltas=coverage_deltas), finish
@@ -0,0 +1,600 @@
+# Copyright ***** contributors.
+# Licensed under the Apache License, Version 2.0, see LICENSE for details.
+# SPDX-License-Identifier: Apache-2.0
+
+import copy
+import importlib
+import math
+import random
+import struct
+import sys
+import unittest
+import zlib
+from array import array
+from itertools import chain, product
+from dataclasses import fields, is_dataclass
+from enum import Enum
+from typing import Dict, List, Tuple
+
+import numpy as np
+
+from shared_helpers.sim_protocol import *
+
+# Binary encoding of the messages between the stimulus senders and the cocotb
+# SimulationControllers, used instead of pickle. Only None, bool, int, float,
+# str, list, tuple, dict and the registered types can be decoded, so neither end
+# builds arbitrary objects out of what it receives. Other values that convert to
+# int, such as cocotb's BinaryValue, are sent as ints.
+#
+# A message is the header followed by one tagged value. All numbers are little
+# endian. Registered types are the sim_protocol messages followed by the DUT's
+# WIRE_TYPES (see its shared_types.py), whose position gives their type id:
+#   dataclass   type id (u16), field count (u8), the fields in declared order
+#   enum        type id (u16), the member's value
+#   coverage    type id (u16), layout hash (u32), counter count (u32) and the
+#               counters as u32, in the canonical bin order of coverage_counters
+# The layout describes where the counters of the flat array go: the database's
+# attributes, list shapes and dict keys. It is sent along with the counters the
+# first time (COVERAGE_LAYOUT) and only referred to by its hash afterwards.
+# Attributes that are not counters are sent with the layout only.
+# Over a shm:// link the counters are written to the segment's shared counter
+# array instead (SHARED_COVERAGE), and the message only carries the header.
+
+MAGIC = b"LV"
+VERSION = 1
+HEADER = struct.Struct("<2sBB")  # magic, version, reserved
+
+TAG_NONE = 0
+TAG_FALSE = 1
+TAG_TRUE = 2
+TAG_INT = 3
+TAG_FLOAT = 4
+TAG_STR = 5
+TAG_LIST = 6
+TAG_TUPLE = 7
+TAG_DICT = 8
+TAG_INT_LIST = 9
+TAG_DATACLASS = 10
+TAG_ENUM = 11
+TAG_COVERAGE = 12
+TAG_COVERAGE_LAYOUT = 13
+TAG_SHARED_COVERAGE = 14
+
+U8 = struct.Struct("<B")
+U16 = struct.Struct("<H")
+U32 = struct.Struct("<I")
+I64 = struct.Struct("<q")
+F64 = struct.Struct("<d")
+OBJECT_HEADER = struct.Struct("<HB")
+COVERAGE_HEADER = struct.Struct("<HII")
+LAYOUT_HEADER = struct.Struct("<HI")
+
+# layout nodes, tuples whose first element is the kind
+LAYOUT_INT = 0  # (LAYOUT_INT,)
+LAYOUT_ARRAY = 1  # (LAYOUT_ARRAY, shape) for rectangular nested lists of ints
+LAYOUT_INT_DICT = 2  # (LAYOUT_INT_DICT, keys) for dicts of ints
+LAYOUT_DICT = 3  # (LAYOUT_DICT, keys, value layouts)
+LAYOUT_LIST = 4  # (LAYOUT_LIST, item layouts)
+LAYOUT_CONST = 5  # (LAYOUT_CONST, value) for anything that is not a counter
+
+# counters are gathered in an array of this type before being sent
+COUNTER_TYPECODE = "I"
+assert array(COUNTER_TYPECODE).itemsize == 4
+
+PROTOCOL_TYPES = [StimulusBatch, BatchReply, ReplyModeRequest, CoverageUpdate]
+
+
+def is_wire_message(payload) -> bool:
+    return bytes(payload[: len(MAGIC)]) == MAGIC
+
+
+# Encoder and decoder for one peer. Both ends must be built with the same
+# wire_types, the DUT's coverage database first. Coverage layouts are tracked
+# per direction, so a codec must not be shared between peers.
+class WireCodec:
+    def __init__(self, wire_types: list):
+        self.coverage_type = wire_types[0]
+        self.types = PROTOCOL_TYPES + list(wire_types)
+        self.type_ids = {t: i for (i, t) in enumerate(self.types)}
+        self.dataclass_fields = {
+            t: [f.name for f in fields(t)]
+            for t in self.types
+            if is_dataclass(t) and t is not self.coverage_type
+        }
+
+        # layouts this end has sent, by hash
+        self.sent_layouts = set()
+        # layout of the last database encoded and its hash
+        self.layout = None
+        self.layout_hash = None
+        # layouts received, by hash
+        self.layouts: Dict[int, tuple] = {}
+        # counter array shared by both ends (ShmChannel.counters), if any
+        self.shared_counters: memoryview = None
+
+    def encode(self, obj) -> bytes:
+        chunks = [HEADER.pack(MAGIC, VERSION, 0)]
+        self._encode_value(obj, chunks)
+        return b"".join(chunks)
+
+    def decode(self, payload):
+        view = memoryview(payload)
+        magic, version, _ = HEADER.unpack_from(view, 0)
+        if magic != MAGIC:
+            raise RuntimeError("Not a wire format message")
+        if version != VERSION:
+            raise RuntimeError(f"Unsupported wire format version {version}")
+
+        obj, _ = self._decode_value(view, HEADER.size)
+        return obj
+
+    def _encode_value(self, obj, chunks: list):
+        if obj is None:
+            chunks.append(U8.pack(TAG_NONE))
+        elif obj is True or obj is False:
+            chunks.append(U8.pack(TAG_TRUE if obj else TAG_FALSE))
+        elif isinstance(obj, Enum):
+            chunks.append(U8.pack(TAG_ENUM) + U16.pack(self._type_id(obj)))
+            self._encode_value(obj.value, chunks)
+        elif isinstance(obj, int):
+            chunks.append(U8.pack(TAG_INT) + I64.pack(obj))
+        elif isinstance(obj, float):
+            chunks.append(U8.pack(TAG_FLOAT) + F64.pack(obj))
+        elif isinstance(obj, str):
+            data = obj.encode("utf-8")
+            chunks.append(U8.pack(TAG_STR) + U32.pack(len(data)))
+            chunks.append(data)
+        elif isinstance(obj, list) and all(type(v) is int for v in obj):
+            chunks.append(U8.pack(TAG_INT_LIST) + U32.pack(len(obj)))
+            chunks.append(np.asarray(obj, dtype="<i8").tobytes())
+        elif isinstance(obj, (list, tuple)):
+            tag = TAG_LIST if isinstance(obj, list) else TAG_TUPLE
+            chunks.append(U8.pack(tag) + U32.pack(len(obj)))
+            for v in obj:
+                self._encode_value(v, chunks)
+        elif isinstance(obj, dict):
+            chunks.append(U8.pack(TAG_DICT) + U32.pack(len(obj)))
+            for (k, v) in obj.items():
+                self._encode_value(k, chunks)
+                self._encode_value(v, chunks)
+        elif isinstance(obj, self.coverage_type):
+            self._encode_coverage(obj, chunks)
+        elif type(obj) in self.dataclass_fields:
+            names = self.dataclass_fields[type(obj)]
+            chunks.append(
+                U8.pack(TAG_DATACLASS) + OBJECT_HEADER.pack(self._type_id(obj), len(names))
+            )
+            for name in names:
+                self._encode_value(getattr(obj, name), chunks)
+        elif hasattr(type(obj), "__int__"):
+            # signal values sampled by cocotb (BinaryValue) and numpy integers
+            chunks.append(U8.pack(TAG_INT) + I64.pack(int(obj)))
+        else:
+            raise TypeError(f"Type {type(obj).__name__} cannot be sent over the wire")
+
+    def _encode_coverage(self, coverage, chunks: list):
+        counts = array(COUNTER_TYPECODE)
+        try:
+            if self.layout is None:
+                raise LayoutChanged
+            _flatten(vars(coverage), self.layout, counts)
+        except LayoutChanged:
+            self.layout = _layout(vars(coverage))
+            self.layout_hash = zlib.crc32(repr(self.layout).encode("utf-8"))
+            counts = array(COUNTER_TYPECODE)
+            _flatten(vars(coverage), self.layout, counts)
+
+        if sys.byteorder == "big":
+            counts.byteswap()
+        type_id = self._type_id(coverage)
+        if self.layout_hash not in self.sent_layouts:
+            self.sent_layouts.add(self.layout_hash)
+            chunks.append(
+                U8.pack(TAG_COVERAGE_LAYOUT) + LAYOUT_HEADER.pack(type_id, self.layout_hash)
+            )
+            self._encode_value(self.layout, chunks)
+
+        header = COVERAGE_HEADER.pack(type_id, self.layout_hash, len(counts))
+        if self.shared_counters is None:
+            chunks.append(U8.pack(TAG_COVERAGE) + header)
+            chunks.append(counts.tobytes())
+            return
+
+        size = len(counts) * counts.itemsize
+        if size > len(self.shared_counters):
+            raise ValueError("Coverage does not fit the shared counter array")
+        self.shared_counters[:size] = memoryview(counts).cast("B")
+        chunks.append(U8.pack(TAG_SHARED_COVERAGE) + header)
+
+    def _decode_value(self, view: memoryview, pos: int):
+        (tag,) = U8.unpack_from(view, pos)
+        pos += U8.size
+
+        if tag == TAG_NONE:
+            return None, pos
+        if tag == TAG_FALSE:
+            return False, pos
+        if tag == TAG_TRUE:
+            return True, pos
+        if tag == TAG_INT:
+            return I64.unpack_from(view, pos)[0], pos + I64.size
+        if tag == TAG_FLOAT:
+            return F64.unpack_from(view, pos)[0], pos + F64.size
+        if tag == TAG_STR:
+            (length,) = U32.unpack_from(view, pos)
+            pos += U32.size
+            return str(view[pos : pos + length], "utf-8"), pos + length
+        if tag == TAG_INT_LIST:
+            (length,) = U32.unpack_from(view, pos)
+            pos += U32.size
+            values = np.frombuffer(view, dtype="<i8", count=length, offset=pos)
+            return values.tolist(), pos + values.nbytes
+        if tag in (TAG_LIST, TAG_TUPLE):
+            (length,) = U32.unpack_from(view, pos)
+            pos += U32.size
+            values = []
+            for _ in range(length):
+                v, pos = self._decode_value(view, pos)
+                values.append(v)
+            return (values if tag == TAG_LIST else tuple(values)), pos
+        if tag == TAG_DICT:
+            (length,) = U32.unpack_from(view, pos)
+            pos += U32.size
+            values = {}
+            for _ in range(length):
+                k, pos = self._decode_value(view, pos)
+                v, pos = self._decode_value(view, pos)
+                values[k] = v
+            return values, pos
+        if tag == TAG_ENUM:
+            (type_id,) = U16.unpack_from(view, pos)
+            value, pos = self._decode_value(view, pos + U16.size)
+            return self._type(type_id)(value), pos
+        if tag == TAG_DATACLASS:
+            type_id, count = OBJECT_HEADER.unpack_from(view, pos)
+            pos += OBJECT_HEADER.size
+            values = []
+            for _ in range(count):
+                v, pos = self._decode_value(view, pos)
+                values.append(v)
+            return self._type(type_id)(*values), pos
+        if tag == TAG_COVERAGE_LAYOUT:
+            _, layout_hash = LAYOUT_HEADER.unpack_from(view, pos)
+            self.layouts[layout_hash], pos = self._decode_value(view, pos + LAYOUT_HEADER.size)
+            # the counters follow
+            return self._decode_value(view, pos)
+        if tag in (TAG_COVERAGE, TAG_SHARED_COVERAGE):
+            type_id, layout_hash, length = COVERAGE_HEADER.unpack_from(view, pos)
+            pos += COVERAGE_HEADER.size
+            if layout_hash not in self.layouts:
+                raise RuntimeError("Coverage received before its layout")
+            if tag == TAG_COVERAGE:
+                counts = np.frombuffer(view, dtype="<u4", count=length, offset=pos)
+                pos += counts.nbytes
+            else:
+                counts = np.frombuffer(self.shared_counters, dtype="<u4", count=length)
+            attributes, _ = _unflatten(self.layouts[layout_hash], counts, 0)
+            coverage = self._type(type_id).__new__(self._type(type_id))
+            coverage.__dict__.update(attributes)
+            return coverage, pos
+
+        raise RuntimeError(f"Unknown wire format tag {tag}")
+
+    def _type_id(self, obj) -> int:
+        if type(obj) not in self.type_ids:
+            raise TypeError(f"Type {type(obj).__name__} cannot be sent over the wire")
+        return self.type_ids[type(obj)]
+
+    def _type(self, type_id: int):
+        if type_id >= len(self.types):
+            raise RuntimeError(f"Unknown wire format type id {type_id}")
+        return self.types[type_id]
+
+
+class LayoutChanged(Exception):
+    pass
+
+
+# Describe where the counters of a coverage database's attributes are
+def _layout(value) -> tuple:
+    if type(value) is int:
+        return (LAYOUT_INT,)
+    if isinstance(value, list):
+        shape = _array_shape(value)
+        if shape is not None:
+            return (LAYOUT_ARRAY, shape)
+        return (LAYOUT_LIST, tuple(_layout(v) for v in value))
+    if isinstance(value, dict):
+        if all(type(v) is int for v in value.values()):
+            return (LAYOUT_INT_DICT, tuple(value))
+        return (LAYOUT_DICT, tuple(value), tuple(_layout(v) for v in value.values()))
+    return (LAYOUT_CONST, value)
+
+
+# Shape of a rectangular nested list of ints, None for anything else
+def _array_shape(value: list):
+    if all(type(v) is int for v in value):
+        return (len(value),)
+    if len(value) == 0 or not all(isinstance(v, list) for v in value):
+        return None
+    shapes = {_array_shape(v) for v in value}
+    if len(shapes) != 1 or None in shapes:
+        return None
+    return (len(value),) + shapes.pop()
+
+
+# Append the counters of a value to `counts`, following its layout. Raises
+# LayoutChanged if the value no longer fits the layout.
+def _flatten(value, layout: tuple, counts: array):
+    kind = layout[0]
+    if kind == LAYOUT_INT:
+        if type(value) is not int:
+            raise LayoutChanged
+        counts.append(value)
+    elif kind == LAYOUT_ARRAY:
+        # check the length of each level of the nested lists, then copy the ints
+        rows = [value]
+        try:
+            for size in layout[1][:-1]:
+                if set(map(len, rows)) != {size}:
+                    raise LayoutChanged
+                rows = list(chain.from_iterable(rows))
+            if set(map(len, rows)) != {layout[1][-1]}:
+                raise LayoutChanged
+            counts.extend(chain.from_iterable(rows))
+        except TypeError:
+            raise LayoutChanged
+    elif kind == LAYOUT_INT_DICT:
+        if not isinstance(value, dict) or tuple(value) != layout[1]:
+            raise LayoutChanged
+        try:
+            counts.extend(value.values())
+        except TypeError:
+            raise LayoutChanged
+    elif kind == LAYOUT_DICT:
+        if not isinstance(value, dict) or tuple(value) != layout[1]:
+            raise LayoutChanged
+        for (v, l) in zip(value.values(), layout[2]):
+            _flatten(v, l, counts)
+    elif kind == LAYOUT_LIST:
+        if not isinstance(value, list) or len(value) != len(layout[1]):
+            raise LayoutChanged
+        for (v, l) in zip(value, layout[1]):
+            _flatten(v, l, counts)
+    elif kind == LAYOUT_CONST:
+        if isinstance(value, (int, list, dict)) and type(value) is not bool:
+            raise LayoutChanged
+
+
+# Rebuild a value from its layout and the counters starting at `pos`
+def _unflatten(layout: tuple, counts: np.ndarray, pos: int):
+    kind = layout[0]
+    if kind == LAYOUT_INT:
+        return int(counts[pos]), pos + 1
+    if kind == LAYOUT_ARRAY:
+        size = math.prod(layout[1])
+        return counts[pos : pos + size].reshape(layout[1]).tolist(), pos + size
+    if kind == LAYOUT_INT_DICT:
+        size = len(layout[1])
+        return dict(zip(layout[1], counts[pos : pos + size].tolist())), pos + size
+    if kind == LAYOUT_DICT:
+        values = {}
+        for (k, l) in zip(layout[1], layout[2]):
+            values[k], pos = _unflatten(l, counts, pos)
+        return values, pos
+    if kind == LAYOUT_LIST:
+        values = []
+        for l in layout[1]:
+            v, pos = _unflatten(l, counts, pos)
+            values.append(v)
+        return values, pos
+    return copy.deepcopy(layout[1]), pos
+
+
+# Paths (as in coverage_counters) of the counters of a layout, in the order
+# _flatten appends them
+def _counter_paths(layout: tuple, path: tuple, paths: list):
+    kind = layout[0]
+    if kind == LAYOUT_INT:
+        paths.append(path)
+    elif kind == LAYOUT_ARRAY:
+        paths.extend(path + index for index in product(*map(range, layout[1])))
+    elif kind == LAYOUT_INT_DICT:
+        paths.extend(path + (k,) for k in layout[1])
+    elif kind == LAYOUT_DICT:
+        for (k, l) in zip(layout[1], layout[2]):
+            _counter_paths(l, path + (k,), paths)
+    elif kind == LAYOUT_LIST:
+        for (i, l) in enumerate(layout[1]):
+            _counter_paths(l, path + (i,), paths)
+
+
+# Reads successive states of a coverage database as flat arrays of counters,
+# with the layout machinery of the wire format, so that the counters moved
+# between two states are found by one array comparison instead of flattening
+# the whole database into a dict each time (see drive_batch).
+class CounterReader:
+    def __init__(self):
+        self.layout = None
+        # path of each counter of the layout
+        self.paths: List[tuple] = []
+
+    # (counters, their paths); the paths are the same list as long as the
+    # layout of the database does not change
+    def read(self, coverage) -> Tuple[np.ndarray, List[tuple]]:
+        counts = array("q")
+        try:
+            if self.layout is None:
+                raise LayoutChanged
+            _flatten(vars(coverage), self.layout, counts)
+        except LayoutChanged:
+            self.layout = _layout(vars(coverage))
+            self.paths = []
+            _counter_paths(self.layout, (), self.paths)
+            counts = array("q")
+            _flatten(vars(coverage), self.layout, counts)
+        return np.frombuffer(counts, dtype=np.int64), self.paths
+
+    # coverage_delta of two reads
+    @staticmethod
+    def delta(
+        before: Tuple[np.ndarray, List[tuple]], after: Tuple[np.ndarray, List[tuple]]
+    ) -> Dict[tuple, int]:
+        (before_counts, before_paths), (after_counts, after_paths) = before, after
+        if before_paths is not after_paths:
+            # e.g. counters created by the stimulus
+            return coverage_delta(
+                dict(zip(before_paths, before_counts.tolist())),
+                dict(zip(after_paths, after_counts.tolist())),
+            )
+        changed = np.flatnonzero(after_counts != before_counts)
+        return {
+            after_paths[i]: int(after_counts[i] - before_counts[i]) for i in changed.tolist()
+        }
+
+
+# Tests: a coverage database, a stimulus and a DUT state of each DUT, with
+# counters set at random
+def _sample_messages(dut: str, rng: random.Random) -> tuple:
+    t = importlib.import_module(f"{dut}.shared_types")
+    coverage = t.CoverageDatabase.__new__(t.CoverageDatabase)
+    if dut in ["ibex_cpu", "mips_cpu"]:
+        coverage.instructions = {
+            instr: {cov: rng.randrange(3) for cov in instr.type().coverpoints()}
+            for instr in t.Instr
+        }
+        coverage.cross_coverage = {
+            instr: {key: rng.randrange(3) for key in instr.type().cross_coverpoints()}
+            for instr in t.Instr
+        }
+        stimulus = t.Stimulus(
+            insn_mem_updates=[(0x100, 0x00000033), (0x104, 2**32 - 1)], finish=False
+        )
+        dut_state = t.WIRE_TYPES[2](last_pc=0x104, last_insn=None)
+        return t.WIRE_TYPES, [coverage, stimulus, dut_state]
+    if dut == "ibex_decoder":
+        coverage = t.CoverageDatabase.create(["add", "sub"], ["word", "byte"])
+        coverage.read_reg_a[rng.randrange(32)] += 1
+        coverage.alu_ops_x_write_reg["sub"][rng.randrange(32)] += 2
+        coverage.misc["illegal_insn"] = rng.randrange(1000)
+        return t.WIRE_TYPES, [coverage]
+
+    if dut == "stride_detector":
+        coverage.stride_1_seen = [rng.randrange(3) for _ in range(t.NUM_STRIDES)]
+        coverage.stride_2_seen = [
+            [rng.randrange(3) for _ in range(t.NUM_STRIDES)] for _ in range(t.NUM_STRIDES)
+        ]
+        coverage.misc_bins = {"no_stride_to_single": rng.randrange(3), "double_stride_to_single": 0}
+        stimulus = t.Stimulus(value=-5, finish=False)
+        dut_state = t.DUTState(1, -16, 3, [15, 0], 1, [2, 0])
+    elif dut == "agile_prefetcher.weight_bank":
+        coverage.out_features = [rng.randrange(3) for _ in range(t.BOUND + 1)]
+        coverage.in_features = [rng.randrange(3) for _ in range(t.BOUND // 16 + 1)]
+        coverage.combined_features = [
+            [rng.randrange(3) for _ in range(t.BOUND + 1)] for _ in range(t.BOUND // 16 + 1)
+        ]
+        stimulus = t.Stimulus(value=[(1, 2), (3, 4)], finish=True)
+        dut_state = t.DUTState(reset_weights=1)
+    else:
+        coverage.misc_bins = {"read": rng.randrange(3), "write": rng.randrange(2**32)}
+        stimulus = t.Stimulus(value=[1, 0, None], finish=False)
+        dut_state = t.DUTState(allocated_nodeslot=3) if "agile" in dut else t.DUTState()
+    return t.WIRE_TYPES, [coverage, stimulus, dut_state]
+
+
+# comparable form of a message, the coverage databases not being dataclasses
+def _plain(value):
+    if isinstance(value, (list, tuple)):
+        return type(value)(_plain(v) for v in value)
+    if isinstance(value, dict):
+        return {_plain(k): _plain(v) for (k, v) in value.items()}
+    if isinstance(value, Enum) or not hasattr(value, "__dict__"):
+        return value
+    return (type(value).__name__, _plain(vars(value)))
+
+
+class TestWireCodec(unittest.TestCase):
+    DUTS = [
+        "stride_detector",
+        "async_fifo",
+        "sdram_controller",
+        "ibex_cpu",
+        "mips_cpu",
+        "ibex_decoder",
+        "agile_prefetcher.fetch_tag",
+        "agile_prefetcher.prefetcher",
+        "agile_prefetcher.weight_bank",
+    ]
+
+    def round_trip(self, sender: WireCodec, receiver: WireCodec, message):
+        payload = sender.encode(message)
+        self.assertTrue(is_wire_message(payload))
+        decoded = receiver.decode(payload)
+        self.assertEqual(_plain(message), _plain(decoded))
+        return payload
+
+    def test_round_trip(self) -> None:
+        rng = random.Random(0)
+        for dut in self.DUTS:
+            with self.subTest(dut=dut):
+                wire_types, messages = _sample_messages(dut, rng)
+                coverage = messages[0]
+                sender, receiver = WireCodec(wire_types), WireCodec(wire_types)
+                for message in messages:
+                    self.round_trip(sender, receiver, message)
+                self.round_trip(sender, receiver, tuple(messages[1:]) + (coverage,))
+                self.round_trip(sender, receiver, StimulusBatch(stimuli=messages[1:2] * 3))
+                self.round_trip(
+                    sender,
+                    receiver,
+                    BatchReply(reply=(messages[-1], coverage), coverage_deltas=[{}, {("a", 1): 2}]),
+                )
+                self.round_trip(sender, receiver, CoverageUpdate(changes={("b", "c"): 1}))
+                self.round_trip(sender, receiver, CoverageUpdate(changes={}, snapshot=coverage))
+                self.round_trip(sender, receiver, ReplyModeRequest(coverage_updates=True))
+
+    # the layout is sent once, and again when it changes
+    def test_layout(self) -> None:
+        wire_types, (coverage, _, _) = _sample_messages("sdram_controller", random.Random(0))
+        sender, receiver = WireCodec(wire_types), WireCodec(wire_types)
+        first = self.round_trip(sender, receiver, coverage)
+        coverage.misc_bins["read"] += 1
+        second = self.round_trip(sender, receiver, coverage)
+        self.assertLess(len(second), len(first))
+        coverage.misc_bins["activate"] = 1
+        self.assertGreater(len(self.round_trip(sender, receiver, coverage)), len(second))
+
+        self.assertRaises(RuntimeError, WireCodec(wire_types).decode, second)
+
+    def test_refused(self) -> None:
+        codec = WireCodec(_sample_messages("async_fifo", random.Random(0))[0])
+        self.assertRaises(TypeError, codec.encode, object())
+        self.assertRaises(RuntimeError, codec.decode, b"XX\x01\x00")
+        self.assertFalse(is_wire_message(b"\x80\x04"))
+
+
+class TestCounterReader(unittest.TestCase):
+    def test_delta(self) -> None:
+        rng = random.Random(0)
+        wire_types, (coverage, _, _) = _sample_messages("ibex_cpu", rng)
+        reader = CounterReader()
+        before = reader.read(coverage)
+        for i in range(20):
+            counters = coverage_counters(coverage)
+            for _ in range(rng.randrange(4)):
+                instr = rng.choice(list(coverage.instructions))
+                covs = coverage.instructions[instr]
+                if covs:
+                    covs[rng.choice(list(covs))] += rng.randrange(1, 3)
+            if i == 10:
+                # counters created by a stimulus
+                coverage.instructions["new"] = {"seen": 1}
+            after = reader.read(coverage)
+            self.assertEqual(
+                coverage_delta(counters, coverage_counters(coverage)), reader.delta(before, after)
+            )
+            before = after
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -2,12 +2,26 @@
 # Licensed under the Apache License, Version 2.0, see LICENSE for details.
 # SPDX-License-Identifier: Apache-2.0
 
+import random
 import re
+import unittest
 from abc import abstractmethod
 from typing import List, Tuple, Optional
 
+from ibex_cpu.assembler import MNEMONICS, AssemblyError, assemble
+
 
 class BaseExtractor:
+    def __init__(self):
+        # response streamed in so far, the length of its settled part, and the
+        # number of stimuli returned from it
+        self.stream_text = ""
+        self.settled_len = 0
+        self.streamed_cnt = 0
+        # problems with the last response extracted, to be reported back to the
+        # LLM in the next prompt
+        self.errors: List[str] = []
+
     @abstractmethod
     def __call__(self, text: str):
         raise NotImplementedError
@@ -16,6 +30,39 @@ class BaseExtractor:
     def reset(self):
         raise NotImplementedError
 
+    # Extraction of a response as it streams in: feed() takes each new piece of
+    # text and returns the stimuli it completes, flush() the rest once the
+    # response has ended. Together they return the stimuli __call__ would of
+    # the whole response, in the same order.
+    def feed(self, text: str) -> list:
+        self.stream_text += text
+        settled = self._settled(self.stream_text)
+        if len(settled) <= self.settled_len:
+            return []
+        self.settled_len = len(settled)
+        stimuli = self._extract(settled)
+        new_stimuli = stimuli[self.streamed_cnt :]
+        self.streamed_cnt = len(stimuli)
+        return new_stimuli
+
+    def flush(self) -> list:
+        stimuli = self._extract(self.stream_text) if self.stream_text else []
+        new_stimuli = stimuli[self.streamed_cnt :]
+        self.stream_text = ""
+        self.settled_len = 0
+        self.streamed_cnt = 0
+        return new_stimuli
+
+    # The longest prefix of a partial response whose stimuli are a prefix of
+    # those of any complete response starting with it; by default none, so
+    # that stimuli are only extracted once the response has ended
+    def _settled(self, text: str) -> str:
+        return ""
+
+    # __call__ without logging
+    def _extract(self, text: str) -> list:
+        return self(text)
+
 
 class DumbExtractor(BaseExtractor):
     def __init__(self):
@@ -30,9 +77,158 @@ class DumbExtractor(BaseExtractor):
         )
         return numbers
 
+    # up to the last separator, which no literal spans
+    def _settled(self, text: str) -> str:
+        return text[: re.search(r"[^\s,;()\[\]{}]*\Z", text).start()]
+
     def reset(self):
         pass
 
+# Extracts the integers of a response written with constructs that are expanded
+# here, instead of being spelled out by the LLM one integer at a time:
+#   range(start, stride, count)    count integers from start, stride apart
+#   alt(start, s1, s2, count)      count integers from start, with strides s1
+#                                  and s2 in turn
+#   repeat(seq, n)                 seq n times, seq being a construct, an
+#                                  integer or a list [a, b, range(...), ...]
+# Integers outside the constructs are taken as they are, as by DumbExtractor, so
+# that plain lists still work. A malformed construct is dropped whole, and what
+# is wrong with it is kept in `errors`. Each expansion is cut at max_len
+# integers.
+class StrideDSLExtractor(BaseExtractor):
+    TOKEN = r"0x[\da-fA-F]+|-?\d+(?!\d)(?!\.)(?!:)|[A-Za-z_]\w*|[()\[\],]"
+    ARGS = {
+        "range": ("start", "stride", "count"),
+        "alt": ("start", "s1", "s2", "count"),
+        "repeat": ("seq", "n"),
+    }
+    ARITY = {k: len(args) for (k, args) in ARGS.items()}
+    MAX_ERRORS = 10
+
+    def __init__(self, max_len: int = 10000):
+        super().__init__()
+        self.max_len = max_len
+
+    def __call__(self, text: str) -> List[int]:
+        matches = list(re.finditer(self.TOKEN, text))
+        tokens = [match.group() for match in matches]
+        numbers = []
+        self.errors = []
+        i = 0
+        while i < len(tokens):
+            if tokens[i] in self.ARITY and tokens[i + 1 : i + 2] == ["("]:
+                end = self._closing(tokens, i + 1)
+                try:
+                    sequence, pos = self._expression(tokens[:end], i)
+                    if pos != end:
+                        raise ValueError(f"unexpected {tokens[pos]}")
+                    numbers += sequence
+                except (ValueError, IndexError) as e:
+                    if len(self.errors) < self.MAX_ERRORS:
+                        construct = text[matches[i].start() : matches[end - 1].end()]
+                        error = str(e) if isinstance(e, ValueError) else "not closed"
+                        self.errors.append(f"{construct}: {error}")
+                i = end
+            elif self._is_int(tokens[i]):
+                numbers.append(self._int(tokens[i]))
+                i += 1
+            else:
+                i += 1
+        return numbers
+
+    # up to the last separator outside of the constructs
+    def _settled(self, text: str) -> str:
+        depth = 0
+        end = 0
+        for (i, c) in enumerate(text):
+            if c == "(":
+                depth += 1
+            elif c == ")":
+                depth = max(0, depth - 1)
+            elif depth == 0 and c in " \t\n,;":
+                end = i
+        return text[:end]
+
+    # index after the ")" closing the "(" at `start`, or the end of the tokens
+    def _closing(self, tokens: List[str], start: int) -> int:
+        depth = 0
+        for i in range(start, len(tokens)):
+            if tokens[i] == "(":
+                depth += 1
+            elif tokens[i] == ")":
+                depth -= 1
+                if depth == 0:
+                    return i + 1
+        return len(tokens)
+
+    # (integers, index after it) of the expression at `pos`
+    def _expression(self, tokens: List[str], pos: int) -> Tuple[List[int], int]:
+        token = tokens[pos]
+        if self._is_int(token):
+            return [self._int(token)], pos + 1
+        if token == "[":
+            sequence = []
+            pos += 1
+            while tokens[pos] != "]":
+                item, pos = self._expression(tokens, pos)
+                sequence += item
+                if tokens[pos] == ",":
+                    pos += 1
+                elif tokens[pos] != "]":
+                    raise ValueError(f"expected , or ] instead of {tokens[pos]}")
+            return sequence[: self.max_len], pos + 1
+        if token not in self.ARITY or tokens[pos + 1] != "(":
+            raise ValueError(f"{token} is not an integer, a list or a construct")
+
+        pos += 2
+        args = []
+        while tokens[pos] != ")":
+            if token == "repeat" and len(args) == 0:
+                arg, pos = self._expression(tokens, pos)
+            else:
+                arg, pos = self._int(tokens[pos]), pos + 1
+            args.append(arg)
+            if tokens[pos] == ",":
+                pos += 1
+            elif tokens[pos] != ")":
+                raise ValueError(f"expected , or ) instead of {tokens[pos]}")
+        if len(args) != self.ARITY[token]:
+            raise ValueError(
+                f"{token} takes {self.ARITY[token]} arguments ({', '.join(self.ARGS[token])}), "
+                f"not {len(args)}"
+            )
+        if args[-1] < 0:
+            raise ValueError(f"negative {self.ARGS[token][-1]}")
+        count = min(args[-1], self.max_len)
+
+        if token == "range":
+            start, stride = args[0], args[1]
+            sequence = [start + i * stride for i in range(count)]
+        elif token == "alt":
+            start, strides = args[0], args[1:3]
+            sequence = [start]
+            for i in range(count - 1):
+                sequence.append(sequence[-1] + strides[i % 2])
+            sequence = sequence[:count]
+        else:
+            sequence = []
+            while len(sequence) < self.max_len and count > 0 and len(args[0]) > 0:
+                sequence += args[0]
+                count -= 1
+            sequence = sequence[: self.max_len]
+        return sequence, pos + 1
+
+    def _is_int(self, token: str) -> bool:
+        return token[:2] == "0x" or token.lstrip("-").isdigit()
+
+    def _int(self, token: str) -> int:
+        if not self._is_int(token):
+            raise ValueError(f"{token} is not an integer")
+        return int(token, 16) if token[:2] == "0x" else int(token)
+
+    def reset(self):
+        self.errors = []
+
 class AG_FTExtractor(BaseExtractor):
     def __init__(self):
         super().__init__()
@@ -71,6 +267,13 @@ class ICExtractor(BaseExtractor):
 
     def __call__(self, text: str) -> List[Tuple[int, int]]:
         print(text)
+        return self._extract(text)
+
+    # up to the last "),", i.e. the pairs followed by another one
+    def _settled(self, text: str) -> str:
+        return text[: text.rfind("),") + 2] if ")," in text else ""
+
+    def _extract(self, text: str) -> List[Tuple[int, int]]:
         if(text[-1] != "]"):
             text = "),".join(text.split("),")[:-1]) + ")]"
         pairs: List[str] = list(
@@ -97,6 +300,18 @@ class UniversalExtractor(BaseExtractor):
     def __call__(self, text):
         print("===============================")
         print(text)
+        stimuli = self._extract(text)
+        print(stimuli)
+        print("================================")
+        return stimuli
+
+    # once the list has started, up to the last ",", i.e. the complete fields
+    def _settled(self, text: str) -> str:
+        if "[" not in text or text.rfind(",") < text.index("["):
+            return ""
+        return text[: text.rfind(",")]
+
+    def _extract(self, text):
         stimuli = []
         if("[" in text):
             text = "[".join(text.split("[")[1:])
@@ -108,9 +323,157 @@ class UniversalExtractor(BaseExtractor):
                 current_stimulus.append(stim_str[i+j])
             stimuli.append(current_stimulus)
             i += self.stim_seq_length
-        print(stimuli)
-        print("================================")
         return stimuli
     
     def reset(self):
-        pass
\ No newline at end of file
+        pass
+
+
+# Assembles a response of RISC-V instructions, one per line, e.g. "add x5, x6,
+# x7" (see ibex_cpu/assembler.py), into stimuli shaped as those of
+# UniversalExtractor(1), i.e. single hex words. Lines that do not start with an
+# instruction are ignored, except those that look like one with an unsupported
+# mnemonic; these and the lines that fail to assemble are kept in `errors`.
+class AsmExtractor(BaseExtractor):
+    MAX_ERRORS = 10
+
+    def __init__(self):
+        super().__init__()
+
+    def __call__(self, text: str) -> List[List[str]]:
+        print(text)
+        return self._extract(text)
+
+    # up to the last line break, i.e. the complete lines
+    def _settled(self, text: str) -> str:
+        return text[: text.rfind("\n") + 1]
+
+    def _extract(self, text: str) -> List[List[str]]:
+        stimuli = []
+        self.errors = []
+        for line in re.split(r"[\n;]", text):
+            # list and markdown decorations, and comments
+            line = re.sub(r"(#|//).*", "", line)
+            line = line.strip(" \t\r[]\"'`,*-")
+            line = re.sub(r"^\d+[.)]\s*", "", line)
+            match = re.match(r"([a-zA-Z]+)\s+(\w+\s*,.*)$", line)
+            if match is None:
+                continue
+            if match.group(1).lower() not in MNEMONICS and not re.match(
+                r"(x\d+|zero|ra|sp|gp|tp|fp|[ast]\d+)\s*,", match.group(2), re.I
+            ):
+                continue
+            try:
+                stimuli.append([f"0x{assemble(line):08x}"])
+            except AssemblyError as e:
+                if len(self.errors) < self.MAX_ERRORS:
+                    self.errors.append(f"{line}: {e}")
+        return stimuli
+
+    def reset(self):
+        self.errors = []
+
+
+# Everything above is what `from stimuli_extractor import *` gives, as before the
+# tests below were added
+__all__ = [k for k in dir() if not k.startswith("_")]
+
+
+"""Tests"""
+
+
+class TestStrideDSLExtractor(unittest.TestCase):
+    def setUp(self) -> None:
+        self.extractor = StrideDSLExtractor(max_len=50)
+
+    def _check(self, cases: List[Tuple[str, List[int]]]):
+        for (text, numbers) in cases:
+            with self.subTest(text=text):
+                self.assertEqual(numbers, self.extractor(text))
+                self.assertEqual([], self.extractor.errors)
+
+    def test_grammar(self) -> None:
+        self._check(
+            [
+                # the examples of the prompt
+                ("range(-15, 1, 18)", list(range(-15, 3))),
+                ("alt(-15, -1, 2, 18)", [-15 + i // 2 - i % 2 for i in range(18)]),
+                ("repeat([1, 5, 4], 2)", [1, 5, 4, 1, 5, 4]),
+                ("[1, 5, 4, -11, -12, 5]\nalt(0, 3, -5, 4)", [1, 5, 4, -11, -12, 5, 0, 3, -2, 1]),
+                ("repeat(range(0, 2, 2), 3)", [0, 2, 0, 2, 0, 2]),
+                ("repeat([alt(0, 1, 1, 2), 9], 2)", [0, 1, 9, 0, 1, 9]),
+                ("1, 0x10 range(0x10, 0x1, 2) -3", [1, 16, 16, 17, -3]),
+                ("range(0, 1, 0) alt(5, 1, 1, 1) repeat([], 3)", [5]),
+                # cut at max_len
+                ("repeat(range(0, 1, 30), 5)", list(range(30)) + list(range(20))),
+                ("range(0, 1, 100)", list(range(50))),
+            ]
+        )
+
+    def test_negative_strides(self) -> None:
+        self._check(
+            [
+                ("range(10, -3, 4)", [10, 7, 4, 1]),
+                ("alt(0, -4, 1, 5)", [0, -4, -3, -7, -6]),
+                ("[range(5, -2, 3), -1]", [5, 3, 1, -1]),
+                ("alt(-1, -1, -1, 3)", [-1, -2, -3]),
+            ]
+        )
+
+    # malformed constructs are dropped, told why, and the rest is extracted
+    def test_malformed(self) -> None:
+        text = (
+            "range(0, 1) 7 range(0, 1, -2)\nalt(1, 2, 3, x) 8 repeat([1 2], 2) "
+            "range(0, 1, 2) 3) range(4, 4"
+        )
+        self.assertEqual([7, 8, 0, 1, 3], self.extractor(text))
+        self.assertEqual(
+            [
+                "range(0, 1): range takes 3 arguments (start, stride, count), not 2",
+                "range(0, 1, -2): negative count",
+                "alt(1, 2, 3, x): x is not an integer",
+                "repeat([1 2], 2): expected , or ] instead of 2",
+                "range(4, 4: not closed",
+            ],
+            self.extractor.errors,
+        )
+        # those of the last response only, and not too many
+        self.extractor("range(0, 1, 2)")
+        self.assertEqual([], self.extractor.errors)
+        self.extractor("range(1) " * 20)
+        self.assertEqual(StrideDSLExtractor.MAX_ERRORS, len(self.extractor.errors))
+
+
+class TestStreamedExtraction(unittest.TestCase):
+    RESPONSES = [
+        (DumbExtractor, "Values: 1, 2, -3\n0x1f 45; [6, 7] 8.5 9: 10 -11"),
+        (
+            StrideDSLExtractor,
+            "range(0, 4, 5), alt(1, 2, -3, 4)\nrepeat([1, range(2, 1, 2)], 2) 7 [8, 9] range(1, 2",
+        ),
+        (ICExtractor, "[(0x1, 0x2), ('0x3', '0x4'), (0x5, 0x6)]"),
+        (lambda: UniversalExtractor(2), "Here: [a, 1, b, 2, c, 3, d]"),
+        (AsmExtractor, "1. add x5, x6, x7\naddi x1, x0, 5 # five\nfoo x1, x2\nlw a0, 4(sp)"),
+    ]
+
+    # the stimuli of a response fed in random pieces are those of the whole
+    # response, in the same order
+    def test_feed_flush(self) -> None:
+        rng = random.Random(0)
+        for (extractor_type, response) in self.RESPONSES:
+            extractor = extractor_type()
+            whole = extractor._extract(response)
+            self.assertGreater(len(whole), 2)
+            for _ in range(20):
+                cuts = sorted(rng.sample(range(1, len(response)), rng.randint(1, 12)))
+                pieces = [response[i:j] for (i, j) in zip([0] + cuts, cuts + [len(response)])]
+                streamed = []
+                for piece in pieces:
+                    streamed += extractor.feed(piece)
+                streamed += extractor.flush()
+                with self.subTest(extractor=type(extractor).__name__, pieces=pieces):
+                    self.assertEqual(whole, streamed)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,30 @@
+# Copyright ***** contributors.
+# Licensed under the Apache License, Version 2.0, see LICENSE for details.
+# SPDX-License-Identifier: Apache-2.0
+
+from shared_helpers.dut_registry import *
+from stride_detector.shared_types import CoverageDatabase, DUTState
+
+# Registers the stride detector's types with GlobalCoverageDatabase and GlobalDUTState
+
+
+def coverage_bins_SD(coverage: CoverageDatabase) -> List[Bin]:
+    bins = []
+    for i in range(len(coverage.stride_1_seen)):
+        stride = i - 32 if i >= 16 else i
+        bins.append((("stride_1_seen", i), f"single_{stride}", "single", 1))
+    for (i, row) in enumerate(coverage.stride_2_seen):
+        for j in range(len(row)):
+            if i == j:
+                continue
+            stride_1 = i - 32 if i >= 16 else i
+            stride_2 = j - 32 if j >= 16 else j
+            bins.append(
+                (("stride_2_seen", i, j), f"double_{stride_1}_{stride_2}", "double", 2.5)
+            )
+    bins += misc_bins(coverage)
+    return bins
+
+
+register_coverage(CoverageDatabase, coverage_bins_SD)
+register_dut_state(DUTState)
@@ -16,37 +16,42 @@ import numpy as np
 import argparse
 
 from models.llm_azure import AzureOpenai
+from models.response_cache import ResponseCache
+from models.llm_transport import shared_transport
+from models.llm_scheduler import TokenBucketScheduler
 
 directory = os.path.dirname(os.path.abspath("__file__"))
 sys.path.insert(0, os.path.dirname(directory))
 # print(sys.path)
 
 from stride_detector.shared_types import *
+from shared_helpers.stimulus_sender import BaseStimulusSender, sender_address, ask_server_ip_port
+from stride_detector.golden_model import StrideDetectorModel
+from shared_helpers.simulator_pool import SimulatorPool
+from shared_helpers.coverage_store import CoverageRecorder
+from shared_helpers.coverage_attribution import CoverageAttributor
 from global_shared_types import *
 from agents.agent_random import *
 from agents.agent_LLM import *
+from agents.agent_multi_dialog import MultiDialogAgent
 from prompt_generators.prompt_generator_fixed_SD import FixedPromptGenerator4SD1
 from prompt_generators.prompt_generator_template_SD import *
 from models.llm_gpt import ChatGPT
 from models.llm_openrouter import OpenRouter
-from stimuli_extractor import DumbExtractor
+from stimuli_extractor import DumbExtractor, StrideDSLExtractor
 from stimuli_filter import Filter
 from loggers.logger_csv import CSVLogger
 from loggers.logger_txt import TXTLogger
+from loggers.logger_base import log_dir
 from pathlib import Path
 
 
 
-class StimulusSender:
-    def __init__(self, zmq_addr):
-        self.context = zmq.Context()
-        self.socket = self.context.socket(zmq.REQ)
-        self.socket.connect(zmq_addr)
-
-    def send_stimulus(self, stimulus_obj):
-        self.socket.send_pyobj(stimulus_obj)
-        state_coverage_obj = self.socket.recv_pyobj()
+class StimulusSender(BaseStimulusSender):
+    wire_types = WIRE_TYPES
+    golden_model = StrideDetectorModel
 
+    def check_reply(self, state_coverage_obj):
         if not isinstance(state_coverage_obj, tuple):
             raise RuntimeError("Bad format of coverage response")
         if not isinstance(state_coverage_obj[0], DUTState):
@@ -54,22 +59,19 @@ class StimulusSender:
         if not isinstance(state_coverage_obj[1], CoverageDatabase):
             raise RuntimeError("Bad format of coverage response element 1")
 
-        return state_coverage_obj
-
-    def close(self):
-        if self.socket:
-            self.socket.close()
-
 
 def random_experiment():
     print("Running random experiment on SD...\n")
 
     # server_ip_port = "0.0.0.0:5050"
-    server_ip_port = input(
-        "Please enter server's IP and port (e.g. 127.0.0.1:5050, 128.232.65.218:5555): "
+    server_ip_port = ask_server_ip_port(
+        "Please enter server's IP and port (e.g. 127.0.0.1:5050, 128.232.65.218:5555) or shm://name, "
+        "comma separated for several simulators: "
     )
 
     CYCLES = 1000000
+    BATCH_SIZE = 1000
+    WINDOW = 4
     agent = RandomAgent(total_cycle=CYCLES, seed=int(datetime.now().timestamp()))
 
     # run test
@@ -77,10 +79,19 @@ def random_experiment():
     g_dut_state = GlobalDUTState()
     g_coverage = GlobalCoverageDatabase()
 
-    with closing(StimulusSender(f"tcp://{server_ip_port}")) as stimulus_sender:
+    addresses = [sender_address(addr) for addr in server_ip_port.split(",")]
+    with closing(SimulatorPool(StimulusSender, addresses, window=WINDOW)) as stimulus_sender:
+        stimulus_sender.request_coverage_updates()
         while not agent.end_simulation(g_dut_state, g_coverage):
-            stimulus.value = agent.generate_next_value(g_dut_state, g_coverage)
-            dut_state, coverage = stimulus_sender.send_stimulus(stimulus)
+            values = agent.generate_next_batch(g_dut_state, g_coverage, BATCH_SIZE)
+            replies = stimulus_sender.submit_stimuli(
+                [Stimulus(value=value, finish=False) for value in values]
+            )
+            for (dut_state, coverage), _ in replies[-1:]:
+                g_dut_state.set(dut_state)
+                g_coverage.set(coverage)
+
+        for (dut_state, coverage), _ in stimulus_sender.drain()[-1:]:
             g_dut_state.set(dut_state)
             g_coverage.set(coverage)
 
@@ -98,7 +109,35 @@ def random_experiment():
         stimulus_sender.send_stimulus(stimulus)
 
 
-def main(model_name="meta-llama/llama-2-70b-chat", missed_bin_sampling="RANDOM", best_iter_message_sampling="Recent Responses", dialogue_restarting="rst_plan_Low_Tolerance", buffer_resetting="STABLE", code_summary_type = 0, few_shot=0):
+# The options after few_shot are keyword only, see the command line flags below
+def main(
+    model_name="meta-llama/llama-2-70b-chat",
+    missed_bin_sampling="RANDOM",
+    best_iter_message_sampling="Recent Responses",
+    dialogue_restarting="rst_plan_Low_Tolerance",
+    buffer_resetting="STABLE",
+    code_summary_type=0,
+    few_shot=0,
+    *,
+    batch_size=1,
+    coverage_updates=0,
+    window=1,
+    prefetch_threshold=0,
+    prefetch_tolerance=0,
+    dialogs=1,
+    coverage_store="",
+    response_cache="",
+    response_cache_mode="DETERMINISTIC",
+    llm_seed=None,
+    requests_per_minute=0,
+    tokens_per_minute=0,
+    streaming=0,
+    stream_stimulus_bound=0,
+    stream_stall_chars=0,
+    stimulus_dsl=0,
+    attribution=0,
+    buffer_patience=0,
+):
     if(dialogue_restarting == "rst_plan_Normal_Tolerance"):
         dialogue_restarting = rst_plan_Normal_Tolerance
     elif (dialogue_restarting == "rst_plan_Low_Tolerance"):
@@ -109,13 +148,14 @@ def main(model_name="meta-llama/llama-2-70b-chat", missed_bin_sampling="RANDOM",
         dialogue_restarting = rst_plan_Coverage_RateBased_Tolerance
     print("Running main experiment on SD...\n")
 
-    server_ip_port = input(
-        "Please enter server's IP and port (e.g. 127.0.0.1:5050, 128.232.65.218:5555): "
+    server_ip_port = ask_server_ip_port(
+        "Please enter server's IP and port (e.g. 127.0.0.1:5050, 128.232.65.218:5555) or shm://name, "
+        "comma separated for several simulators: "
     )
     # server_ip_port = "0.0.0.0:5050"
 
     # build loggers
-    prefix = "./logs/" + model_name + "_"
+    prefix = log_dir() + model_name + "_"
 
     if("gpt-3" in model_name):
         prefix = prefix.replace("openai", "openai_gpt-3")
@@ -173,66 +213,166 @@ def main(model_name="meta-llama/llama-2-70b-chat", missed_bin_sampling="RANDOM",
 
     t = datetime.now()
     t = t.strftime("%Y%m%d_%H%M%S")
-    logger_txt = TXTLogger(f"{prefix}{t}.txt")
-    logger_csv = CSVLogger(f"{prefix}{t}.csv")
-
-    # build components
-    prompt_generator = TemplatePromptGenerator4SD1(
-        bin_descr_path="../examples_SD/bins_description.txt",
-        dut_code_path="stride_detector.sv",
-        tb_code_path="stride_detector_cocotb.py",
-        sampling_missed_bins_method=missed_bin_sampling,
-        code_summary_type=int(code_summary_type),
-        easy_cutoff = 200,
-        few_shot=int(few_shot)
-    )
 
-    # stimulus_generator = Llama2(system_prompt=prompt_generator.generate_system_prompt())
-    # print('Llama2 successfully built')
-    stimulus_generator = AzureOpenai(
-        system_prompt=prompt_generator.generate_system_prompt(),
-        best_iter_buffer_resetting=buffer_resetting,
-        compress_msg_algo=best_iter_message_sampling.replace("_", " "),
-        prioritise_harder_bins=False,
-        model_name=model_name
-    )
-    extractor = DumbExtractor()
-    stimulus_filter = Filter(-10000, 10000)
-
-    # create agent
-    agent = LLMAgent(
-        prompt_generator,
-        stimulus_generator,
-        extractor,
-        stimulus_filter,
-        [logger_txt, logger_csv],
-        dialog_bound=700,
-        rst_plan=dialogue_restarting,
-        bin_count = 1034
+    # shared by the LLMs of all dialogs
+    cache = ResponseCache(response_cache, response_cache_mode) if response_cache else None
+    scheduler = (
+        TokenBucketScheduler(requests_per_minute, tokens_per_minute)
+        if requests_per_minute or tokens_per_minute
+        else None
     )
+
+    # one dialog: loggers, prompt generator, LLM and agent
+    def build_dialog(log_name):
+        logger_txt = TXTLogger(f"{prefix}{log_name}.txt")
+        logger_csv = CSVLogger(f"{prefix}{log_name}.csv")
+
+        # build components
+        prompt_generator = TemplatePromptGenerator4SD1(
+            bin_descr_path="../examples_SD/bins_description.txt",
+            dut_code_path="stride_detector.sv",
+            tb_code_path="stride_detector_cocotb.py",
+            sampling_missed_bins_method=missed_bin_sampling,
+            code_summary_type=int(code_summary_type),
+            easy_cutoff = 200,
+            few_shot=int(few_shot),
+            stimulus_dsl=bool(stimulus_dsl),
+        )
+
+        # stimulus_generator = Llama2(system_prompt=prompt_generator.generate_system_prompt())
+        # print('Llama2 successfully built')
+        stimulus_generator = AzureOpenai(
+            system_prompt=prompt_generator.generate_system_prompt(),
+            best_iter_buffer_resetting=buffer_resetting,
+            compress_msg_algo=best_iter_message_sampling.replace("_", " "),
+            prioritise_harder_bins=False,
+            model_name=model_name
+        )
+        stimulus_generator.response_cache = cache
+        stimulus_generator.seed = llm_seed
+        stimulus_generator.scheduler = scheduler
+        extractor = StrideDSLExtractor() if stimulus_dsl else DumbExtractor()
+        stimulus_filter = Filter(-10000, 10000)
+
+        # create agent
+        return LLMAgent(
+            prompt_generator,
+            stimulus_generator,
+            extractor,
+            stimulus_filter,
+            [logger_txt, logger_csv],
+            dialog_bound=700,
+            rst_plan=dialogue_restarting,
+            bin_count = 1034,
+            prefetch_threshold=prefetch_threshold,
+            prefetch_tolerance=prefetch_tolerance,
+            streaming=bool(streaming),
+            stream_stimulus_bound=stream_stimulus_bound,
+            stream_stall_chars=stream_stall_chars,
+            buffer_policy=StagnationBufferPolicy(buffer_patience) if buffer_patience else None,
+        )
+
+    if dialogs > 1:
+        agent = MultiDialogAgent([build_dialog(f"{t}_dialog{i}") for i in range(dialogs)])
+    else:
+        agent = build_dialog(t)
     print("Agent successfully built\n")
 
     # run test
     stimulus = Stimulus(value=0, finish=False)
     g_dut_state = GlobalDUTState()
     g_coverage = GlobalCoverageDatabase()
-
-    with closing(StimulusSender(f"tcp://{server_ip_port}")) as stimulus_sender:
+    # merge the coverage of this run into the campaign's store on disk
+    recorder = CoverageRecorder(coverage_store, prefix + t) if coverage_store else None
+    # credit newly hit bins to the stimuli, and their responses, that hit them
+    attributor = CoverageAttributor() if attribution else None
+    stimulus_cnt = 0
+
+    addresses = [sender_address(addr) for addr in server_ip_port.split(",")]
+    with closing(SimulatorPool(StimulusSender, addresses, window=window)) as stimulus_sender:
+        if coverage_updates:
+            stimulus_sender.request_coverage_updates()
         while not agent.end_simulation(g_dut_state, g_coverage):
-            stimulus.value = agent.generate_next_value(g_dut_state, g_coverage)
-            dut_state, coverage = stimulus_sender.send_stimulus(stimulus)
+            values = agent.generate_next_batch(g_dut_state, g_coverage, batch_size)
+            replies = stimulus_sender.submit_stimuli(
+                [Stimulus(value=value, finish=False) for value in values],
+                tag=agent.batch_origins if attributor is not None else None,
+            )
+            # wait for the simulator only when the agent is about to prompt again
+            if agent.needs_coverage_feedback():
+                replies += stimulus_sender.drain()
+            stimulus_cnt += sum(len(deltas) for (_, deltas) in replies)
+            g_coverage.set_progress(agent.total_msg_cnt, stimulus_cnt)
+            for (dut_state, coverage), _ in replies[-1:]:
+                g_dut_state.set(dut_state)
+                g_coverage.set(coverage)
+            if attributor is not None:
+                for (origins, coverage_deltas) in stimulus_sender.take_tagged():
+                    attributor.attribute(origins, coverage_deltas, g_coverage)
+            if recorder is not None:
+                recorder.record(g_coverage, agent.total_msg_cnt)
+
+        replies = stimulus_sender.drain()
+        stimulus_cnt += sum(len(deltas) for (_, deltas) in replies)
+        g_coverage.set_progress(agent.total_msg_cnt, stimulus_cnt)
+        for (dut_state, coverage), _ in replies[-1:]:
             g_dut_state.set(dut_state)
             g_coverage.set(coverage)
+        if attributor is not None:
+            for (origins, coverage_deltas) in stimulus_sender.take_tagged():
+                attributor.attribute(origins, coverage_deltas, g_coverage)
+        if recorder is not None:
+            recorder.record(g_coverage, agent.total_msg_cnt)
+            recorder.close()
 
         coverage_plan = {
             k: v for (k, v) in g_coverage.get_coverage_plan().items() if v > 0
         }
         print(
-            f"Finished at dialog #{agent.dialog_index}, message #{agent.msg_index}, \n"
-            f"with total {agent.total_msg_cnt} messages \n"
+            (
+                f"Finished {dialogs} dialogs, \n"
+                if dialogs > 1
+                else f"Finished at dialog #{agent.dialog_index}, message #{agent.msg_index}, \n"
+            )
+            + f"with total {agent.total_msg_cnt} messages \n"
             f"Hits: {coverage_plan}, \n"
             f"Coverage rate: {g_coverage.get_coverage_rate()}\n"
         )
+        # message and stimulus count at which each bin was first hit
+        with open(f"{prefix}{t}_first_hits.csv", "w", encoding="UTF8", newline="") as f:
+            writer = csv.writer(f)
+            writer.writerow(["Bin", "Message", "Stimulus"])
+            for (bin_name, (msg_cnt, hit_stimulus_cnt)) in g_coverage.get_first_hits().items():
+                writer.writerow([bin_name, msg_cnt, hit_stimulus_cnt])
+        # the stimuli that newly hit bins, with the response they came from
+        if attributor is not None:
+            dialog_agents = agent.dialogs if dialogs > 1 else [agent]
+            for (i, dialog_agent) in enumerate(dialog_agents):
+                log_name = f"{t}_dialog{i}" if dialogs > 1 else t
+                with open(f"{prefix}{log_name}_attribution.csv", "w", encoding="UTF8", newline="") as f:
+                    writer = csv.writer(f)
+                    writer.writerow(["Dialog", "Message", "Stimulus", "Value", "New bins"])
+                    for ((dialog_index, msg_index, index), (value, new_bins)) in dialog_agent.attribution.items():
+                        writer.writerow([dialog_index, msg_index, index, value, " ".join(new_bins)])
+            print(f"Bins attributed to stimuli: {attributor.attributed_cnt}\n")
+        if prefetch_threshold > 0:
+            dialog_agents = agent.dialogs if dialogs > 1 else [agent]
+            print(
+                f"Prefetched responses used: {sum(d.prefetch_used_cnt for d in dialog_agents)}, "
+                f"discarded: {sum(d.prefetch_discarded_cnt for d in dialog_agents)}\n"
+            )
+        if streaming:
+            dialog_agents = agent.dialogs if dialogs > 1 else [agent]
+            print(f"Streamed responses stopped early: {sum(d.stream_stopped_cnt for d in dialog_agents)}\n")
+        if buffer_patience:
+            dialog_agents = agent.dialogs if dialogs > 1 else [agent]
+            print(f"Responses cut by the buffer policy: {sum(d.buffer_cut_cnt for d in dialog_agents)}\n")
+        if cache is not None:
+            print(f"{cache}\n")
+            cache.close()
+        print(f"{shared_transport()}\n")
+        if scheduler is not None:
+            print(f"{scheduler}\n")
 
         stimulus.value = None
         stimulus.finish = True
@@ -247,13 +387,13 @@ def budget_experiment():
 
     BUDGET = Budget(budget_per_trial=INIT_BUDGET, total_budget=INIT_BUDGET)
 
-    server_ip_port = input(
-        "Please enter server's IP and port (e.g. 127.0.0.1:5050, 128.232.65.218:5555): "
+    server_ip_port = ask_server_ip_port(
+        "Please enter server's IP and port (e.g. 127.0.0.1:5050, 128.232.65.218:5555) or shm://name: "
     )
 
     t = datetime.now()
     t = t.strftime("%Y%m%d_%H%M%S")
-    prefix = f"./logs/{t}_budget/"
+    prefix = f"{log_dir()}{t}_budget/"
     if not os.path.exists(prefix):
         os.makedirs(prefix)
 
@@ -309,7 +449,7 @@ def budget_experiment():
         g_dut_state = GlobalDUTState()
         g_coverage = GlobalCoverageDatabase()
 
-        with closing(StimulusSender(f"tcp://{server_ip_port}")) as stimulus_sender:
+        with closing(StimulusSender(sender_address(server_ip_port))) as stimulus_sender:
             while not agent.end_simulation(g_dut_state, g_coverage):
                 stimulus.value = agent.generate_next_value(g_dut_state, g_coverage)
                 dut_state, coverage = stimulus_sender.send_stimulus(stimulus)
@@ -373,8 +513,26 @@ if __name__ == "__main__":
     parser.add_argument("--buffer_resetting", type=str, default="STABLE")
     parser.add_argument("--code_summary_type", type=int, default=0)
     parser.add_argument("--few_shot", type=int, default=0)
+    parser.add_argument("--batch_size", type=int, default=1)
+    parser.add_argument("--coverage_updates", type=int, default=0)
+    parser.add_argument("--window", type=int, default=1)
+    parser.add_argument("--prefetch_threshold", type=int, default=0, help="stimuli left in the buffer when the next response is requested, 0 to disable")
+    parser.add_argument("--prefetch_tolerance", type=int, default=0, help="newly hit bins a prefetched response is still used after")
+    parser.add_argument("--dialogs", type=int, default=1, help="LLM dialogs kept open at once, each asked for its own share of the missed bins")
+    parser.add_argument("--coverage_store", type=str, default="", help="directory of the on-disk coverage store the run is merged into, empty to disable")
+    parser.add_argument("--response_cache", type=str, default="", help="SQLite file of cached LLM responses, empty to disable")
+    parser.add_argument("--response_cache_mode", type=str, default="DETERMINISTIC", help="DETERMINISTIC reuses responses at temperature 0 or with --llm_seed only, ALWAYS at any temperature")
+    parser.add_argument("--llm_seed", type=int, default=None, help="sampling seed sent with the LLM requests, none by default")
+    parser.add_argument("--requests_per_minute", type=int, default=0, help="LLM requests admitted per minute over all dialogs, 0 for no limit")
+    parser.add_argument("--tokens_per_minute", type=int, default=0, help="LLM tokens admitted per minute over all dialogs, 0 for no limit")
+    parser.add_argument("--streaming", type=int, default=0, help="send stimuli to the simulator as they stream in from the LLM")
+    parser.add_argument("--stream_stimulus_bound", type=int, default=0, help="stimuli after which a streamed response is stopped, 0 for no limit")
+    parser.add_argument("--stream_stall_chars", type=int, default=0, help="characters without a new stimulus after which a streamed response is stopped, 0 for no limit")
+    parser.add_argument("--stimulus_dsl", type=int, default=0, help="let the LLM write stride patterns as range/alt/repeat constructs, expanded locally")
+    parser.add_argument("--attribution", type=int, default=0, help="record which stimuli of which responses newly hit which bins, written to <log>_attribution.csv")
+    parser.add_argument("--buffer_patience", type=int, default=0, help="stimuli in a row without a newly hit bin after which the rest of a response is dropped, counted in whole batches, 0 to disable")
     args = parser.parse_args()
-    main(args.model_name, args.missed_bin_sampling, args.best_iter_message_sampling, args.dialogue_restarting, args.buffer_resetting, args.code_summary_type, args.few_shot)
+    main(**vars(args))
     # Example: python generate_stimulus.py --model_name meta-llama/llama-2-70b-chat --missed_bin_sampling MIXED --best_iter_message_sampling Successful_Responses --dialogue_restarting rst_plan_Low_Tolerance --buffer_resetting KEEP --code_summary_type 0 --few_shot 0
 
 
@@ -0,0 +1,272 @@
+# Copyright ***** contributors.
+# Licensed under the Apache License, Version 2.0, see LICENSE for details.
+# SPDX-License-Identifier: Apache-2.0
+
+import random
+
+from stride_detector.shared_types import *
+
+# Pure Python golden model of stride_detector.sv and its testbench, served
+# in-process for golden:// addresses (see shared_helpers/local_transport.py).
+# It is meant to be cycle accurate: each stimulus is one clock cycle, as in
+# stride_detector_cocotb.py, and the coverage bins are those of its
+# CoverageMonitor. It has not been checked against an RTL trace yet; record one
+# with shared_helpers/golden_conformance.py, and check it after changing either
+# side.
+
+NO_STRIDE = 0
+SINGLE_STRIDE = 1
+DOUBLE_STRIDE = 2
+
+MAX_STRIDE_WIDTH = 5
+STRIDE_MASK = (1 << MAX_STRIDE_WIDTH) - 1
+VALUE_MASK = 0xFFFFFFFF
+
+# stride_2_state_q encoding
+STATE_SECOND_STRIDE = 0
+STATE_FIRST_STRIDE = 1
+
+CONFIDENCE_MAX = 3
+
+
+# Same bins as CoverageMonitor in stride_detector_cocotb.py, sampled from the
+# values of its signals rather than from the DUT
+class CoverageModel:
+    def __init__(self):
+        self.coverage_database = CoverageDatabase()
+
+        self.coverage_database.stride_1_seen = [0] * NUM_STRIDES
+        self.coverage_database.stride_2_seen = []
+
+        for i in range(NUM_STRIDES):
+            self.coverage_database.stride_2_seen.append([0] * NUM_STRIDES)
+
+        self.coverage_database.misc_bins = {
+            "single_stride_n_overflow": 0,
+            "single_stride_p_overflow": 0,
+            "double_stride_nn_overflow": 0,
+            "double_stride_np_overflow": 0,
+            "double_stride_pn_overflow": 0,
+            "double_stride_pp_overflow": 0,
+            "no_stride_to_double": 0,
+            "no_stride_to_single": 0,
+            "single_stride_to_double": 0,
+            "double_stride_to_single": 0,
+        }
+
+        self.stride_state = NO_STRIDE
+        self.no_strides_count = 0
+
+        self.last_values = []
+
+    def sample_coverage(self, valid, value, stride_1_valid, stride_1, stride_2_valid, stride_2):
+        if valid:
+            self.last_values.append(value)
+
+            if len(self.last_values) > 16:
+                self.last_values = self.last_values[-16:]
+
+        if stride_1_valid:
+            if stride_2_valid:
+                self.coverage_database.stride_2_seen[stride_1][stride_2] += 1
+            else:
+                self.coverage_database.stride_1_seen[stride_1] += 1
+
+        self.check_latest_strides()
+
+    def sample_single_stride_coverage(self, single_stride):
+        no_stride = True
+
+        if single_stride < STRIDE_MIN:
+            self.coverage_database.misc_bins["single_stride_n_overflow"] += 1
+        elif single_stride > STRIDE_MAX:
+            self.coverage_database.misc_bins["single_stride_p_overflow"] += 1
+        else:
+            no_stride = False
+
+            if self.stride_state == NO_STRIDE:
+                self.coverage_database.misc_bins["no_stride_to_single"] += 1
+            elif self.stride_state == DOUBLE_STRIDE:
+                self.coverage_database.misc_bins["double_stride_to_single"] += 1
+
+            self.stride_state = SINGLE_STRIDE
+            self.no_strides_count = 0
+
+        if no_stride:
+            self.no_strides_count += 1
+
+    def sample_double_stride_coverage(self, first_stride, second_stride):
+        no_stride = True
+
+        if first_stride < STRIDE_MIN and second_stride < STRIDE_MIN:
+            self.coverage_database.misc_bins["double_stride_nn_overflow"] += 1
+        if first_stride < STRIDE_MIN and second_stride > STRIDE_MAX:
+            self.coverage_database.misc_bins["double_stride_np_overflow"] += 1
+        if first_stride > STRIDE_MAX and second_stride < STRIDE_MIN:
+            self.coverage_database.misc_bins["double_stride_pn_overflow"] += 1
+        if first_stride > STRIDE_MAX and second_stride > STRIDE_MAX:
+            self.coverage_database.misc_bins["double_stride_pp_overflow"] += 1
+        else:
+            no_stride = False
+            if self.stride_state == NO_STRIDE:
+                self.coverage_database.misc_bins["no_stride_to_double"] += 1
+            elif self.stride_state == SINGLE_STRIDE:
+                self.coverage_database.misc_bins["single_stride_to_double"] += 1
+
+            self.stride_state = DOUBLE_STRIDE
+            self.no_strides_count = 0
+
+        if no_stride:
+            self.no_strides_count += 1
+
+    def check_latest_strides(self):
+        if len(self.last_values) < 16:
+            return
+
+        strides = [b - a for (a, b) in zip(self.last_values, self.last_values[1:])]
+
+        stride_set = set(strides)
+        if len(stride_set) == 1:
+            self.sample_single_stride_coverage(next(iter(stride_set)))
+        elif len(stride_set) == 2:
+            first_stride_set = set(strides[0::2])
+            second_stride_set = set(strides[1::2])
+
+            if len(first_stride_set) == 1 and len(second_stride_set) == 1:
+                self.sample_double_stride_coverage(
+                    next(iter(first_stride_set)), next(iter(second_stride_set))
+                )
+            else:
+                self.no_strides_count += 1
+        else:
+            self.no_strides_count += 1
+
+        if self.no_strides_count > 16:
+            self.stride_state = NO_STRIDE
+
+
+# A stride and its 2-bit saturating confidence, as updated by the two
+# always_comb blocks of stride_detector.sv
+def update_stride(stride, confidence, incoming_stride, incoming_stride_overflow):
+    if incoming_stride == stride and not incoming_stride_overflow:
+        return stride, min(confidence + 1, CONFIDENCE_MAX)
+    if confidence > 0:
+        return stride, confidence - 1
+    return incoming_stride, confidence
+
+
+class StrideDetectorModel:
+    def __init__(self):
+        self.coverage_model = CoverageModel()
+
+        # registers after reset
+        self.last_value = 0
+        self.stride_1 = 0
+        self.stride_1_confidence = 0
+        self.stride_2 = [0, 0]
+        self.stride_2_confidence = [0, 0]
+        self.stride_2_state = STATE_FIRST_STRIDE
+
+    @property
+    def coverage_database(self):
+        return self.coverage_model.coverage_database
+
+    # Drives a single stimulus, returns the reply to it and whether it ends the simulation
+    async def handle_stimulus(self, stimulus_obj):
+        if not isinstance(stimulus_obj, Stimulus):
+            assert False, "Saw bad stimulus message"
+
+        dut_state = self.sample_dut_state()
+
+        valid = stimulus_obj.value is not None
+        # the testbench drives a 32-bit input, which it reads back unsigned
+        value = stimulus_obj.value & VALUE_MASK if valid else 0xBAADDEAD
+
+        self.clock(valid, value)
+
+        self.coverage_model.sample_coverage(
+            valid,
+            value,
+            self.stride_1_valid(),
+            self.stride_1_out(),
+            self.stride_2_valid(),
+            self.stride_2[1],
+        )
+        return (dut_state, self.coverage_database), stimulus_obj.finish
+
+    # One rising clock edge with the given inputs
+    def clock(self, valid, value):
+        if not valid:
+            return
+
+        incoming_stride_full = value - self.last_value
+        incoming_stride_overflow = not (STRIDE_MIN <= incoming_stride_full <= STRIDE_MAX)
+        incoming_stride = incoming_stride_full & STRIDE_MASK
+
+        self.stride_1, self.stride_1_confidence = update_stride(
+            self.stride_1, self.stride_1_confidence, incoming_stride, incoming_stride_overflow
+        )
+
+        i = 0 if self.stride_2_state == STATE_FIRST_STRIDE else 1
+        self.stride_2[i], self.stride_2_confidence[i] = update_stride(
+            self.stride_2[i], self.stride_2_confidence[i], incoming_stride, incoming_stride_overflow
+        )
+        self.stride_2_state = (
+            STATE_SECOND_STRIDE if self.stride_2_state == STATE_FIRST_STRIDE else STATE_FIRST_STRIDE
+        )
+
+        self.last_value = value
+
+    def stride_1_valid(self):
+        return (
+            self.stride_1_confidence == CONFIDENCE_MAX
+            or self.stride_2_confidence[0] == CONFIDENCE_MAX
+        )
+
+    def stride_1_out(self):
+        return self.stride_1 if self.stride_1_confidence == CONFIDENCE_MAX else self.stride_2[0]
+
+    def stride_2_valid(self):
+        return (
+            self.stride_2_confidence[0] == CONFIDENCE_MAX
+            and self.stride_2_confidence[1] == CONFIDENCE_MAX
+            and self.stride_1_confidence != CONFIDENCE_MAX
+        )
+
+    def sample_dut_state(self):
+        return DUTState(
+            last_value=self.last_value,
+            stride_1=self.stride_1,
+            stride_1_confidence=self.stride_1_confidence,
+            stride_2=list(self.stride_2),
+            stride_2_state=self.stride_2_state,
+            stride_2_confidence=list(self.stride_2_confidence),
+        )
+
+
+GOLDEN_MODEL = StrideDetectorModel
+
+
+# Stimulus for recording conformance traces: runs of single and double strides,
+# some beyond the detector's range, mixed with random values and idle cycles
+def random_stimulus(rng: random.Random, length: int):
+    stimuli = []
+    value = rng.getrandbits(32)
+    while len(stimuli) < length:
+        strides = rng.choice(
+            [
+                [rng.randint(STRIDE_MIN, STRIDE_MAX)],
+                [rng.randint(STRIDE_MIN, STRIDE_MAX), rng.randint(STRIDE_MIN, STRIDE_MAX)],
+                [rng.randint(-64, 64), rng.randint(-64, 64)],
+            ]
+        )
+        for i in range(rng.randint(1, 40)):
+            if rng.random() < 0.05:
+                stimuli.append(Stimulus(value=None, finish=False))
+            elif rng.random() < 0.05:
+                value = rng.getrandbits(32)
+                stimuli.append(Stimulus(value=value, finish=False))
+            else:
+                value = (value + strides[i % len(strides)]) & VALUE_MASK
+                stimuli.append(Stimulus(value=value, finish=False))
+    return stimuli[:length]
@@ -104,3 +104,8 @@ class CoverageDatabase:
 
     def get_coverage_bool_vector(self):
         return [1 if x > 0 else 0 for x in self.get_coverage_vector()]
+
+
+# Types sent over the binary wire format (shared_helpers/wire_format.py), the
+# coverage database first. The position of a type is its id on the wire.
+WIRE_TYPES = [CoverageDatabase, Stimulus, DUTState]
@@ -15,6 +15,7 @@ import zmq
 import pickle
 from contextlib import closing
 from stride_detector.shared_types import *
+from shared_helpers.cocotb_helpers import serve_stimuli, open_server_socket, server_address, ask_server_port
 
 import cocotb
 from cocotb.clock import Clock
@@ -203,38 +204,40 @@ class SimulationController:
 
     # Handles driving a new_value when one is provided by `determine_next_value`
     async def controller_loop(self):
-        with self.zmq_context.socket(zmq.REP) as socket:
-            socket.bind(self.zmq_addr)
+        with open_server_socket(self.zmq_context, self.zmq_addr) as socket:
 
             await ClockCycles(self.dut.clk_i, 1)
             await ReadWrite()
 
-            while True:
-                stimulus_msg = socket.recv()
-                stimulus_obj = pickle.loads(stimulus_msg)
-                print(stimulus_obj.value)
+            await serve_stimuli(
+                socket,
+                self.handle_stimulus,
+                lambda: self.coverage_monitor.coverage_database,
+                WIRE_TYPES,
+            )
+            self.end_simulation_event.set()
 
-                if not isinstance(stimulus_obj, Stimulus):
-                    assert False, "Saw bad stimulus message"
+    # Drives a single stimulus, returns the reply to it and whether it ends the simulation
+    async def handle_stimulus(self, stimulus_obj):
+        print(stimulus_obj.value)
 
-                dut_state = self.sample_dut_state()
+        if not isinstance(stimulus_obj, Stimulus):
+            assert False, "Saw bad stimulus message"
 
-                if stimulus_obj.value is None:
-                    self.dut.valid_i.value = 0
-                    self.dut.value_i.value = 0xBAADDEAD
-                else:
-                    self.dut.valid_i.value = 1
-                    self.dut.value_i.value = stimulus_obj.value
+        dut_state = self.sample_dut_state()
 
-                await ClockCycles(self.dut.clk_i, 1)
-                await ReadWrite()
+        if stimulus_obj.value is None:
+            self.dut.valid_i.value = 0
+            self.dut.value_i.value = 0xBAADDEAD
+        else:
+            self.dut.valid_i.value = 1
+            self.dut.value_i.value = stimulus_obj.value
 
-                self.coverage_monitor.sample_coverage()
-                socket.send_pyobj((dut_state, self.coverage_monitor.coverage_database))
+        await ClockCycles(self.dut.clk_i, 1)
+        await ReadWrite()
 
-                if stimulus_obj.finish:
-                    self.end_simulation_event.set()
-                    break
+        self.coverage_monitor.sample_coverage()
+        return (dut_state, self.coverage_monitor.coverage_database), stimulus_obj.finish
 
     def sample_dut_state(self):
         return DUTState(
@@ -260,7 +263,7 @@ class SimulationController:
 async def basic_test(dut):
     from global_shared_types import GlobalCoverageDatabase
 
-    server_port = input("Please enter server's port (e.g. 5050, 5555): ")
+    server_port = ask_server_port("Please enter server's port (e.g. 5050, 5555) or shm://name: ")
     # server_port = "5050"
 
     trial_cnt = 0
@@ -275,7 +278,7 @@ async def basic_test(dut):
         await do_reset(dut)
 
         with closing(
-            SimulationController(dut, coverage_monitor, f"tcp://*:{server_port}")
+            SimulationController(dut, coverage_monitor, server_address(server_port))
         ) as simulation_controller:
             simulation_controller.run_controller()
 
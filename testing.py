@@ -10,7 +10,7 @@ from pprint import pprint
 import fire as fire
 import openai
 
-from models.llm_gpt import num_tokens_from_messages
+from models.token_counter import num_tokens_from_messages
 
 
 def testLlama(ckpt_dir="llama-2-7b-chat/", max_seq_len=4096, max_gen_len=None):